@@ -0,0 +1,52 @@
+"""Notify the scheduler service of due time changes
+
+Revision ID: 2e7b5c8d4f16
+Revises: 9d3a6f1b2c47
+Create Date: 2026-10-18 23:48:12.604113
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2e7b5c8d4f16"
+down_revision = "9d3a6f1b2c47"
+branch_labels = None
+depends_on = None
+
+TABLES = {
+    "reminders": (["next_reminder", "number_of_reminders"], None),
+    "reminders_on_spectra": (["next_reminder", "number_of_reminders"], None),
+    "reminders_on_gcns": (["next_reminder", "number_of_reminders"], None),
+    "reminders_on_shifts": (["next_reminder", "number_of_reminders"], None),
+    "recurringapis": (["next_call", "active"], None),
+    "listings": (["list_name", "params"], "NEW.list_name = 'watchlist'"),
+}
+
+
+def upgrade():
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_due_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('skyportal_due', TG_TABLE_NAME || ':' || NEW.id);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table, (columns, condition) in TABLES.items():
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_notify_due
+                AFTER INSERT OR UPDATE OF {", ".join(columns)} ON {table}
+                FOR EACH ROW {f"WHEN ({condition})" if condition else ""}
+                EXECUTE FUNCTION notify_due_change()
+            """
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_due ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS notify_due_change()")
@@ -0,0 +1,172 @@
+"""Galaxies of catalogs within localizations
+
+Revision ID: 5b8e1d4a7c93
+Revises: 2e7b5c8d4f16
+Create Date: 2026-10-18 23:58:40.210731
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b8e1d4a7c93"
+down_revision = "2e7b5c8d4f16"
+branch_labels = None
+depends_on = None
+
+TRIGGERS = r"""
+CREATE OR REPLACE FUNCTION localization_galaxy_rankings_invalidate_localization() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM localization_galaxy_rankings WHERE localization_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION localization_galaxy_rankings_invalidate_catalogs() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        DELETE FROM localization_galaxy_rankings
+        WHERE catalog_id IN (
+            SELECT catalog_id FROM old_galaxys
+            UNION SELECT catalog_id FROM new_galaxys
+        );
+    ELSE
+        DELETE FROM localization_galaxy_rankings
+        WHERE catalog_id IN (SELECT DISTINCT catalog_id FROM new_galaxys);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER localization_galaxy_rankings_invalidate
+    AFTER UPDATE OF uniq, probdensity, distmu, distsigma, distnorm ON localizations
+    FOR EACH ROW EXECUTE FUNCTION localization_galaxy_rankings_invalidate_localization();
+
+CREATE TRIGGER localization_galaxy_rankings_invalidate_insert
+    AFTER INSERT ON galaxys
+    REFERENCING NEW TABLE AS new_galaxys
+    FOR EACH STATEMENT EXECUTE FUNCTION localization_galaxy_rankings_invalidate_catalogs();
+
+CREATE TRIGGER localization_galaxy_rankings_invalidate_update
+    AFTER UPDATE ON galaxys
+    REFERENCING OLD TABLE AS old_galaxys NEW TABLE AS new_galaxys
+    FOR EACH STATEMENT EXECUTE FUNCTION localization_galaxy_rankings_invalidate_catalogs();
+"""
+
+
+def upgrade():
+    op.create_table(
+        "localization_galaxy_rankings",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("localization_id", sa.Integer(), nullable=False),
+        sa.Column("catalog_id", sa.Integer(), nullable=False),
+        sa.Column("cumprob", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["localization_id"], ["localizations.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["catalog_id"], ["galaxycatalogs.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("localization_id", "catalog_id"),
+    )
+    op.create_index(
+        op.f("ix_localization_galaxy_rankings_created_at"),
+        "localization_galaxy_rankings",
+        ["created_at"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_localization_galaxy_rankings_localization_id"),
+        "localization_galaxy_rankings",
+        ["localization_id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_localization_galaxy_rankings_catalog_id"),
+        "localization_galaxy_rankings",
+        ["catalog_id"],
+        unique=False,
+    )
+    op.create_table(
+        "localization_galaxies",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("ranking_id", sa.Integer(), nullable=False),
+        sa.Column("galaxy_id", sa.Integer(), nullable=False),
+        sa.Column("probdensity", sa.Float(), nullable=False),
+        sa.Column("cum_prob", sa.Float(), nullable=False),
+        sa.Column("probability", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["ranking_id"], ["localization_galaxy_rankings.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["galaxy_id"], ["galaxys.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("ranking_id", "galaxy_id"),
+    )
+    op.create_index(
+        op.f("ix_localization_galaxies_created_at"),
+        "localization_galaxies",
+        ["created_at"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_localization_galaxies_galaxy_id"),
+        "localization_galaxies",
+        ["galaxy_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_localization_galaxies_ranking_id_cum_prob",
+        "localization_galaxies",
+        ["ranking_id", "cum_prob"],
+        unique=False,
+    )
+    op.execute(TRIGGERS)
+
+
+def downgrade():
+    op.execute(
+        "DROP TRIGGER IF EXISTS localization_galaxy_rankings_invalidate_update ON galaxys"
+    )
+    op.execute(
+        "DROP TRIGGER IF EXISTS localization_galaxy_rankings_invalidate_insert ON galaxys"
+    )
+    op.execute(
+        "DROP TRIGGER IF EXISTS localization_galaxy_rankings_invalidate ON localizations"
+    )
+    op.execute(
+        "DROP FUNCTION IF EXISTS localization_galaxy_rankings_invalidate_catalogs()"
+    )
+    op.execute(
+        "DROP FUNCTION IF EXISTS localization_galaxy_rankings_invalidate_localization()"
+    )
+    op.drop_index(
+        "ix_localization_galaxies_ranking_id_cum_prob",
+        table_name="localization_galaxies",
+    )
+    op.drop_index(
+        op.f("ix_localization_galaxies_galaxy_id"), table_name="localization_galaxies"
+    )
+    op.drop_index(
+        op.f("ix_localization_galaxies_created_at"), table_name="localization_galaxies"
+    )
+    op.drop_table("localization_galaxies")
+    op.drop_index(
+        op.f("ix_localization_galaxy_rankings_catalog_id"),
+        table_name="localization_galaxy_rankings",
+    )
+    op.drop_index(
+        op.f("ix_localization_galaxy_rankings_localization_id"),
+        table_name="localization_galaxy_rankings",
+    )
+    op.drop_index(
+        op.f("ix_localization_galaxy_rankings_created_at"),
+        table_name="localization_galaxy_rankings",
+    )
+    op.drop_table("localization_galaxy_rankings")
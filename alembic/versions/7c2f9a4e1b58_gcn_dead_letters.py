@@ -0,0 +1,50 @@
+"""GCN notices that failed to be ingested
+
+Revision ID: 7c2f9a4e1b58
+Revises: 5b8e1d4a7c93
+Create Date: 2026-10-19 09:12:27.530184
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7c2f9a4e1b58"
+down_revision = "5b8e1d4a7c93"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "gcndeadletters",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("topic", sa.String(), nullable=False),
+        sa.Column("kafka_partition", sa.Integer(), nullable=False),
+        sa.Column("kafka_offset", sa.BigInteger(), nullable=False),
+        sa.Column("content", sa.LargeBinary(), nullable=True),
+        sa.Column("error", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_gcndeadletters_created_at"),
+        "gcndeadletters",
+        ["created_at"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_gcndeadletters_topic"),
+        "gcndeadletters",
+        ["topic"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_gcndeadletters_topic"), table_name="gcndeadletters")
+    op.drop_index(op.f("ix_gcndeadletters_created_at"), table_name="gcndeadletters")
+    op.drop_table("gcndeadletters")
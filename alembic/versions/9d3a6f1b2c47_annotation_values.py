@@ -0,0 +1,189 @@
+"""Annotation values
+
+Revision ID: 9d3a6f1b2c47
+Revises: 4b8e2d1c9a73
+Create Date: 2026-10-18 23:05:41.512377
+
+"""
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9d3a6f1b2c47"
+down_revision = "4b8e2d1c9a73"
+branch_labels = None
+depends_on = None
+
+# the triggers keep the table in sync with new and updated annotations
+TRIGGERS = r"""
+CREATE OR REPLACE FUNCTION annotation_value_to_float(value text) RETURNS double precision AS $$
+BEGIN
+    RETURN value::double precision;
+EXCEPTION
+    -- values outside the range of double precision (e.g. 1e999) are
+    -- skipped rather than failing the write of the annotation
+    WHEN numeric_value_out_of_range OR invalid_text_representation THEN
+        RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE STRICT;
+
+CREATE OR REPLACE FUNCTION annotation_values_refresh() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM annotation_values WHERE annotation_id = NEW.id;
+    INSERT INTO annotation_values
+        (annotation_id, obj_id, origin, key, value, group_ids, created_at, modified)
+    SELECT
+        NEW.id,
+        NEW.obj_id,
+        NEW.origin,
+        item.key,
+        float_value,
+        ARRAY(SELECT group_id FROM group_annotations WHERE annotation_id = NEW.id),
+        now() AT TIME ZONE 'utc',
+        now() AT TIME ZONE 'utc'
+    FROM jsonb_each(NEW.data) AS item,
+        LATERAL annotation_value_to_float(item.value #>> '{}') AS float_value
+    WHERE float_value IS NOT NULL AND (
+        jsonb_typeof(item.value) = 'number'
+        OR (
+            jsonb_typeof(item.value) = 'string'
+            AND item.value #>> '{}' ~ '^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$'
+        )
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION annotation_values_refresh_groups() RETURNS trigger AS $$
+DECLARE
+    changed_annotation_id integer;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_annotation_id := OLD.annotation_id;
+    ELSE
+        changed_annotation_id := NEW.annotation_id;
+    END IF;
+    UPDATE annotation_values
+    SET group_ids = ARRAY(
+        SELECT group_id FROM group_annotations
+        WHERE annotation_id = changed_annotation_id
+    )
+    WHERE annotation_id = changed_annotation_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS annotation_values_refresh ON annotations;
+CREATE TRIGGER annotation_values_refresh
+    AFTER INSERT OR UPDATE OF obj_id, origin, data ON annotations
+    FOR EACH ROW EXECUTE FUNCTION annotation_values_refresh();
+
+DROP TRIGGER IF EXISTS annotation_values_refresh_groups ON group_annotations;
+CREATE TRIGGER annotation_values_refresh_groups
+    AFTER INSERT OR UPDATE OR DELETE ON group_annotations
+    FOR EACH ROW EXECUTE FUNCTION annotation_values_refresh_groups();
+"""
+
+
+# copies the existing annotations, once the triggers are in place (so that
+# annotations written meanwhile are not missed); for large tables, the
+# copy can also be redone in batches with tools/backfill_annotation_values.py
+BACKFILL = r"""
+INSERT INTO annotation_values
+    (annotation_id, obj_id, origin, key, value, group_ids, created_at, modified)
+SELECT
+    annotations.id,
+    annotations.obj_id,
+    annotations.origin,
+    item.key,
+    float_value,
+    ARRAY(
+        SELECT group_id FROM group_annotations
+        WHERE annotation_id = annotations.id
+    ),
+    now() AT TIME ZONE 'utc',
+    now() AT TIME ZONE 'utc'
+FROM annotations, jsonb_each(annotations.data) AS item,
+    LATERAL annotation_value_to_float(item.value #>> '{}') AS float_value
+WHERE float_value IS NOT NULL AND (
+    jsonb_typeof(item.value) = 'number'
+    OR (
+        jsonb_typeof(item.value) = 'string'
+        AND item.value #>> '{}' ~ '^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$'
+    )
+)
+ON CONFLICT (annotation_id, key) DO NOTHING;
+"""
+
+
+def upgrade():
+    op.create_table(
+        "annotation_values",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("modified", sa.DateTime(), nullable=False),
+        sa.Column("annotation_id", sa.Integer(), nullable=False),
+        sa.Column("obj_id", sa.String(), nullable=False),
+        sa.Column("origin", sa.String(), nullable=False),
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column(
+            "group_ids",
+            postgresql.ARRAY(sa.Integer()),
+            server_default="{}",
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["annotation_id"], ["annotations.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["obj_id"], ["objs.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("annotation_id", "key"),
+    )
+    op.create_index(
+        op.f("ix_annotation_values_created_at"),
+        "annotation_values",
+        ["created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_annotation_values_key_value",
+        "annotation_values",
+        ["key", "value"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_annotation_values_obj_id_key",
+        "annotation_values",
+        ["obj_id", "key"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_annotation_values_group_ids_gin",
+        "annotation_values",
+        ["group_ids"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.execute(TRIGGERS)
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.execute(
+        "DROP TRIGGER IF EXISTS annotation_values_refresh_groups ON group_annotations"
+    )
+    op.execute("DROP TRIGGER IF EXISTS annotation_values_refresh ON annotations")
+    op.execute("DROP FUNCTION IF EXISTS annotation_values_refresh_groups()")
+    op.execute("DROP FUNCTION IF EXISTS annotation_values_refresh()")
+    op.execute("DROP FUNCTION IF EXISTS annotation_value_to_float(text)")
+    op.drop_index("ix_annotation_values_group_ids_gin", table_name="annotation_values")
+    op.drop_index("ix_annotation_values_obj_id_key", table_name="annotation_values")
+    op.drop_index("ix_annotation_values_key_value", table_name="annotation_values")
+    op.drop_index(
+        op.f("ix_annotation_values_created_at"), table_name="annotation_values"
+    )
+    op.drop_table("annotation_values")
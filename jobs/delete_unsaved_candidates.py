@@ -1,10 +1,44 @@
 #!/usr/bin/env python
 
+import argparse
 import datetime
+import json
+import os
+import time
+
+import sqlalchemy as sa
 
 from baselayer.app.env import load_env
 from skyportal.models import Candidate, DBSession, Obj, Source, init_db
 
+parser = argparse.ArgumentParser(
+    description="Delete the Objs that passed a filter but were never saved as sources, "
+    "in batches ordered by creation date. Progress is checkpointed so that an "
+    "interrupted run resumes where it stopped."
+)
+parser.add_argument(
+    "--dry-run",
+    action="store_true",
+    help="Only count the unsaved Objs and Candidates that would be deleted",
+)
+parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=1000,
+    help="Number of Objs deleted per transaction (default: 1000)",
+)
+parser.add_argument(
+    "--checkpoint",
+    default="persistentdata/delete_unsaved_candidates.json",
+    help="File in which to store the progress of the purge",
+)
+parser.add_argument(
+    "--restart",
+    action="store_true",
+    help="Ignore any existing checkpoint and start from the oldest Obj",
+)
+args, _ = parser.parse_known_args()
+
 env, cfg = load_env()
 init_db(**cfg["database"])
 
@@ -21,17 +55,115 @@ if not 1 <= n_days <= 30:
         "days_to_keep_unsaved_candidates must be an integer between 1 and 30"
     )
 
+if args.batch_size < 1:
+    raise ValueError("--batch-size must be a positive integer")
+
 cutoff_datetime = datetime.datetime.now() - datetime.timedelta(days=n_days)
 
-n_deleted = (
-    DBSession()
-    .query(Obj)
-    .filter(Obj.id.in_(DBSession.query(Candidate.obj_id)))
-    .filter(Obj.id.notin_(DBSession.query(Source.obj_id)))
-    .filter(Obj.created_at <= cutoff_datetime)
-    .delete(synchronize_session="fetch")
+unsaved_objs_filter = sa.and_(
+    sa.exists().where(Candidate.obj_id == Obj.id),
+    ~sa.exists().where(Source.obj_id == Obj.id),
+    Obj.created_at <= cutoff_datetime,
 )
 
-DBSession.commit()
 
-print(f"Deleted {n_deleted} unsaved candidates.")
+def read_checkpoint():
+    if args.restart or not os.path.exists(args.checkpoint):
+        return None
+    with open(args.checkpoint) as f:
+        checkpoint = json.load(f)
+    return datetime.datetime.fromisoformat(checkpoint["created_at"]), checkpoint["id"]
+
+
+def write_checkpoint(created_at, obj_id, n_deleted):
+    os.makedirs(os.path.dirname(os.path.abspath(args.checkpoint)), exist_ok=True)
+    tmp_path = f"{args.checkpoint}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {
+                "created_at": created_at.isoformat(),
+                "id": obj_id,
+                "n_deleted": n_deleted,
+            },
+            f,
+        )
+    os.replace(tmp_path, args.checkpoint)
+
+
+def count():
+    with DBSession() as session:
+        n_old_unsaved_objs = session.scalar(
+            sa.select(sa.func.count(Obj.id)).where(unsaved_objs_filter)
+        )
+        print(f"There are {n_old_unsaved_objs} unsaved Objs older than {n_days} days.")
+
+        n_old_unsaved_cands = session.scalar(
+            sa.select(sa.func.count(Candidate.id)).where(
+                ~sa.exists().where(Source.obj_id == Candidate.obj_id),
+                Candidate.passed_at <= cutoff_datetime,
+            )
+        )
+        print(
+            f"There are {n_old_unsaved_cands} unsaved Candidates older than {n_days} days."
+        )
+
+
+def purge():
+    checkpoint = read_checkpoint()
+    if checkpoint is not None:
+        print(f"Resuming from Obj {checkpoint[1]} (created at {checkpoint[0]})")
+
+    n_deleted = 0
+    start = time.perf_counter()
+    while True:
+        with DBSession() as session:
+            # Objs locked by other sessions (e.g. being saved as sources
+            # right now) are skipped, and will be reconsidered on the next run
+            stmt = (
+                sa.select(Obj.id, Obj.created_at)
+                .where(unsaved_objs_filter)
+                .order_by(Obj.created_at, Obj.id)
+                .limit(args.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            if checkpoint is not None:
+                stmt = stmt.where(
+                    sa.tuple_(Obj.created_at, Obj.id) > sa.tuple_(*checkpoint)
+                )
+            batch = session.execute(stmt).all()
+            if len(batch) == 0:
+                break
+
+            # photometry, thumbnails, candidates etc. are deleted by the cascades
+            session.execute(
+                sa.delete(Obj)
+                .where(Obj.id.in_([obj_id for obj_id, _ in batch]))
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+
+        n_deleted += len(batch)
+        checkpoint = (batch[-1].created_at, batch[-1].id)
+        write_checkpoint(*checkpoint, n_deleted)
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"Deleted {n_deleted} unsaved candidates "
+            f"({n_deleted / elapsed:.1f} rows/s, last created at {checkpoint[0]})"
+        )
+
+    # the purge is complete, the next run starts from the oldest Obj again
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    elapsed = time.perf_counter() - start
+    rate = n_deleted / elapsed if elapsed > 0 else 0
+    print(
+        f"Deleted {n_deleted} unsaved candidates in {elapsed:.1f} s ({rate:.1f} rows/s)."
+    )
+
+
+if args.dry_run:
+    count()
+else:
+    purge()
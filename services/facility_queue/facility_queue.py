@@ -23,6 +23,7 @@ from skyportal.models import (
     FacilityTransactionRequest,
     FollowupRequest,
 )
+from skyportal.utils.http import get_facility_metrics
 
 env, cfg = load_env()
 log = make_log("facility_queue")
@@ -361,7 +362,15 @@ def api(queue):
     class QueueHandler(tornado.web.RequestHandler):
         def get(self):
             self.set_header("Content-Type", "application/json")
-            self.write({"status": "success", "data": {"queue_length": len(queue)}})
+            self.write(
+                {
+                    "status": "success",
+                    "data": {
+                        "queue_length": len(queue),
+                        "facility_http": get_facility_metrics(),
+                    },
+                }
+            )
 
         async def post(self):
             try:
@@ -1,11 +1,15 @@
+import asyncio
 import json
 import os
 import traceback
 import uuid
+from threading import Thread
 
 import lxml
 import sqlalchemy as sa
+import tornado.web
 import xmlschema
+from astropy.time import Time
 from gcn_kafka import Consumer
 
 from baselayer.app.env import load_env
@@ -18,9 +22,10 @@ from skyportal.handlers.api.gcn import (
     post_gcnevent_from_xml,
     post_skymap_from_notice,
 )
-from skyportal.models import DBSession, GcnEvent, User
+from skyportal.models import DBSession, GcnDeadLetter, GcnEvent, User
 from skyportal.utils.gcn import get_dateobs, get_skymap_metadata, get_trigger
 from skyportal.utils.notifications import post_notification
+from skyportal.utils.ordered_consumer import OrderedConsumer, StageMetrics
 from skyportal.utils.services import check_loaded
 
 env, cfg = load_env()
@@ -77,6 +82,244 @@ def is_configured():
     return True
 
 
+def get_ordering_key(topic, alert_type, root, payload):
+    """Notices about the same event (same dateobs) are processed in order."""
+    dateobs = None
+    try:
+        if alert_type == "voevent":
+            dateobs = get_dateobs(root)
+        elif alert_type == "json" and payload.get("trigger_time") is not None:
+            dateobs = Time(
+                Time(payload["trigger_time"], format="isot", precision=0).iso
+            ).datetime
+    except Exception:
+        dateobs = None
+    # notices without a dateobs are processed in order per topic
+    return dateobs if dateobs is not None else topic
+
+
+def prepare_notice(message):
+    """Parse and filter a notice, in the consuming thread.
+
+    Returns None if the notice is rejected, or its ordering key along with
+    everything needed to ingest it.
+    """
+    payload = message.value()
+    topic = message.topic()
+
+    if payload is None:
+        return None
+
+    if payload.find(b"Broker: Unknown topic or partition") != -1:
+        return None
+
+    # initialize some variables tht will be used later
+    notice_type = (
+        str(topic).replace("gcn.notices.", "").replace("gcn.classic.voevent.", "")
+    )
+    root, tags, alert_type = None, None, None
+
+    if any(topic in notice_type for notice_type in voevent_notice_types):
+        alert_type = "voevent"
+        root = get_root_from_payload(payload)
+        tags = get_tags(root, notice_type)
+        # if the notice_type is svom.voevent.grm but there is no ra/dec/error radius
+        # or if the error radius is negative, we reject the event
+        if notice_type == "svom.voevent.grm":
+            loc = root.find("./WhereWhen/ObsDataLocation/ObservationLocation")
+            if loc is None:
+                log(f"Rejecting gcn_event from {topic} due to missing location")
+                return None
+            error = loc.find("./AstroCoords/Position2D/Error2Radius")
+            if error is None:
+                log(f"Rejecting gcn_event from {topic} due to missing error")
+                return None
+            try:
+                error = float(error.text)
+                if error < 0:
+                    raise ValueError("error is negative")
+            except ValueError:
+                log(f"Rejecting gcn_event from {topic} due to invalid error: {error}")
+                return None
+
+    elif any(topic in notice_type for notice_type in json_notice_types):
+        alert_type = "json"
+        payload = json.loads(payload.decode("utf8"))
+        payload["notice_type"] = notice_type
+        tags = get_json_tags(payload)
+
+        if payload["notice_type"] == "icecube.lvk_nu_track_search":
+            # 2 sigma
+            pval_bayesian = payload.get("pval_bayesian", 1)
+            if not isinstance(pval_bayesian, int | float) or pval_bayesian > 0.05:
+                log(
+                    f"Rejecting gcn_event from {topic} due to pval_bayesian: {pval_bayesian}"
+                )
+                return None
+
+    tags_intersection = list(set(tags).intersection(set(reject_tags)))
+    if len(tags_intersection) > 0:
+        log(f"Rejecting gcn_event from {topic} due to tag(s): {tags_intersection}")
+        return None
+
+    notice = {
+        "topic": topic,
+        "payload": payload,
+        "notice_type": notice_type,
+        "alert_type": alert_type,
+        "root": root,
+    }
+    return get_ordering_key(topic, alert_type, root, payload), notice
+
+
+def ingest_notice(notice, metrics):
+    """Ingest a notice (event and skymap), in a worker thread.
+
+    Raises if the event could not be ingested, so that it can be retried.
+    """
+    topic, payload, notice_type, alert_type, root = (
+        notice["topic"],
+        notice["payload"],
+        notice["notice_type"],
+        notice["alert_type"],
+        notice["root"],
+    )
+    dateobs, notice_id = None, None
+
+    with DBSession() as session:
+        # check if the user exists in the DB, and assign it to the session
+        user = session.scalar(sa.select(User).where(User.id == user_id))
+        if user is None:
+            log(f"User {user_id} not found in DB, cannot ingest gcn_event")
+            return
+        session.user_or_token = user
+
+        # we skip the ingestion of a retraction of the event does not exist in the DB
+        if notice_type == "LVC_RETRACTION":
+            dateobs = get_dateobs(root)
+            trigger_id = get_trigger(root)
+            existing_event = None
+            if trigger_id is not None:
+                existing_event = session.scalar(
+                    sa.select(GcnEvent).where(GcnEvent.trigger_id == trigger_id)
+                )
+            if existing_event is None and dateobs is not None:
+                existing_event = session.scalar(
+                    sa.select(GcnEvent).where(GcnEvent.dateobs == dateobs)
+                )
+            if existing_event is None:
+                log(f"No event found to retract for gcn_event from {topic}, skipping")
+                return
+
+        # event ingestion
+        log(f"Ingesting gcn_event from {topic}")
+        try:
+            with metrics.time("event"):
+                if alert_type == "voevent":
+                    dateobs, _, notice_id = post_gcnevent_from_xml(
+                        payload,
+                        user_id,
+                        session,
+                        notice_type=notice_type,
+                        post_skymap=False,
+                        asynchronous=False,
+                        notify=False,
+                    )
+                elif alert_type == "json":
+                    dateobs, _, notice_id = post_gcnevent_from_json(
+                        payload,
+                        user_id,
+                        session,
+                        post_skymap=False,
+                        asynchronous=False,
+                        notify=False,
+                    )
+        except Exception as e:
+            session.rollback()
+            raise ValueError(f"Failed to ingest gcn_event from {topic}: {e}")
+
+        notified_on_skymap = False
+        status, metadata = None, None
+        with metrics.time("skymap_metadata"):
+            if alert_type == "voevent":
+                status, metadata = get_skymap_metadata(root, notice_type, 15)
+            elif alert_type == "json":
+                status, metadata = get_skymap_metadata(payload, notice_type, 15)
+
+        if status in ["available", "cone"]:
+            log(f"Ingesting skymap for gcn_event: {dateobs}, notice_id: {notice_id}")
+            try:
+                with metrics.time("skymap"):
+                    localization_id = post_skymap_from_notice(
+                        dateobs,
+                        notice_id,
+                        user_id,
+                        session,
+                        asynchronous=False,
+                        notify=False,
+                    )
+                request_body = {
+                    "target_class_name": "Localization",
+                    "target_id": localization_id,
+                }
+                with metrics.time("notification"):
+                    notified_on_skymap = post_notification(request_body, timeout=30)
+            except Exception as e:
+                log(
+                    f"Failed to ingest skymap for gcn_event: {dateobs}, notice_id: {notice_id}: {e}"
+                )
+        elif status == "unavailable":
+            log(
+                f"No skymap available for gcn_event: {dateobs}, notice_id: {notice_id} with url: {metadata.get('url', None)}"
+            )
+        else:
+            log(f"No skymap available for gcn_event: {dateobs}, notice_id: {notice_id}")
+
+        if not notified_on_skymap:
+            request_body = {
+                "target_class_name": "GcnNotice",
+                "target_id": notice_id,
+            }
+            with metrics.time("notification"):
+                post_notification(request_body, timeout=30)
+
+
+def dead_letter(message, error):
+    """Record a notice that failed to be ingested, so that its offset
+    can be committed without losing it."""
+    with DBSession() as session:
+        session.add(
+            GcnDeadLetter(
+                topic=message.topic(),
+                kafka_partition=message.partition(),
+                kafka_offset=message.offset(),
+                content=message.value(),
+                error=str(error),
+            )
+        )
+        session.commit()
+    log(
+        f"Recorded gcn_event from {message.topic()} (offset {message.offset()}) "
+        f"as failed: {error}"
+    )
+
+
+def api(metrics):
+    class MetricsHandler(tornado.web.RequestHandler):
+        def get(self):
+            self.set_header("Content-Type", "application/json")
+            self.write({"status": "success", "data": metrics.summary()})
+
+    app = tornado.web.Application([(r"/", MetricsHandler)])
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    app.listen(cfg["ports.gcn_service"])
+    loop.run_forever()
+
+
 @check_loaded(logger=log)
 def poll_events(*args, **kwargs):
     client_group_id = cfg.get("gcn.client_group_id")
@@ -103,192 +346,24 @@ def poll_events(*args, **kwargs):
     except Exception as e:
         log(f"Failed to subscribe to gcn events: {e}")
         return
+
+    metrics = StageMetrics()
+    Thread(target=api, args=(metrics,), daemon=True).start()
+
+    # notices are processed concurrently, in order for a given event,
+    # and committed once ingested (or recorded as failed)
+    processor = OrderedConsumer(
+        prepare_notice,
+        ingest_notice,
+        lambda message: consumer.commit(message, asynchronous=False),
+        dead_letter=dead_letter,
+        max_workers=cfg.get("gcn.workers", 4),
+        metrics=metrics,
+        log=log,
+    )
     while True:
         try:
-            for message in consumer.consume():
-                payload = message.value()
-                topic = message.topic()
-                consumer.commit(message)
-
-                if payload is None:
-                    continue
-
-                if payload.find(b"Broker: Unknown topic or partition") != -1:
-                    continue
-
-                # initialize some variables tht will be used later
-                notice_type = (
-                    str(topic)
-                    .replace("gcn.notices.", "")
-                    .replace("gcn.classic.voevent.", "")
-                )
-                root, tags, alert_type, dateobs, notice_id = (
-                    None,
-                    None,
-                    None,
-                    None,
-                    None,
-                )
-
-                if any(topic in notice_type for notice_type in voevent_notice_types):
-                    alert_type = "voevent"
-                    root = get_root_from_payload(payload)
-                    tags = get_tags(root, notice_type)
-                    # if the notice_type is svom.voevent.grm but there is no ra/dec/error radius
-                    # or if the error radius is negative, we reject the event
-                    if notice_type == "svom.voevent.grm":
-                        loc = root.find(
-                            "./WhereWhen/ObsDataLocation/ObservationLocation"
-                        )
-                        if loc is None:
-                            log(
-                                f"Rejecting gcn_event from {topic} due to missing location"
-                            )
-                            continue
-                        error = loc.find("./AstroCoords/Position2D/Error2Radius")
-                        if error is None:
-                            log(
-                                f"Rejecting gcn_event from {topic} due to missing error"
-                            )
-                            continue
-                        try:
-                            error = float(error.text)
-                            if error < 0:
-                                raise ValueError("error is negative")
-                        except ValueError:
-                            log(
-                                f"Rejecting gcn_event from {topic} due to invalid error: {error}"
-                            )
-                            continue
-
-                elif any(topic in notice_type for notice_type in json_notice_types):
-                    alert_type = "json"
-                    payload = json.loads(payload.decode("utf8"))
-                    payload["notice_type"] = notice_type
-                    tags = get_json_tags(payload)
-
-                    if payload["notice_type"] == "icecube.lvk_nu_track_search":
-                        # 2 sigma
-                        pval_bayesian = payload.get("pval_bayesian", 1)
-                        if (
-                            not isinstance(pval_bayesian, int | float)
-                            or pval_bayesian > 0.05
-                        ):
-                            log(
-                                f"Rejecting gcn_event from {topic} due to pval_bayesian: {pval_bayesian}"
-                            )
-                            continue
-
-                tags_intersection = list(set(tags).intersection(set(reject_tags)))
-                if len(tags_intersection) > 0:
-                    log(
-                        f"Rejecting gcn_event from {topic} due to tag(s): {tags_intersection}"
-                    )
-                    continue
-
-                with DBSession() as session:
-                    # check if the user exists in the DB, and assign it to the session
-                    user = session.scalar(sa.select(User).where(User.id == user_id))
-                    if user is None:
-                        log(f"User {user_id} not found in DB, cannot ingest gcn_event")
-                        continue
-                    session.user_or_token = user
-
-                    # we skip the ingestion of a retraction of the event does not exist in the DB
-                    if notice_type == "LVC_RETRACTION":
-                        dateobs = get_dateobs(root)
-                        trigger_id = get_trigger(root)
-                        existing_event = None
-                        if trigger_id is not None:
-                            existing_event = session.scalar(
-                                sa.select(GcnEvent).where(
-                                    GcnEvent.trigger_id == trigger_id
-                                )
-                            )
-                        if existing_event is None and dateobs is not None:
-                            existing_event = session.scalar(
-                                sa.select(GcnEvent).where(GcnEvent.dateobs == dateobs)
-                            )
-                        if existing_event is None:
-                            log(
-                                f"No event found to retract for gcn_event from {message.topic()}, skipping"
-                            )
-                            continue
-
-                    # event ingestion
-                    log(f"Ingesting gcn_event from {message.topic()}")
-                    try:
-                        if alert_type == "voevent":
-                            dateobs, _, notice_id = post_gcnevent_from_xml(
-                                payload,
-                                user_id,
-                                session,
-                                notice_type=notice_type,
-                                post_skymap=False,
-                                asynchronous=False,
-                                notify=False,
-                            )
-                        elif alert_type == "json":
-                            dateobs, _, notice_id = post_gcnevent_from_json(
-                                payload,
-                                user_id,
-                                session,
-                                post_skymap=False,
-                                asynchronous=False,
-                                notify=False,
-                            )
-                    except Exception as e:
-                        traceback.print_exc()
-                        log(f"Failed to ingest gcn_event from {message.topic()}: {e}")
-                        continue
-
-                    notified_on_skymap = False
-                    status, metadata = None, None
-                    if alert_type == "voevent":
-                        status, metadata = get_skymap_metadata(root, notice_type, 15)
-                    elif alert_type == "json":
-                        status, metadata = get_skymap_metadata(payload, notice_type, 15)
-
-                    if status in ["available", "cone"]:
-                        log(
-                            f"Ingesting skymap for gcn_event: {dateobs}, notice_id: {notice_id}"
-                        )
-                        try:
-                            localization_id = post_skymap_from_notice(
-                                dateobs,
-                                notice_id,
-                                user_id,
-                                session,
-                                asynchronous=False,
-                                notify=False,
-                            )
-                            request_body = {
-                                "target_class_name": "Localization",
-                                "target_id": localization_id,
-                            }
-                            notified_on_skymap = post_notification(
-                                request_body, timeout=30
-                            )
-                        except Exception as e:
-                            log(
-                                f"Failed to ingest skymap for gcn_event: {dateobs}, notice_id: {notice_id}: {e}"
-                            )
-                    elif status == "unavailable":
-                        log(
-                            f"No skymap available for gcn_event: {dateobs}, notice_id: {notice_id} with url: {metadata.get('url', None)}"
-                        )
-                    else:
-                        log(
-                            f"No skymap available for gcn_event: {dateobs}, notice_id: {notice_id}"
-                        )
-
-                    if not notified_on_skymap:
-                        request_body = {
-                            "target_class_name": "GcnNotice",
-                            "target_id": notice_id,
-                        }
-                        post_notification(request_body, timeout=30)
-
+            processor.run(iter(lambda: consumer.consume(timeout=1), None))
         except Exception as e:
             traceback.print_exc()
             log(f"Failed to consume gcn event: {e}")
@@ -1,9 +1,15 @@
+import asyncio
 import itertools
+import multiprocessing
+import queue
 import time
 import traceback
+from datetime import datetime, timezone
+from threading import Thread
 
 import arrow
 import sqlalchemy as sa
+import tornado.web
 
 from baselayer.app.env import load_env
 from baselayer.app.flow import Flow
@@ -19,6 +25,7 @@ from skyportal.models import (
     EventObservationPlan,
     ObservationPlanRequest,
 )
+from skyportal.utils.ordered_consumer import StageMetrics
 from skyportal.utils.services import check_loaded
 
 env, cfg = load_env()
@@ -147,218 +154,382 @@ def prioritize_requests(requests):
         return 0
 
 
-@check_loaded(logger=log)
-def service(*args, **kwargs):
-    log("Starting observation plan queue.")
-    while True:
-        with DBSession() as session:
-            try:
-                stmt = sa.select(ObservationPlanRequest).where(
-                    # we only want to process plans that have been created in the last 72 hours
-                    sa.or_(
-                        sa.and_(
-                            ObservationPlanRequest.status == "pending submission",
-                            ObservationPlanRequest.created_at
-                            > arrow.utcnow().shift(days=-3).datetime,
-                        ),
-                        # or plans that have been "running" for more than 5 minutes but less than 1 hours
-                        # this is a way to grab plans that have been stuck in the running state
-                        # and have not been processed
-                        sa.and_(
-                            ObservationPlanRequest.status == "running",
-                            ObservationPlanRequest.created_at
-                            < arrow.utcnow().shift(minutes=-5).datetime,
-                            ObservationPlanRequest.created_at
-                            > arrow.utcnow().shift(hours=-1).datetime,
-                        ),
-                    )
-                )
-                single_requests = session.scalars(stmt).unique().all()
-
-                # reprocessing plans that were marked as running before (and probably stuck in that state)
-                # is lower priority, so if we have any pending submission plans, we prioritize those
-                # and remove the running plans from the list
-                if any(
-                    request.status == "pending submission"
-                    for request in single_requests
-                ):
-                    single_requests = [
-                        request
-                        for request in single_requests
-                        if request.status == "pending submission"
-                    ]
+def try_lock(connection, keys):
+    """Take session-level advisory locks on all the keys, or on none of
+    them if one is held by another worker."""
+    acquired = []
+    for key in sorted(keys):
+        if connection.scalar(
+            sa.text("SELECT pg_try_advisory_lock(hashtextextended(:key, 0))"),
+            {"key": key},
+        ):
+            acquired.append(key)
+        else:
+            unlock(connection, acquired)
+            return False
+    return True
 
-                # requests is a list. We want to group that list of plans to be a list of list,
-                # we group based on the plans 'combined_id' which is a unique uuid for a group of plans
-                # plans that are not grouped simply don't have one
-                combined_requests = [
-                    request
-                    for request in single_requests
-                    if request.combined_id is not None
-                ]
-                requests = [
-                    list(group)
-                    for _, group in itertools.groupby(
-                        combined_requests, lambda x: x.combined_id
-                    )
-                ] + [
-                    [request]
-                    for request in single_requests
-                    if request.combined_id is None
-                ]
-
-                if len(requests) == 0:
-                    time.sleep(5)
-                    continue
 
-                log(f"Prioritizing {len(requests)} observation plan requests...")
+def unlock(connection, keys):
+    for key in keys:
+        connection.execute(
+            sa.text("SELECT pg_advisory_unlock(hashtextextended(:key, 0))"),
+            {"key": key},
+        )
 
-                index = prioritize_requests(requests)
 
-                plan_requests = requests[index]
-                plan_ids = []
-                if len(plan_requests) == 1:
-                    plan_request = plan_requests[0]
-                    try:
-                        plan_id = (
-                            plan_request.allocation.instrument.api_class_obsplan.submit(
-                                plan_request.id, asynchronous=False
-                            )
-                        )
-                        plan_ids.append(plan_id)
-                    except Exception as e:
-                        traceback.print_exc()
-                        plan_request.status = "failed to process"
-                        log(f"Error processing observation plan: {e.args[0]}")
-                        session.commit()
-                        time.sleep(2)
-                        continue
-                    plan_request = session.scalar(
-                        sa.select(ObservationPlanRequest).where(
-                            ObservationPlanRequest.id == plan_request.id
-                        )
-                    )
-                    log(f"Plan {plan_id} status: {plan_request.status}")
-                    if plan_request.status == "running":
-                        plan_request.status = "complete"
-                        session.merge(plan_request)
-                        session.commit()
-
-                    try:
-                        flow = Flow()
-                        flow.push(
-                            "*",
-                            "skyportal/REFRESH_GCNEVENT_OBSERVATION_PLAN_REQUESTS",
-                            payload={"gcnEvent_dateobs": plan_request.gcnevent.dateobs},
-                        )
-                    except Exception as e:
-                        log(
-                            f"Error refreshing observation plan requests on the frontend: {e.args[0]}"
-                        )
+def lock_connect():
+    """New connection to hold the advisory locks of a worker."""
+    return (
+        DBSession.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT")
+    )
 
-                else:
-                    try:
-                        plan_ids = plan_requests[
-                            0
-                        ].allocation.instrument.api_class_obsplan.submit_multiple(
-                            plan_requests, asynchronous=False
-                        )
-                    except Exception as e:
-                        for plan_request in plan_requests:
-                            plan_request.status = "failed to process"
-                        log(
-                            f"Error processing combined plans: {[plan_request.id for plan_request in plan_requests]}: {str(e)}"
-                        )
-                        session.commit()
-                        time.sleep(2)
-                        continue
-
-                    for plan_request in plan_requests:
-                        plan_request = session.scalar(
-                            sa.select(ObservationPlanRequest).where(
-                                ObservationPlanRequest.id == plan_request.id
-                            )
-                        )
-                        log(f"Plan {plan_request.id} status: {plan_request.status}")
-                        if plan_request.status == "running":
-                            plan_request.status = "complete"
-                            session.merge(plan_request)
-                            session.commit()
-
-                    try:
-                        unique_dateobs = {
-                            plan.gcnevent.dateobs for plan in plan_requests
-                        }
-                        flow = Flow()
-                        for dateobs in unique_dateobs:
-                            flow.push(
-                                "*",
-                                "skyportal/REFRESH_GCNEVENT_OBSERVATION_PLAN_REQUESTS",
-                                payload={"gcnEvent_dateobs": dateobs},
-                            )
-                    except Exception as e:
-                        log(
-                            f"Error refreshing observation plan requests on the frontend: {e}"
-                        )
 
-                log(f"Generated plans: {plan_ids}")
-                for id in plan_ids:
-                    try:
-                        plan = session.scalars(
-                            sa.select(EventObservationPlan).where(
-                                EventObservationPlan.id == int(id)
-                            )
-                        ).first()
-                        default = plan.observation_plan_request.payload.get(
-                            "default", None
+def discard(connection):
+    """Close a lock connection after a database error. It is invalidated
+    rather than returned to the pool, so that the database releases the
+    advisory locks it may still hold."""
+    if connection is None:
+        return
+    try:
+        connection.invalidate()
+        connection.close()
+    except Exception as e:
+        log(f"Error occured closing the lock connection: {e}")
+
+
+def claim_requests(session, lock_connection):
+    """Claim the most urgent group of plan requests that no other worker is
+    processing.
+
+    The pending requests are selected with FOR UPDATE SKIP LOCKED, so that
+    workers claiming at the same time consider different requests. The
+    claimed requests, and the telescopes they are for, are then locked with
+    advisory locks on the worker's connection until they are processed: the
+    plans for a telescope are generated one at a time, while plans for
+    different telescopes are generated in parallel. Requests left "running"
+    by a worker that died are no longer locked, and are claimed again.
+
+    Returns
+    -------
+    tuple or None
+        The claimed requests and the keys of their locks, or None if there is
+        no request to process.
+    """
+    stmt = (
+        sa.select(ObservationPlanRequest)
+        .where(
+            # we only want to process plans that have been created in the last 72 hours
+            sa.or_(
+                sa.and_(
+                    ObservationPlanRequest.status == "pending submission",
+                    ObservationPlanRequest.created_at
+                    > arrow.utcnow().shift(days=-3).datetime,
+                ),
+                # or plans that have been "running" for more than 5 minutes but less than 1 hours
+                # this is a way to grab plans that have been stuck in the running state
+                # and have not been processed
+                sa.and_(
+                    ObservationPlanRequest.status == "running",
+                    ObservationPlanRequest.created_at
+                    < arrow.utcnow().shift(minutes=-5).datetime,
+                    ObservationPlanRequest.created_at
+                    > arrow.utcnow().shift(hours=-1).datetime,
+                ),
+            )
+        )
+        .with_for_update(skip_locked=True, of=ObservationPlanRequest)
+    )
+    single_requests = session.scalars(stmt).unique().all()
+
+    # reprocessing plans that were marked as running before (and probably stuck in that state)
+    # is lower priority, so if we have any pending submission plans, we prioritize those
+    # and remove the running plans from the list
+    if any(request.status == "pending submission" for request in single_requests):
+        single_requests = [
+            request
+            for request in single_requests
+            if request.status == "pending submission"
+        ]
+
+    # requests is a list. We want to group that list of plans to be a list of list,
+    # we group based on the plans 'combined_id' which is a unique uuid for a group of plans
+    # plans that are not grouped simply don't have one
+    combined_requests = sorted(
+        (request for request in single_requests if request.combined_id is not None),
+        key=lambda x: str(x.combined_id),
+    )
+    requests = [
+        list(group)
+        for _, group in itertools.groupby(
+            combined_requests, lambda x: str(x.combined_id)
+        )
+    ] + [[request] for request in single_requests if request.combined_id is None]
+
+    if len(requests) > 0:
+        log(f"Prioritizing {len(requests)} observation plan requests...")
+
+    while len(requests) > 0:
+        plan_requests = requests.pop(prioritize_requests(requests))
+        lock_keys = {
+            f"observation_plan_request:{request.id}" for request in plan_requests
+        } | {
+            f"observation_plan_telescope:{request.allocation.instrument.telescope_id}"
+            for request in plan_requests
+        }
+        if try_lock(lock_connection, lock_keys):
+            return plan_requests, lock_keys
+
+    return None
+
+
+def record_latency(plan_requests, claimed_at, metrics_queue):
+    """Publish the end-to-end latency of processed plan requests: the time
+    spent in the queue, generating the plan, and in total."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for plan_request in plan_requests:
+        status = plan_request.status
+        if status == "complete":
+            metrics_queue.put(("record", "queue", claimed_at - plan_request.created_at))
+            metrics_queue.put(("record", "plan", now - claimed_at))
+            metrics_queue.put(("record", "total", now - plan_request.created_at))
+            log(
+                f"Plan request {plan_request.id} completed in {(now - plan_request.created_at).total_seconds():.1f} s "
+                f"(queued for {(claimed_at - plan_request.created_at).total_seconds():.1f} s)"
+            )
+        metrics_queue.put(
+            ("increment", "complete" if status == "complete" else "failed", 1)
+        )
+
+
+def process_requests(session, plan_requests):
+    """Generate the observation plans of a group of requests, then send the
+    plans and analyze them as set by their default plan requests."""
+    plan_ids = []
+    if len(plan_requests) == 1:
+        plan_request = plan_requests[0]
+        try:
+            plan_id = plan_request.allocation.instrument.api_class_obsplan.submit(
+                plan_request.id, asynchronous=False
+            )
+            plan_ids.append(plan_id)
+        except Exception as e:
+            traceback.print_exc()
+            plan_request.status = "failed to process"
+            log(f"Error processing observation plan: {e.args[0]}")
+            session.commit()
+            return
+        plan_request = session.scalar(
+            sa.select(ObservationPlanRequest).where(
+                ObservationPlanRequest.id == plan_request.id
+            )
+        )
+        log(f"Plan {plan_id} status: {plan_request.status}")
+        if plan_request.status == "running":
+            plan_request.status = "complete"
+            session.merge(plan_request)
+            session.commit()
+
+        try:
+            flow = Flow()
+            flow.push(
+                "*",
+                "skyportal/REFRESH_GCNEVENT_OBSERVATION_PLAN_REQUESTS",
+                payload={"gcnEvent_dateobs": plan_request.gcnevent.dateobs},
+            )
+        except Exception as e:
+            log(
+                f"Error refreshing observation plan requests on the frontend: {e.args[0]}"
+            )
+
+    else:
+        try:
+            plan_ids = plan_requests[
+                0
+            ].allocation.instrument.api_class_obsplan.submit_multiple(
+                plan_requests, asynchronous=False
+            )
+        except Exception as e:
+            for plan_request in plan_requests:
+                plan_request.status = "failed to process"
+            log(
+                f"Error processing combined plans: {[plan_request.id for plan_request in plan_requests]}: {str(e)}"
+            )
+            session.commit()
+            return
+
+        for plan_request in plan_requests:
+            plan_request = session.scalar(
+                sa.select(ObservationPlanRequest).where(
+                    ObservationPlanRequest.id == plan_request.id
+                )
+            )
+            log(f"Plan {plan_request.id} status: {plan_request.status}")
+            if plan_request.status == "running":
+                plan_request.status = "complete"
+                session.merge(plan_request)
+                session.commit()
+
+        try:
+            unique_dateobs = {plan.gcnevent.dateobs for plan in plan_requests}
+            flow = Flow()
+            for dateobs in unique_dateobs:
+                flow.push(
+                    "*",
+                    "skyportal/REFRESH_GCNEVENT_OBSERVATION_PLAN_REQUESTS",
+                    payload={"gcnEvent_dateobs": dateobs},
+                )
+        except Exception as e:
+            log(f"Error refreshing observation plan requests on the frontend: {e}")
+
+    log(f"Generated plans: {plan_ids}")
+    for id in plan_ids:
+        try:
+            plan = session.scalars(
+                sa.select(EventObservationPlan).where(
+                    EventObservationPlan.id == int(id)
+                )
+            ).first()
+            default = plan.observation_plan_request.payload.get("default", None)
+            if default is not None:
+                defaultobsplanrequest = session.scalars(
+                    sa.select(DefaultObservationPlanRequest).where(
+                        DefaultObservationPlanRequest.id == int(default)
+                    )
+                ).first()
+                if defaultobsplanrequest is not None:
+                    if defaultobsplanrequest.auto_send:
+                        send_observation_plan(
+                            plan.observation_plan_request.id,
+                            session=session,
+                            auto_send=True,
+                            default_obsplan_id=default,
                         )
-                        if default is not None:
-                            defaultobsplanrequest = session.scalars(
-                                sa.select(DefaultObservationPlanRequest).where(
-                                    DefaultObservationPlanRequest.id == int(default)
+                    for (
+                        default_survey_efficiency
+                    ) in defaultobsplanrequest.default_survey_efficiencies:
+                        try:
+                            post_survey_efficiency_analysis(
+                                default_survey_efficiency.to_dict(),
+                                plan.observation_plan_request.id,
+                                1,
+                                session,
+                                asynchronous=False,
+                            )
+                        except Exception as e:
+                            if (
+                                "Need at least one observation to evaluate efficiency"
+                                in str(e)
+                            ):
+                                log(
+                                    f"Error processing default survey efficiency for plan {id}: {e}"
                                 )
-                            ).first()
-                            if defaultobsplanrequest is not None:
-                                if defaultobsplanrequest.auto_send:
-                                    send_observation_plan(
-                                        plan.observation_plan_request.id,
-                                        session=session,
-                                        auto_send=True,
-                                        default_obsplan_id=default,
-                                    )
-                                for (
-                                    default_survey_efficiency
-                                ) in defaultobsplanrequest.default_survey_efficiencies:
-                                    try:
-                                        post_survey_efficiency_analysis(
-                                            default_survey_efficiency.to_dict(),
-                                            plan.observation_plan_request.id,
-                                            1,
-                                            session,
-                                            asynchronous=False,
-                                        )
-                                    except Exception as e:
-                                        if (
-                                            "Need at least one observation to evaluate efficiency"
-                                            in str(e)
-                                        ):
-                                            log(
-                                                f"Error processing default survey efficiency for plan {id}: {e}"
-                                            )
-                                        else:
-                                            raise e
-                    except Exception as e:
-                        traceback.print_exc()
-                        log(
-                            f"Error occured processing default queue submission or survey efficiency for plan {id}: {e}"
-                        )
-                        session.rollback()
-                        time.sleep(2)
+                            else:
+                                raise e
+        except Exception as e:
+            traceback.print_exc()
+            log(
+                f"Error occured processing default queue submission or survey efficiency for plan {id}: {e}"
+            )
+            session.rollback()
 
+
+def worker(index, metrics_queue):
+    """Claim and process plan requests, until the process is stopped."""
+    log(f"Starting observation plan queue worker {index}.")
+    # connection holding the advisory locks on the requests being processed,
+    # opened again after database errors
+    lock_connection = None
+    while True:
+        with DBSession() as session:
+            try:
+                if lock_connection is None:
+                    lock_connection = lock_connect()
+                claimed = claim_requests(session, lock_connection)
+            except Exception as e:
+                log(f"Error occured claiming observation plan requests: {e}")
+                session.rollback()
+                discard(lock_connection)
+                lock_connection = None
+                time.sleep(2)
+                continue
+
+            if claimed is None:
+                session.rollback()
+                time.sleep(5)
+                continue
+
+            plan_requests, lock_keys = claimed
+            claimed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+            # release the row locks, the requests stay locked by this worker
+            session.commit()
+            try:
+                process_requests(session, plan_requests)
+                for plan_request in plan_requests:
+                    session.refresh(plan_request)
+                record_latency(plan_requests, claimed_at, metrics_queue)
             except Exception as e:
                 log(f"Error occured processing the observation plan queue: {e}")
                 session.rollback()
                 time.sleep(2)
+            finally:
+                try:
+                    unlock(lock_connection, lock_keys)
+                except Exception as e:
+                    log(f"Error occured releasing observation plan request locks: {e}")
+                    discard(lock_connection)
+                    lock_connection = None
+
+
+def api(metrics):
+    class MetricsHandler(tornado.web.RequestHandler):
+        def get(self):
+            self.set_header("Content-Type", "application/json")
+            self.write({"status": "success", "data": metrics.summary()})
+
+    app = tornado.web.Application([(r"/", MetricsHandler)])
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    app.listen(cfg["ports.observation_plan_queue"])
+    loop.run_forever()
+
+
+@check_loaded(logger=log)
+def service(*args, **kwargs):
+    n_workers = cfg.get("observation_plan_queue.workers", 2)
+    log(f"Starting observation plan queue with {n_workers} workers.")
+
+    # the workers publish the latency of the plans they process, which
+    # are aggregated and served here
+    metrics = StageMetrics()
+    Thread(target=api, args=(metrics,), daemon=True).start()
+
+    # spawn rather than fork, as the database connections cannot be shared
+    context = multiprocessing.get_context("spawn")
+    metrics_queue = context.Queue()
+    workers = {}
+    while True:
+        for index in range(n_workers):
+            if index in workers and workers[index].is_alive():
+                continue
+            if index in workers:
+                log(f"Worker {index} exited with code {workers[index].exitcode}")
+            workers[index] = context.Process(
+                target=worker, args=(index, metrics_queue), daemon=True
+            )
+            workers[index].start()
+
+        try:
+            kind, name, value = metrics_queue.get(timeout=5)
+        except queue.Empty:
+            continue
+        if kind == "record":
+            metrics.record(name, value.total_seconds())
+        else:
+            metrics.increment(name, value)
 
 
 if __name__ == "__main__":
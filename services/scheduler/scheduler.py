@@ -0,0 +1,581 @@
+import asyncio
+import json
+from collections import defaultdict
+from datetime import timedelta
+from threading import Thread
+
+import psycopg2
+import requests
+import sqlalchemy as sa
+import tornado.web
+from astropy.time import Time
+from sqlalchemy.orm import joinedload
+
+from baselayer.app.env import load_env
+from baselayer.app.flow import Flow
+from baselayer.app.models import init_db
+from baselayer.log import make_log
+from skyportal.handlers.api.alert import (
+    alert_available,
+    get_alerts_by_position,
+    post_alert,
+)
+from skyportal.models import (
+    DUE_CHANNEL,
+    DBSession,
+    Listing,
+    Obj,
+    RecurringAPI,
+    Reminder,
+    ReminderOnGCN,
+    ReminderOnShift,
+    ReminderOnSpectrum,
+    Telescope,
+    User,
+    UserNotification,
+)
+from skyportal.models.gcn import GcnEvent
+from skyportal.models.shift import Shift
+from skyportal.tests import api as call_api
+from skyportal.utils.due_scheduler import DueScheduler, JobSource, listen, utcnow
+from skyportal.utils.ordered_consumer import StageMetrics
+from skyportal.utils.services import HOST, check_loaded
+from skyportal.utils.watch_list import search_watched_positions
+
+try:
+    from skyportal.handlers.api.alert import get_alerts_by_positions, post_alerts
+except ImportError:
+    # extensions that only implement single cone searches and posts
+    get_alerts_by_positions = post_alerts = None
+
+env, cfg = load_env()
+
+init_db(**cfg["database"])
+
+log = make_log("scheduler")
+
+MAX_RETRIES = 10
+
+
+class Reminders(JobSource):
+    """Reminders on sources, spectra, GCN events and shifts, one job per
+    reminder, due at its next_reminder."""
+
+    name = "reminders"
+    classes = {
+        cls.__tablename__: cls
+        for cls in [Reminder, ReminderOnSpectrum, ReminderOnGCN, ReminderOnShift]
+    }
+    tables = set(classes)
+
+    def job_id(self, table, row_id):
+        return (table, row_id)
+
+    def due_times(self, until):
+        due_times = {}
+        with DBSession() as session:
+            for table, cls in self.classes.items():
+                rows = session.execute(
+                    sa.select(cls.id, cls.next_reminder).where(
+                        cls.number_of_reminders > 0, cls.next_reminder <= until
+                    )
+                ).all()
+                due_times.update({(table, id): due for id, due in rows})
+        return due_times
+
+    def due_time(self, job_id):
+        table, reminder_id = job_id
+        cls = self.classes[table]
+        with DBSession() as session:
+            return session.scalar(
+                sa.select(cls.next_reminder).where(
+                    cls.id == reminder_id, cls.number_of_reminders > 0
+                )
+            )
+
+    def run(self, job_id):
+        table, reminder_id = job_id
+        reminder_type = self.classes[table]
+        now = utcnow()
+        with DBSession() as session:
+            reminder = session.scalar(
+                sa.select(reminder_type).where(reminder_type.id == reminder_id)
+            )
+            if (
+                reminder is None
+                or reminder.number_of_reminders <= 0
+                or reminder.next_reminder > now
+            ):
+                return
+
+            if reminder_type == Reminder:
+                text_to_send = (
+                    f"Reminder of source *{reminder.obj_id}*: {reminder.text}"
+                )
+                url_endpoint = f"/source/{reminder.obj_id}"
+                notification_type = "reminder_on_source"
+            elif reminder_type == ReminderOnSpectrum:
+                text_to_send = f"Reminder of spectrum *{reminder.spectrum_id}* on source *{reminder.obj_id}*: {reminder.text}"
+                url_endpoint = f"/source/{reminder.obj_id}"
+                notification_type = "reminder_on_spectra"
+            elif reminder_type == ReminderOnGCN:
+                gcn_event = session.scalar(
+                    sa.select(GcnEvent).where(GcnEvent.id == reminder.gcn_id)
+                )
+                text_to_send = (
+                    f"Reminder of GCN event *{gcn_event.dateobs}*: {reminder.text}"
+                )
+                url_endpoint = f"/gcn_events/{gcn_event.dateobs}"
+                notification_type = "reminder_on_gcn"
+            elif reminder_type == ReminderOnShift:
+                shift = session.scalar(
+                    sa.select(Shift).where(Shift.id == reminder.shift_id)
+                )
+                text_to_send = f"Reminder of shift *{shift.name}*: {reminder.text}"
+                url_endpoint = f"/shifts/{shift.id}"
+                notification_type = "reminder_on_shift"
+            else:
+                raise ValueError(f"Unknown reminder type: {reminder_type}")
+
+            session.add(
+                UserNotification(
+                    user=reminder.user,
+                    text=text_to_send,
+                    notification_type=notification_type,
+                    url=url_endpoint,
+                )
+            )
+            while True:
+                reminder.number_of_reminders -= 1
+                reminder.next_reminder += timedelta(days=reminder.reminder_delay)
+                if reminder.next_reminder > now or reminder.number_of_reminders == 0:
+                    break
+            session.add(reminder)
+            session.commit()
+
+            Flow().push(reminder.user_id, "skyportal/FETCH_NOTIFICATIONS")
+
+
+class RecurringAPIs(JobSource):
+    """Recurring API calls, one job per active call, due at its next_call."""
+
+    name = "recurring_apis"
+    tables = {RecurringAPI.__tablename__}
+
+    def due_times(self, until):
+        with DBSession() as session:
+            rows = session.execute(
+                sa.select(RecurringAPI.id, RecurringAPI.next_call).where(
+                    RecurringAPI.active.is_(True), RecurringAPI.next_call <= until
+                )
+            ).all()
+        return dict(rows)
+
+    def due_time(self, job_id):
+        with DBSession() as session:
+            return session.scalar(
+                sa.select(RecurringAPI.next_call).where(
+                    RecurringAPI.id == job_id, RecurringAPI.active.is_(True)
+                )
+            )
+
+    def run(self, job_id):
+        now = utcnow()
+        with DBSession() as session:
+            recurring_api = session.scalar(
+                sa.select(RecurringAPI).where(RecurringAPI.id == job_id)
+            )
+            if (
+                recurring_api is None
+                or not recurring_api.active
+                or recurring_api.next_call > now
+            ):
+                return
+
+            token = recurring_api.owner.tokens[0].id
+            if isinstance(recurring_api.payload, str):
+                data = json.loads(recurring_api.payload)
+            elif isinstance(recurring_api.payload, dict):
+                data = recurring_api.payload
+            else:
+                raise Exception("payload must be dictionary or string")
+
+            method = recurring_api.method.upper()
+            if method == "POST":
+                response_status, data = call_api(
+                    method, recurring_api.endpoint, token=token, host=HOST, data=data
+                )
+            elif method == "GET":
+                response_status, data = call_api(
+                    method, recurring_api.endpoint, token=token, host=HOST, params=data
+                )
+            else:
+                # left active, as before the scheduler: it is retried (and
+                # logged) until its method is fixed or it is deactivated
+                log(
+                    f"Warning: unable to execute recurring API call {recurring_api.id}, "
+                    "only GET and POST calls are supported"
+                )
+                return
+
+            while True:
+                recurring_api.next_call += timedelta(days=recurring_api.call_delay)
+                if recurring_api.next_call > now:
+                    break
+
+            if response_status == 200:
+                recurring_api.number_of_retries = MAX_RETRIES
+                text_to_send = f"Successfully called recurring API {recurring_api.id}"
+            else:
+                recurring_api.number_of_retries = recurring_api.number_of_retries - 1
+                if recurring_api.number_of_retries == 0:
+                    recurring_api.active = False
+                    text_to_send = f"Failed call to recurring API {recurring_api.id}: {str(data)}; Maximum Retries exceeded, deactivating service."
+                else:
+                    text_to_send = f"Failed call to recurring API {recurring_api.id}: {str(data)}; will try again {recurring_api.next_call}, remaining calls before deactivation: {recurring_api.number_of_retries}."
+
+            log(text_to_send)
+            session.add(recurring_api)
+            session.add(
+                UserNotification(
+                    user=recurring_api.owner,
+                    text=text_to_send,
+                    notification_type="Recurring API",
+                )
+            )
+            session.commit()
+
+
+def ztf_observing_times():
+    with DBSession() as session:
+        telescope = session.scalar(
+            sa.select(Telescope).where(Telescope.nickname.in_(["ZTF", "P48"]))
+        )
+        if telescope is None:
+            raise Exception("Could not find ZTF")
+        return telescope.current_time
+
+
+def watch_list_due():
+    """Due time of each watchlist listing (SQL expression) and whether it is
+    only checked after the night, from its parameters: the last time it was
+    processed plus its cadence (in minutes), one day if after_night."""
+    params = Listing.params
+    after_night = sa.func.coalesce(params["after_night"].astext.cast(sa.Boolean), True)
+    cadence = sa.case(
+        (after_night, 1440.0),
+        else_=sa.func.coalesce(params["cadence"].astext.cast(sa.Float), 1440.0),
+    )
+    last_processed_at = sa.func.coalesce(
+        params["last_processed_at"].astext.cast(sa.DateTime), Obj.created_at
+    )
+    due = last_processed_at + cadence * sa.literal_column("interval '1 minute'")
+    return due, after_night
+
+
+class WatchList(JobSource):
+    """Watchlist listings, checked for new alerts around their object.
+
+    The listings are checked together in a single job, due when the first
+    of them is: for those checked after the night, not before the end of
+    the night.
+    """
+
+    name = "watch_list"
+    tables = {Listing.__tablename__}
+
+    def job_id(self, table, row_id):
+        return "watchlist"
+
+    def due_times(self, until):
+        due = self.due_time("watchlist")
+        return {} if due is None or due > until else {"watchlist": due}
+
+    def due_time(self, job_id):
+        due, after_night = watch_list_due()
+        with DBSession() as session:
+            rows = session.execute(
+                sa.select(after_night, sa.func.min(due))
+                .select_from(Listing)
+                .join(Obj, Obj.id == Listing.obj_id)
+                .where(Listing.list_name == "watchlist")
+                .group_by(after_night)
+            ).all()
+        if len(rows) == 0:
+            return None
+
+        time_info = None
+        due_times = []
+        for is_after_night, due_time in rows:
+            if is_after_night:
+                time_info = time_info or ztf_observing_times()
+                morning = time_info["morning"]
+                if time_info["is_night_astronomical"] and morning:
+                    due_time = max(due_time, morning.datetime)
+            due_times.append(due_time)
+        return min(due_times)
+
+    def run(self, job_id):
+        check_watch_list(ztf_observing_times())
+
+
+def watch_list_params(listing):
+    params = listing.params if listing.params is not None else {}
+    created_at = listing.obj.created_at.isoformat()
+    params = {
+        "arcsec": params.get(
+            "arcsec", 5.0
+        ),  # arcseconds to use for the cone search radius
+        "cadence": params.get(
+            "cadence", 1440.0
+        ),  # how often to check for new candidates around that location in minutes
+        "after_night": params.get(
+            "after_night", True
+        ),  # whether to only check for new candidates after the end of the night
+        "filter": params.get(
+            "filter", {}
+        ),  # extra kowalski filters to apply when querying for new candidates
+        "last_processed_at": params.get(
+            "last_processed_at", created_at
+        ),  # when was the last time we checked for new candidates
+        "last_got_candidates_at": params.get(
+            "last_got_candidates_at", created_at
+        ),  # when was the last time we got candidates
+    }
+    # if after_night is True, force the cadence to one day as anyway nothing is updated during the day
+    if params["after_night"]:
+        params["cadence"] = 1440.0
+    return params
+
+
+def program_id_selector(user):
+    # allow access to public data only by default
+    selector = {1}
+    for stream in user.streams:
+        if "ztf" in stream.name.lower():
+            selector.update(set(stream.altdata.get("selector", [])))
+    return selector
+
+
+def post_new_alerts(object_ids, group_ids, owner_id, selector, session):
+    """Post the alerts of objects to the groups of an owner, and return the
+    IDs of the posted photometry by object ID."""
+    if post_alerts is not None:
+        return post_alerts(
+            object_ids,
+            group_ids,
+            owner_id,
+            session,
+            program_id_selector=selector,
+        )
+    photometry_ids = {}
+    for object_id in object_ids:
+        photometry_ids[object_id], _ = post_alert(
+            object_id,
+            group_ids,
+            owner_id,
+            session,
+            program_id_selector=selector,
+        )
+    return photometry_ids
+
+
+def check_watch_list(time_info):
+    """Search for new alerts around the due watchlist listings.
+
+    The listings are searched for together, with one multi-cone query per
+    set of stream permissions, filter and radius, and the new objects are
+    posted once per owner (see skyportal.utils.watch_list).
+    """
+    now = utcnow()
+    due, _ = watch_list_due()
+    with DBSession() as session:
+        try:
+            listings = (
+                session.scalars(
+                    sa.select(Listing)
+                    .join(Obj, Obj.id == Listing.obj_id)
+                    .where(Listing.list_name == "watchlist", due <= now)
+                    .options(
+                        joinedload(Listing.obj),
+                        joinedload(Listing.user).selectinload(User.streams),
+                        joinedload(Listing.user).selectinload(User.groups),
+                    )
+                )
+                .unique()
+                .all()
+            )
+        except Exception as e:
+            log(e)
+            return
+
+        selectors = {}
+        positions = []
+        listings_by_id = {}
+        for listing in listings:
+            params = watch_list_params(listing)
+            if params["after_night"] and time_info["is_night_astronomical"]:
+                # if the user requests for update after night has ended and its still night, skip
+                continue
+
+            if listing.user_id not in selectors:
+                selectors[listing.user_id] = program_id_selector(listing.user)
+            positions.append(
+                {
+                    "id": listing.id,
+                    "ra": listing.obj.ra,
+                    "dec": listing.obj.dec,
+                    "arcsec": params["arcsec"],
+                    "filter": params["filter"],
+                    "program_id_selector": selectors[listing.user_id],
+                    "since": Time(
+                        params["last_got_candidates_at"], format="isot", scale="utc"
+                    ).jd,
+                }
+            )
+            listings_by_id[listing.id] = listing
+
+            # we will also update it once we get the alerts, but we update it here in case we get any errors below
+            # to avoid getting stuck in a loop
+            listing.params = {**params, "last_processed_at": now.isoformat()}
+        session.commit()
+
+        if len(positions) == 0:
+            return
+
+        try:
+            matches = search_watched_positions(
+                positions,
+                get_alerts_by_positions=get_alerts_by_positions,
+                get_alerts_by_position=get_alerts_by_position,
+            )
+        except Exception as e:
+            log(f"Failed to query alerts for the watch list: {e}")
+            return
+
+        # the new objects are posted once per owner, whatever the number of
+        # their listings that matched them
+        objects_by_owner = defaultdict(set)
+        for listing_id, alerts in matches.items():
+            if len(alerts) == 0:
+                continue
+            listing = listings_by_id[listing_id]
+            objects_by_owner[listing.user_id].update(
+                alert["objectId"] for alert in alerts
+            )
+            # we update the last_got_candidates_at to the latest jd of the alerts we just got
+            # this is to avoid missing alerts as there is a delay between when the alert is created and when it is available for query
+            # so if we get alerts with jd < last_processed_at ingested in Kowalski after last_processed_at, we will miss them
+            listing.params = {
+                **listing.params,
+                "last_got_candidates_at": Time(
+                    max(alert["candidate"]["jd"] for alert in alerts), format="jd"
+                ).isot,
+            }
+        session.commit()
+
+        photometry_ids = {}
+        for owner_id, object_ids in objects_by_owner.items():
+            owner = session.scalar(sa.select(User).where(User.id == owner_id))
+            try:
+                photometry_ids[owner_id] = post_new_alerts(
+                    sorted(object_ids),
+                    [g.id for g in owner.groups],
+                    owner_id,
+                    list(selectors[owner_id]),
+                    session,
+                )
+            except Exception as e:
+                log(f"Failed to post watch list alerts for user {owner_id}: {e}")
+                session.rollback()
+
+        notifications_microservice_url = (
+            f"http://127.0.0.1:{cfg['ports.notification_queue']}"
+        )
+        for listing_id, alerts in matches.items():
+            listing = listings_by_id[listing_id]
+            posted = photometry_ids.get(listing.user_id, {})
+            if not any(
+                len(posted.get(alert["objectId"]) or []) > 0 for alert in alerts
+            ):
+                continue
+            request_body = {
+                "target_class_name": "Listing",
+                "target_id": listing_id,
+            }
+            try:
+                resp = requests.post(
+                    notifications_microservice_url,
+                    json=request_body,
+                    timeout=30,
+                )
+                if resp.status_code != 200:
+                    log(
+                        f"Notification request failed for {request_body['target_class_name']} with ID {request_body['target_id']}: {resp.content}"
+                    )
+            except Exception as e:
+                log(e)
+
+
+def connect():
+    url = DBSession.get_bind().url
+    return psycopg2.connect(
+        host=url.host,
+        port=url.port,
+        user=url.username,
+        password=url.password,
+        dbname=url.database,
+    )
+
+
+def api(scheduler):
+    class MetricsHandler(tornado.web.RequestHandler):
+        def get(self):
+            self.set_header("Content-Type", "application/json")
+            self.write(
+                {
+                    "status": "success",
+                    "data": {
+                        **scheduler.metrics.summary(),
+                        "jobs": scheduler.pending(),
+                    },
+                }
+            )
+
+    app = tornado.web.Application([(r"/", MetricsHandler)])
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    app.listen(cfg["ports.scheduler"])
+    loop.run_forever()
+
+
+@check_loaded(logger=log)
+def service(*args, **kwargs):
+    sources = [Reminders(), RecurringAPIs()]
+    if alert_available:
+        sources.append(WatchList())
+
+    scheduler = DueScheduler(
+        sources,
+        max_workers=cfg.get("scheduler.workers", 4),
+        resync_interval=timedelta(seconds=cfg.get("scheduler.resync_seconds", 300)),
+        metrics=StageMetrics(),
+        log=log,
+    )
+    Thread(
+        target=listen,
+        args=(connect, DUE_CHANNEL, scheduler.notify),
+        kwargs={"log": log},
+        daemon=True,
+    ).start()
+    Thread(target=api, args=(scheduler,), daemon=True).start()
+
+    log(f"Scheduling {', '.join(source.name for source in sources)}")
+    scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    service()
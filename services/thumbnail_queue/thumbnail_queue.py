@@ -12,6 +12,7 @@ from skyportal.models import (
     Thumbnail,
 )
 from skyportal.utils.services import check_loaded
+from skyportal.utils.source_snapshots import invalidate_source_snapshots
 
 env, cfg = load_env()
 log = make_log("thumbnail_queue")
@@ -107,6 +108,7 @@ def service(*args, **kwargs):
 
             if internal_key is not None:
                 flow = Flow()
+                invalidate_source_snapshots(internal_key)
                 flow.push(
                     "*",
                     "skyportal/REFRESH_SOURCE",
@@ -22,14 +22,21 @@ from skyportal.handlers.api.photometry import add_external_photometry
 from skyportal.handlers.api.source import post_source
 from skyportal.handlers.api.spectrum import post_spectrum
 from skyportal.models import DBSession, Group, Obj, Source, User
-from skyportal.utils.calculations import great_circle_distance
 from skyportal.utils.services import check_loaded
+from skyportal.utils.source_snapshots import invalidate_source_snapshots
 from skyportal.utils.tns import (
     get_IAUname,
     get_recent_TNS,
     read_tns_photometry,
     read_tns_spectrum,
 )
+from skyportal.utils.tns_catalog import (
+    crossmatch_tns_catalog,
+    download_tns_public_objects,
+    ingest_tns_public_objects,
+    read_tns_public_objects,
+    tns_name_takes_precedence,
+)
 
 env, cfg = load_env()
 log = make_log("tns_queue")
@@ -48,6 +55,7 @@ bot_id = cfg.get("app.tns.bot_id", None)
 bot_name = cfg.get("app.tns.bot_name", None)
 api_key = cfg.get("app.tns.api_key", None)
 look_back_days = cfg.get("app.tns.look_back_days", 1)
+catalog_mirror_interval = cfg.get("app.tns.catalog_mirror_interval", None)
 
 
 def refresh_obj_on_frontend(obj, user_id="*"):
@@ -62,6 +70,7 @@ def refresh_obj_on_frontend(obj, user_id="*"):
     """
     try:
         flow = Flow()
+        invalidate_source_snapshots(obj.internal_key)
         flow.push(
             user_id,
             "skyportal/REFRESH_SOURCE",
@@ -95,39 +104,18 @@ def add_tns_name_to_existing_objs(tns_name, tns_source_data, tns_ra, tns_dec, se
     if len(existing_objs) > 0:
         for obj in existing_objs:
             try:
-                if obj.tns_name == tns_name:
-                    continue
-                elif obj.tns_name is None or obj.tns_name == "":
-                    obj.tns_name = tns_name
-                    obj.tns_info = tns_source_data
-                # if the obj has tns_info that contains radeg and decdeg,
-                # check if the new TNS source is closer to the obj than the existing TNS source
-                elif (
-                    isinstance(obj.tns_info, dict)
-                    and "radeg" in obj.tns_info
-                    and "decdeg" in obj.tns_info
+                if not tns_name_takes_precedence(
+                    obj.ra,
+                    obj.dec,
+                    obj.tns_name,
+                    obj.tns_info,
+                    tns_name,
+                    tns_ra,
+                    tns_dec,
                 ):
-                    existing_tns_dist = great_circle_distance(
-                        obj.ra,
-                        obj.dec,
-                        float(obj.tns_info["radeg"]),
-                        float(obj.tns_info["decdeg"]),
-                    )
-                    new_tns_dist = great_circle_distance(
-                        obj.ra, obj.dec, float(tns_ra), float(tns_dec)
-                    )
-                    if new_tns_dist < existing_tns_dist:
-                        obj.tns_name = tns_name
-                        obj.tns_info = tns_source_data
-                # if the current name doesn't have the SN designation but the new name has it, update
-                elif not str(obj.tns_name).lower().strip().startswith(
-                    "sn"
-                ) and "AT" not in str(tns_name):
-                    obj.tns_name = str(tns_name).strip()
-                    obj.tns_info = tns_source_data
-                else:
                     continue
-
+                obj.tns_name = tns_name
+                obj.tns_info = tns_source_data
                 session.commit()
                 log(f"Updated object {obj.id} with TNS name {tns_name}")
                 refresh_obj_on_frontend(obj)
@@ -550,6 +538,41 @@ def tns_watcher(queue):
         time.sleep(60 * 4)  # sleep for 4 minutes
 
 
+def tns_catalog_mirror():
+    """Periodically mirror the TNS public objects catalog
+    and crossmatch it against all the existing objects"""
+    if (
+        TNS_URL is None
+        or bot_id is None
+        or bot_name is None
+        or api_key is None
+        or catalog_mirror_interval is None
+    ):
+        log("TNS catalog mirror not configured, skipping")
+        return
+    tns_headers = {
+        "User-Agent": f'tns_marker{{"tns_id": {bot_id},"type": "bot", "name": "{bot_name}"}}',
+    }
+
+    while True:
+        try:
+            start = time.perf_counter()
+            df = read_tns_public_objects(
+                download_tns_public_objects(api_key, tns_headers)
+            )
+            with DBSession() as session:
+                ingest_tns_public_objects(df, session)
+                stats = crossmatch_tns_catalog(session, radius=DEFAULT_RADIUS)
+            log(
+                f"Mirrored {len(df)} TNS objects and updated {stats['n_updated']} objects "
+                f"in {time.perf_counter() - start:.2f} s"
+            )
+        except Exception as e:
+            log(f"Error mirroring the TNS catalog: {e}")
+
+        time.sleep(60 * 60 * float(catalog_mirror_interval))
+
+
 def api(queue):
     """Start the internal API that endpoint that receives requests from the main app
 
@@ -621,9 +644,11 @@ def service(*args, **kwargs):
     t = Thread(target=process_queue, args=(queue,))
     t2 = Thread(target=api, args=(queue,))
     t3 = Thread(target=tns_watcher, args=(queue,))
+    t4 = Thread(target=tns_catalog_mirror)
     t.start()
     t2.start()
     t3.start()
+    t4.start()
     while True:
         log(f"Current TNS retrieval queue length: {len(queue)}")
         time.sleep(120)
@@ -1,3 +1,6 @@
+import functools
+import time
+
 import sentry_sdk
 import tornado.web
 from sentry_sdk.integrations.tornado import TornadoIntegration
@@ -18,6 +21,7 @@ from skyportal.handlers.api import (
     AnalysisWebhookHandler,
     AnnotationHandler,
     AssignmentHandler,
+    BulkCandidateHandler,
     BulkDeletePhotometryHandler,
     BulkTNSHandler,
     CandidateFilterHandler,
@@ -40,8 +44,11 @@ from skyportal.handlers.api import (
     EarthquakePredictionHandler,
     EarthquakeStatusHandler,
     EnumTypesHandler,
+    FacilityHTTPMetricsHandler,
     FacilityMessageHandler,
     FilterHandler,
+    FindingChartJobDownloadHandler,
+    FindingChartJobHandler,
     FollowupRequestCommentHandler,
     FollowupRequestHandler,
     FollowupRequestPrioritizationHandler,
@@ -160,6 +167,7 @@ from skyportal.handlers.api import (
     SourceOffsetsHandler,
     SourcesConfirmedInGCNHandler,
     SourcesConfirmedInGCNTNSHandler,
+    SourcesOffsetsHandler,
     SpatialCatalogASCIIFileHandler,
     SpatialCatalogHandler,
     SpectrumASCIIFileHandler,
@@ -230,6 +238,23 @@ log = make_log("app_server")
 
 
 class CustomApplication(tornado.web.Application):
+    def __init__(self, handlers=None, *args, **kwargs):
+        self._openapi_handlers = handlers
+        super().__init__(handlers, *args, **kwargs)
+
+    @functools.cached_property
+    def openapi_spec(self):
+        """OpenAPI spec of the application.
+
+        Parsing the docstrings of all the handlers is slow, so the spec is only
+        generated when it is first needed, rather than at the startup of
+        every app process. `make api-docs` generates it at build time.
+        """
+        start = time.perf_counter()
+        spec = openapi.spec_from_handlers(self._openapi_handlers)
+        log(f"Generated the OpenAPI spec in {time.perf_counter() - start:.2f} s")
+        return spec
+
     def log_request(self, handler):
         # We don't want to log expected exceptions intentionally raised
         # during auth pipeline; such exceptions will have "google-oauth2" in
@@ -258,6 +283,7 @@ skyportal_handlers = [
         AnalysisProductsHandler,
     ),
     (r"/api/assignment(/.*)?", AssignmentHandler),
+    (r"/api/candidates_bulk", BulkCandidateHandler),
     (r"/api/candidates_filter", CandidateFilterHandler),
     (r"/api/candidates(/[0-9A-Za-z-_]+)/([0-9]+)", CandidateHandler),
     (r"/api/candidates(/.*)?", CandidateHandler),
@@ -286,6 +312,8 @@ skyportal_handlers = [
     ),
     (r"/api/facility", FacilityMessageHandler),
     (r"/api/filters(/.*)?", FilterHandler),
+    (r"/api/finding_charts(/[0-9a-f]+)/download", FindingChartJobDownloadHandler),
+    (r"/api/finding_charts(/[0-9a-f]+)?", FindingChartJobHandler),
     (
         r"/api/followup_request/([0-9A-Za-z-_\.\+]+)/comment",
         FollowupRequestCommentHandler,
@@ -470,6 +498,7 @@ skyportal_handlers = [
     (r"/api/sources(/[0-9A-Za-z-_\.\+]+)/photometry", ObjPhotometryHandler),
     (r"/api/sources(/[0-9A-Za-z-_\.\+]+)/spectra", ObjSpectraHandler),
     (r"/api/sources(/[0-9A-Za-z-_\.\+]+)/host", ObjHostHandler),
+    (r"/api/sources/offsets", SourcesOffsetsHandler),
     (r"/api/sources(/[0-9A-Za-z-_\.\+]+)/offsets", SourceOffsetsHandler),
     (r"/api/sources(/[0-9A-Za-z-_\.\+]+)/finder", SourceFinderHandler),
     (r"/api/sources(/[0-9A-Za-z-_\.\+]+)/classifications", ObjClassificationHandler),
@@ -539,6 +568,7 @@ skyportal_handlers = [
         SurveyEfficiencyForObservationPlanHandler,
     ),
     (r"/api/db_stats", StatsHandler),
+    (r"/api/facility_http_metrics", FacilityHTTPMetricsHandler),
     (r"/api/sysinfo", SysInfoHandler),
     (r"/api/config", ConfigHandler),
     (r"/api/taxonomy(/.*)?", TaxonomyHandler),
@@ -733,6 +763,5 @@ def make_app(cfg, baselayer_handlers, baselayer_settings, process=None, env=None
         print("-" * 78)
 
     model_util.provision_public_group()
-    app.openapi_spec = openapi.spec_from_handlers(handlers)
 
     return app
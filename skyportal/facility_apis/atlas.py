@@ -3,7 +3,6 @@ from io import StringIO
 
 import numpy as np
 import pandas as pd
-import requests
 from astropy.time import Time
 from marshmallow.exceptions import ValidationError
 from sqlalchemy.orm import scoped_session, sessionmaker
@@ -13,10 +12,13 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("atlas")
+
 if cfg.get("app.atlas.port") is None:
     ATLAS_URL = f"{cfg['app.atlas.protocol']}://{cfg['app.atlas.host']}"
 else:
@@ -116,7 +118,7 @@ def commit_photometry(
         result_url = json_response["result_url"]
         request.status = f"Task is complete with results available at {result_url}"
 
-        s = requests.get(
+        s = client.get(
             result_url,
             headers={
                 "Authorization": f"Token {altdata['api_token']}",
@@ -223,6 +225,7 @@ def commit_photometry(
         session.commit()
 
         flow = Flow()
+        invalidate_source_snapshots(request.obj.internal_key)
         flow.push(
             "*",
             "skyportal/REFRESH_SOURCE",
@@ -264,7 +267,7 @@ class ATLASAPI(FollowUpAPI):
         if not altdata:
             raise ValueError("Missing allocation information.")
 
-        r = requests.post(
+        r = client.post(
             f"{ATLAS_URL}/forcedphot/queue/",
             headers={
                 "Authorization": f"Token {altdata['api_token']}",
@@ -300,7 +303,7 @@ class ATLASAPI(FollowUpAPI):
             facility_microservice_url = (
                 f"http://127.0.0.1:{cfg['ports.facility_queue']}"
             )
-            requests.post(
+            http.get_facility_client("facility_queue").post(
                 facility_microservice_url,
                 json={
                     "request_id": req.id,
@@ -324,6 +327,7 @@ class ATLASAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -367,6 +371,7 @@ class ATLASAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -1,6 +1,5 @@
 from datetime import datetime
 
-import requests
 from astropy import units as u
 from astropy.coordinates import SkyCoord
 from requests.auth import HTTPBasicAuth
@@ -9,10 +8,13 @@ from baselayer.app.env import load_env
 from baselayer.app.flow import Flow
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("colibri")
+
 
 if cfg.get("app.colibri.port") is None:
     COLIBRI_URL = f"{cfg['app.colibri.protocol']}://{cfg['app.colibri.host']}"
@@ -93,7 +95,7 @@ class COLIBRIAPI(FollowUpAPI):
 
         requestpath = f"{COLIBRI_URL}/cgi-bin/internal/process_colibri_ztf_request.py"
 
-        r = requests.post(
+        r = client.post(
             requestpath,
             auth=HTTPBasicAuth(altdata["username"], altdata["password"]),
             json=requestgroup,
@@ -116,6 +118,7 @@ class COLIBRIAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -147,6 +150,7 @@ class COLIBRIAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
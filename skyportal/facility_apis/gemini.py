@@ -3,7 +3,6 @@ from datetime import datetime, timedelta
 from json import JSONDecodeError
 
 import arrow
-import requests
 
 from baselayer.app.env import load_env
 from baselayer.app.flow import Flow
@@ -15,10 +14,13 @@ from ..utils.offset import (
     _calculate_best_position_for_offset_stars,
     get_nearby_offset_stars,
 )
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("gemini")
+
 # Submission URL
 API_URL = f"{cfg['app.gemini.protocol']}://{cfg['app.gemini.host']}:{cfg['app.gemini.port']}/too"
 
@@ -306,7 +308,7 @@ class GEMINIAPI(FollowUpAPI):
             log(traceback.format_exc())
             raise ValueError(f"Error building Gemini request: {e}")
 
-        r = requests.post(API_URL, verify=False, params=gemini_request.payload)
+        r = client.post(API_URL, verify=False, params=gemini_request.payload)
 
         if r.status_code == 200:
             request.status = "submitted"
@@ -339,6 +341,7 @@ class GEMINIAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
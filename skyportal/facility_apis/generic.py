@@ -1,16 +1,17 @@
 import json
 from datetime import datetime, timedelta
 
-import requests
-
 from baselayer.app.env import load_env
 from baselayer.app.flow import Flow
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("generic")
+
 
 def validate_request(request, filters):
     """Validate FollowupRequest contents for queue.
@@ -113,7 +114,7 @@ class GENERICAPI(FollowUpAPI):
                     "payload": request.payload,
                 }
 
-                r = requests.post(
+                r = client.post(
                     altdata["endpoint"],
                     json=payload,
                     headers={"Authorization": f"token {altdata['api_token']}"},
@@ -176,6 +177,7 @@ class GENERICAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -224,7 +226,7 @@ class GENERICAPI(FollowUpAPI):
 
                 uid = content["data"]["id"]
 
-                r = requests.delete(
+                r = client.delete(
                     f"{altdata['endpoint']}/{uid}",
                     headers={"Authorization": f"token {altdata['api_token']}"},
                 )
@@ -253,6 +255,7 @@ class GENERICAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -290,7 +293,7 @@ class GENERICAPI(FollowUpAPI):
                 "payload": request.payload,
             }
 
-            r = requests.post(
+            r = client.post(
                 altdata["endpoint"],
                 json=payload,
                 headers={"Authorization": f"token {altdata['api_token']}"},
@@ -321,6 +324,7 @@ class GENERICAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
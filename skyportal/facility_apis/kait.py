@@ -1,14 +1,16 @@
-import requests
 from requests.auth import HTTPBasicAuth
 
 from baselayer.app.env import load_env
 from baselayer.app.flow import Flow
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("kait")
+
 
 if cfg.get("app.kait.port") is None:
     KAIT_URL = f"{cfg['app.kait.protocol']}://{cfg['app.kait.host']}"
@@ -84,7 +86,7 @@ class KAITAPI(FollowUpAPI):
 
         requestpath = f"{KAIT_URL}/cgi-bin/internal/process_kait_ztf_request.py"
 
-        r = requests.post(
+        r = client.post(
             requestpath,
             auth=HTTPBasicAuth(altdata["username"], altdata["password"]),
             json=requestgroup,
@@ -107,6 +109,7 @@ class KAITAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -138,6 +141,7 @@ class KAITAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -4,7 +4,6 @@ import json
 import urllib
 from datetime import datetime, timedelta
 
-import requests
 import sqlalchemy as sa
 from sqlalchemy.orm import scoped_session, sessionmaker
 from tornado.ioloop import IOLoop
@@ -14,10 +13,13 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("lco")
+
 requestpath = f"{cfg['app.lco_protocol']}://{cfg['app.lco_host']}:{cfg['app.lco_port']}/api/requestgroups/"
 archivepath = f"{cfg['app.lco_archive_endpoint']}/frames/"
 
@@ -578,7 +580,7 @@ class LCOAPI(FollowUpAPI):
             if "id" in content:
                 uid = content["id"]
 
-                r = requests.post(
+                r = client.post(
                     f"{requestpath}{uid}/cancel/",
                     headers={"Authorization": f"Token {altdata['API_TOKEN']}"},
                 )
@@ -602,6 +604,7 @@ class LCOAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -640,7 +643,7 @@ class LCOAPI(FollowUpAPI):
         uid = content["id"]
         request_id = content["requests"][0]["id"]
 
-        r = requests.get(
+        r = client.get(
             f"{requestpath}{request_id}/",
             headers={"Authorization": f"Token {altdata['API_TOKEN']}"},
         )
@@ -655,7 +658,7 @@ class LCOAPI(FollowUpAPI):
             request.status = "complete"
 
             archive_headers = {"Authorization": f"Token {altdata['API_ARCHIVE_TOKEN']}"}
-            ar = requests.get(
+            ar = client.get(
                 f"{archivepath}?REQNUM={uid}&start=2014-01-01&RLEVEL=91",
                 headers=archive_headers,
             )
@@ -683,6 +686,7 @@ class LCOAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -739,7 +743,7 @@ class SINISTROAPI(LCOAPI):
         lcoreq = SINISTRORequest(request)
         requestgroup = lcoreq.requestgroup
 
-        r = requests.post(
+        r = client.post(
             requestpath,
             headers={"Authorization": f"Token {altdata['API_TOKEN']}"},
             json=requestgroup,  # Make sure you use json!
@@ -761,6 +765,7 @@ class SINISTROAPI(LCOAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -870,7 +875,7 @@ class SPECTRALAPI(LCOAPI):
         lcoreq = SPECTRALRequest(request)
         requestgroup = lcoreq.requestgroup
 
-        r = requests.post(
+        r = client.post(
             requestpath,
             headers={"Authorization": f"Token {altdata['API_TOKEN']}"},
             json=requestgroup,  # Make sure you use json!
@@ -892,6 +897,7 @@ class SPECTRALAPI(LCOAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -1000,7 +1006,7 @@ class MUSCATAPI(LCOAPI):
         lcoreq = MUSCATRequest(request)
         requestgroup = lcoreq.requestgroup
 
-        r = requests.post(
+        r = client.post(
             requestpath,
             headers={"Authorization": f"Token {altdata['API_TOKEN']}"},
             json=requestgroup,  # Make sure you use json!
@@ -1022,6 +1028,7 @@ class MUSCATAPI(LCOAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -1123,7 +1130,7 @@ class FLOYDSAPI(LCOAPI):
         lcoreq = FLOYDSRequest(request)
         requestgroup = lcoreq.requestgroup
 
-        r = requests.post(
+        r = client.post(
             requestpath,
             headers={"Authorization": f"Token {altdata['API_TOKEN']}"},
             json=requestgroup,  # Make sure you use json!
@@ -1146,6 +1153,7 @@ class FLOYDSAPI(LCOAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
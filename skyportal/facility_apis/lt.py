@@ -13,6 +13,7 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
@@ -424,6 +425,7 @@ class LTAPI(FollowUpAPI):
 
             if kwargs.get("refresh_source", False):
                 flow = Flow()
+                invalidate_source_snapshots(obj_internal_key)
                 flow.push(
                     "*",
                     "skyportal/REFRESH_SOURCE",
@@ -530,6 +532,7 @@ class IOOAPI(LTAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -683,6 +686,7 @@ class IOIAPI(LTAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -837,6 +841,7 @@ class SPRATAPI(LTAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
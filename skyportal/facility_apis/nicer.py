@@ -2,7 +2,6 @@ import re
 import urllib
 from datetime import datetime, timedelta
 
-import requests
 from astropy.time import Time
 
 from baselayer.app.env import load_env
@@ -10,10 +9,13 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("nicer")
+
 
 # Submission URL
 LOGIN_URL = f"{cfg['app.heasarc_endpoint']}/ark/LOGIN"
@@ -148,7 +150,7 @@ class NICERAPI(FollowUpAPI):
             "credential_1": request.allocation.altdata["password"],
         }
 
-        r_cred = requests.post(LOGIN_URL, params=params)
+        r_cred = client.post(LOGIN_URL, params=params)
         for hist in r_cred.history:
             if len(hist.cookies) > 0:
                 cookies = hist.cookies
@@ -163,7 +165,7 @@ class NICERAPI(FollowUpAPI):
         }
 
         data_verify = {**data, "RPS_VERIFY.x": 49, "RPS_VERIFY.y": 15}
-        r = requests.post(url=NICER_URL, data=data_verify, headers=headers)
+        r = client.post(url=NICER_URL, data=data_verify, headers=headers)
         if "Attempted verification detected" in r.text:
             error_message = re.sub(
                 CLEANR,
@@ -179,7 +181,7 @@ class NICERAPI(FollowUpAPI):
                 "RPS_SUBMIT.y": 4,
                 "RPS_OPENED_3": "",
             }
-            r = requests.post(url=NICER_URL, data=data_submit, headers=headers)
+            r = client.post(url=NICER_URL, data=data_submit, headers=headers)
             request.status = "submitted"
 
         transaction = FacilityTransaction(
@@ -193,6 +195,7 @@ class NICERAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -224,6 +227,7 @@ class NICERAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -4,7 +4,6 @@ import tempfile
 from datetime import datetime, timedelta
 
 import paramiko
-import requests
 import sqlalchemy as sa
 from astropy.time import Time
 from paramiko import SSHClient
@@ -24,6 +23,8 @@ log = make_log("api/observation_plan")
 
 env, cfg = load_env()
 
+client = http.get_facility_client("treasuremap")
+
 SLACK_URL = f"{cfg['slack.expected_url_preamble']}/services"
 
 default_filters = cfg["app.observation_plan.default_filters"]
@@ -775,7 +776,7 @@ class MMAAPI(FollowUpAPI):
                 }
             )
 
-            r = requests.post(
+            r = client.post(
                 slack_microservice_url,
                 data=data,
                 headers={"Content-Type": "application/json"},
@@ -1,6 +1,5 @@
 import astropy
 import numpy as np
-import requests
 from sqlalchemy.orm import scoped_session, sessionmaker
 from tornado.ioloop import IOLoop
 
@@ -10,10 +9,13 @@ from baselayer.log import make_log
 
 from ..utils import http
 from ..utils.calculations import great_circle_distance
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("ps1")
+
 PS1_URL = cfg["app.ps1_endpoint"]
 
 log = make_log("facility_apis/ps1")
@@ -112,6 +114,7 @@ def commit_photometry(text_response, request_id, instrument_id, user_id):
         session.commit()
 
         flow = Flow()
+        invalidate_source_snapshots(request.obj.internal_key)
         flow.push(
             "*",
             "skyportal/REFRESH_SOURCE",
@@ -188,7 +191,7 @@ class PS1API(FollowUpAPI):
 
         url = f"{PS1_URL}/api/v0.1/panstarrs/dr2/detection.csv"
         try:
-            r = requests.get(url, params=params, timeout=5.0)  # timeout in seconds
+            r = client.get(url, params=params, timeout=5.0)  # timeout in seconds
         except TimeoutError:
             request.status = "error: timeout"
 
@@ -220,6 +223,7 @@ class PS1API(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -266,7 +270,7 @@ class PS1API(FollowUpAPI):
         }
 
         url = f"{PS1_URL}/api/v0.1/panstarrs/dr2/mean.csv"
-        r = requests.get(url, params=params)
+        r = client.get(url, params=params)
         if r.status_code == 200:
             try:
                 if len(r.text) == 0:
@@ -292,6 +296,7 @@ class PS1API(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -337,6 +342,7 @@ class PS1API(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -3,17 +3,18 @@ import traceback
 from copy import deepcopy
 from datetime import datetime, timedelta
 
-import requests
-
 from baselayer.app.env import load_env
 from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI, Listener
 
 env, cfg = load_env()
 
+client = http.get_facility_client("sedm")
+
 log = make_log("facility_apis/sedm")
 
 
@@ -213,7 +214,7 @@ class SEDMAPI(FollowUpAPI):
 
         payload = convert_request_to_sedm(request, method_value="new")
         content = json.dumps(payload)
-        r = requests.post(
+        r = client.post(
             cfg["app.sedm_endpoint"],
             files={"jsonfile": ("jsonfile", content)},
         )
@@ -234,6 +235,7 @@ class SEDMAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -289,7 +291,7 @@ class SEDMAPI(FollowUpAPI):
 
         payload = convert_request_to_sedm(request, method_value="delete")
         content = json.dumps(payload)
-        r = requests.post(
+        r = client.post(
             cfg["app.sedm_endpoint"],
             files={"jsonfile": ("jsonfile", content)},
         )
@@ -312,6 +314,7 @@ class SEDMAPI(FollowUpAPI):
 
         flow = Flow()
         if kwargs.get("refresh_source", False):
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -339,7 +342,7 @@ class SEDMAPI(FollowUpAPI):
 
         payload = convert_request_to_sedm(request, method_value="edit")
         content = json.dumps(payload)
-        r = requests.post(
+        r = client.post(
             cfg["app.sedm_endpoint"],
             files={"jsonfile": ("jsonfile", content)},
         )
@@ -362,6 +365,7 @@ class SEDMAPI(FollowUpAPI):
 
         flow = Flow()
         if kwargs.get("refresh_source", False):
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -4,7 +4,6 @@ import json
 from datetime import datetime
 
 import numpy as np
-import requests
 from astropy.time import Time, TimeDelta
 from paramiko import AutoAddPolicy, SSHClient
 from requests.auth import HTTPBasicAuth
@@ -17,10 +16,13 @@ from baselayer.log import make_log
 
 from ..utils import http
 from ..utils.instrument_log import read_logs
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("sedmv2")
+
 log = make_log("facility_apis/sedmv2")
 
 
@@ -110,7 +112,7 @@ class SEDMV2API(FollowUpAPI):
                 "payload": request.payload,
             }
 
-            r = requests.post(
+            r = client.post(
                 cfg["app.sedmv2_endpoint"],
                 json=payload,
                 headers={"Authorization": f"token {altdata['api_token']}"},
@@ -141,6 +143,7 @@ class SEDMV2API(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -190,7 +193,7 @@ class SEDMV2API(FollowUpAPI):
 
             uid = content["data"]["id"]
 
-            r = requests.delete(
+            r = client.delete(
                 f"{cfg['app.sedmv2_endpoint']}/{uid}",
                 headers={"Authorization": f"token {altdata['api_token']}"},
             )
@@ -217,6 +220,7 @@ class SEDMV2API(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -257,7 +261,7 @@ class SEDMV2API(FollowUpAPI):
                 "payload": request.payload,
             }
 
-            r = requests.post(
+            r = client.post(
                 cfg["app.sedmv2_endpoint"],
                 json=payload,
                 headers={"Authorization": f"token {altdata['api_token']}"},
@@ -288,6 +292,7 @@ class SEDMV2API(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -559,7 +564,7 @@ def fetch_nightly_logs(instrument_id, altdata, request_start, request_end):
         days = np.arange(np.floor(request_start.mjd), np.ceil(request_end.mjd) + 1)
         for day in days:
             day = Time(day, format="mjd").strftime("%Y%m%d")
-            r = requests.get(
+            r = client.get(
                 f"{altdata['url']}/Archive/{day}/robo_test.{day}.log",
                 auth=HTTPBasicAuth(altdata["user"], altdata["password"]),
             )
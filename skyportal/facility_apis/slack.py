@@ -1,7 +1,6 @@
 import json
 import textwrap
 
-import requests
 from astropy import units as u
 from astropy.coordinates import SkyCoord
 
@@ -10,10 +9,13 @@ from baselayer.app.flow import Flow
 
 from ..app_utils import get_app_base_url
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("slack")
+
 
 SLACK_URL = f"{cfg['slack.expected_url_preamble']}/services"
 
@@ -122,7 +124,7 @@ class SLACKAPI(FollowUpAPI):
             }
         )
 
-        r = requests.post(
+        r = client.post(
             slack_microservice_url,
             data=data,
             headers={"Content-Type": "application/json"},
@@ -145,6 +147,7 @@ class SLACKAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -176,6 +179,7 @@ class SLACKAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -1,17 +1,18 @@
 import json
 from datetime import datetime, timedelta
 
-import requests
-
 from baselayer.app.env import load_env
 from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("soar")
+
 requestpath = f"{cfg['app.lco_protocol']}://{cfg['app.lco_host']}:{cfg['app.lco_port']}/api/requestgroups/"
 
 log = make_log("facility_apis/soar")
@@ -425,7 +426,7 @@ class SOARAPI(FollowUpAPI):
             if "id" in content:
                 uid = content["id"]
 
-                r = requests.post(
+                r = client.post(
                     f"{requestpath}{uid}/cancel/",
                     headers={"Authorization": f"Token {altdata['API_TOKEN']}"},
                 )
@@ -451,6 +452,7 @@ class SOARAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -504,7 +506,7 @@ class SOARGHTSIMAGERAPI(SOARAPI):
         soarreq = SOAR_GHTS_IMAGER_Request(request)
         requestgroup = soarreq.requestgroup
 
-        r = requests.post(
+        r = client.post(
             requestpath,
             headers={"Authorization": f"Token {altdata['API_TOKEN']}"},
             json=requestgroup,  # Make sure you use json!
@@ -527,6 +529,7 @@ class SOARGHTSIMAGERAPI(SOARAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -672,7 +675,7 @@ class SOARGHTSAPI(SOARAPI):
         soarreq = SOAR_GHTS_Request(request)
         requestgroup = soarreq.requestgroup
 
-        r = requests.post(
+        r = client.post(
             requestpath,
             headers={"Authorization": f"Token {altdata['API_TOKEN']}"},
             json=requestgroup,  # Make sure you use json!
@@ -695,6 +698,7 @@ class SOARGHTSAPI(SOARAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -844,7 +848,7 @@ class SOARTSPECAPI(SOARAPI):
         soarreq = SOAR_TripleSpec_Request(request)
         requestgroup = soarreq.requestgroup
 
-        r = requests.post(
+        r = client.post(
             requestpath,
             headers={"Authorization": f"Token {altdata['API_TOKEN']}"},
             json=requestgroup,  # Make sure you use json!
@@ -867,6 +871,7 @@ class SOARTSPECAPI(SOARAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
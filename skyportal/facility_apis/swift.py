@@ -8,7 +8,6 @@ import traceback
 from datetime import datetime, timedelta
 
 import pandas as pd
-import requests
 import sqlalchemy as sa
 from astropy.time import Time
 from sqlalchemy.orm import scoped_session, sessionmaker
@@ -21,10 +20,13 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import MMAAPI, FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("swift")
+
 
 # Submission URL
 API_URL = f"{cfg['app.swift.protocol']}://{cfg['app.swift.host']}:{cfg['app.swift.port']}/toop/submit_api.php"
@@ -485,6 +487,7 @@ class UVOTXRTAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -520,7 +523,7 @@ class UVOTXRTAPI(FollowUpAPI):
             swiftreq = UVOTXRTRequest(request)
             swiftreq.requestgroup.validate()
 
-            r = requests.post(
+            r = client.post(
                 url=API_URL, verify=True, data={"jwt": swiftreq.requestgroup.jwt}
             )
 
@@ -555,7 +558,7 @@ class UVOTXRTAPI(FollowUpAPI):
 
         elif request.payload["request_type"] == "XRT API":
             swiftreq = XRTAPIRequest(request)
-            r = requests.post(url=XRT_URL, json=swiftreq.requestgroup.getJSONDict())
+            r = client.post(url=XRT_URL, json=swiftreq.requestgroup.getJSONDict())
             returnedData = json.loads(r.text)
             if r.status_code != 200:
                 request.status = f"rejected: {r.reason}"
@@ -584,6 +587,7 @@ class UVOTXRTAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
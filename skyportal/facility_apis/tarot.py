@@ -13,10 +13,13 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("tarot")
+
 log = make_log("facility_apis/tarot")
 
 station_dict = {
@@ -277,7 +280,7 @@ def login_to_tarot(request, session, altdata):
         "Submit": "Entry",
     }
 
-    login_response = requests.post(
+    login_response = client.post(
         f"{cfg['app.tarot_endpoint']}/manage/manage/login.php",
         data=data,
         auth=(altdata["browser_username"], altdata["browser_password"]),
@@ -341,7 +344,7 @@ class TAROTAPI(FollowUpAPI):
             "Submit": "Ok for quick depot",
         }
 
-        response = requests.post(
+        response = client.post(
             f"{cfg['app.tarot_endpoint']}/manage/manage/depot/depot-defaultshort.res.php?hashuser={hash_user}&idreq={altdata['request_id']}",
             data=payload,
             auth=(altdata["browser_username"], altdata["browser_password"]),
@@ -371,6 +374,7 @@ class TAROTAPI(FollowUpAPI):
         try:
             flow = Flow()
             if kwargs.get("refresh_source", False):
+                invalidate_source_snapshots(request.obj.internal_key)
                 flow.push(
                     "*",
                     "skyportal/REFRESH_SOURCE",
@@ -409,7 +413,7 @@ class TAROTAPI(FollowUpAPI):
             request.transactions[-1].response["content"],
         )
 
-        response = requests.get(
+        response = client.get(
             f"{cfg['app.tarot_endpoint']}/rejected{station_dict[request.payload['station_name']]['url_to_request']}.txt",
             auth=(altdata["browser_username"], altdata["browser_password"]),
             timeout=5.0,
@@ -456,7 +460,7 @@ class TAROTAPI(FollowUpAPI):
                 f"app.{station_dict[request.payload['station_name']]['endpoint']}"
             ]
             if station_endpoint:
-                response = requests.get(f"{station_endpoint}/klotz/", timeout=5.0)
+                response = client.get(f"{station_endpoint}/klotz/", timeout=5.0)
 
                 if response.status_code != 200:
                     raise ValueError("Error trying to get the observation log")
@@ -494,6 +498,7 @@ class TAROTAPI(FollowUpAPI):
         try:
             flow = Flow()
             if kwargs.get("refresh_source", False):
+                invalidate_source_snapshots(request.obj.internal_key)
                 flow.push(
                     "*",
                     "skyportal/REFRESH_SOURCE",
@@ -558,7 +563,7 @@ class TAROTAPI(FollowUpAPI):
 
             data = {"check[]": insert_scene_ids, "remove": "Remove Scenes"}
 
-            response = requests.post(
+            response = client.post(
                 f"{cfg['app.tarot_endpoint']}/manage/manage/liste_scene.php?hashuser={hash_user}&idreq={altdata['request_id']}",
                 data=data,
                 auth=(altdata["browser_username"], altdata["browser_password"]),
@@ -592,6 +597,7 @@ class TAROTAPI(FollowUpAPI):
         try:
             flow = Flow()
             if kwargs.get("refresh_source", False):
+                invalidate_source_snapshots(obj_internal_key)
                 flow.push(
                     "*",
                     "skyportal/REFRESH_SOURCE",
@@ -9,6 +9,7 @@ from baselayer.app.env import load_env
 from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
@@ -151,6 +152,7 @@ def commit_photometry(lc, request_id, instrument_id, user_id):
         session.commit()
 
         flow = Flow()
+        invalidate_source_snapshots(request.obj.internal_key)
         flow.push(
             "*",
             "skyportal/REFRESH_SOURCE",
@@ -233,6 +235,7 @@ class TESSAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -264,6 +267,7 @@ class TESSAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
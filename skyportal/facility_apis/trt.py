@@ -6,7 +6,6 @@ from datetime import datetime, timedelta
 from urllib.parse import urlparse
 
 import astropy.units as u
-import requests
 import sqlalchemy as sa
 from astropy.coordinates import SkyCoord
 from astropy.time import Time, TimeDelta
@@ -16,10 +15,13 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("trt")
+
 log = make_log("facility_apis/trt")
 
 
@@ -184,7 +186,7 @@ class TRTAPI(FollowUpAPI):
             payload = json.dumps({"script": [requestgroup]})
             url = f"{cfg['app.trt_endpoint']}/newobservation"
 
-            r = requests.request(
+            r = client.request(
                 "POST",
                 url,
                 data=payload,
@@ -221,6 +223,7 @@ class TRTAPI(FollowUpAPI):
         try:
             flow = Flow()
             if kwargs.get("refresh_source", False):
+                invalidate_source_snapshots(request.obj.internal_key)
                 flow.push(
                     "*",
                     "skyportal/REFRESH_SOURCE",
@@ -294,7 +297,7 @@ class TRTAPI(FollowUpAPI):
                 "Content-Type": "application/json",
                 "TRT": altdata["token"],
             }
-            r = requests.request("POST", url, headers=headers, data=payload)
+            r = client.request("POST", url, headers=headers, data=payload)
 
             r.raise_for_status()
 
@@ -339,6 +342,7 @@ class TRTAPI(FollowUpAPI):
         try:
             flow = Flow()
             if kwargs.get("refresh_source", False):
+                invalidate_source_snapshots(request.obj.internal_key)
                 flow.push(
                     "*",
                     "skyportal/REFRESH_SOURCE",
@@ -432,7 +436,7 @@ class TRTAPI(FollowUpAPI):
                     "Content-Type": "application/json",
                     "TRT": altdata["token"],
                 }
-                r = requests.request("POST", url, headers=headers, data=payload)
+                r = client.request("POST", url, headers=headers, data=payload)
 
                 r.raise_for_status()
                 request.status = "deleted"
@@ -457,6 +461,7 @@ class TRTAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -3,7 +3,6 @@ import traceback
 import urllib
 from datetime import datetime, timedelta
 
-import requests
 from astropy.time import Time
 from requests.auth import HTTPBasicAuth
 
@@ -12,10 +11,13 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("winter")
+
 
 log = make_log("facility_apis/winter")
 
@@ -195,7 +197,7 @@ class WINTERAPI(FollowUpAPI):
             name = req.schedule_name(request)
 
             url = urllib.parse.urljoin(WINTER_URL, "too/delete")
-            r = requests.delete(
+            r = client.delete(
                 url,
                 params={
                     "program_name": altdata["program_name"],
@@ -221,6 +223,7 @@ class WINTERAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -264,7 +267,7 @@ class WINTERAPI(FollowUpAPI):
         payload = req._build_payload(request)
         url = urllib.parse.urljoin(WINTER_URL, "too/winter")
 
-        r = requests.post(
+        r = client.post(
             url,
             params={
                 "program_name": altdata["program_name"],
@@ -306,6 +309,7 @@ class WINTERAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -1,12 +1,14 @@
 import functools
 import json
+import threading
 import urllib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from io import StringIO
 
 import astropy
 import numpy as np
 import pandas as pd
-import requests
 import sqlalchemy as sa
 from astropy.io import ascii
 from astropy.time import Time
@@ -21,10 +23,13 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..utils import http
+from ..utils.source_snapshots import invalidate_source_snapshots
 from . import MMAAPI, FollowUpAPI
 
 env, cfg = load_env()
 
+client = http.get_facility_client("ztf")
+
 
 if cfg["app.ztf.port"] is None:
     ZTF_URL = f"{cfg['app.ztf.protocol']}://{cfg['app.ztf.host']}"
@@ -348,7 +353,7 @@ def commit_photometry(
         if not allocation:
             raise ValueError("Missing request's allocation information.")
 
-        r = requests.get(
+        r = client.get(
             url,
             auth=HTTPBasicAuth(
                 altdata["ipac_http_user"], altdata["ipac_http_password"]
@@ -451,6 +456,7 @@ def commit_photometry(
         session.commit()
 
         flow = Flow()
+        invalidate_source_snapshots(request.obj.internal_key)
         flow.push(
             "*",
             "skyportal/REFRESH_SOURCE",
@@ -542,6 +548,7 @@ class ZTFAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -604,7 +611,7 @@ class ZTFAPI(FollowUpAPI):
             prepped = req.prepare()
             r = s.send(prepped)
         elif request.payload["request_type"] == "forced_photometry":
-            r = requests.get(
+            r = client.get(
                 url,
                 auth=HTTPBasicAuth(
                     altdata["ipac_http_user"], altdata["ipac_http_password"]
@@ -647,7 +654,7 @@ class ZTFAPI(FollowUpAPI):
                 facility_microservice_url = (
                     f"http://127.0.0.1:{cfg['ports.facility_queue']}"
                 )
-                requests.post(
+                http.get_facility_client("facility_queue").post(
                     facility_microservice_url,
                     json={
                         "request_id": req.id,
@@ -669,6 +676,7 @@ class ZTFAPI(FollowUpAPI):
 
         if kwargs.get("refresh_source", False):
             flow = Flow()
+            invalidate_source_snapshots(request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -1036,13 +1044,14 @@ class ZTFMMAAPI(MMAAPI):
         if jd_start > jd_end:
             raise ValueError("start_date must be before end_date.")
 
-        s = Session()
-        s.auth = (altdata["depot_username"], altdata["depot_password"])
+        make_session = functools.partial(
+            depot_session, (altdata["depot_username"], altdata["depot_password"])
+        )
 
         fetch_obs = functools.partial(
             fetch_depot_observations,
             allocation.instrument.id,
-            s,
+            make_session,
             altdata["depot"],
             jd_start,
             jd_end,
@@ -1176,153 +1185,242 @@ class ZTFMMAAPI(MMAAPI):
         return form_json_schema
 
 
-def fetch_depot_observations(instrument_id, session, depot_url, jd_start, jd_end):
-    """Fetch executed observations from a TAP client.
+def aggregate_exposures(obstable, exposure_column, field_column, filter_column):
+    """Aggregate the quadrant-level rows of executed observations per exposure.
+
+    Parameters
+    ----------
+    obstable : pandas.DataFrame
+        One row per processed quadrant.
+    exposure_column : str
+        Name of the exposure ID column.
+    field_column : str
+        Name of the field ID column.
+    filter_column : str
+        Name of the filter ID column.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per exposure, with the median of the numeric columns, the
+        exposure ID as observation_id, the fraction of the 64 quadrants
+        processed as processed_fraction, and the filter name as filter.
+    """
+    grouped = obstable.groupby(exposure_column)
+    exposures = grouped.median(numeric_only=True)
+    exposures["processed_fraction"] = grouped[field_column].size() / 64.0
+    exposures["filter"] = exposures[filter_column].astype(int).map(inv_bands)
+    exposures["observation_id"] = exposures.index.astype(np.int64)
+    return exposures.reset_index(drop=True)
+
+
+def fetch_depot_night(instrument_id, session, depot_url, jd):
+    """Fetch the executed observations of a night from the depot.
+
+    Parameters
+    ----------
     instrument_id : int
         ID of the instrument
     session : request.Session()
         An authenticated request session.
     depot_url : str
         URL of the depot server
+    jd : float
+        JD of the night
+
+    Returns
+    -------
+    pandas.DataFrame or None
+        The observations of the night, one row per exposure, or None
+        if there are none.
+    """
+
+    date = Time(jd, format="jd").datetime.strftime("%Y%m%d")
+    r = session.get(f"{depot_url}/{date}/ztf_recentproc_{date}.json")
+
+    if r.status_code == 401:
+        log(
+            f"Unauthorized access to depot for instrument ID {instrument_id} for JD: {jd}"
+        )
+        return None
+
+    # file exists
+    if r.status_code == 200:
+        obstable = pd.DataFrame(r.json())
+
+        if obstable.empty:
+            log(f"No observations for instrument ID {instrument_id} for JD: {jd}")
+            return None
+        # only want successfully reduced images
+        obstable = obstable[obstable["status"] == 0]
+    else:
+        # look for another similar file generated at the end of the night: goodsubs_YYYYMMDD.txt
+        r = session.get(f"{depot_url}/{date}/goodsubs_{date}.txt")
+        if r.status_code != 200:
+            return None
+
+        obstable = pd.read_fwf(  # fwf is fixed width format
+            StringIO(r.text),
+            skiprows=[1],
+            delimiter="|",
+        )
+        # remove spaces around the column names and str values if any
+        obstable.columns = [col.strip() for col in obstable.columns]
+        for col in obstable.columns:
+            if obstable[col].dtype == "object":
+                obstable[col] = obstable[col].str.strip()
+
+        if obstable.empty:
+            log(f"No observations for instrument ID {instrument_id} for JD: {jd}")
+            return None
+
+        # remove the columns we do not need, and the rows with NaN values
+        obstable = obstable[
+            [
+                "jd",
+                "field",
+                "fid",
+                "expid",
+                "diffmaglim",
+                "difffwhm",
+                "exptime",
+                "subtractionstatus",
+            ]
+        ].dropna()
+        obstable = obstable.astype(
+            {
+                "jd": float,
+                "field": int,
+                "diffmaglim": float,
+                "difffwhm": float,
+                "fid": int,
+                "expid": int,
+                "exptime": float,
+                "subtractionstatus": int,
+            }
+        )
+
+        # only want successfully reduced images, the column in that file is called subtractionstatus, and 1 means success
+        obstable = obstable[obstable["subtractionstatus"] == 1]
+
+        # rename the relevant columns to have the same names as the other file
+        # and/or the name expected by the add_observation function
+        obstable = obstable.rename(
+            columns={
+                "jd": "obsjd",
+                "diffmaglim": "maglim",
+                "difffwhm": "fwhm",
+                "fid": "filter_id",
+                "field": "field_id",
+                "expid": "exposure_id",
+                "exptime": "exposure_time",
+            }
+        )
+
+    if obstable.empty:
+        log(f"No observations for instrument ID {instrument_id} for JD: {jd}")
+        return None
+
+    return aggregate_exposures(obstable, "exposure_id", "field_id", "filter_id")
+
+
+def depot_session(auth):
+    """New requests session authenticated for the depot."""
+    session = Session()
+    session.auth = auth
+    return session
+
+
+def get_depot_observations(
+    instrument_id, make_session, depot_url, jd_start, jd_end, max_workers=8
+):
+    """Fetch the executed observations of a range of nights from the depot,
+    fetching several nights concurrently.
+
+    Parameters
+    ----------
+    instrument_id : int
+        ID of the instrument
+    make_session : callable
+        Returns a new authenticated request session. requests sessions are
+        not thread-safe, so each worker thread uses its own.
+    depot_url : str
+        URL of the depot server
     jd_start : float
         JD of the start time of observations
     jd_end : float
         JD of the end time of observations
+    max_workers : int, optional
+        Maximum number of nights fetched at once, by default 8
+
+    Returns
+    -------
+    pandas.DataFrame or None
+        The observations, in the format expected by add_observations,
+        or None if there are none.
     """
 
-    dfs = []
-
     jds = np.arange(np.floor(jd_start), np.ceil(jd_end))
-    for jd in jds:
-        date = Time(jd, format="jd").datetime.strftime("%Y%m%d")
-        url = f"{depot_url}/{date}/ztf_recentproc_{date}.json"
-        r = session.head(url)
-
-        if r.status_code == 401:
-            log(
-                f"Unauthorized access to depot for instrument ID {instrument_id} for JD: {jd}"
-            )
-            continue
-
-        # file exists
-        if r.status_code == 200:
-            r = session.get(url)
-            obstable = pd.DataFrame(r.json())
-
-            if obstable.empty:
-                log(f"No observations for instrument ID {instrument_id} for JD: {jd}")
+    local = threading.local()
+
+    def fetch_night(jd):
+        if not hasattr(local, "session"):
+            local.session = make_session()
+        return fetch_depot_night(instrument_id, local.session, depot_url, jd)
+
+    nights = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(fetch_night, jd) for jd in jds]
+        for jd, future in zip(jds, futures):
+            try:
+                night = future.result()
+            except Exception as e:
+                log(
+                    f"Failed to fetch observations for instrument ID {instrument_id} for JD: {jd}: {e}"
+                )
                 continue
-            # only want successfully reduced images
-            obstable = obstable[obstable["status"] == 0]
-
-            obs_grouped_by_exp = obstable.groupby("exposure_id")
-            for expid, df_group in obs_grouped_by_exp:
-                df_group_median = df_group.median()
-                df_group_median["observation_id"] = int(expid)
-                df_group_median["processed_fraction"] = len(df_group["field_id"]) / 64.0
-                df_group_median["filter"] = inv_bands[int(df_group_median["filter_id"])]
-                dfs.append(df_group_median)
-        else:
-            # look for another similar file generated at the end of the night: goodsubs_YYYYMMDD.txt
-            url = f"{depot_url}/{date}/goodsubs_{date}.txt"
-            r = session.head(url)
-            if r.status_code == 200:
-                r = session.get(url)
-                from io import StringIO
+            if night is not None:
+                nights.append(night)
 
-                obstable = pd.read_fwf(  # fwf is fixed width format
-                    StringIO(r.text),
-                    skiprows=[1],
-                    delimiter="|",
-                )
-                # remove spaces around the column names and str values if any
-                obstable.columns = [col.strip() for col in obstable.columns]
-                for col in obstable.columns:
-                    if obstable[col].dtype == "object":
-                        obstable[col] = obstable[col].str.strip()
-
-                if obstable.empty:
-                    log(
-                        f"No observations for instrument ID {instrument_id} for JD: {jd}"
-                    )
-                    continue
-
-                # remove the columns we do not need:
-                obstable = obstable[
-                    [
-                        "jd",
-                        "field",
-                        "fid",
-                        "expid",
-                        "diffmaglim",
-                        "difffwhm",
-                        "exptime",
-                        "subtractionstatus",
-                    ]
-                ]
+    if len(nights) == 0:
+        return None
 
-                # move rows with NaN values in any of the columns
-                obstable = obstable.dropna()
-
-                obstable["jd"] = obstable["jd"].astype(float)
-                obstable["field"] = obstable["field"].astype(int)
-                obstable["diffmaglim"] = obstable["diffmaglim"].astype(float)
-                obstable["difffwhm"] = obstable["difffwhm"].astype(float)
-                obstable["fid"] = obstable["fid"].astype(int)
-                obstable["expid"] = obstable["expid"].astype(int)
-                obstable["exptime"] = obstable["exptime"].astype(float)
-                obstable["subtractionstatus"] = obstable["subtractionstatus"].astype(
-                    int
-                )
+    obstable = pd.concat(nights, ignore_index=True)
+    obstable.rename(
+        columns={
+            "obsjd": "obstime",
+            "maglim": "limmag",
+            "fwhm": "seeing",  # equivalent as plate scale is 1"/pixel
+        },
+        inplace=True,
+    )
+    obstable["target_name"] = None
+    return obstable
 
-                if obstable.empty:
-                    log(
-                        f"No observations for instrument ID {instrument_id} for JD: {jd}"
-                    )
-                    continue
-
-                # only want successfully reduced images, the column in that file is called subtractionstatus, and 1 means success
-                obstable = obstable[obstable["subtractionstatus"] == 1]
-
-                # rename the relevant columns to have the same names as the other file
-                # and/or the name expected by the add_observation function
-                obstable.rename(
-                    columns={
-                        "jd": "obsjd",
-                        "diffmaglim": "maglim",
-                        "difffwhm": "fwhm",
-                        "fid": "filter_id",
-                        "field": "field_id",
-                        "expid": "exposure_id",
-                        "exptime": "exposure_time",
-                    },
-                    inplace=True,
-                )
 
-                obs_grouped_by_exp = obstable.groupby("exposure_id")
-                for expid, df_group in obs_grouped_by_exp:
-                    df_group_median = df_group.median()
-                    df_group_median["observation_id"] = int(expid)
-                    df_group_median["processed_fraction"] = (
-                        len(df_group["field_id"]) / 64.0
-                    )
-                    df_group_median["filter"] = inv_bands[
-                        int(df_group_median["filter_id"])
-                    ]
-                    dfs.append(df_group_median)
-
-    if len(dfs) > 0:
-        obstable = pd.concat(dfs, axis=1).T
-        obstable.rename(
-            columns={
-                "obsjd": "obstime",
-                "maglim": "limmag",
-                "fwhm": "seeing",  # equivalent as plate scale is 1"/pixel
-            },
-            inplace=True,
-        )
-        obstable["target_name"] = None
+def fetch_depot_observations(instrument_id, make_session, depot_url, jd_start, jd_end):
+    """Fetch executed observations from the depot, and add them.
+    instrument_id : int
+        ID of the instrument
+    make_session : callable
+        Returns a new authenticated request session.
+    depot_url : str
+        URL of the depot server
+    jd_start : float
+        JD of the start time of observations
+    jd_end : float
+        JD of the end time of observations
+    """
 
+    obstable = get_depot_observations(
+        instrument_id,
+        make_session,
+        depot_url,
+        jd_start,
+        jd_end,
+        max_workers=cfg.get("app.ztf_depot_max_workers", 8),
+    )
+    if obstable is not None:
         from skyportal.handlers.api.observation import add_observations
 
         add_observations(instrument_id, obstable)
@@ -1351,15 +1449,7 @@ def fetch_tap_observations(instrument_id, client, request_str):
         )
         return
 
-    obs_grouped_by_exp = obstable.groupby("expid")
-    dfs = []
-    for expid, df_group in obs_grouped_by_exp:
-        df_group_median = df_group.median()
-        df_group_median["observation_id"] = int(expid)
-        df_group_median["processed_fraction"] = len(df_group["field"]) / 64.0
-        df_group_median["filter"] = inv_bands[int(df_group_median["fid"])]
-        dfs.append(df_group_median)
-    obstable = pd.concat(dfs, axis=1).T
+    obstable = aggregate_exposures(obstable, "expid", "field", "fid")
     obstable.rename(
         columns={
             "obsjd": "obstime",
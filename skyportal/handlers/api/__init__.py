@@ -19,7 +19,7 @@ from .annotation_services import (
     PS1QueryHandler,
     VizierQueryHandler,
 )
-from .candidate import CandidateFilterHandler, CandidateHandler
+from .candidate import BulkCandidateHandler, CandidateFilterHandler, CandidateHandler
 from .catalog_services import (
     CatalogQueryHandler,
     GaiaPhotometricAlertsQueryHandler,
@@ -43,8 +43,10 @@ from .earthquake import (
     EarthquakeStatusHandler,
 )
 from .enum_types import EnumTypesHandler
+from .facility_http_metrics import FacilityHTTPMetricsHandler
 from .facility_listener import FacilityMessageHandler
 from .filter import FilterHandler
+from .finding_chart import FindingChartJobDownloadHandler, FindingChartJobHandler
 from .followup_request import (
     AssignmentHandler,
     DefaultFollowupRequestHandler,
@@ -168,6 +170,7 @@ from .source import (
     SourceNotificationHandler,
     SourceObservabilityPlotHandler,
     SourceOffsetsHandler,
+    SourcesOffsetsHandler,
     SurveyThumbnailHandler,
 )
 from .source_exists import SourceExistsHandler
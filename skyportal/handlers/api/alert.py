@@ -12,3 +12,16 @@ def post_alert(*args, **kwargs):
 
 def get_alerts_by_position(*args, **kwargs):
     pass
+
+
+def get_alerts_by_positions(*args, **kwargs):
+    # multi-cone version of get_alerts_by_position, taking a list of
+    # (ra, dec) coordinates; optional, the watch list falls back to
+    # single cone searches if an extension does not provide it
+    pass
+
+
+def post_alerts(*args, **kwargs):
+    # bulk version of post_alert, taking a list of object IDs and returning
+    # the photometry IDs posted by object ID; optional, as above
+    pass
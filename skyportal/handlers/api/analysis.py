@@ -45,6 +45,7 @@ from ...models import (
     User,
     UserNotification,
 )
+from ...utils.source_snapshots import invalidate_source_snapshots
 from ..base import BaseHandler
 from .photometry import serialize
 
@@ -1444,6 +1445,7 @@ class AnalysisHandler(BaseHandler):
                 try:
                     flow = Flow()
                     if analysis.analysis_service.is_summary:
+                        invalidate_source_snapshots(analysis.obj.internal_key)
                         flow.push(
                             "*",
                             "skyportal/REFRESH_SOURCE",
@@ -18,9 +18,6 @@ from io import StringIO
 import numpy as np
 import pandas as pd
 import sqlalchemy as sa
-from astroquery.gaia import GaiaClass
-from astroquery.irsa import Irsa
-from astroquery.vizier import Vizier
 from sqlalchemy.exc import IntegrityError
 
 from baselayer.app.access import auth_or_token
@@ -127,6 +124,8 @@ class GaiaQueryHandler(BaseHandler):
             num_matches = data.pop("crossmatchNumber", cfg["cross_match.gaia.number"])
             candidate_coord = SkyCoord(ra=obj.ra * u.deg, dec=obj.dec * u.deg)
 
+            from astroquery.gaia import GaiaClass
+
             gc = GaiaClass()
             sub_context = gc.GAIA_MESSAGES
             conn_handler = gc._TapPlus__getconnhandler()
@@ -351,6 +350,8 @@ class IRSAQueryWISEHandler(BaseHandler):
             radius_arcsec = data.pop("crossmatchRadius", 2.0)
             candidate_coord = SkyCoord(ra=obj.ra * u.deg, dec=obj.dec * u.deg)
 
+            from astroquery.irsa import Irsa
+
             df = Irsa.query_region(
                 coordinates=candidate_coord,
                 catalog=catalog,
@@ -501,6 +502,8 @@ class VizierQueryHandler(BaseHandler):
             radius_arcsec = data.pop("crossmatchRadius", 2.0)
             candidate_coord = SkyCoord(ra=obj.ra * u.deg, dec=obj.dec * u.deg)
 
+            from astroquery.vizier import Vizier
+
             tl = Vizier.query_region(
                 coordinates=candidate_coord,
                 catalog=catalog,
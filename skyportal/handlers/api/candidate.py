@@ -14,12 +14,13 @@ import numpy as np
 import sqlalchemy as sa
 from astropy.time import Time
 from marshmallow.exceptions import ValidationError
+from sqlalchemy.dialects import postgresql as psql
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload, scoped_session, sessionmaker
 from sqlalchemy.sql import Values, bindparam, column, text
-from sqlalchemy.sql.expression import case, cast, func
-from sqlalchemy.types import Boolean, Float, Integer, String
+from sqlalchemy.sql.expression import cast, func
+from sqlalchemy.types import Boolean, Integer, String
 
 from baselayer.app.access import auth_or_token, permissions
 from baselayer.app.env import load_env
@@ -29,6 +30,7 @@ from baselayer.log import make_log
 from ...models import (
     Annotation,
     AnnotationOnPhotometry,
+    AnnotationValue,
     Candidate,
     Classification,
     Comment,
@@ -48,6 +50,7 @@ from ...utils.sizeof import SIZE_WARNING_THRESHOLD, sizeof
 from ..base import BaseHandler
 
 MAX_NUM_DAYS_USING_LOCALIZATION = 31 * 12 * 10  # 10 years
+MAX_CANDIDATES_PER_BULK_REQUEST = 5000
 
 _, cfg = load_env()
 cache_dir = "cache/candidates_queries"
@@ -898,8 +901,6 @@ class CandidateHandler(BaseHandler):
             q = Obj.select(session.user_or_token).join(
                 candidate_subquery, Obj.id == candidate_subquery.c.obj_id
             )
-            if sort_by_origin is not None or annotation_filter_list is not None:
-                q = q.outerjoin(Annotation)
 
             if classifications is not None:
                 if isinstance(classifications, str) and "," in classifications:
@@ -1086,9 +1087,15 @@ class CandidateHandler(BaseHandler):
                         value = new_filter["value"]
                         if isinstance(value, bool):
                             q = q.where(
-                                Annotation.origin == new_filter["origin"],
-                                Annotation.data[new_filter["key"]].astext.cast(Boolean)
-                                == value,
+                                Obj.id.in_(
+                                    sa.select(Annotation.obj_id).where(
+                                        Annotation.origin == new_filter["origin"],
+                                        Annotation.data[new_filter["key"]].astext.cast(
+                                            Boolean
+                                        )
+                                        == value,
+                                    )
+                                )
                             )
                         else:
                             # Test if the value is a nested object
@@ -1106,20 +1113,29 @@ class CandidateHandler(BaseHandler):
                                 # If not, this is just a string field and we don't
                                 # need the string formatting above
                                 pass
-                            q = q.filter(
-                                Annotation.origin == new_filter["origin"],
-                                Annotation.data[new_filter["key"]].astext == value,
+                            q = q.where(
+                                Obj.id.in_(
+                                    sa.select(Annotation.obj_id).where(
+                                        Annotation.origin == new_filter["origin"],
+                                        Annotation.data[new_filter["key"]].astext
+                                        == value,
+                                    )
+                                )
                             )
                     elif "min" in new_filter and "max" in new_filter:
                         try:
                             min_value = float(new_filter["min"])
                             max_value = float(new_filter["max"])
+                            # numeric ranges use the indexed annotation_values
                             q = q.where(
-                                Annotation.origin == new_filter["origin"],
-                                Annotation.data[new_filter["key"]].cast(Float)
-                                >= min_value,
-                                Annotation.data[new_filter["key"]].cast(Float)
-                                <= max_value,
+                                Obj.id.in_(
+                                    sa.select(AnnotationValue.obj_id).where(
+                                        AnnotationValue.origin == new_filter["origin"],
+                                        AnnotationValue.key == new_filter["key"],
+                                        AnnotationValue.value >= min_value,
+                                        AnnotationValue.value <= max_value,
+                                    )
+                                )
                             )
                         except ValueError:
                             return self.error(
@@ -1133,23 +1149,38 @@ class CandidateHandler(BaseHandler):
             if sort_by_origin is not None:
                 sort_by_key = self.get_query_argument("sortByAnnotationKey", None)
                 sort_by_order = self.get_query_argument("sortByAnnotationOrder", None)
-                # Define a custom sort order to have annotations from the correct
-                # origin first, all others afterwards
-                origin_sort_order = case(
-                    {sort_by_origin: 1},
-                    value=Annotation.origin,
-                    else_=None,
+                # Join only the annotation from the requested origin, and its
+                # numeric value if it has one, so that objects without it come
+                # last. Numeric values are sorted from the indexed
+                # annotation_values, other values from the JSONB data.
+                q = q.outerjoin(
+                    Annotation,
+                    sa.and_(
+                        Annotation.obj_id == Obj.id,
+                        Annotation.origin == sort_by_origin,
+                    ),
+                ).outerjoin(
+                    AnnotationValue,
+                    sa.and_(
+                        AnnotationValue.annotation_id == Annotation.id,
+                        AnnotationValue.key == sort_by_key,
+                    ),
                 )
-                annotation_sort_criterion = (
-                    Annotation.data[sort_by_key].desc().nullslast()
+                annotation_sort_criteria = (
+                    [
+                        AnnotationValue.value.desc().nullslast(),
+                        Annotation.data[sort_by_key].desc().nullslast(),
+                    ]
                     if sort_by_order == "desc"
-                    else Annotation.data[sort_by_key].nullslast()
+                    else [
+                        AnnotationValue.value.nullslast(),
+                        Annotation.data[sort_by_key].nullslast(),
+                    ]
                 )
                 # Don't apply the order by just yet. Save it so we can pass it to
                 # the LIMT/OFFSET helper function.
                 order_by = [
-                    origin_sort_order.nullslast(),
-                    annotation_sort_criterion,
+                    *annotation_sort_criteria,
                     candidate_subquery.c.passed_at.desc().nullslast(),
                     Obj.id,
                 ]
@@ -1738,6 +1769,293 @@ class CandidateHandler(BaseHandler):
             return self.success()
 
 
+def post_candidates(candidates_data, user, session):
+    """Post candidates (and their Objs, if new) in bulk, in a single transaction.
+
+    Objs and Candidates are inserted with one statement each, and the healpix
+    indices of all the Objs are computed at once. Invalid items, and items of
+    existing Objs the user cannot access, are skipped and reported, without
+    preventing the other items from being posted.
+
+    Parameters
+    ----------
+    candidates_data : list of dict
+        Candidates to post, each with the same content as the body of
+        a POST request to /api/candidates.
+    user : `skyportal.models.User`
+        User posting the candidates.
+    session : `sqlalchemy.orm.session.Session`
+        Database session for this transaction.
+
+    Returns
+    -------
+    list of dict
+        For each item (in the same order), the Obj ID, the IDs of the new
+        candidates, and the error message if the item could not be posted.
+    """
+    results = [
+        {"obj_id": None, "ids": [], "error": None} for _ in range(len(candidates_data))
+    ]
+    valid_items = []
+    for i, item in enumerate(candidates_data):
+        if not isinstance(item, dict) or item.get("id") in [None, ""]:
+            results[i]["error"] = "Missing required parameter: `id`."
+            continue
+        item = dict(item)
+        results[i]["obj_id"] = str(item["id"])
+        passing_alert_id = item.pop("passing_alert_id", None)
+        passed_at = item.pop("passed_at", None)
+        filter_ids = item.pop("filter_ids", None)
+        if passed_at is None:
+            results[i]["error"] = "Missing required parameter: `passed_at`."
+            continue
+        if not isinstance(filter_ids, list) or len(filter_ids) == 0:
+            results[i]["error"] = "Missing required filter_ids parameter."
+            continue
+        try:
+            passed_at = arrow.get(passed_at).to("utc").naive
+            filter_ids = [int(filter_id) for filter_id in filter_ids]
+        except (arrow.ParserError, TypeError, ValueError) as e:
+            results[i]["error"] = f"Invalid parameters: {e}"
+            continue
+        valid_items.append((i, item, filter_ids, passing_alert_id, passed_at))
+
+    accessible_filter_ids = set(
+        session.scalars(
+            Filter.select(session.user_or_token, columns=[Filter.id]).where(
+                Filter.id.in_(
+                    {
+                        fid
+                        for _, _, filter_ids, _, _ in valid_items
+                        for fid in filter_ids
+                    }
+                )
+            )
+        ).all()
+    )
+    item_obj_ids = {str(item["id"]) for _, item, _, _, _ in valid_items}
+    existing_objs = {
+        obj.id: obj
+        for obj in session.scalars(
+            Obj.select(session.user_or_token).where(Obj.id.in_(item_obj_ids))
+        ).all()
+    }
+    # Objs that exist but that the user cannot access must not be treated
+    # as new: their candidates are not posted
+    inaccessible_obj_ids = (
+        set(session.scalars(sa.select(Obj.id).where(Obj.id.in_(item_obj_ids))).all())
+        - existing_objs.keys()
+    )
+
+    schema = Obj.__schema__()
+    new_objs = {}
+    positions = {}
+    candidate_rows = []
+    for i, item, filter_ids, passing_alert_id, passed_at in valid_items:
+        obj_id = str(item["id"])
+        if obj_id in inaccessible_obj_ids:
+            results[i]["error"] = f"Insufficient permissions for object {obj_id}."
+            continue
+        filter_ids = [fid for fid in filter_ids if fid in accessible_filter_ids]
+        if len(filter_ids) == 0:
+            results[i]["error"] = "At least one valid filter ID must be provided."
+            continue
+
+        obj = existing_objs.get(obj_id, new_objs.get(obj_id))
+        if obj is None:
+            if item.get("ra") is None:
+                results[i]["error"] = "RA must not be null for a new Obj"
+                continue
+            if item.get("dec") is None:
+                results[i]["error"] = "Dec must not be null for a new Obj"
+                continue
+            try:
+                obj = schema.load(item)
+            except ValidationError as e:
+                results[i]["error"] = (
+                    f"Invalid/missing parameters: {e.normalized_messages()}"
+                )
+                continue
+            new_objs[obj_id] = obj
+
+        update_redshift_history_if_relevant(item, obj, user)
+        if item.get("ra") is not None and item.get("dec") is not None:
+            positions[obj_id] = (item["ra"], item["dec"])
+        elif obj_id not in positions and obj.ra is not None and obj.dec is not None:
+            positions[obj_id] = (obj.ra, obj.dec)
+
+        candidate_rows.extend(
+            {
+                "obj_id": obj_id,
+                "filter_id": filter_id,
+                "passing_alert_id": passing_alert_id,
+                "passed_at": passed_at,
+                "uploader_id": user.id,
+            }
+            for filter_id in filter_ids
+        )
+
+    # compute the healpix indices of all the new or updated Objs at once
+    if len(positions) > 0:
+        obj_ids = list(positions.keys())
+        ra, dec = np.array([positions[obj_id] for obj_id in obj_ids], dtype=float).T
+        healpix = ha.constants.HPX.lonlat_to_healpix(ra * u.deg, dec * u.deg)
+        for obj_id, hpx in zip(obj_ids, healpix):
+            obj = existing_objs.get(obj_id, new_objs.get(obj_id))
+            obj.healpix = int(hpx)
+
+    if len(new_objs) > 0:
+        obj_columns = [attr.key for attr in sa.inspect(Obj).column_attrs]
+        session.execute(
+            psql.insert(Obj).on_conflict_do_nothing(index_elements=["id"]),
+            [
+                {
+                    key: getattr(obj, key)
+                    for key in obj_columns
+                    if getattr(obj, key) is not None
+                }
+                for obj in new_objs.values()
+            ],
+        )
+
+    inserted = {}
+    if len(candidate_rows) > 0:
+        rows = session.execute(
+            psql.insert(Candidate)
+            .on_conflict_do_nothing(index_elements=["obj_id", "filter_id", "passed_at"])
+            .returning(
+                Candidate.id,
+                Candidate.obj_id,
+                Candidate.filter_id,
+                Candidate.passed_at,
+            ),
+            candidate_rows,
+        ).all()
+        inserted = {(row.obj_id, row.filter_id, row.passed_at): row.id for row in rows}
+    session.commit()
+
+    for i, item, filter_ids, _, passed_at in valid_items:
+        if results[i]["error"] is not None:
+            continue
+        obj_id = results[i]["obj_id"]
+        duplicates = []
+        for filter_id in filter_ids:
+            if filter_id not in accessible_filter_ids:
+                continue
+            candidate_id = inserted.pop((obj_id, filter_id, passed_at), None)
+            if candidate_id is None:
+                duplicates.append(filter_id)
+            else:
+                results[i]["ids"].append(candidate_id)
+        if len(duplicates) > 0:
+            results[i]["error"] = (
+                f"Failed to post candidate for object {obj_id}: candidate already "
+                f"exists for filter(s) {duplicates} passed at {passed_at}"
+            )
+
+    return results
+
+
+class BulkCandidateHandler(BaseHandler):
+    @permissions(["Upload data"])
+    def post(self):
+        """
+        ---
+        summary: Create new candidates in bulk
+        description: |
+          Create new candidates (one per filter) for multiple objects in a
+          single transaction. Invalid items are skipped and reported in the
+          response, without preventing the other items from being posted.
+        tags:
+          - candidates
+        requestBody:
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  candidates:
+                    type: array
+                    items:
+                      allOf:
+                        - $ref: '#/components/schemas/ObjPost'
+                        - type: object
+                          properties:
+                            filter_ids:
+                              type: array
+                              items:
+                                type: integer
+                              description: List of associated filter IDs
+                            passing_alert_id:
+                              type: integer
+                              description: ID of associated filter that created candidate
+                              nullable: true
+                            passed_at:
+                              type: string
+                              description: Arrow-parseable datetime string indicating when passed filter.
+                          required:
+                            - filter_ids
+                            - passed_at
+                    description: |
+                      Candidates to post, in the same format as for
+                      POST /api/candidates. At most 5000 per request.
+                required:
+                  - candidates
+        responses:
+          200:
+            content:
+              application/json:
+                schema:
+                  allOf:
+                    - $ref: '#/components/schemas/Success'
+                    - type: object
+                      properties:
+                        data:
+                          type: object
+                          properties:
+                            results:
+                              type: array
+                              items:
+                                type: object
+                                properties:
+                                  obj_id:
+                                    type: string
+                                    description: ID of the object
+                                  ids:
+                                    type: array
+                                    items:
+                                      type: integer
+                                    description: List of new candidate IDs
+                                  error:
+                                    type: string
+                                    nullable: true
+                                    description: Why the item could not be posted, if it failed
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        data = self.get_json()
+        candidates_data = data.get("candidates")
+        if not isinstance(candidates_data, list) or len(candidates_data) == 0:
+            return self.error("Missing required parameter: `candidates`.")
+        if len(candidates_data) > MAX_CANDIDATES_PER_BULK_REQUEST:
+            return self.error(
+                f"Cannot post more than {MAX_CANDIDATES_PER_BULK_REQUEST} candidates at once."
+            )
+
+        with self.Session() as session:
+            try:
+                results = post_candidates(
+                    candidates_data, self.associated_user_object, session
+                )
+            except Exception as e:
+                session.rollback()
+                return self.error(f"Failed to post candidates: {e}")
+
+            return self.success(data={"results": results})
+
+
 def get_obj_id_values(obj_ids):
     """Return a Postgres VALUES representation of ordered list of Obj IDs
     to be returned by the Candidates/Sources query.
@@ -16,6 +16,7 @@ from ...models import (
     Taxonomy,
     User,
 )
+from ...utils.source_snapshots import invalidate_source_snapshots
 from ..base import BaseHandler
 
 _, cfg = load_env()
@@ -151,6 +152,7 @@ def post_classification(data, user_id, session):
     session.commit()
 
     flow = Flow()
+    invalidate_source_snapshots(classification.obj.internal_key)
     flow.push(
         "*",
         "skyportal/REFRESH_SOURCE",
@@ -0,0 +1,66 @@
+import requests
+
+from baselayer.app.access import permissions
+from baselayer.app.env import load_env
+from baselayer.log import make_log
+
+from ...utils.http import get_facility_metrics
+from ..base import BaseHandler
+
+_, cfg = load_env()
+log = make_log("api/facility_http_metrics")
+
+
+class FacilityHTTPMetricsHandler(BaseHandler):
+    @permissions(["System admin"])
+    def get(self):
+        """
+        ---
+        summary: Get facility API request metrics
+        description: |
+          Retrieve the request count, errors, status codes and latency
+          histogram of the requests sent to each facility API, by the app
+          process serving this request and by the facility queue service.
+        tags:
+          - system info
+        responses:
+          200:
+            content:
+              application/json:
+                schema:
+                  allOf:
+                    - $ref: '#/components/schemas/Success'
+                    - type: object
+                      properties:
+                        data:
+                          type: object
+                          properties:
+                            app:
+                              type: object
+                              description: |
+                                Metrics of the requests sent by this app
+                                process, by facility
+                            facility_queue:
+                              type: object
+                              nullable: true
+                              description: |
+                                Metrics of the requests sent by the facility
+                                queue service, by facility (null if the
+                                service could not be reached)
+        """
+        facility_queue_metrics = None
+        try:
+            response = requests.get(
+                f"http://127.0.0.1:{cfg['ports.facility_queue']}", timeout=5
+            )
+            response.raise_for_status()
+            facility_queue_metrics = response.json()["data"].get("facility_http")
+        except Exception as e:
+            log(f"Could not get the facility queue metrics: {e}")
+
+        return self.success(
+            data={
+                "app": get_facility_metrics(),
+                "facility_queue": facility_queue_metrics,
+            }
+        )
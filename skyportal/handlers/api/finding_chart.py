@@ -0,0 +1,360 @@
+import datetime
+import functools
+import io
+
+from dateutil.parser import isoparse
+from tornado.ioloop import IOLoop
+
+from baselayer.app.access import auth_or_token
+from baselayer.app.env import load_env
+
+from ...models import Obj, ObservingRun
+from ...utils.finding_charts import (
+    create_finding_chart_job,
+    get_finding_chart_job,
+    get_finding_chart_job_output,
+    run_finding_chart_job,
+)
+from ...utils.offset import facility_parameters, source_image_parameters
+from ..base import BaseHandler
+from .source import get_offset_stars_target
+
+_, cfg = load_env()
+
+MAX_FINDING_CHART_SOURCES = 200
+MAX_FINDING_CHART_FILE_SIZE = 500 * 1024**2
+
+
+class FindingChartJobHandler(BaseHandler):
+    def _get_job(self, job_id):
+        job = get_finding_chart_job(job_id)
+        if job is None or (
+            job["user_id"] != self.associated_user_object.id
+            and not self.current_user.is_system_admin
+        ):
+            return None
+        return job
+
+    @auth_or_token
+    async def post(self):
+        """
+        ---
+        summary: Generate finding charts
+        description: |
+          Start generating the finding charts of many sources (those of an
+          observing run, or a list of sources), combined in a single PDF
+          or in a zip archive. Returns the ID of the job, whose status can be
+          retrieved from /api/finding_charts/{job_id}, and its output from
+          /api/finding_charts/{job_id}/download once complete.
+        tags:
+          - sources
+          - finding chart
+        requestBody:
+          content:
+            application/json:
+              schema:
+                type: object
+                properties:
+                  obj_ids:
+                    type: array
+                    items:
+                      type: string
+                    description: |
+                      IDs of the sources. Required if observing_run_id
+                      is not provided.
+                  observing_run_id:
+                    type: integer
+                    description: |
+                      ID of an observing run, whose assigned sources are
+                      used if obj_ids is not provided
+                  output:
+                    type: string
+                    enum: [pdf, zip]
+                    description: |
+                      Combine the charts in a single PDF, or in a zip archive.
+                      Defaults to pdf.
+                  type:
+                    type: string
+                    enum: [png, pdf]
+                    description: |
+                      Format of the charts in the zip archive. Defaults to pdf.
+                  imsize:
+                    type: number
+                    minimum: 2
+                    maximum: 15
+                    description: Image size in arcmin (square). Defaults to 4.
+                  facility:
+                    type: string
+                    enum: [Keck, Shane, P200, P200-NGPS]
+                  image_source:
+                    type: string
+                    enum: [desi, dss, ztfref, ps1]
+                    description: |
+                      Source of the image used in the finding charts.
+                      Defaults to ps1
+                  use_ztfref:
+                    type: boolean
+                    description: |
+                      Use ZTFref catalog for offset star positions,
+                      otherwise DR3
+                  obstime:
+                    type: string
+                    description: |
+                      datetime of observation in isoformat
+                      (e.g. 2020-12-30T12:34:10)
+                  num_offset_stars:
+                    type: integer
+                    minimum: 0
+                    maximum: 4
+                    description: |
+                      desired number of offset stars [0,4] (default: 3)
+        responses:
+          200:
+            content:
+              application/json:
+                schema:
+                  allOf:
+                    - $ref: '#/components/schemas/Success'
+                    - type: object
+                      properties:
+                        data:
+                          type: object
+                          properties:
+                            id:
+                              type: string
+                              description: ID of the job
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        data = self.get_json()
+        obj_ids = data.get("obj_ids")
+        observing_run_id = data.get("observing_run_id")
+        if obj_ids is None and observing_run_id is None:
+            return self.error("Either `obj_ids` or `observing_run_id` is required")
+        if obj_ids is not None and (
+            not isinstance(obj_ids, list)
+            or not all(isinstance(obj_id, str) for obj_id in obj_ids)
+        ):
+            return self.error("Invalid argument for `obj_ids`")
+
+        output = data.get("output", "pdf")
+        if output not in ["pdf", "zip"]:
+            return self.error(f"Invalid argument for `output`: {output}")
+
+        output_type = data.get("type", "pdf")
+        if output_type not in ["png", "pdf"]:
+            return self.error(f"Invalid argument for `type`: {output_type}")
+
+        try:
+            imsize = float(data.get("imsize", 4.0))
+        except (TypeError, ValueError):
+            return self.error("Invalid argument for `imsize`")
+        if imsize < 2.0 or imsize > 15.0:
+            return self.error(
+                "The value for `imsize` is outside the allowed range (2.0-15.0)"
+            )
+
+        try:
+            num_offset_stars = int(data.get("num_offset_stars", 3))
+        except (TypeError, ValueError):
+            return self.error("Invalid argument for `num_offset_stars`")
+        if not 0 <= num_offset_stars <= 4:
+            return self.error(
+                "The value for `num_offset_stars` is outside the allowed range (0-4)"
+            )
+
+        obstime = data.get("obstime", datetime.datetime.utcnow().isoformat())
+        try:
+            isoparse(obstime)
+        except (TypeError, ValueError):
+            return self.error("obstime is not valid isoformat")
+
+        facility = data.get("facility", "Keck")
+        if facility not in facility_parameters:
+            return self.error("Invalid facility")
+
+        image_source = data.get("image_source", "ps1")
+        if image_source not in source_image_parameters:
+            return self.error("Invalid source image")
+
+        use_ztfref = data.get("use_ztfref", True)
+
+        with self.Session() as session:
+            if observing_run_id is not None:
+                run = session.scalars(
+                    ObservingRun.select(session.user_or_token).where(
+                        ObservingRun.id == observing_run_id
+                    )
+                ).first()
+                if run is None:
+                    return self.error(
+                        f"Could not find observing run {observing_run_id}",
+                        status=404,
+                    )
+                if obj_ids is None:
+                    obj_ids = [assignment.obj_id for assignment in run.assignments]
+
+            obj_ids = list(dict.fromkeys(obj_ids))
+            if len(obj_ids) == 0:
+                return self.error("No sources to generate finding charts for")
+            if len(obj_ids) > MAX_FINDING_CHART_SOURCES:
+                return self.error(
+                    f"Cannot generate the finding charts of more than {MAX_FINDING_CHART_SOURCES} sources at once"
+                )
+
+            sources = session.scalars(
+                Obj.select(session.user_or_token).where(Obj.id.in_(obj_ids))
+            ).all()
+            sources = {source.id: source for source in sources}
+            missing = [obj_id for obj_id in obj_ids if obj_id not in sources]
+            if len(missing) > 0:
+                return self.error(
+                    f"Sources not found: {', '.join(missing)}", status=404
+                )
+
+            targets = []
+            for obj_id in obj_ids:
+                try:
+                    ra, dec, target_kwargs = get_offset_stars_target(
+                        session,
+                        sources[obj_id],
+                        facility,
+                        observing_run_id=observing_run_id,
+                    )
+                except ValueError as e:
+                    return self.error(str(e))
+                targets.append(
+                    {"obj_id": obj_id, "ra": ra, "dec": dec, "kwargs": target_kwargs}
+                )
+
+            user_id = self.associated_user_object.id
+
+        options = {
+            "image_source": image_source,
+            "output_format": output_type,
+            "imsize": imsize,
+            "how_many": num_offset_stars,
+            "starlist_type": facility,
+            "obstime": obstime,
+            "use_source_pos_in_starlist": True,
+            "allowed_queries": 2,
+            "queries_issued": 0,
+            "use_ztfref": use_ztfref,
+            **facility_parameters[facility],
+        }
+        job_id = create_finding_chart_job(user_id, len(targets), output)
+        IOLoop.current().run_in_executor(
+            None,
+            functools.partial(
+                run_finding_chart_job,
+                job_id,
+                targets,
+                options,
+                output=output,
+                n_processes=cfg.get("misc.finding_chart_processes", 4),
+            ),
+        )
+        return self.success(data={"id": job_id})
+
+    @auth_or_token
+    def get(self, job_id=None):
+        """
+        ---
+        summary: Retrieve the status of a finding chart job
+        tags:
+          - sources
+          - finding chart
+        parameters:
+          - in: path
+            name: job_id
+            required: true
+            schema:
+              type: string
+        responses:
+          200:
+            content:
+              application/json:
+                schema:
+                  allOf:
+                    - $ref: '#/components/schemas/Success'
+                    - type: object
+                      properties:
+                        data:
+                          type: object
+                          properties:
+                            status:
+                              type: string
+                              enum: [pending, running, complete, failed]
+                            n_targets:
+                              type: integer
+                            n_done:
+                              type: integer
+                              description: Number of charts rendered so far
+                            failed:
+                              type: object
+                              description: |
+                                Reason why the chart of a source could not
+                                be generated, by source ID
+                            error:
+                              type: string
+          404:
+            content:
+              application/json:
+                schema: Error
+        """
+        if job_id is None:
+            return self.error("Missing required parameter `job_id`")
+        job = self._get_job(job_id)
+        if job is None:
+            return self.error(f"Could not find finding chart job {job_id}", status=404)
+        return self.success(data=job)
+
+
+class FindingChartJobDownloadHandler(FindingChartJobHandler):
+    @auth_or_token
+    async def get(self, job_id):
+        """
+        ---
+        summary: Download the output of a finding chart job
+        tags:
+          - sources
+          - finding chart
+        parameters:
+          - in: path
+            name: job_id
+            required: true
+            schema:
+              type: string
+        responses:
+          200:
+            description: The finding charts, as a PDF or a zip archive
+            content:
+              application/pdf:
+                schema:
+                  type: string
+                  format: binary
+              application/zip:
+                schema:
+                  type: string
+                  format: binary
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+        job = self._get_job(job_id)
+        if job is None:
+            return self.error(f"Could not find finding chart job {job_id}", status=404)
+        if job["status"] != "complete":
+            return self.error(f"Finding chart job {job_id} is {job['status']}")
+
+        with open(get_finding_chart_job_output(job_id), "rb") as f:
+            data = io.BytesIO(f.read())
+        await self.send_file(
+            data,
+            job["filename"],
+            output_type=job["output"],
+            max_file_size=MAX_FINDING_CHART_FILE_SIZE,
+        )
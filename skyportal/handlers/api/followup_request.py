@@ -62,7 +62,9 @@ from ...models import (
     cosmo,
 )
 from ...models.schema import AssignmentSchema, FollowupRequestPost
+from ...utils.grid_scheduler import grid_schedule
 from ...utils.offset import get_formatted_standards_list
+from ...utils.source_snapshots import invalidate_source_snapshots
 from ..base import BaseHandler
 
 log = make_log("api/followup_request")
@@ -116,6 +118,7 @@ def post_assignment(data, session):
     session.commit()
 
     flow = Flow()
+    invalidate_source_snapshots(assignment.obj.internal_key)
     flow.push(
         "*",
         "skyportal/REFRESH_SOURCE",
@@ -665,6 +668,7 @@ def post_followup_request(
         session.commit()
         flow = Flow()
         if refresh_source:
+            invalidate_source_snapshots(followup_request.obj.internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -696,6 +700,7 @@ def post_followup_request(
         ) and "failed to submit" in followup_request.status:
             flow = Flow()
             if refresh_source:
+                invalidate_source_snapshots(followup_request.obj.internal_key)
                 flow.push(
                     "*",
                     "skyportal/REFRESH_SOURCE",
@@ -1604,6 +1609,7 @@ def observation_schedule(
     standards=pd.DataFrame(),
     output_format="csv",
     figsize=(10, 8),
+    scheduler="astroplan",
 ):
     """Create a schedule to display observations for a particular instrument
     Parameters
@@ -1625,6 +1631,11 @@ def observation_schedule(
         "csv", "pdf" or "png" -- determines the format of the returned observation plan
     figsize : tuple, optional
         Matplotlib figsize of the pdf/png created
+    scheduler : str, optional
+        "astroplan" to use astroplan's PriorityScheduler, or "grid" to
+        place the blocks greedily on a precomputed grid of scores
+        (see skyportal.utils.grid_scheduler), much faster for long
+        lists of requests. Defaults to "astroplan".
     Returns
     -------
     dict
@@ -1815,18 +1826,36 @@ def observation_schedule(
     slew_rate = 2.0 * u.deg / u.second
     transitioner = Transitioner(slew_rate, {"filter": {"default": 10 * u.second}})
 
-    # Initialize the sequential scheduler with the constraints and transitioner
-    prior_scheduler = PriorityScheduler(
-        constraints=global_constraints,
-        observer=observer,
-        transitioner=transitioner,
-        time_resolution=time_resolution,
-    )
     # Initialize a Schedule object, to contain the new schedule
     priority_schedule = Schedule(observation_start, observation_end)
 
-    # Call the schedule with the observing blocks and schedule to schedule the blocks
-    prior_scheduler(blocks, priority_schedule)
+    if scheduler == "grid":
+        # same constraints and transitions, evaluated on a grid of slots
+        for block, block_start in grid_schedule(
+            blocks,
+            toos,
+            observer,
+            observation_start,
+            observation_end,
+            time_resolution=time_resolution,
+            slew_rate=slew_rate,
+            filter_change_time=10 * u.second,
+        ):
+            priority_schedule.insert_slot(block_start, block)
+        priority_schedule.observer = observer
+    elif scheduler == "astroplan":
+        # Initialize the sequential scheduler with the constraints and transitioner
+        prior_scheduler = PriorityScheduler(
+            constraints=global_constraints,
+            observer=observer,
+            transitioner=transitioner,
+            time_resolution=time_resolution,
+        )
+
+        # Call the schedule with the observing blocks and schedule to schedule the blocks
+        prior_scheduler(blocks, priority_schedule)
+    else:
+        raise ValueError(f"Unknown scheduler {scheduler}")
 
     log(f"Generated schedule for {instrument.name} in {time.time() - start_time} s")
 
@@ -2022,6 +2051,16 @@ class FollowupRequestSchedulerHandler(BaseHandler):
             type: string
           description: |
             Output format for schedule. Can be png, pdf, or csv
+        - in: query
+          name: scheduler
+          nullable: true
+          schema:
+            type: string
+            enum: [astroplan, grid]
+          description: |
+            Scheduling algorithm: astroplan's priority scheduler, or a
+            faster greedy scheduler on a grid of time slots. Defaults to
+            astroplan.
         responses:
           200:
             description: A PDF/PNG schedule file
@@ -2066,6 +2105,11 @@ class FollowupRequestSchedulerHandler(BaseHandler):
             standards_only = self.get_query_argument("standardsOnly", False)
             magnitude_range_str = self.get_query_argument("magnitudeRange", None)
             time_resolution = self.get_query_argument("timeResolution", 20)
+            scheduler = self.get_query_argument("scheduler", "astroplan")
+            if scheduler not in ["astroplan", "grid"]:
+                return self.error(
+                    f"Invalid scheduler {scheduler}, should be astroplan or grid"
+                )
             if magnitude_range_str is None:
                 magnitude_range = (np.inf, -np.inf)
             else:
@@ -2170,6 +2214,7 @@ class FollowupRequestSchedulerHandler(BaseHandler):
                 standards=standards,
                 output_format=output_format,
                 figsize=(10, 8),
+                scheduler=scheduler,
             )
 
             self.push_notification(
@@ -2678,6 +2723,7 @@ class FollowupRequestWatcherHandler(BaseHandler):
 
             flow = Flow()
             if refresh_source:
+                invalidate_source_snapshots(followup_request.obj.internal_key)
                 flow.push(
                     user_id=session.user_or_token.id,
                     action_type="skyportal/REFRESH_SOURCE",
@@ -2760,6 +2806,7 @@ class FollowupRequestWatcherHandler(BaseHandler):
 
             flow = Flow()
             if refresh_source:
+                invalidate_source_snapshots(followup_request.obj.internal_key)
                 flow.push(
                     user_id=session.user_or_token.id,
                     action_type="skyportal/REFRESH_SOURCE",
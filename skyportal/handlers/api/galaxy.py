@@ -3,18 +3,15 @@ import os
 import time
 from io import StringIO
 
-import arrow
 import astropy.units as u
 import conesearch_alchemy as ca
 import healpix_alchemy as ha
-import healpy as hp
 import numpy as np
 import pandas as pd
 import sqlalchemy as sa
 from astropy.io import ascii
 from geojson import Feature, Point
 from scipy.integrate import quad
-from scipy.stats import norm
 from sqlalchemy import func, nulls_last
 from sqlalchemy.orm import scoped_session, sessionmaker
 from tornado.ioloop import IOLoop
@@ -28,10 +25,12 @@ from ...models import (
     Galaxy,
     GalaxyCatalog,
     Localization,
-    LocalizationTile,
+    LocalizationGalaxy,
     Obj,
 )
 from ...utils.asynchronous import run_async
+from ...utils.copy import copy_columns
+from ...utils.galaxy_ranking import get_galaxy_rankings
 from ..base import BaseHandler
 
 log = make_log("api/galaxy")
@@ -142,8 +141,15 @@ def get_galaxies(
             )
 
     localization = None
-    tiles_subquery = None
+    ranking_subquery = None
     if localization_dateobs is not None:
+        try:
+            localization_cumprob = float(localization_cumprob)
+        except (TypeError, ValueError):
+            raise ValueError(
+                "Invalid values for localization_cumprob - could not convert to float"
+            )
+
         if localization_name is not None:
             localization = session.scalars(
                 Localization.select(session.user_or_token).where(
@@ -172,97 +178,27 @@ def get_galaxies(
             if min_distance is None:
                 min_distance = np.max([distmean - 3 * distsigma, 0])
 
-        # now get the dateobs in the format YYYY_MM
-        partition_key = arrow.get(localization.dateobs).datetime
-        localizationtile_partition_name = (
-            f"{partition_key.year}_{partition_key.month:02d}"
-        )
-        localizationtilescls = LocalizationTile.partitions.get(
-            localizationtile_partition_name, None
-        )
-        if localizationtilescls is None:
-            localizationtilescls = LocalizationTile.partitions.get(
-                "def", LocalizationTile
-            )
+        if catalog is not None:
+            catalog_ids = [catalog.id]
         else:
-            # check that there is actually a localizationTile with the given localization_id in the partition
-            # if not, use the default partition
-            if not (
-                session.scalars(
-                    localizationtilescls.select(session.user_or_token).where(
-                        localizationtilescls.localization_id == localization.id
-                    )
-                ).first()
-            ):
-                localizationtilescls = localizationtilescls.partitions.get(
-                    "def", localizationtilescls
-                )
-
-        cum_prob = (
-            sa.func.sum(
-                localizationtilescls.probdensity * localizationtilescls.healpix.area
-            )
-            .over(order_by=localizationtilescls.probdensity.desc())
-            .label("cum_prob")
+            catalog_ids = session.scalars(
+                GalaxyCatalog.select(session.user_or_token, columns=[GalaxyCatalog.id])
+            ).all()
+        # the galaxies within the localization and their probabilities are
+        # computed once per localization and catalog, and then only read
+        ranking_ids = list(
+            get_galaxy_rankings(
+                localization.id, catalog_ids, localization_cumprob
+            ).values()
         )
-        localizationtile_subquery = (
-            sa.select(localizationtilescls.probdensity, cum_prob).filter(
-                localizationtilescls.localization_id == localization.id
-            )
-        ).subquery()
-
-        min_probdensity = (
-            sa.select(sa.func.min(localizationtile_subquery.columns.probdensity)).where(
-                localizationtile_subquery.columns.cum_prob <= localization_cumprob
-            )
-        ).scalar_subquery()
-
-        tile_ids = session.scalars(
-            sa.select(localizationtilescls.id).where(
-                localizationtilescls.localization_id == localization.id,
-                localizationtilescls.probdensity >= min_probdensity,
+        ranking_subquery = (
+            sa.select(
+                LocalizationGalaxy.galaxy_id.label("id"),
+                LocalizationGalaxy.probdensity,
             )
-        ).all()
-
-        col = [Galaxy.id]
-        if sort_by == "prob":
-            col.append(localizationtilescls.probdensity)
-        elif sort_by == "mstar_prob_weighted":
-            if catalog is None:
-                raise ValueError(
-                    "Cannot sort by mstar_prob_weighted without specifying a catalog_name"
-                )
-            # we normalize the mstar values in the catalog to be between 0 and 1
-            min_mstar_query = (
-                sa.select(sa.func.min(Galaxy.mstar))
-                .where(Galaxy.catalog_id == catalog.id)
-                .group_by(Galaxy.catalog_id)
-            )
-            max_mstar_query = (
-                sa.select(sa.func.max(Galaxy.mstar))
-                .where(Galaxy.catalog_id == catalog.id)
-                .group_by(Galaxy.catalog_id)
-            )
-            min_mstar, max_mstar = (
-                session.scalars(min_mstar_query).first(),
-                session.scalars(max_mstar_query).first(),
-            )
-            if min_mstar is None or max_mstar is None:
-                raise ValueError(
-                    "Could not find min or max mstar in the selected catalog, cannot sort by mstar_prob_weighted"
-                )
-            col.append(
-                (
-                    ((Galaxy.mstar - min_mstar) / (max_mstar - min_mstar))
-                    * localizationtilescls.probdensity  # * localizationtilescls.healpix.area
-                ).label("mstar_prob_weighted")
-            )
-
-        tiles_subquery = (
-            sa.select(*col)
             .where(
-                localizationtilescls.id.in_(tile_ids),
-                localizationtilescls.healpix.contains(Galaxy.healpix),
+                LocalizationGalaxy.ranking_id.in_(ranking_ids),
+                LocalizationGalaxy.cum_prob <= localization_cumprob,
             )
             .subquery()
         )
@@ -274,8 +210,8 @@ def get_galaxies(
 
     if localization_dateobs is not None:
         query = query.join(
-            tiles_subquery,
-            Galaxy.id == tiles_subquery.c.id,
+            ranking_subquery,
+            Galaxy.id == ranking_subquery.c.id,
         )
 
     if catalog is not None:
@@ -339,7 +275,7 @@ def get_galaxies(
                 "Invalid sort_by field, must be one of 'distmpc', 'redshift', 'name', 'mstar', 'prob', 'mstar_prob_weighted', 'sfr_fuv', 'magb', 'magk'"
             )
         if sort_by in ["prob", "mstar_prob_weighted"] and (
-            localization_dateobs is None or tiles_subquery is None
+            localization_dateobs is None or ranking_subquery is None
         ):
             raise ValueError(
                 "Cannot sort by 'prob' without providing a localization_dateobs"
@@ -356,9 +292,26 @@ def get_galaxies(
         elif sort_by == "mstar":
             sort_by_field = Galaxy.mstar
         elif sort_by == "prob":
-            sort_by_field = tiles_subquery.columns.probdensity
+            sort_by_field = ranking_subquery.columns.probdensity
         elif sort_by == "mstar_prob_weighted":
-            sort_by_field = tiles_subquery.columns.mstar_prob_weighted
+            if catalog is None:
+                raise ValueError(
+                    "Cannot sort by mstar_prob_weighted without specifying a catalog_name"
+                )
+            # we normalize the mstar values in the catalog to be between 0 and 1
+            min_catalog_mstar, max_catalog_mstar = session.execute(
+                sa.select(sa.func.min(Galaxy.mstar), sa.func.max(Galaxy.mstar)).where(
+                    Galaxy.catalog_id == catalog.id
+                )
+            ).one()
+            if min_catalog_mstar is None or max_catalog_mstar is None:
+                raise ValueError(
+                    "Could not find min or max mstar in the selected catalog, cannot sort by mstar_prob_weighted"
+                )
+            sort_by_field = (
+                (Galaxy.mstar - min_catalog_mstar)
+                / (max_catalog_mstar - min_catalog_mstar)
+            ) * ranking_subquery.columns.probdensity
         elif sort_by == "sfr_fuv":
             sort_by_field = Galaxy.sfr_fuv
         elif sort_by == "magb":
@@ -393,26 +346,24 @@ def get_galaxies(
         total_matches = len(galaxies)
 
     if return_probability and localization is not None:
-        ras = np.array([galaxy.ra for galaxy in galaxies])
-        decs = np.array([galaxy.dec for galaxy in galaxies])
-        ipix = hp.ang2pix(localization.nside, ras, decs, lonlat=True)
-
-        if localization.is_3d:
-            PROB, DISTMU, DISTSIGMA, DISTNORM = localization.flat
-            dists = np.array([galaxy.distmpc for galaxy in galaxies])
-
-            probability = (
-                PROB[ipix]
-                * (DISTNORM[ipix] * norm(DISTMU[ipix], DISTSIGMA[ipix]).pdf(dists))
-                / hp.nside2pixarea(localization.nside)
+        galaxy_ids = [galaxy.id for galaxy in galaxies]
+        probabilities = (
+            dict(
+                session.execute(
+                    sa.select(
+                        LocalizationGalaxy.galaxy_id, LocalizationGalaxy.probability
+                    ).where(
+                        LocalizationGalaxy.ranking_id.in_(ranking_ids),
+                        LocalizationGalaxy.galaxy_id.in_(galaxy_ids),
+                    )
+                ).all()
             )
-        else:
-            (PROB,) = localization.flat
-            probability = PROB[ipix]
-
+            if len(galaxy_ids) > 0
+            else {}
+        )
         galaxies = [
-            {**galaxy.to_dict(), "probability": prob}
-            for galaxy, prob in zip(galaxies, probability)
+            {**galaxy.to_dict(), "probability": probabilities.get(galaxy.id)}
+            for galaxy in galaxies
         ]
     else:
         galaxies = [galaxy.to_dict() for galaxy in galaxies]
@@ -857,6 +808,104 @@ def delete_galaxies(catalog_id):
         log(f"Unable to delete galaxy catalog with id {catalog_id}: {e}")
 
 
+# numerical columns of the galaxies table
+GALAXY_FLOAT_COLUMNS = [
+    "distmpc",
+    "distmpc_unc",
+    "redshift",
+    "redshift_error",
+    "sfr_fuv",
+    "sfr_w4",
+    "mstar",
+    "magb",
+    "magk",
+    "mag_fuv",
+    "mag_nuv",
+    "mag_w1",
+    "mag_w2",
+    "mag_w3",
+    "mag_w4",
+    "a",
+    "b2a",
+    "pa",
+    "btc",
+]
+
+# galaxies indexed and copied to the database at once
+GALAXY_COPY_CHUNK_SIZE = 100_000
+
+
+def copy_galaxies(
+    catalog_id,
+    catalog_data,
+    session=None,
+    chunk_size=GALAXY_COPY_CHUNK_SIZE,
+    progress=None,
+):
+    """Insert galaxies into a catalog with COPY.
+
+    The galaxies are processed in chunks: the HEALPix indices of a chunk are
+    computed at once, and its rows are streamed to the database without
+    creating an ORM object per galaxy, so that large catalogs are ingested
+    in bounded memory.
+
+    Parameters
+    ----------
+    catalog_id : int
+        ID of the GalaxyCatalog.
+    catalog_data : dict
+        Columns of the galaxies: "ra", "dec" and "name" are required, the
+        other columns of the galaxies table are optional. Missing values are
+        None or NaN, and are inserted as NULL.
+    session : sqlalchemy.orm.Session, optional
+        Database session, by default DBSession(). Not committed.
+    chunk_size : int, optional
+        Number of galaxies processed at once.
+    progress : callable, optional
+        Called with the number of galaxies inserted so far and the total
+        number of galaxies, after each chunk.
+
+    Returns
+    -------
+    int
+        Number of inserted galaxies.
+    """
+    if session is None:
+        session = DBSession()
+
+    ra = np.asarray(catalog_data["ra"], dtype=float)
+    dec = np.asarray(catalog_data["dec"], dtype=float)
+    n_galaxies = len(ra)
+    utcnow = datetime.datetime.utcnow()
+    for start in range(0, n_galaxies, chunk_size):
+        stop = min(start + chunk_size, n_galaxies)
+        columns = {
+            "catalog_id": catalog_id,
+            "name": catalog_data["name"][start:stop],
+            "alt_name": catalog_data["alt_name"][start:stop]
+            if catalog_data.get("alt_name") is not None
+            else None,
+            "ra": ra[start:stop],
+            "dec": dec[start:stop],
+            "healpix": ha.constants.HPX.lonlat_to_healpix(
+                ra[start:stop] * u.deg, dec[start:stop] * u.deg
+            ).astype(np.int64),
+            "created_at": utcnow,
+            "modified": utcnow,
+        }
+        for key in GALAXY_FLOAT_COLUMNS:
+            values = catalog_data.get(key)
+            columns[key] = (
+                np.asarray(values[start:stop], dtype=float)
+                if values is not None
+                else None
+            )
+        copy_columns("galaxys", columns, session=session, nan_as_null=True)
+        if progress is not None:
+            progress(stop, n_galaxies)
+    return n_galaxies
+
+
 def add_galaxies(catalog_metadata, catalog_data):
     if Session.registry.has():
         session = Session()
@@ -878,63 +927,17 @@ def add_galaxies(catalog_metadata, catalog_data):
             )
             session.add(catalog)
             session.commit()
-        galaxies = [
-            Galaxy(
-                catalog_id=catalog.id,
-                ra=ra,
-                dec=dec,
-                name=name,
-                alt_name=alt_name,
-                distmpc=distmpc,
-                distmpc_unc=distmpc_unc,
-                redshift=redshift,
-                redshift_error=redshift_error,
-                sfr_fuv=sfr_fuv,
-                sfr_w4=sfr_w4,
-                mstar=mstar,
-                magk=magk,
-                magb=magb,
-                mag_nuv=mag_nuv,
-                mag_fuv=mag_fuv,
-                mag_w1=mag_w1,
-                mag_w2=mag_w2,
-                mag_w3=mag_w3,
-                mag_w4=mag_w4,
-                a=a,
-                b2a=b2a,
-                pa=pa,
-                btc=btc,
-                healpix=ha.constants.HPX.lonlat_to_healpix(ra * u.deg, dec * u.deg),
-            )
-            for ra, dec, name, alt_name, distmpc, distmpc_unc, redshift, redshift_error, sfr_fuv, sfr_w4, mstar, magb, magk, mag_fuv, mag_nuv, mag_w1, mag_w2, mag_w3, mag_w4, a, b2a, pa, btc in zip(
-                catalog_data["ra"],
-                catalog_data["dec"],
-                catalog_data["name"],
-                catalog_data["alt_name"],
-                catalog_data["distmpc"],
-                catalog_data["distmpc_unc"],
-                catalog_data["redshift"],
-                catalog_data["redshift_error"],
-                catalog_data["sfr_fuv"],
-                catalog_data["sfr_w4"],
-                catalog_data["mstar"],
-                catalog_data["magb"],
-                catalog_data["magk"],
-                catalog_data["mag_fuv"],
-                catalog_data["mag_nuv"],
-                catalog_data["mag_w1"],
-                catalog_data["mag_w2"],
-                catalog_data["mag_w3"],
-                catalog_data["mag_w4"],
-                catalog_data["a"],
-                catalog_data["b2a"],
-                catalog_data["pa"],
-                catalog_data["btc"],
-            )
-        ]
-
-        session.add_all(galaxies)
+        start = time.perf_counter()
+        n_galaxies = copy_galaxies(
+            catalog.id,
+            catalog_data,
+            session=session,
+            progress=lambda n_done, n: log(
+                f"Added {n_done}/{n} galaxies to catalog {catalog.name} in {time.perf_counter() - start:0.1f} seconds"
+            ),
+        )
         session.commit()
+        log(f"Added {n_galaxies} galaxies to catalog {catalog.name}")
         return log("Generated galaxy table")
     except Exception as e:
         return log(f"Unable to generate galaxy table: {e}")
@@ -1141,179 +1144,41 @@ def add_glade(file_path=None, file_url=None):
             start_timer = time.perf_counter()
             df = df.to_pandas()
             df = df.replace({"null": np.nan})
-            # df['GLADE_name'] = ['GLADE-' + str(n) for n in df['GLADE_no']]
-            # create a GLADE_name column, where names are: GLADE-<GLADE_no> with GLADE_no as a string using pandas
-            df["GLADE_name"] = "GLADE-" + df["GLADE_no"].astype(str)
-            df.rename(
-                columns={
-                    "RA": "ra",
-                    "Dec": "dec",
-                    "GLADE_name": "name",
-                    "Mstar": "mstar",
-                    "K": "magk",
-                    "B": "magb",
-                    "W1": "mag_w1",
-                    "W2": "mag_w2",
-                    "z_helio": "redshift",
-                    "z_err": "redshift_error",
-                    "d_L": "distmpc",
-                    "d_L_err": "distmpc_unc",
-                },
-                inplace=True,
-            )
-
-            float_columns = [
-                "ra",
-                "dec",
-                "mstar",
-                "magk",
-                "magb",
-                "mag_w1",
-                "mag_w2",
-                "mag_w3",
-                "mag_w4",
-                "redshift",
-                "redshift_error",
-                "distmpc",
-                "distmpc_unc",
-            ]
-            for col in float_columns:
-                df[col] = df[col].astype(float)
-
-            drop_columns = list(
-                set(df.columns.values)
-                - {
-                    "ra",
-                    "dec",
-                    "name",
-                    "mstar",
-                    "magk",
-                    "magb",
-                    "redshift",
-                    "redshift_error",
-                    "distmpc",
-                    "distmpc_unc",
-                }
-            )
 
-            df.drop(
-                columns=drop_columns,
-                inplace=True,
-            )
-            df = df.replace({np.nan: None})
-            positive_definite_parameters = [
-                "distmpc",
-                "distmpc_unc",
-                "redshift_error",
-            ]
-            # remove rows where any of the positive definite parameters are negative using pandas
-            for key in positive_definite_parameters:
-                df = df.drop(df.index[df[key] < 0])
-            # if ra, dec or name are missing, remove the row
-            required_columns = ["ra", "dec", "name"]
-            df = df[df[required_columns].notnull().all(axis=1)]
-
-            # fill in any missing optional parameters
-            optional_parameters = [
-                "alt_name",
-                "distmpc",
-                "distmpc_unc",
-                "redshift",
-                "redshift_error",
-                "sfr_fuv",
-                "mstar",
-                "magk",
-                "magb",
-                "mag_fuv",
-                "mag_nuv",
-                "mag_w1",
-                "mag_w2",
-                "mag_w3",
-                "mag_w4",
-                "a",
-                "b2a",
-                "pa",
-                "btc",
-            ]
-
-            # for the optional parameters, if a row is missing a value, fill it in with None
-            for key in optional_parameters:
-                if key not in df.columns.values:
-                    df[key] = None
-            # remove rows with incorrect ra or dec
-            df = df[(df["ra"] >= 0) & (df["ra"] < 360)]
-            df = df[(df["dec"] >= -90) & (df["dec"] <= 90)]
-
-            # the mstar in Glade is in 10^10 M_Sun units, so multiply by 1e10 where its not None
-            df["mstar"] = df["mstar"].apply(
-                lambda x: x * 1e10 if x is not None else None
+            def column(name):
+                return df[name].astype(float).to_numpy()
+
+            catalog_data = {
+                "ra": column("RA"),
+                "dec": column("Dec"),
+                "name": ("GLADE-" + df["GLADE_no"].astype(str)).to_numpy(),
+                # the mstar in Glade is in 10^10 M_Sun units
+                "mstar": column("Mstar") * 1e10,
+                "magk": column("K"),
+                "magb": column("B"),
+                "redshift": column("z_helio"),
+                "redshift_error": column("z_err"),
+                "distmpc": column("d_L"),
+                "distmpc_unc": column("d_L_err"),
+            }
+
+            # remove rows where any of the positive definite parameters are
+            # negative, rows with incorrect ra or dec, and rows without a name
+            keep = (
+                (catalog_data["ra"] >= 0)
+                & (catalog_data["ra"] < 360)
+                & (catalog_data["dec"] >= -90)
+                & (catalog_data["dec"] <= 90)
+                & df["GLADE_no"].notnull().to_numpy()
             )
+            for key in ["distmpc", "distmpc_unc", "redshift_error"]:
+                keep &= ~(catalog_data[key] < 0)
+            catalog_data = {key: values[keep] for key, values in catalog_data.items()}
 
-            # add a healpix column where healpix = ha.constants.HPX.lonlat_to_healpix(ra * u.deg, dec * u.deg)
-            df["healpix"] = [
-                ha.constants.HPX.lonlat_to_healpix(ra * u.deg, dec * u.deg)
-                for ra, dec in zip(df["ra"], df["dec"])
-            ]
-
-            df["catalog_id"] = catalog_id
-            utcnow = datetime.datetime.utcnow().isoformat()
-            df["created_at"] = utcnow
-            df["modified_at"] = utcnow
-            blueshift_length = len(df[(df["redshift"] < 0)])
-            length = len(df)
+            blueshift_length = int(np.sum(catalog_data["redshift"] < 0))
+            length = copy_galaxies(catalog_id, catalog_data, session=DBSession())
             full_length += length
             full_blueshift_length += blueshift_length
-            columns = (
-                "ra",
-                "dec",
-                "magb",
-                "magk",
-                "redshift",
-                "redshift_error",
-                "distmpc",
-                "distmpc_unc",
-                "mstar",
-                "name",
-                "alt_name",
-                "sfr_fuv",
-                "mag_fuv",
-                "mag_nuv",
-                "mag_w1",
-                "mag_w2",
-                "mag_w3",
-                "mag_w4",
-                "a",
-                "b2a",
-                "pa",
-                "btc",
-                "healpix",
-                "catalog_id",
-                "created_at",
-                "modified",
-            )
-            output = StringIO()
-            df.replace("NaN", "null", inplace=True)
-            df.replace(np.nan, "NaN", inplace=True)
-            df.to_csv(
-                output,
-                index=False,
-                sep="\t",
-                header=False,
-                encoding="utf8",
-                quotechar="'",
-            )
-            output.seek(0)
-            connection = DBSession().connection().connection
-            cursor = connection.cursor()
-            cursor.copy_from(
-                output,
-                "galaxys",
-                sep="\t",
-                null="",
-                columns=columns,
-            )
-            cursor.close()
-            output.close()
             DBSession().commit()
             end_timer = time.perf_counter()
             log(
@@ -1321,6 +1186,7 @@ def add_glade(file_path=None, file_url=None):
             )
         except Exception as e:
             log(f"add_glade - File part {ii}: Error: {e}")
+            DBSession().rollback()
             continue
     log(
         f"add_glade - Added a total of {full_length} galaxies (including {full_blueshift_length} with a negative redshift) to the database in {time.perf_counter() - start_loop_timer:0.4f} seconds"
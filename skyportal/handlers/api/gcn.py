@@ -34,7 +34,7 @@ from marshmallow.fields import Integer
 from sqlalchemy import String, func
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import joinedload, scoped_session, sessionmaker
-from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm.attributes import flag_modified, set_committed_value
 from sqlalchemy.sql.expression import cast
 from tabulate import tabulate
 from tornado.ioloop import IOLoop
@@ -79,6 +79,7 @@ from ...models import (
     User,
     UserNotification,
 )
+from ...utils.copy import copy_binary, copy_binary_arrays_out
 from ...utils.gcn import (
     from_bytes,
     from_cone,
@@ -97,8 +98,10 @@ from ...utils.gcn import (
     get_trigger,
     get_xml_notice_type,
     has_skymap,
+    uniq_to_tile_ranges,
 )
 from ...utils.notifications import post_notification
+from ...utils.source_snapshots import invalidate_source_snapshots
 from ...utils.UTCTZnaiveDateTime import UTCTZnaiveDateTime
 from ..base import BaseHandler
 from .galaxy import MAX_GALAXIES, get_galaxies, get_galaxies_completeness
@@ -121,6 +124,15 @@ Session = scoped_session(sessionmaker())
 
 MAX_GCNEVENTS = 1000
 
+# HEALPix arrays of a localization, and their Postgres types
+LOCALIZATION_ARRAY_COLUMNS = {
+    "uniq": "int8[]",
+    "probdensity": "float8[]",
+    "distmu": "float8[]",
+    "distsigma": "float8[]",
+    "distnorm": "float8[]",
+}
+
 op_options = [
     "lt",
     "le",
@@ -429,8 +441,7 @@ def post_skymap_from_notice(
         )
     ).first()
     if localization is None:
-        localization = Localization(**skymap, notice_id=notice_id)
-        session.add(localization)
+        localization = add_localization(skymap, session, notice_id=notice_id)
         session.commit()
         localization_id = localization.id
 
@@ -745,8 +756,7 @@ def post_gcnevent_from_dictionary(payload, user_id, session, asynchronous=True):
         )
     ).first()
     if localization is None:
-        localization = Localization(**skymap)
-        session.add(localization)
+        localization = add_localization(skymap, session)
         session.commit()
         localization_id = localization.id
 
@@ -2121,6 +2131,101 @@ class GcnEventUserHandler(BaseHandler):
             return self.success()
 
 
+def add_localization(skymap, session, **kwargs):
+    """Add a localization, writing its HEALPix arrays with a binary COPY
+    instead of converting them to Python lists for the ORM.
+
+    Parameters
+    ----------
+    skymap : dict
+        Localization columns, with the HEALPix arrays as NumPy arrays or lists.
+    session : `sqlalchemy.orm.session.Session`
+        Database session object
+    **kwargs
+        Other Localization columns.
+
+    Returns
+    -------
+    `skyportal.models.Localization`
+        The flushed localization.
+    """
+    arrays = {
+        name: np.asarray(skymap[name])
+        for name in LOCALIZATION_ARRAY_COLUMNS
+        if skymap.get(name) is not None
+    }
+    localization = Localization(
+        **{k: v for k, v in skymap.items() if k not in LOCALIZATION_ARRAY_COLUMNS},
+        uniq=[],
+        probdensity=[],
+        **kwargs,
+    )
+    session.add(localization)
+    session.flush()
+
+    # COPY cannot update a row, so the arrays go through a temporary table
+    session.execute(
+        sa.text(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS localization_arrays ("
+            + ", ".join(
+                f"{name} {pg_type}"
+                for name, pg_type in LOCALIZATION_ARRAY_COLUMNS.items()
+            )
+            + ") ON COMMIT DROP"
+        )
+    )
+    session.execute(sa.text("TRUNCATE localization_arrays"))
+    copy_binary(
+        "localization_arrays",
+        {
+            name: (LOCALIZATION_ARRAY_COLUMNS[name], [values])
+            for name, values in arrays.items()
+        },
+        session=session,
+    )
+    session.execute(
+        sa.text(
+            "UPDATE localizations SET "
+            + ", ".join(f"{name} = localization_arrays.{name}" for name in arrays)
+            + " FROM localization_arrays WHERE localizations.id = :id"
+        ),
+        {"id": localization.id},
+    )
+    set_localization_arrays(localization, arrays)
+    return localization
+
+
+def load_localization_arrays(localization_id, session):
+    """Read the HEALPix arrays of a localization as NumPy arrays,
+    with a binary COPY rather than through Python lists.
+
+    Parameters
+    ----------
+    localization_id : int
+        ID of the localization.
+    session : `sqlalchemy.orm.session.Session`
+        Database session object
+
+    Returns
+    -------
+    dict
+        Mapping of column name to array, or None for missing distances.
+    """
+    (row,) = copy_binary_arrays_out(
+        f"SELECT {', '.join(LOCALIZATION_ARRAY_COLUMNS)} "
+        f"FROM localizations WHERE id = {int(localization_id)}",
+        session=session,
+    )
+    return dict(zip(LOCALIZATION_ARRAY_COLUMNS, row))
+
+
+def set_localization_arrays(localization, arrays):
+    """Set the HEALPix arrays of a localization as already loaded
+    from the database, so that they are neither reloaded nor rewritten."""
+    for name, values in arrays.items():
+        set_committed_value(localization, name, values)
+
+
 def add_tiles_and_properties_and_contour(
     localization_id,
     user_id,
@@ -2143,6 +2248,8 @@ def add_tiles_and_properties_and_contour(
         localization = session.scalar(
             sa.select(Localization).where(Localization.id == localization_id)
         )
+        arrays = load_localization_arrays(localization_id, session)
+        set_localization_arrays(localization, arrays)
 
         log(f"Retrieving skymap properties for localization {localization_id}")
         properties_dict, tags_list = get_skymap_properties(localization)
@@ -2189,22 +2296,27 @@ def add_tiles_and_properties_and_contour(
             )
 
         log(f"Adding tiles for localization {localization_id}")
-        tiles = [
-            LocalizationTile(
-                localization_id=localization_id,
-                healpix=uniq,
-                probdensity=probdensity,
-                dateobs=localization.dateobs,
-            )
-            for uniq, probdensity in zip(localization.uniq, localization.probdensity)
-        ]
+        lower, upper = uniq_to_tile_ranges(arrays["uniq"])
+        utcnow = datetime.datetime.utcnow()
+        copy_binary(
+            "localizationtiles",
+            {
+                "localization_id": ("int4", localization_id),
+                "dateobs": ("timestamp", localization.dateobs),
+                "probdensity": ("float8", arrays["probdensity"]),
+                "healpix": ("int8range", (lower, upper)),
+                "created_at": ("timestamp", utcnow),
+                "modified": ("timestamp", utcnow),
+            },
+            session=session,
+        )
 
         if parent_session is None:
             session.add(localization)
-        session.add_all(tiles)
         session.commit()
 
         log(f"Adding contour for localization {localization_id}")
+        set_localization_arrays(localization, arrays)
         localization = get_contour(localization)
         session.add(localization)
         session.commit()
@@ -5354,6 +5466,7 @@ def crossmatch_gcn_objects(obj_id, event_ids, user_id, integrated_probability=0.
         session.commit()
 
         flow = Flow()
+        invalidate_source_snapshots(obj.internal_key)
         flow.push(
             "*",
             "skyportal/REFRESH_SOURCE",
@@ -1,8 +1,8 @@
+import functools
 import tempfile
 
 import arrow
 import sqlalchemy as sa
-from ligo.gracedb.rest import GraceDb
 from sqlalchemy.orm import scoped_session, sessionmaker
 from tornado.ioloop import IOLoop
 
@@ -22,10 +22,16 @@ _, cfg = load_env()
 GRACEDB_URL = cfg["app.gracedb_endpoint"]
 GRACEDB_CREDENTIAL = cfg.get("app.gracedb_credential")
 
-if GRACEDB_CREDENTIAL is not None:
-    client = GraceDb(service_url=GRACEDB_URL, cred=GRACEDB_CREDENTIAL)
-else:
-    client = GraceDb(service_url=GRACEDB_URL)
+
+@functools.cache
+def get_gracedb_client():
+    """Create the GraceDB client on first use, so that ligo.gracedb
+    is not imported (and GraceDB not contacted) when the app starts."""
+    from ligo.gracedb.rest import GraceDb
+
+    if GRACEDB_CREDENTIAL is not None:
+        return GraceDb(service_url=GRACEDB_URL, cred=GRACEDB_CREDENTIAL)
+    return GraceDb(service_url=GRACEDB_URL)
 
 
 def post_gracedb_data(dateobs, gracedb_id, user_id):
@@ -35,6 +41,7 @@ def post_gracedb_data(dateobs, gracedb_id, user_id):
         session = Session(bind=DBSession.session_factory.kw["bind"])
 
     try:
+        client = get_gracedb_client()
         flow = Flow()
         user = session.scalars(sa.select(User).where(User.id == user_id)).first()
         stmt = GcnEvent.select(user, mode="update").where(GcnEvent.dateobs == dateobs)
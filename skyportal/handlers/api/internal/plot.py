@@ -1,7 +1,5 @@
 import datetime
 
-import astropy.units as u
-import numpy as np
 import pandas as pd
 from astropy import time as ap_time
 
@@ -9,6 +7,7 @@ from baselayer.app.access import auth_or_token
 from baselayer.app.env import load_env
 
 from ....models import ClassicalAssignment, Obj, Telescope
+from ....utils.observability import next_event, night_airmass
 from ...base import BaseHandler
 from ..photometry import get_effective_wavelength
 
@@ -25,12 +24,13 @@ _, cfg = load_env()
 
 class AirmassHandler(BaseHandler):
     def calculate_airmass(self, obj, telescope, sunset, sunrise, sample_size=50):
-        time = np.linspace(sunset.unix, sunrise.unix, sample_size)
-        time = ap_time.Time(time, format="unix")
-
-        airmass = obj.airmass(telescope, time)
-        time = time.unix * 1000
-        df = pd.DataFrame({"time": time, "airmass": airmass})
+        time, airmass = night_airmass(
+            [{"ra": obj.ra, "dec": obj.dec, "field_id": obj.id}],
+            telescope.observer,
+            [(sunset.unix, sunrise.unix)],
+            sample_size=sample_size,
+        )
+        df = pd.DataFrame({"time": time[0] * 1000, "airmass": airmass[0, 0]})
         return df
 
 
@@ -50,16 +50,11 @@ class PlotAssignmentAirmassHandler(AirmassHandler):
             telescope = assignment.run.instrument.telescope
             time = assignment.run.calendar_noon
 
-            sunrise = telescope.next_sunrise(time=time)
-            sunset = telescope.next_sunset(time=time)
-
+            sunset, sunrise = telescope.night(time=time)
             if sunrise is None or sunset is None:
                 return self.error("sunrise or sunset not available")
 
-            if sunset > sunrise:
-                sunset = telescope.observer.sun_set_time(time, which="previous")
-
-            json = self.calculate_airmass(obj, telescope, sunrise, sunset).to_dict(
+            json = self.calculate_airmass(obj, telescope, sunset, sunrise).to_dict(
                 orient="records"
             )
             return self.success(data=json)
@@ -97,16 +92,11 @@ class PlotObjTelAirmassHandler(AirmassHandler):
             if telescope is None:
                 return self.error(f"Could not load telescope with ID {telescope_id}")
 
-            sunrise = telescope.next_sunrise(time=time)
-            sunset = telescope.next_sunset(time=time)
-
+            sunset, sunrise = telescope.night(time=time)
             if sunrise is None or sunset is None:
                 return self.error("sunrise or sunset not available")
 
-            if sunset > sunrise:
-                sunset = telescope.observer.sun_set_time(time, which="previous")
-
-            json = self.calculate_airmass(obj, telescope, sunrise, sunset).to_dict(
+            json = self.calculate_airmass(obj, telescope, sunset, sunrise).to_dict(
                 orient="records"
             )
             return self.success(data=json)
@@ -141,36 +131,46 @@ class PlotHoursBelowAirmassHandler(AirmassHandler):
 
             year = datetime.date.today().year
             year_start = datetime.datetime(year, 1, 1, 0, 0, 0)
+            table = telescope.twilight_table(year)
+            if table is None:
+                return self.error("sunrise or sunset not available")
 
-            json = []
             # Sample every 7 days for the year
             deltat = 7
+            days, nights = [], []
             for day in range(365 // deltat):
                 day = year_start + datetime.timedelta(days=day * deltat)
                 day = ap_time.Time(day.isoformat(), format="isot")
 
-                # Get sunrise/sunset times for that day
-                sunrise = telescope.next_sunrise(time=day)
-                sunset = telescope.next_sunset(time=day)
-
-                if sunrise is None or sunset is None:
+                # Get sunset/sunrise times of the next night
+                sunset = next_event(table, "sun_set", day.unix)
+                if sunset is None:
                     continue
+                sunrise = next_event(table, "sun_rise", sunset)
+                if sunrise is None:
+                    continue
+                days.append(day)
+                nights.append((sunset, sunrise))
+
+            # Compute airmasses for all the nights at once
+            sample_size = 60
+            _, airmass = night_airmass(
+                [{"ra": obj.ra, "dec": obj.dec, "field_id": obj.id}],
+                telescope.observer,
+                nights,
+                sample_size=sample_size,
+            )
 
-                # check if is in middle of night
-                if (sunrise - sunset).to_value("hr") < 0:
-                    sunrise = sunrise + ap_time.TimeDelta(1 * u.day)
-
-                # Compute airmasses for that day
-                sample_size = 60
-                df = self.calculate_airmass(
-                    obj, telescope, sunrise, sunset, sample_size
-                )
-
-                # Compute hours below airmass
-                num_times_below = df.loc[df["airmass"] < threshold].shape[0]
-                total_hours = (sunrise - sunset).to_value("hr")
-                hours_below = num_times_below / sample_size * total_hours
-                json.append({"date": day.isot, "hours_below": hours_below})
+            # Compute hours below airmass
+            num_times_below = (airmass[0] < threshold).sum(axis=1)
+            total_hours = [(sunrise - sunset) / 3600 for sunset, sunrise in nights]
+            json = [
+                {
+                    "date": day.isot,
+                    "hours_below": float(n_below / sample_size * hours),
+                }
+                for day, n_below, hours in zip(days, num_times_below, total_hours)
+            ]
 
             return self.success(data=json)
 
@@ -20,6 +20,7 @@ from ...models import (
     Obj,
     User,
 )
+from ...utils.source_snapshots import invalidate_source_snapshots
 from ..base import BaseHandler
 
 env, cfg = load_env()
@@ -209,6 +210,7 @@ def query_mpc(obj_id, user_id, url):
             log(f"Message from MPC for {obj_id} not parsable: {response.text}")
 
         flow = Flow()
+        invalidate_source_snapshots(obj.internal_key)
         flow.push(
             "*",
             "skyportal/REFRESH_SOURCE",
@@ -1,4 +1,3 @@
-import dustmaps.sfd
 import numpy as np
 import sqlalchemy as sa
 from astropy import coordinates as ap_coord
@@ -301,7 +300,7 @@ class ObjPositionHandler(BaseHandler):
                         "dec": dec,
                         "gal_lon": skycoord.galactic.l.deg,
                         "gal_lat": skycoord.galactic.b.deg,
-                        "ebv": float(dustmaps.sfd.SFDQuery()(skycoord)),
+                        "ebv": obj.ebv,
                         "separation": float(
                             great_circle_distance(ra, dec, obj.ra, obj.dec) * 3600
                         ),
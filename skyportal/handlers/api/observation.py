@@ -72,6 +72,7 @@ cache = Cache(
 )
 
 MAX_OBSERVATIONS = 10000
+OBSERVATION_INSERT_CHUNK_SIZE = 10000
 
 
 def add_queued_observations(instrument_id, obstable):
@@ -134,6 +135,30 @@ def add_queued_observations(instrument_id, obstable):
         Session.remove()
 
 
+def parse_obstimes(obstime):
+    """Convert a column of observation times, given either as ISO strings
+    or as JDs, to datetimes.
+
+    Parameters
+    ----------
+    obstime : pandas.Series
+        Observation times.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of datetime.datetime.
+    """
+    if pd.api.types.is_numeric_dtype(obstime):
+        return Time(obstime.to_numpy(dtype=float), format="jd").datetime
+    try:
+        # can catch iso and isot this way
+        return Time(list(obstime)).datetime
+    except ValueError:
+        # otherwise catch jd as the numerical example
+        return Time(obstime.astype(float).to_numpy(), format="jd").datetime
+
+
 def add_observations(instrument_id, obstable):
     """Post executed observations for a given instrument.
     obstable is a pandas DataFrame of the form:
@@ -218,41 +243,41 @@ def add_observations(instrument_id, obstable):
 
         del missing, unique_observation_ids, unique_observation_ids_batched
 
-        # again, batch the insertions
-        obstable_batched = np.array_split(obstable, 100)
-        for chunk in obstable_batched:
-            observations = []
-            try:
-                for _, row in chunk.iterrows():
-                    # enable multiple obstime formats
-                    try:
-                        # can catch iso and isot this way
-                        obstime = Time(row["obstime"])
-                    except ValueError:
-                        # otherwise catch jd as the numerical example
-                        obstime = Time(row["obstime"], format="jd")
-
-                    observations.append(
-                        ExecutedObservation(
-                            instrument_id=instrument_id,
-                            observation_id=int(row["observation_id"]),
-                            instrument_field_id=int(id_mapper[row["field_id"]]),
-                            obstime=obstime.datetime,
-                            seeing=row.get("seeing", None),
-                            limmag=float(row["limmag"]),
-                            exposure_time=int(row["exposure_time"]),
-                            filt=row["filter"],
-                            processed_fraction=float(row["processed_fraction"]),
-                            target_name=row["target_name"],
-                        )
+        if len(obstable) > 0:
+            # build all the rows at once, and insert them in batches
+            rows = pd.DataFrame(
+                {
+                    "instrument_id": int(instrument_id),
+                    "observation_id": obstable["observation_id"].astype(np.int64),
+                    "instrument_field_id": obstable["field_id"]
+                    .astype(np.int64)
+                    .map(id_mapper),
+                    "obstime": parse_obstimes(obstable["obstime"]),
+                    "seeing": obstable["seeing"].astype(float)
+                    if "seeing" in obstable
+                    else None,
+                    "limmag": obstable["limmag"].astype(float),
+                    "exposure_time": obstable["exposure_time"]
+                    .astype(float)
+                    .astype(int),
+                    "filt": obstable["filter"],
+                    "processed_fraction": obstable["processed_fraction"].astype(float),
+                    "target_name": obstable["target_name"],
+                }
+            )
+            rows = rows.astype(object).where(rows.notna(), None).to_dict("records")
+            for start in range(0, len(rows), OBSERVATION_INSERT_CHUNK_SIZE):
+                try:
+                    session.execute(
+                        sa.insert(ExecutedObservation),
+                        rows[start : start + OBSERVATION_INSERT_CHUNK_SIZE],
+                    )
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    return log(
+                        f"Unable to add observations for instrument {instrument_id}: {e}"
                     )
-                session.add_all(observations)
-                session.commit()
-            except Exception as e:
-                session.rollback()
-                return log(
-                    f"Unable to add observations for instrument {instrument_id}: {e}"
-                )
 
         flow = Flow()
         flow.push("*", "skyportal/REFRESH_OBSERVATIONS")
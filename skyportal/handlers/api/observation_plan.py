@@ -12,7 +12,6 @@ import urllib
 import uuid
 from datetime import datetime, timedelta
 
-import afterglowpy
 import arrow
 import astropy
 import geopandas
@@ -21,13 +20,10 @@ import humanize
 import jsonschema
 import ligo.skymap
 import matplotlib
-import matplotlib.patches as mpatches
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import requests
-import simsurvey
-import sncosmo
 import sqlalchemy as sa
 from astroplan import (
     AirmassConstraint,
@@ -44,9 +40,7 @@ from ligo.skymap.bayestar import rasterize
 from ligo.skymap.distance import parameters_to_marginal_moments
 from ligo.skymap.tool.ligo_skymap_plot_airmass import main as plot_airmass
 from marshmallow.exceptions import ValidationError
-from matplotlib import animation, dates
-from simsurvey.models import AngularTimeSeriesSource
-from simsurvey.utils import model_tools
+from matplotlib import dates
 from sncosmo import get_bandpass
 from sqlalchemy import func
 from sqlalchemy.orm import joinedload, scoped_session, sessionmaker, undefer
@@ -85,13 +79,24 @@ from ...models import (
     User,
 )
 from ...models.schema import ObservationPlanPost
+from ...utils.cache import Cache
 from ...utils.earthquake import COUNTRIES_FILE
-from ...utils.simsurvey import get_simsurvey_parameters, random_parameters_notheta
+from ...utils.observation_animation import encode_movie, render_frames
+from ...utils.simsurvey import get_simsurvey_parameters, run_simsurvey
 from ..base import BaseHandler
 
 env, cfg = load_env()
 log = make_log("api/observation_plan")
 
+# GeoJSON and movies of observation plans (by plan version), and world map
+# plots of localizations
+render_cache = Cache(
+    cache_dir="cache/observation_plan_renders",
+    max_items=cfg.get("misc.max_items_in_observation_plan_render_cache", 100),
+    max_age=cfg.get("misc.minutes_to_keep_observation_plan_render_cache", 24 * 60)
+    * 60,  # defaults to 1 day
+)
+
 # monkey-patch numpy to have a np.int type, required by simsurvey
 np.int = int  # noqa: NPY001
 
@@ -1603,12 +1608,15 @@ def observation_animations(
     decay=4,
     alpha_default=1,
     alpha_cutoff=0.1,
+    n_processes=1,
 ):
     """Create a movie to display observations of a given skymap
+
     Parameters
     ----------
-    observations : skyportal.models.observation_plan.PlannedObservation
-        The planned observations associated with the request
+    observations : list of tuple
+        Filter and field contour summary (GeoJSON) of the planned
+        observations associated with the request, in order
     localization : skyportal.models.localization.Localization
         The skymap that the request is made based on
     output_format : str, optional
@@ -1626,6 +1634,9 @@ def observation_animations(
         The alpha below which you don't draw a field since it is
         too light. Used to not draw lots of invisible fields and
         waste processing time.
+    n_processes : int, optional
+        Number of processes rendering the frames of the movie
+
     Returns
     -------
     dict
@@ -1651,7 +1662,7 @@ def observation_animations(
         "TNS": "#ED6CF6",
     }
 
-    filters = list({obs.filt for obs in observations})
+    filters = list({filt for filt, _ in observations})
     for filt in filters:
         if filt in surveyColors:
             continue
@@ -1659,72 +1670,136 @@ def observation_animations(
             [random.choice("0123456789ABCDEF") for i in range(6)]
         )
 
-    matplotlib.use("Agg")
-    fig = plt.figure(figsize=figsize, constrained_layout=False)
-    ax = plt.axes(projection="astro mollweide")
-    ax.imshow_hpx(localization.flat_2d, cmap="cylon")
-
-    old_artists = []
-
-    def plot_schedule(k):
-        for artist in old_artists:
-            artist.remove()
-        del old_artists[:]
-
-        for i, obs in enumerate(observations):
-            if decay != 0:
-                alpha = np.exp((i - k) / decay)
-            else:
-                alpha = alpha_default
-            if alpha > 1:
-                alpha = 1
+    fields = []
+    for filt, contour_summary in observations:
+        coords = contour_summary["features"][0]["geometry"]["coordinates"]
+        ras = np.array(coords)[:, 0]
+        # cannot handle 0-crossing well
+        if len(np.where(ras > 180)[0]) > 0 and len(np.where(ras < 180)[0]) > 0:
+            coords = None
+        fields.append((coords, filt))
 
-            if alpha > alpha_cutoff:
-                coords = obs.field.contour_summary["features"][0]["geometry"][
-                    "coordinates"
-                ]
-                ras = np.array(coords)[:, 0]
-                # cannot handle 0-crossing well
-                if len(np.where(ras > 180)[0]) > 0 and len(np.where(ras < 180)[0]) > 0:
-                    continue
-                poly = plt.Polygon(
-                    coords,
-                    alpha=alpha,
-                    facecolor=surveyColors[obs.filt],
-                    edgecolor="black",
-                    transform=ax.get_transform("world"),
-                )
-                ax.add_patch(poly)
-                old_artists.append(poly)
-
-        patches = []
-        for filt in filters:
-            patches.append(mpatches.Patch(color=surveyColors[filt], label=filt))
-        plt.legend(handles=patches)
-
-    if output_format == "gif":
-        writer = animation.PillowWriter()
-    elif output_format == "mp4":
-        writer = animation.FFMpegWriter()
-    else:
+    if output_format not in ["gif", "mp4"]:
         raise ValueError("output_format must be gif or mp4")
 
-    with tempfile.NamedTemporaryFile(mode="w", suffix="." + output_format) as f:
-        anim = animation.FuncAnimation(fig, plot_schedule, frames=len(observations))
-        anim.save(f.name, writer=writer)
-        f.flush()
-
-        with open(f.name, mode="rb") as g:
-            anim_content = g.read()
+    frames = render_frames(
+        localization.flat_2d,
+        fields,
+        {filt: surveyColors[filt] for filt in filters},
+        figsize=figsize,
+        alpha_options={
+            "decay": decay,
+            "alpha_default": alpha_default,
+            "alpha_cutoff": alpha_cutoff,
+        },
+        n_processes=n_processes,
+    )
 
     return {
         "success": True,
         "name": f"{localization.localization_name}.{output_format}",
-        "data": anim_content,
+        "data": encode_movie(frames, output_format=output_format),
         "reason": "",
     }
 
 
+def get_observation_plan_version(session, observation_plan_id):
+    """Identify the current state of an observation plan, which changes when
+    the plan or its fields are modified, or observations are added to or
+    removed from it. Used as the key of its cached GeoJSON and movies.
+
+    Parameters
+    ----------
+    session : `sqlalchemy.orm.session.Session`
+        Database session object
+    observation_plan_id : int
+        ID of the EventObservationPlan.
+
+    Returns
+    -------
+    str
+        Version of the plan.
+    """
+    row = session.execute(
+        sa.select(
+            EventObservationPlan.modified,
+            func.count(PlannedObservation.id),
+            func.coalesce(func.sum(PlannedObservation.id), 0),
+            func.max(PlannedObservation.modified),
+            func.max(InstrumentField.modified),
+        )
+        .select_from(EventObservationPlan)
+        .outerjoin(
+            PlannedObservation,
+            PlannedObservation.observation_plan_id == EventObservationPlan.id,
+        )
+        .outerjoin(InstrumentField, PlannedObservation.field_id == InstrumentField.id)
+        .where(EventObservationPlan.id == observation_plan_id)
+        .group_by(EventObservationPlan.id)
+    ).one()
+    return "_".join([str(observation_plan_id)] + [str(value) for value in row])
+
+
+def get_observation_plan_geojson(session, observation_plan_id):
+    """Get the contour summaries (GeoJSON) of the fields of an observation
+    plan, in the order they are first observed, with a single query.
+
+    Parameters
+    ----------
+    session : `sqlalchemy.orm.session.Session`
+        Database session object
+    observation_plan_id : int
+        ID of the EventObservationPlan.
+
+    Returns
+    -------
+    list of dict
+        Contour summaries of the fields.
+    """
+    fields = (
+        sa.select(
+            PlannedObservation.field_id,
+            func.min(PlannedObservation.id).label("first_observation_id"),
+        )
+        .where(PlannedObservation.observation_plan_id == observation_plan_id)
+        .group_by(PlannedObservation.field_id)
+        .subquery()
+    )
+    return session.scalars(
+        sa.select(InstrumentField.contour_summary)
+        .join(fields, fields.c.field_id == InstrumentField.id)
+        .order_by(fields.c.first_observation_id)
+    ).all()
+
+
+def get_observation_plan_id(session, observation_plan_request_id):
+    """Get the ID of the (first) observation plan of a request accessible to
+    the session's user, or None if there is no such plan.
+
+    Raises
+    ------
+    ValueError
+        If the request is not accessible to the user.
+    """
+    observation_plan_request = session.scalars(
+        ObservationPlanRequest.select(session.user_or_token).where(
+            ObservationPlanRequest.id == observation_plan_request_id
+        )
+    ).first()
+    if observation_plan_request is None:
+        raise ValueError(
+            f"Could not find observation_plan_request with ID {observation_plan_request_id}"
+        )
+    return session.scalar(
+        sa.select(EventObservationPlan.id)
+        .where(
+            EventObservationPlan.observation_plan_request_id
+            == observation_plan_request.id
+        )
+        .order_by(EventObservationPlan.id)
+    )
+
+
 class ObservationPlanMovieHandler(BaseHandler):
     @auth_or_token
     async def get(self, observation_plan_request_id):
@@ -1747,57 +1822,72 @@ class ObservationPlanMovieHandler(BaseHandler):
                 schema: SingleObservationPlanRequest
         """
 
+        output_format = "gif"
         with self.Session() as session:
-            stmt = (
-                ObservationPlanRequest.select(session.user_or_token)
-                .where(ObservationPlanRequest.id == observation_plan_request_id)
-                .options(
-                    joinedload(ObservationPlanRequest.observation_plans)
-                    .joinedload(EventObservationPlan.planned_observations)
-                    .joinedload(PlannedObservation.field)
-                    .undefer(InstrumentField.contour_summary)
-                )
-            )
-            observation_plan_request = session.scalars(stmt).first()
-
-            if observation_plan_request is None:
-                return self.error(
-                    f"Could not find observation_plan_request with ID {observation_plan_request_id}"
+            try:
+                observation_plan_id = get_observation_plan_id(
+                    session, observation_plan_request_id
                 )
+            except ValueError as e:
+                return self.error(str(e))
 
             localization = session.scalars(
                 Localization.select(
                     session.user_or_token,
-                ).where(Localization.id == observation_plan_request.localization_id)
+                ).where(
+                    Localization.id
+                    == sa.select(ObservationPlanRequest.localization_id)
+                    .where(ObservationPlanRequest.id == observation_plan_request_id)
+                    .scalar_subquery()
+                )
             ).first()
             if localization is None:
                 return self.error(
-                    message=f"Invalid Localization dateobs: {observation_plan_request.localization_id}"
+                    message=f"Invalid Localization for observation_plan_request: {observation_plan_request_id}"
                 )
 
-            observation_plan = observation_plan_request.observation_plans[0]
-            num_observations = len(observation_plan.planned_observations)
-            if num_observations == 0:
+            if observation_plan_id is None:
                 return self.error("Need at least one observation to produce a movie")
 
-            observations = observation_plan.planned_observations
+            # movies are cached per plan version
+            cache_key = (
+                f"movie_{get_observation_plan_version(session, observation_plan_id)}"
+                f"_{localization.id}_{output_format}"
+            )
+            cache_file = render_cache[cache_key]
+            if cache_file is not None:
+                filename = f"{localization.localization_name}.{output_format}"
+                data = io.BytesIO(cache_file.read_bytes())
+                return await self.send_file(data, filename, output_type=output_format)
+
+            observations = session.execute(
+                sa.select(PlannedObservation.filt, InstrumentField.contour_summary)
+                .join(
+                    InstrumentField, PlannedObservation.field_id == InstrumentField.id
+                )
+                .where(PlannedObservation.observation_plan_id == observation_plan_id)
+                .order_by(PlannedObservation.id)
+            ).all()
+            if len(observations) == 0:
+                return self.error("Need at least one observation to produce a movie")
 
-            output_format = "gif"
             anim = functools.partial(
                 observation_animations,
-                observations,
+                [tuple(observation) for observation in observations],
                 localization,
                 output_format=output_format,
                 figsize=(10, 8),
                 decay=4,
                 alpha_default=1,
                 alpha_cutoff=0.1,
+                n_processes=cfg.get("misc.observation_plan_movie_processes", 4),
             )
 
             self.push_notification(
                 "Movie generation in progress. Download will start soon."
             )
             rez = await IOLoop.current().run_in_executor(None, anim)
+            render_cache[cache_key] = rez["data"]
 
             filename = rez["name"]
             data = io.BytesIO(rez["data"])
@@ -2139,41 +2229,28 @@ class ObservationPlanGeoJSONHandler(BaseHandler):
         """
 
         with self.Session() as session:
-            stmt = (
-                ObservationPlanRequest.select(session.user_or_token)
-                .where(ObservationPlanRequest.id == observation_plan_request_id)
-                .options(
-                    joinedload(ObservationPlanRequest.observation_plans)
-                    .joinedload(EventObservationPlan.planned_observations)
-                    .joinedload(PlannedObservation.field)
-                    .undefer(InstrumentField.contour_summary)
-                )
-            )
-            observation_plan_request = session.scalars(stmt).first()
-
-            if observation_plan_request is None:
-                return self.error(
-                    f"Could not find observation_plan_request with ID {observation_plan_request_id}"
+            try:
+                observation_plan_id = get_observation_plan_id(
+                    session, observation_plan_request_id
                 )
+            except ValueError as e:
+                return self.error(str(e))
 
-            if len(observation_plan_request.observation_plans) == 0:
+            if observation_plan_id is None:
                 return self.error(
                     f"Could not find an observation_plan associated with observation_plan_request ID {observation_plan_request_id}"
                 )
 
-            observation_plan = observation_plan_request.observation_plans[0]
-            # features are JSON representations that the d3 stuff understands.
-            # We use these to render the contours of the sky localization and
-            # locations of the transients.
-
-            geojson = []
-            fields_in = []
-            for observation in observation_plan.planned_observations:
-                if observation.field_id not in fields_in:
-                    fields_in.append(observation.field_id)
-                    geojson.append(observation.field.contour_summary)
-                else:
-                    continue
+            # the GeoJSON is cached per plan version
+            cache_key = (
+                f"geojson_{get_observation_plan_version(session, observation_plan_id)}"
+            )
+            cache_file = render_cache[cache_key]
+            if cache_file is not None:
+                geojson = json.loads(cache_file.read_bytes())
+            else:
+                geojson = get_observation_plan_geojson(session, observation_plan_id)
+                render_cache[cache_key] = json.dumps(geojson).encode()
 
             return self.success(data={"geojson": geojson})
 
@@ -2308,6 +2385,32 @@ class ObservationPlanWorldmapPlotHandler(BaseHandler):
                 Localization.id == localization_id
             )
             localization = session.scalars(stmt).first()
+            if localization is None:
+                return self.error(f"Localization {localization_id} not found")
+
+            output_format = "pdf"
+            filename = f"worldmap.{output_format}"
+
+            # the plot is cached per localization, telescopes and options
+            cache_key = "_".join(
+                [
+                    "worldmap",
+                    str(localization.id),
+                    str(localization.modified),
+                    str(max_airmass),
+                    twilight,
+                ]
+                + [
+                    f"{telescope.id}:{telescope.modified}"
+                    for telescope in telescopes
+                    if telescope.fixed_location
+                ]
+            )
+            cache_file = render_cache[cache_key]
+            if cache_file is not None:
+                data = io.BytesIO(cache_file.read_bytes())
+                return await self.send_file(data, filename, output_type=output_format)
+
             m = localization.flat_2d
             nside = localization.nside
             npix = len(m)
@@ -2371,7 +2474,6 @@ class ObservationPlanWorldmapPlotHandler(BaseHandler):
                 df, geometry=geopandas.points_from_xy(df.lon, df.lat)
             )
 
-            output_format = "pdf"
             fig, (ax0, ax1) = plt.subplots(1, 2, figsize=(14, 10), width_ratios=[10, 1])
             world.plot(ax=ax0)
             gdf.plot(ax=ax0, color=gdf["colors"])
@@ -2391,9 +2493,9 @@ class ObservationPlanWorldmapPlotHandler(BaseHandler):
             buf = io.BytesIO()
             fig.savefig(buf, format=output_format, bbox_inches="tight")
             plt.close(fig)
+            render_cache[cache_key] = buf.getvalue()
             buf.seek(0)
 
-            filename = f"worldmap.{output_format}"
             data = io.BytesIO(buf.read())
 
             await self.send_file(data, filename, output_type=output_format)
@@ -2735,6 +2837,7 @@ def observation_simsurvey(
     maximum_phase=3,
     model_name="kilonova",
     optional_injection_parameters={},
+    seed=None,
 ):
     """Perform the simsurvey analyis for a given skymap
     Parameters
@@ -2767,8 +2870,9 @@ def observation_simsurvey(
         Model to simulate efficiency for. Must be one of kilonova, afterglow, or linear. Defaults to kilonova.
     optional_injection_parameters: dict
         Optional parameters to specify the injection type, along with a list of possible values (to be used in a dropdown UI)
+    seed : int
+        Seed of the random injections. Defaults to the id of the survey efficiency analysis.
     """
-
     if Session.registry.has():
         session = Session()
     else:
@@ -2844,20 +2948,6 @@ def observation_simsurvey(
             pointings["skynoise"].append(10 ** (-0.4 * (limMag - zp)) / 5.0)
             pointings["zp"] = zp
 
-        df = pd.DataFrame.from_dict(pointings)
-        plan = simsurvey.SurveyPlan(
-            time=df["jd"],
-            band=df["filter"],
-            obs_field=df["field_id"].astype(int),
-            skynoise=df["skynoise"],
-            zp=df["zp"],
-            width=width,
-            height=height,
-            fields={
-                k: v for k, v in pointings.items() if k in ["ra", "dec", "field_id"]
-            },
-        )
-
         order = hp.nside2order(localization.nside)
         t = rasterize(localization.table, order)
 
@@ -2887,124 +2977,35 @@ def observation_simsurvey(
             distance_lower = astropy.coordinates.Distance(1 * u.Mpc)
             distance_upper = astropy.coordinates.Distance(1000 * u.Mpc)
 
-        if model_name == "kilonova":
-            phase, wave, cos_theta, flux = model_tools.read_possis_file(
-                optional_injection_parameters["injection_filename"]
-            )
-            transientprop = {
-                "lcmodel": sncosmo.Model(
-                    AngularTimeSeriesSource(
-                        phase=phase, wave=wave, flux=flux, cos_theta=cos_theta
-                    )
-                )
-            }
-            template = "AngularTimeSeriesSource"
-
-        elif model_name == "afterglow":
-            phases = np.linspace(
-                optional_injection_parameters["t_i"],
-                optional_injection_parameters["t_f"],
-                optional_injection_parameters["ntime"],
-            )
-            wave = np.linspace(
-                optional_injection_parameters["lambda_min"],
-                optional_injection_parameters["lambda_max"],
-                optional_injection_parameters["nlambda"],
-            )
-            nu = 3e8 / (wave * 1e-10)
-
-            grb_param_keys = [
-                "jetType",
-                "specType",
-                "thetaObs",
-                "E0",
-                "thetaCore",
-                "thetaWing",
-                "n0",
-                "p",
-                "epsilon_e",
-                "epsilon_B",
-                "z",
-                "d_L",
-                "xi_N",
-            ]
-            grb_params = {k: optional_injection_parameters[k] for k in grb_param_keys}
-            # explicitly case E0 and d_L as float as they like to be an int
-            grb_params["E0"] = float(grb_params["E0"])
-            grb_params["d_L"] = float(grb_params["d_L"])
-
-            flux = []
-            for phase in phases:
-                t = phase * np.ones(nu.shape)
-                mJys = afterglowpy.fluxDensity(t, nu, **grb_params)
-                Jys = 1e-3 * mJys
-                # convert to erg/s/cm^2/A
-                flux.append(Jys * 2.99792458e-05 / (wave**2))
-            transientprop = {
-                "lcmodel": sncosmo.Model(
-                    sncosmo.TimeSeriesSource(phases, wave, np.array(flux))
-                ),
-                "lcsimul_func": random_parameters_notheta,
-            }
-            template = None
-
-        elif model_name == "linear":
-            phases = np.linspace(
-                optional_injection_parameters["t_i"],
-                optional_injection_parameters["t_f"],
-                optional_injection_parameters["ntime"],
-            )
-            wave = np.linspace(
-                optional_injection_parameters["lambda_min"],
-                optional_injection_parameters["lambda_max"],
-                optional_injection_parameters["nlambda"],
-            )
-            magdiff = (
-                optional_injection_parameters["mag"]
-                + phases * optional_injection_parameters["dmag"]
-            )
-            F_Lxlambda2 = 10 ** (-(magdiff + 2.406) / 2.5)
-            waves, F_Lxlambda2s = np.meshgrid(wave, F_Lxlambda2)
-            flux = F_Lxlambda2s / (waves) ** 2
-            transientprop = {
-                "lcmodel": sncosmo.Model(sncosmo.TimeSeriesSource(phases, wave, flux)),
-                "lcsimul_func": random_parameters_notheta,
-            }
-            template = None
-
-        tr = simsurvey.get_transient_generator(
-            [distance_lower.z, distance_upper.z],
-            transient="generic",
-            template=template,
-            ntransient=number_of_injections,
-            ratefunc=lambda z: 5e-7,
-            dec_range=(-90, 90),
-            ra_range=(0, 360),
-            mjd_range=(trigger_time.jd, trigger_time.jd),
-            transientprop=transientprop,
-            skymap=map_struct,
-            sfd98_dir=os.path.join(cfg["misc.dustmap_folder"], "sfd"),
-            apply_mwebv=True,
-        )
-
-        survey = simsurvey.SimulSurvey(
-            generator=tr,
-            plan=plan,
-            phase_range=(minimum_phase, maximum_phase),
-            n_det=number_of_detections,
-            threshold=detection_threshold,
-        )
+        context = {
+            "pointings": pointings,
+            "width": width,
+            "height": height,
+            "model_name": model_name,
+            "optional_injection_parameters": optional_injection_parameters,
+            "redshift_range": [distance_lower.z, distance_upper.z],
+            "trigger_jd": trigger_time.jd,
+            "map_struct": map_struct,
+            "sfd98_dir": os.path.join(cfg["misc.dustmap_folder"], "sfd"),
+            "phase_range": (minimum_phase, maximum_phase),
+            "number_of_detections": number_of_detections,
+            "detection_threshold": detection_threshold,
+        }
 
-        lcs = survey.get_lightcurves(notebook=True)
+        def progress(n_done):
+            survey_efficiency_analysis.progress = n_done / number_of_injections
+            session.commit()
 
-        data = {
-            "lcs": lcs._properties["lcs"],
-            "meta": lcs._properties["meta"],
-            "meta_rejected": lcs._properties["meta_rejected"],
-            "meta_notobserved": lcs._properties["meta_notobserved"],
-            "stats": lcs._derived_properties["stats"],
-            "side": lcs._side_properties,
-        }
+        # the same analysis always uses the same seeds, however many
+        # processes simulate its shards
+        data = run_simsurvey(
+            context,
+            number_of_injections,
+            seed=survey_efficiency_analysis.id if seed is None else seed,
+            injections_per_shard=cfg["misc.simsurvey_injections_per_shard"],
+            n_processes=cfg["misc.simsurvey_processes"],
+            progress=progress,
+        )
 
         class NumpyEncoder(json.JSONEncoder):
             def default(self, obj):
@@ -3,7 +3,6 @@ import datetime
 import json
 import traceback
 import uuid
-from io import StringIO
 
 import arrow
 import numpy as np
@@ -48,6 +47,8 @@ from ...models.schema import (
     PhotometryMag,
     PhotometryRangeQuery,
 )
+from ...utils.copy import copy_columns
+from ...utils.source_snapshots import invalidate_source_snapshots
 from ..base import BaseHandler
 from .photometry_validation import USE_PHOTOMETRY_VALIDATION
 
@@ -193,38 +194,6 @@ BANDPASSES_WAVELENGTHS = {
 }
 
 
-def save_data_using_copy(rows, table, columns):
-    # Prepare data
-    output = StringIO()
-    df = pd.DataFrame.from_records(rows)
-    # Coerce missing non-numbers and numbers, respectively, for SQLAlchemy
-    df.replace("NaN", "null", inplace=True)
-    df.replace(np.nan, "NaN", inplace=True)
-
-    df.to_csv(
-        output,
-        index=False,
-        sep="\t",
-        header=False,
-        encoding="utf8",
-        quotechar="'",
-    )
-    output.seek(0)
-
-    # Insert data
-    connection = DBSession().connection().connection
-    cursor = connection.cursor()
-    cursor.copy_from(
-        output,
-        table,
-        sep="\t",
-        null="",
-        columns=columns,
-    )
-    cursor.close()
-    output.close()
-
-
 def nan_to_none(value):
     """Coerce a value to None if it is nan, else return value."""
     try:
@@ -687,6 +656,34 @@ def standardize_photometry_data(data):
     return df, instrument_cache
 
 
+def lock_photometry_objs(obj_ids, session):
+    """Acquire a transaction-level advisory lock for each object, so that
+    the photometry of an object is not modified between the query for
+    duplicate photometry and the insert of the new photometry.
+
+    Uploads to different objects do not block each other. The locks are
+    taken in a consistent order to avoid deadlocks between uploads that
+    span several objects, and are released when the transaction ends.
+
+    Parameters
+    ----------
+    obj_ids : iterable of str
+        IDs of the objects the photometry is posted to.
+    session : `sqlalchemy.orm.session.Session`
+        Database session object
+    """
+    session.execute(
+        sa.text(
+            "SELECT pg_advisory_xact_lock(lock_key) FROM ("
+            "SELECT DISTINCT hashtextextended('photometry:' || obj_id, 0) AS lock_key "
+            "FROM unnest(CAST(:obj_ids AS text[])) AS obj_id "
+            "ORDER BY lock_key"
+            ") AS lock_keys"
+        ),
+        {"obj_ids": sorted({str(obj_id) for obj_id in obj_ids})},
+    )
+
+
 def get_values_table_and_condition(df, ignore_flux=False):
     """Return a postgres VALUES representation of the indexed columns of
     a photometry dataframe returned by `standardize_photometry_data`.
@@ -805,136 +802,90 @@ def insert_new_photometry_data(
     df = df.where(pd.notnull(df), None)
     df.loc[df["standardized_flux"].isna(), "standardized_flux"] = np.nan
 
-    rows = df.to_dict("records")
-    upload_id = str(uuid.uuid4())
-
-    params = []
-    group_photometry_params = []
-    stream_photometry_params = []
-    for packet in rows:
-        if (
-            instrument_cache[packet["instrument_id"]].type == "imager"
-            and packet["filter"]
-            not in instrument_cache[packet["instrument_id"]].filters
-        ):
-            instrument = instrument_cache[packet["instrument_id"]]
-            raise ValidationError(
-                f"Instrument {instrument.name} has no filter {packet['filter']}."
-            )
-
-        flux = packet.pop("standardized_flux")
-        fluxerr = packet.pop("standardized_fluxerr")
-
-        # reduce the DB size by ~2x
-        keys = ["limiting_mag", "magsys", "limiting_mag_nsigma"]
-        original_user_data = {key: packet[key] for key in keys if key in packet}
-        if original_user_data == {}:
-            original_user_data = None
-
-        utcnow = datetime.datetime.utcnow().isoformat()
-        phot = {
-            "id": packet["id"],
-            "original_user_data": json.dumps(original_user_data),
-            "upload_id": upload_id,
-            "flux": flux,
-            "fluxerr": fluxerr,
-            "obj_id": packet["obj_id"],
-            "altdata": json.dumps(packet.get("altdata")),
-            "instrument_id": packet["instrument_id"],
-            "ra_unc": packet["ra_unc"],
-            "dec_unc": packet["dec_unc"],
-            "mjd": packet["mjd"],
-            "filter": packet["filter"],
-            "ra": packet["ra"],
-            "dec": packet["dec"],
-            "origin": packet["origin"],
-            "owner_id": user.id,
-            "created_at": utcnow,
-            "modified": utcnow,
-        }
-
-        if "ref_standardized_flux" in packet:
-            phot["ref_flux"] = packet.pop("ref_standardized_flux")
-            phot["ref_fluxerr"] = packet.pop("ref_standardized_fluxerr")
-        else:
-            phot["ref_flux"] = None
-            phot["ref_fluxerr"] = None
+    for instrument_id, filters in df.groupby("instrument_id")["filter"]:
+        instrument = instrument_cache[instrument_id]
+        if instrument.type == "imager":
+            missing_filters = set(filters) - set(instrument.filters)
+            if len(missing_filters) > 0:
+                raise ValidationError(
+                    f"Instrument {instrument.name} has no filter {sorted(missing_filters)[0]}."
+                )
 
-        params.append(phot)
+    upload_id = str(uuid.uuid4())
+    utcnow = datetime.datetime.utcnow().isoformat()
+
+    # reduce the DB size by ~2x
+    keys = [
+        key
+        for key in ["limiting_mag", "magsys", "limiting_mag_nsigma"]
+        if key in df.columns
+    ]
+    if len(keys) > 0:
+        original_user_data = [json.dumps(d) for d in df[keys].to_dict(orient="records")]
+    else:
+        original_user_data = json.dumps(None)
 
-        for group_id in group_ids:
-            group_photometry_params.append(
-                {
-                    "photometr_id": packet["id"],
-                    "group_id": group_id,
-                    "created_at": utcnow,
-                    "modified": utcnow,
-                }
-            )
+    if "altdata" in df.columns:
+        altdata = [json.dumps(a) for a in df["altdata"]]
+    else:
+        altdata = json.dumps(None)
 
-        for stream_id in stream_ids:
-            stream_photometry_params.append(
+    if "ref_standardized_flux" in df.columns:
+        ref_flux = df["ref_standardized_flux"].tolist()
+        ref_fluxerr = df["ref_standardized_fluxerr"].tolist()
+    else:
+        ref_flux, ref_fluxerr = None, None
+
+    columns = {
+        "id": ids,
+        "original_user_data": original_user_data,
+        "upload_id": upload_id,
+        "flux": df["standardized_flux"].to_numpy(dtype=float),
+        "fluxerr": df["standardized_fluxerr"].to_numpy(dtype=float),
+        "obj_id": df["obj_id"].tolist(),
+        "altdata": altdata,
+        "instrument_id": df["instrument_id"].tolist(),
+        "ra_unc": df["ra_unc"].tolist(),
+        "dec_unc": df["dec_unc"].tolist(),
+        "mjd": df["mjd"].to_numpy(dtype=float),
+        "filter": df["filter"].tolist(),
+        "ra": df["ra"].tolist(),
+        "dec": df["dec"].tolist(),
+        "origin": df["origin"].tolist(),
+        "owner_id": user.id,
+        "created_at": utcnow,
+        "modified": utcnow,
+        "ref_flux": ref_flux,
+        "ref_fluxerr": ref_fluxerr,
+    }
+    copy_columns("photometry", columns, session=session)
+
+    # Bulk COPY in the group_photometry and stream_photometry records
+    for table, key, target_ids in [
+        ("group_photometry", "group_id", group_ids),
+        ("stream_photometry", "stream_id", stream_ids),
+    ]:
+        if len(target_ids) > 0:
+            copy_columns(
+                table,
                 {
-                    "photometr_id": packet["id"],
-                    "stream_id": stream_id,
+                    "photometr_id": np.repeat(ids, len(target_ids)),
+                    key: np.tile(target_ids, len(ids)),
                     "created_at": utcnow,
                     "modified": utcnow,
-                }
+                },
+                session=session,
             )
 
-    if len(params) > 0:
-        save_data_using_copy(
-            params,
-            "photometry",
-            (
-                "id",
-                "original_user_data",
-                "upload_id",
-                "flux",
-                "fluxerr",
-                "obj_id",
-                "altdata",
-                "instrument_id",
-                "ra_unc",
-                "dec_unc",
-                "mjd",
-                "filter",
-                "ra",
-                "dec",
-                "origin",
-                "owner_id",
-                "created_at",
-                "modified",
-                "ref_flux",
-                "ref_fluxerr",
-            ),
-        )
-
-    if len(group_photometry_params) > 0:
-        # Bulk COPY in the group_photometry records
-        save_data_using_copy(
-            group_photometry_params,
-            "group_photometry",
-            ("photometr_id", "group_id", "created_at", "modified"),
-        )
-
-    if len(stream_photometry_params) > 0:
-        # Bulk COPY in the stream_photometry records
-        save_data_using_copy(
-            stream_photometry_params,
-            "stream_photometry",
-            ("photometr_id", "stream_id", "created_at", "modified"),
-        )
-
     # add a phot stats for each photometry
-    obj_id = phot["obj_id"]
+    obj_id = df["obj_id"].iloc[-1]
     phot_stat = session.scalars(
         sa.select(PhotStat).where(PhotStat.obj_id == obj_id)
     ).first()
     # if there are a lot of new points, should just
     # pull up all the photometry and recalculate
     # instead of adding them one-by-one
-    if phot_stat is None or len(params) > 50:
+    if phot_stat is None or len(df) > 50:
         all_phot = session.scalars(
             sa.select(Photometry).where(Photometry.obj_id == obj_id)
         ).all()
@@ -945,8 +896,13 @@ def insert_new_photometry_data(
         phot_stat.full_update(all_phot)
 
     else:
-        for phot in params:
-            phot_stat.add_photometry_point(phot)
+        for i in range(len(df)):
+            phot_stat.add_photometry_point(
+                {
+                    name: values if np.isscalar(values) or values is None else values[i]
+                    for name, values in columns.items()
+                }
+            )
 
     session.add(phot_stat)
     session.commit()  # add the updated phot_stats
@@ -959,6 +915,7 @@ def insert_new_photometry_data(
             internal_key = session.scalar(
                 sa.select(Obj.internal_key).where(Obj.id == obj_id)
             )
+            invalidate_source_snapshots(internal_key)
             flow.push(
                 "*",
                 "skyportal/REFRESH_SOURCE",
@@ -1095,18 +1052,8 @@ def add_external_photometry(
     username = user.username
     log(f"Pending request from {username} with {len(df.index)} rows")
 
-    # This lock ensures that the Photometry table data are not modified in any way
-    # between when the query for duplicate photometry is first executed and
-    # when the insert statement with the new photometry is performed.
-    # From the psql docs: This mode protects a table against concurrent
-    # data changes, and is self-exclusive so that only one session can
-    # hold it at a time.
     try:
-        session.execute(
-            sa.text(
-                f"LOCK TABLE {Photometry.__tablename__} IN SHARE ROW EXCLUSIVE MODE"
-            )
-        )
+        lock_photometry_objs(df["obj_id"].unique(), session)
         if duplicates in ["ignore", "update"]:
             values_table, condition = get_values_table_and_condition(df)
 
@@ -1208,7 +1155,7 @@ def add_external_photometry(
                 for (df_index, _), id in zip(new_photometry.iterrows(), ids):
                     id_map[df_index] = id
 
-        # release the lock
+        # release the locks
         session.commit()
 
         if duplicates in ["ignore", "update"]:
@@ -1304,19 +1251,9 @@ class PhotometryHandler(BaseHandler):
             f"Pending request from {username} for object {obj_id} with {len(df.index)} rows"
         )
 
-        # This lock ensures that the Photometry table data are not modified in any way
-        # between when the query for duplicate photometry is first executed and
-        # when the insert statement with the new photometry is performed.
-        # From the psql docs: This mode protects a table against concurrent
-        # data changes, and is self-exclusive so that only one session can
-        # hold it at a time.
         with DBSession() as session:
             try:
-                session.execute(
-                    sa.text(
-                        f"LOCK TABLE {Photometry.__tablename__} IN SHARE ROW EXCLUSIVE MODE"
-                    )
-                )
+                lock_photometry_objs(df["obj_id"].unique(), session)
                 ids, upload_id = insert_new_photometry_data(
                     df,
                     instrument_cache,
@@ -1466,20 +1403,9 @@ class PhotometryHandler(BaseHandler):
 
         values_table, condition = get_values_table_and_condition(df, ignore_flux)
 
-        # This lock ensures that the Photometry table data are not modified
-        # in any way between when the query for duplicate photometry is first
-        # executed and when the insert statement with the new photometry is
-        # performed. From the psql docs: This mode protects a table against
-        # concurrent data changes, and is self-exclusive so that only one
-        # session can hold it at a time.
-
         with DBSession() as session:
             try:
-                session.execute(
-                    sa.text(
-                        f"LOCK TABLE {Photometry.__tablename__} IN SHARE ROW EXCLUSIVE MODE"
-                    )
-                )
+                lock_photometry_objs(df["obj_id"].unique(), session)
                 new_photometry_query = session.execute(
                     sa.select(values_table.c.pdidx)
                     .outerjoin(Photometry, condition)
@@ -1602,7 +1528,7 @@ class PhotometryHandler(BaseHandler):
                     for (df_index, _), id in zip(new_photometry.iterrows(), ids):
                         id_map[df_index] = id
 
-                # release the lock
+                # release the locks
                 self.verify_and_commit()
 
                 # get ids in the correct order
@@ -1800,6 +1726,7 @@ class PhotometryHandler(BaseHandler):
                 internal_key = session.scalar(
                     sa.select(Obj.internal_key).where(Obj.id == photometry.obj_id)
                 )
+                invalidate_source_snapshots(internal_key)
                 flow.push(
                     "*",
                     "skyportal/REFRESH_SOURCE",
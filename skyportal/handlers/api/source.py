@@ -6,6 +6,7 @@ import operator  # noqa: F401
 import re
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from json.decoder import JSONDecodeError
 
 import astropy
@@ -78,6 +79,7 @@ from ...models import (
 )
 from ...utils.asynchronous import run_async
 from ...utils.calculations import great_circle_distance
+from ...utils.gaia_cache import gaia_tile_cache
 from ...utils.offset import (
     ALL_NGPS_SNCOSMO_BANDS,
     _calculate_best_position_for_offset_stars,
@@ -87,6 +89,12 @@ from ...utils.offset import (
     source_image_parameters,
 )
 from ...utils.sizeof import SIZE_WARNING_THRESHOLD, sizeof
+from ...utils.source_snapshots import (
+    get_snapshot_key,
+    invalidate_source_snapshots,
+    load_source_snapshot,
+    save_source_snapshot,
+)
 from ...utils.UTCTZnaiveDateTime import UTCTZnaiveDateTime
 from ..base import BaseHandler
 from .candidate import (
@@ -105,6 +113,9 @@ _, cfg = load_env()
 log = make_log("api/source")
 
 MAX_LOCALIZATION_SOURCES = 50000
+MAX_OFFSETS_SOURCES = 500
+MAX_OFFSET_STARS = 10
+OFFSETS_WORKERS = 4
 
 Session = scoped_session(sessionmaker())
 
@@ -967,6 +978,7 @@ def post_source(data, user_id, session, refresh_source=True):
     else:
         if refresh_source:
             flow = Flow()
+            invalidate_source_snapshots(obj.internal_key)
             flow.push(
                 "*", "skyportal/REFRESH_SOURCE", payload={"obj_key": obj.internal_key}
             )
@@ -1948,34 +1960,54 @@ class SourceHandler(BaseHandler):
 
         if obj_id is not None:
             with self.Session() as session:
-                try:
-                    source_info = await get_source(
-                        obj_id,
-                        self.associated_user_object.id,
-                        session,
-                        tns_name=tns_name,
-                        include_thumbnails=include_thumbnails,
-                        include_comments=include_comments,
-                        include_analyses=include_analyses,
-                        include_photometry=include_photometry,
-                        deduplicate_photometry=deduplicate_photometry,
-                        include_photometry_exists=include_photometry_exists,
-                        include_spectrum_exists=include_spectrum_exists,
-                        include_comment_exists=include_comment_exists,
-                        include_period_exists=include_period_exists,
-                        include_detection_stats=include_detection_stats,
-                        include_labellers=include_labellers,
-                        is_token_request=is_token_request,
-                        include_requested=include_requested,
-                        requested_only=requested_only,
-                        include_color_mag=include_color_mag,
-                        include_gcn_crossmatches=include_gcn_crossmatches,
-                        include_gcn_notes=include_gcn_notes,
-                        include_candidates=include_candidates,
+                source_options = {
+                    "tns_name": tns_name,
+                    "include_thumbnails": include_thumbnails,
+                    "include_comments": include_comments,
+                    "include_analyses": include_analyses,
+                    "include_photometry": include_photometry,
+                    "deduplicate_photometry": deduplicate_photometry,
+                    "include_photometry_exists": include_photometry_exists,
+                    "include_spectrum_exists": include_spectrum_exists,
+                    "include_comment_exists": include_comment_exists,
+                    "include_period_exists": include_period_exists,
+                    "include_detection_stats": include_detection_stats,
+                    "include_labellers": include_labellers,
+                    "include_requested": include_requested,
+                    "requested_only": requested_only,
+                    "include_color_mag": include_color_mag,
+                    "include_gcn_crossmatches": include_gcn_crossmatches,
+                    "include_gcn_notes": include_gcn_notes,
+                    "include_candidates": include_candidates,
+                }
+
+                # token requests are registered as source views,
+                # so they always go through get_source
+                snapshot_key = None
+                source_info = None
+                if not is_token_request:
+                    obj_key = session.scalar(
+                        sa.select(Obj.internal_key).where(Obj.id == str(obj_id).strip())
                     )
-                except Exception as e:
-                    traceback.print_exc()
-                    return self.error(f"Cannot retrieve source: {str(e)}")
+                    if obj_key is not None:
+                        snapshot_key = get_snapshot_key(
+                            obj_key, self.associated_user_object, source_options
+                        )
+                        source_info = load_source_snapshot(snapshot_key)
+
+                if source_info is None:
+                    try:
+                        source_info = await get_source(
+                            obj_id,
+                            self.associated_user_object.id,
+                            session,
+                            is_token_request=is_token_request,
+                            **source_options,
+                        )
+                    except Exception as e:
+                        traceback.print_exc()
+                        return self.error(f"Cannot retrieve source: {str(e)}")
+                    save_source_snapshot(snapshot_key, source_info)
 
                 query_size = sizeof(source_info)
                 if query_size >= SIZE_WARNING_THRESHOLD:
@@ -2292,6 +2324,119 @@ class SourceHandler(BaseHandler):
             return self.success()
 
 
+def get_offset_stars_target(
+    session, source, facility, observing_run_id=None, notify=None
+):
+    """Position and starlist information of a source, to look for
+    its offset stars.
+
+    Parameters
+    ----------
+    session : `baselayer.app.models.Session`
+        Database session, with the user or token requesting the starlist.
+    source : `skyportal.models.Obj`
+        The source.
+    facility : str
+        Facility the starlist is generated for.
+    observing_run_id : int or str, optional
+        ID of an observing run the source is assigned to, whose assignment
+        priority and comment are used by the P200-NGPS starlist format.
+    notify : callable, optional
+        Called with a message when the position of the source cannot be
+        computed from its photometry, and the discovery position is used.
+
+    Returns
+    -------
+    (float, float, dict)
+        RA and Dec of the source, and the starlist keyword arguments
+        of get_nearby_offset_stars.
+    """
+    photometry = (
+        session.scalars(
+            sa.select(Photometry).where(
+                sa.and_(
+                    Photometry.obj_id == source.id,
+                    ~Photometry.origin.ilike("%fp%"),
+                )
+            )
+        )
+    ).all()
+
+    photometry = [
+        p
+        for p in photometry
+        if not np.isnan(p.flux)
+        and not np.isnan(p.fluxerr)
+        and p.ra is not None
+        and not np.isnan(p.ra)
+        and p.dec is not None
+        and not np.isnan(p.dec)
+        and p.flux / p.fluxerr > 3.0
+    ]
+
+    ra, dec = source.ra, source.dec
+    try:
+        ra, dec = _calculate_best_position_for_offset_stars(
+            photometry,
+            fallback=(source.ra, source.dec),
+            how="snr2",
+        )
+    except JSONDecodeError:
+        if notify is not None:
+            notify(
+                "Source position using photometry points failed."
+                " Reverting to discovery position."
+            )
+
+    kwargs = {
+        "source_mag": None,
+        "source_magfilter": None,
+        "assignment_priority": 1,
+        "assignment_comment": "science",
+    }
+    if facility in ["P200-NGPS"]:
+        # look for the latest photometry point
+        # in the filters supported by NGPS
+        latest_photometry = session.scalars(
+            Photometry.select(session.user_or_token)
+            .where(
+                Photometry.obj_id == source.id,
+                Photometry.flux.isnot(None),
+                Photometry.flux > 0,
+                Photometry.fluxerr.isnot(None),
+                Photometry.filter.in_(ALL_NGPS_SNCOSMO_BANDS),
+            )
+            .order_by(Photometry.mjd.desc())
+        ).first()
+        if latest_photometry is not None:
+            kwargs["source_mag"] = latest_photometry.mag
+            kwargs["source_magfilter"] = latest_photometry.filter
+
+        # optionally, the source can be associated with an observing run
+        # in which case we retrieve the assignment's priority and comment
+        if observing_run_id is not None:
+            try:
+                observing_run_id = int(observing_run_id)
+            except ValueError:
+                raise ValueError("Invalid argument for `observing_run_id`")
+
+            assignment = session.scalars(
+                ClassicalAssignment.select(session.user_or_token).where(
+                    ClassicalAssignment.obj_id == source.id,
+                    ClassicalAssignment.run_id == observing_run_id,
+                )
+            ).first()
+            if assignment is None:
+                raise ValueError(
+                    f"No target found with obj_id {source.id} and observing run ID {observing_run_id}"
+                )
+
+            kwargs["assignment_priority"] = assignment.priority
+            kwargs["assignment_comment"] = assignment.comment
+
+    return ra, dec, kwargs
+
+
 class SourceOffsetsHandler(BaseHandler):
     @auth_or_token
     async def get(self, obj_id):
@@ -2410,7 +2555,7 @@ class SourceOffsetsHandler(BaseHandler):
                                 than requested
                             query:
                               type: string
-                              description: SQL query submitted to Gaia
+                              description: Description of the catalog search
           400:
             content:
               application/json:
@@ -2437,100 +2582,27 @@ class SourceOffsetsHandler(BaseHandler):
             if facility not in facility_parameters:
                 return self.error("Invalid facility")
 
-            radius_degrees = facility_parameters[facility]["radius_degrees"]
-            mag_limit = facility_parameters[facility]["mag_limit"]
-            min_sep_arcsec = facility_parameters[facility]["min_sep_arcsec"]
-            mag_min = facility_parameters[facility]["mag_min"]
-
             try:
                 num_offset_stars = int(num_offset_stars)
             except ValueError:
                 # could not handle inputs
                 return self.error("Invalid argument for `num_offset_stars`")
-
-            photometry = (
-                session.scalars(
-                    sa.select(Photometry).where(
-                        sa.and_(
-                            Photometry.obj_id == source.id,
-                            ~Photometry.origin.ilike("%fp%"),
-                        )
-                    )
+            if not 0 <= num_offset_stars <= MAX_OFFSET_STARS:
+                return self.error(
+                    "The value for `num_offset_stars` is outside the allowed "
+                    f"range (0-{MAX_OFFSET_STARS})"
                 )
-            ).all()
 
-            photometry = [
-                p
-                for p in photometry
-                if not np.isnan(p.flux)
-                and not np.isnan(p.fluxerr)
-                and p.ra is not None
-                and not np.isnan(p.ra)
-                and p.dec is not None
-                and not np.isnan(p.dec)
-                and p.flux / p.fluxerr > 3.0
-            ]
-
-            ra, dec = source.ra, source.dec
             try:
-                ra, dec = _calculate_best_position_for_offset_stars(
-                    photometry,
-                    fallback=(source.ra, source.dec),
-                    how="snr2",
-                )
-            except JSONDecodeError:
-                self.push_notification(
-                    "Source position using photometry points failed."
-                    " Reverting to discovery position."
+                ra, dec, target_kwargs = get_offset_stars_target(
+                    session,
+                    source,
+                    facility,
+                    observing_run_id=self.get_query_argument("observing_run_id", None),
+                    notify=self.push_notification,
                 )
-
-            (
-                source_mag,
-                source_magfilter,
-            ) = (
-                None,
-                None,
-            )
-            priority, comment = 1, "science"
-            if facility in ["P200-NGPS"]:
-                # look for the latest photometry point
-                # in the filters supported by NGPS
-                latest_photometry = session.scalars(
-                    Photometry.select(session.user_or_token)
-                    .where(
-                        Photometry.obj_id == obj_id,
-                        Photometry.flux.isnot(None),
-                        Photometry.flux > 0,
-                        Photometry.fluxerr.isnot(None),
-                        Photometry.filter.in_(ALL_NGPS_SNCOSMO_BANDS),
-                    )
-                    .order_by(Photometry.mjd.desc())
-                ).first()
-                if latest_photometry is not None:
-                    source_mag = latest_photometry.mag
-                    source_magfilter = latest_photometry.filter
-
-                # optionally, the source can be associated with an observing run
-                # in which case we retrieve the assignment's priority and comment
-                observing_run = self.get_query_argument("observing_run_id", None)
-                if observing_run is not None:
-                    try:
-                        observing_run = int(observing_run)
-                    except ValueError:
-                        return self.error("Invalid argument for `observing_run_id`")
-
-                    assignment = session.scalars(
-                        ClassicalAssignment.select(session.user_or_token).where(
-                            ClassicalAssignment.obj_id == obj_id,
-                            ClassicalAssignment.run_id == observing_run,
-                        )
-                    ).first()
-                    if assignment is None:
-                        return self.error(
-                            f"No target found with obj_id {obj_id} and observing run ID {observing_run}"
-                        )
-
-                    priority, comment = assignment.priority, assignment.comment
+            except ValueError as e:
+                return self.error(str(e))
 
             offset_func = functools.partial(
                 get_nearby_offset_stars,
@@ -2538,18 +2610,12 @@ class SourceOffsetsHandler(BaseHandler):
                 dec,
                 obj_id,
                 how_many=num_offset_stars,
-                radius_degrees=radius_degrees,
-                mag_limit=mag_limit,
-                min_sep_arcsec=min_sep_arcsec,
                 starlist_type=facility,
-                mag_min=mag_min,
                 obstime=obstime,
                 allowed_queries=2,
                 use_ztfref=use_ztfref,
-                assignment_priority=priority,
-                assignment_comment=comment,
-                source_mag=source_mag,
-                source_magfilter=source_magfilter,
+                **facility_parameters[facility],
+                **target_kwargs,
             )
 
             try:
@@ -2583,6 +2649,274 @@ class SourceOffsetsHandler(BaseHandler):
             )
 
 
+class SourcesOffsetsHandler(BaseHandler):
+    @auth_or_token
+    async def get(self):
+        """
+        ---
+        summary: Retrieve offset stars of several sources
+        description: |
+          Retrieve offset stars of several sources at once, for instance to
+          generate the starlist of an observing run. The Gaia sources around
+          all the targets are retrieved in a single pass.
+        tags:
+          - sources
+        parameters:
+        - in: query
+          name: obj_ids
+          required: true
+          schema:
+            type: string
+          description: Comma-separated IDs of the sources (at most 500)
+        - in: query
+          name: facility
+          nullable: true
+          schema:
+            type: string
+            enum: [Keck, Shane, P200, P200-NGPS]
+          description: Which facility to generate the starlist for
+        - in: query
+          name: num_offset_stars
+          nullable: true
+          schema:
+            type: integer
+            minimum: 0
+            maximum: 10
+          description: |
+            Requested number of offset stars per source (set to zero to get
+            a starlist of just the sources themselves)
+        - in: query
+          name: obstime
+          nullable: True
+          schema:
+            type: string
+          description: |
+            datetime of observation in isoformat (e.g. 2020-12-30T12:34:10)
+        - in: query
+          name: use_ztfref
+          required: false
+          schema:
+            type: boolean
+          description: |
+            Use ZTFref catalog for offset star positions, otherwise Gaia DR3
+        - in: query
+          name: observing_run_id
+          required: false
+          schema:
+            type: integer
+          description: |
+            ID of the observing run the sources are assigned to, whose
+            assignment priorities and comments are used by the P200-NGPS format
+        responses:
+          200:
+            content:
+              application/json:
+                schema:
+                  allOf:
+                    - $ref: '#/components/schemas/Success'
+                    - type: object
+                      properties:
+                        data:
+                          type: object
+                          properties:
+                            facility:
+                              type: string
+                              enum: [Keck, Shane, P200, P200-NGPS]
+                              description: Facility queried for starlist
+                            starlist_str:
+                              type: string
+                              description: formatted starlist of all the sources
+                            starlist_info:
+                              type: array
+                              description: |
+                                list of source and offset star information,
+                                for all the sources
+                              items:
+                                type: object
+                            sources:
+                              type: array
+                              description: |
+                                Offset stars of each source, in the order of obj_ids
+                              items:
+                                type: object
+                                properties:
+                                  obj_id:
+                                    type: string
+                                  ra:
+                                    type: number
+                                  dec:
+                                    type: number
+                                  starlist_info:
+                                    type: array
+                                    items:
+                                      type: object
+                                  noffsets:
+                                    type: integer
+                                  queries_issued:
+                                    type: integer
+                                  used_ztfref:
+                                    type: boolean
+                                  error:
+                                    type: string
+                                    description: |
+                                      Why the offset stars could not be
+                                      retrieved, if so
+          400:
+            content:
+              application/json:
+                schema: Error
+        """
+
+        obj_ids = self.get_query_argument("obj_ids", None)
+        if obj_ids is None:
+            return self.error("Missing required parameter `obj_ids`")
+        obj_ids = list(
+            dict.fromkeys(
+                obj_id.strip() for obj_id in obj_ids.split(",") if obj_id.strip()
+            )
+        )
+        if len(obj_ids) == 0:
+            return self.error("Invalid argument for `obj_ids`")
+        if len(obj_ids) > MAX_OFFSETS_SOURCES:
+            return self.error(
+                f"Cannot retrieve the offset stars of more than {MAX_OFFSETS_SOURCES} sources at once"
+            )
+
+        facility = self.get_query_argument("facility", "Keck")
+        num_offset_stars = self.get_query_argument("num_offset_stars", "3")
+        use_ztfref = self.get_query_argument("use_ztfref", True)
+        observing_run_id = self.get_query_argument("observing_run_id", None)
+
+        obstime = self.get_query_argument(
+            "obstime", datetime.datetime.utcnow().isoformat()
+        )
+        if not isinstance(isoparse(obstime), datetime.datetime):
+            return self.error("obstime is not valid isoformat")
+
+        if facility not in facility_parameters:
+            return self.error("Invalid facility")
+
+        try:
+            num_offset_stars = int(num_offset_stars)
+        except ValueError:
+            # could not handle inputs
+            return self.error("Invalid argument for `num_offset_stars`")
+        if not 0 <= num_offset_stars <= MAX_OFFSET_STARS:
+            return self.error(
+                "The value for `num_offset_stars` is outside the allowed "
+                f"range (0-{MAX_OFFSET_STARS})"
+            )
+
+        # sources that are not found (or not accessible) are reported
+        # with an error, without preventing the others from being retrieved
+        errors = {}
+        with self.Session() as session:
+            sources = session.scalars(
+                Obj.select(session.user_or_token).where(Obj.id.in_(obj_ids))
+            ).all()
+            sources = {source.id: source for source in sources}
+
+            targets = []
+            for obj_id in obj_ids:
+                if obj_id not in sources:
+                    errors[obj_id] = "Source not found"
+                    continue
+                try:
+                    ra, dec, target_kwargs = get_offset_stars_target(
+                        session,
+                        sources[obj_id],
+                        facility,
+                        observing_run_id=observing_run_id,
+                        notify=self.push_notification,
+                    )
+                except ValueError as e:
+                    errors[obj_id] = str(e)
+                    continue
+                targets.append(
+                    {
+                        "obj_id": obj_id,
+                        "ra": sources[obj_id].ra,
+                        "dec": sources[obj_id].dec,
+                        "position": (ra, dec),
+                        "kwargs": target_kwargs,
+                    }
+                )
+
+        search_parameters = facility_parameters[facility]
+
+        def get_offset_stars(target):
+            result = {
+                "obj_id": target["obj_id"],
+                "ra": target["ra"],
+                "dec": target["dec"],
+            }
+            try:
+                (
+                    result["starlist_info"],
+                    _,
+                    result["queries_issued"],
+                    result["noffsets"],
+                    result["used_ztfref"],
+                ) = get_nearby_offset_stars(
+                    *target["position"],
+                    target["obj_id"],
+                    how_many=num_offset_stars,
+                    starlist_type=facility,
+                    obstime=obstime,
+                    allowed_queries=2,
+                    use_ztfref=use_ztfref,
+                    **search_parameters,
+                    **target["kwargs"],
+                )
+            except ValueError as e:
+                result["starlist_info"] = []
+                result["error"] = str(e)
+            except Exception as e:
+                # e.g. a failed catalog query, which should not fail the
+                # other targets of the batch
+                traceback.print_exc()
+                log(f"Failed to get the offset stars of {target['obj_id']}: {e}")
+                result["starlist_info"] = []
+                result["error"] = f"Failed to get offset stars: {e}"
+            return result
+
+        def get_all_offset_stars():
+            # fetch the Gaia tiles around all the targets at once, with the
+            # larger radius used when too few offset stars are found
+            try:
+                gaia_tile_cache.prefetch(
+                    [target["position"] for target in targets],
+                    search_parameters["radius_degrees"] * 1.3,
+                )
+            except Exception as e:
+                log(f"Failed to prefetch the Gaia sources of offset stars: {e}")
+            with ThreadPoolExecutor(max_workers=OFFSETS_WORKERS) as executor:
+                return list(executor.map(get_offset_stars, targets))
+
+        results = await IOLoop.current().run_in_executor(None, get_all_offset_stars)
+        results = {result["obj_id"]: result for result in results}
+        results = [
+            results.get(
+                obj_id,
+                {"obj_id": obj_id, "starlist_info": [], "error": errors.get(obj_id)},
+            )
+            for obj_id in obj_ids
+        ]
+
+        starlist_info = [info for result in results for info in result["starlist_info"]]
+        starlist_str = "\n".join(
+            [x["str"].replace(" ", "&nbsp;") for x in starlist_info]
+        )
+        return self.success(
+            data={
+                "facility": facility,
+                "starlist_str": starlist_str,
+                "starlist_info": starlist_info,
+                "sources": results,
+            }
+        )
+
+
 class SourceFinderHandler(BaseHandler):
     @auth_or_token
     async def get(self, obj_id):
@@ -2724,41 +3058,9 @@ class SourceFinderHandler(BaseHandler):
             min_sep_arcsec = facility_parameters[facility]["min_sep_arcsec"]
             mag_min = facility_parameters[facility]["mag_min"]
 
-            photometry = (
-                session.scalars(
-                    sa.select(Photometry).where(
-                        sa.and_(
-                            Photometry.obj_id == source.id,
-                            ~Photometry.origin.ilike("%fp%"),
-                        )
-                    )
-                )
-            ).all()
-
-            photometry = [
-                p
-                for p in photometry
-                if not np.isnan(p.flux)
-                and not np.isnan(p.fluxerr)
-                and p.ra is not None
-                and not np.isnan(p.ra)
-                and p.dec is not None
-                and not np.isnan(p.dec)
-                and p.flux / p.fluxerr > 3.0
-            ]
-
-            ra, dec = source.ra, source.dec
-            try:
-                ra, dec = _calculate_best_position_for_offset_stars(
-                    photometry,
-                    fallback=(source.ra, source.dec),
-                    how="snr2",
-                )
-            except JSONDecodeError:
-                self.push_notification(
-                    "Source position using photometry points failed."
-                    " Reverting to discovery position."
-                )
+            ra, dec, target_kwargs = get_offset_stars_target(
+                session, source, facility, notify=self.push_notification
+            )
 
             finder = functools.partial(
                 get_finding_chart,
@@ -2779,6 +3081,7 @@ class SourceFinderHandler(BaseHandler):
                 allowed_queries=2,
                 queries_issued=0,
                 use_ztfref=use_ztfref,
+                **target_kwargs,
             )
 
             self.push_notification(
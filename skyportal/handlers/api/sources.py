@@ -3,7 +3,6 @@ import re
 import time
 
 import arrow
-import astropy.units as u
 import numpy as np
 import sqlalchemy as sa
 from astropy.time import Time
@@ -33,6 +32,8 @@ from skyportal.models import (
 
 from ...utils.cache import Cache, array_to_bytes
 from ...utils.calculations import radec2lb
+from ...utils.cosmology import get_distances
+from ...utils.extinction import get_ebv
 
 _, cfg = load_env()
 cache_dir = "cache/sources_queries"
@@ -71,7 +72,6 @@ NULL_FIELDS = [
 ]
 
 DEGRA = np.pi / 180.0
-HOOG_REDSHIFT_A, HOOG_REDSHIFT_B = 2.99e5 * u.km / u.s, 350 * u.km / u.s
 
 OPERATORS = {
     "eq": "=",
@@ -263,6 +263,10 @@ def create_annotation_query(
 ):
     stmts = []
     params = []
+    # comparisons with a value use the indexed annotation_values table
+    # rather than casting the JSONB data of every annotation
+    compare_value = annotations_filter is not None and len(annotations_filter) == 3
+    table = "annotation_values" if compare_value else "annotations"
     if annotations_filter_origin is not None:
         query_str, bindparams = array2sql(
             annotations_filter_origin,
@@ -272,7 +276,7 @@ def create_annotation_query(
         params.extend(bindparams)
         stmts.append(
             f"""
-            lower(annotations.origin) in {query_str}
+            lower({table}.origin) in {query_str}
             """
         )
     if annotations_filter_before is not None:
@@ -344,7 +348,8 @@ def create_annotation_query(
             )
             stmts.append(
                 f"""
-                ((annotations.data ->> :annotations_filter_name_{param_index})::float {comp_function} (:annotations_filter_value_{param_index})::float)
+                annotation_values.key = :annotations_filter_name_{param_index}
+                AND annotation_values.value {comp_function} :annotations_filter_value_{param_index}
                 """
             )
         else:
@@ -361,6 +366,21 @@ def create_annotation_query(
                 (annotations.data ->> :annotations_filter_name_{param_index} IS NOT NULL)
                 """
             )
+    if compare_value:
+        join = (
+            "JOIN annotations ON annotations.id=annotation_values.annotation_id"
+            if annotations_filter_before is not None
+            or annotations_filter_after is not None
+            else ""
+        )
+        # the accessible groups are collected in an array (computed once),
+        # so that the overlap with group_ids can use the GIN index
+        return (
+            f"""
+        EXISTS (SELECT obj_id from annotation_values {join} where annotation_values.obj_id=objs.id and {" AND ".join(stmts)} {"and annotation_values.group_ids && ARRAY(SELECT id from groups where id in :accessible_group_ids)" if not is_admin else ""})
+        """,
+            params,
+        )
     if len(stmts) > 0:
         return (
             f"""
@@ -423,52 +443,6 @@ def get_localization(localization_dateobs, localization_name, session):
     return localization_id, localizationtilescls.__tablename__
 
 
-def get_luminosity_distance(obj):
-    """
-    The luminosity distance in Mpc, using either DM or distance data
-    in the altdata fields or using the cosmology/redshift. Specifically
-    the user can add `dm` (mag), `parallax` (arcsec), `dist_kpc`,
-    `dist_Mpc`, `dist_pc` or `dist_cm` to `altdata` and
-    those will be picked up (in that order) as the distance
-    rather than the redshift.
-
-    Return None if the redshift puts the source not within the Hubble flow
-    """
-
-    # there may be a non-redshift based measurement of distance
-    # for nearby sources
-    if isinstance(obj["altdata"], dict):
-        if obj["altdata"].get("dm") is not None:
-            # see eq (24) of https://ned.ipac.caltech.edu/level5/Hogg/Hogg7.html
-            return (
-                (10 ** (float(obj["altdata"].get("dm")) / 5.0)) * 1e-5 * u.Mpc
-            ).value
-        if obj["altdata"].get("parallax") is not None:
-            if float(obj["altdata"].get("parallax")) > 0:
-                # assume parallax in arcsec
-                return (1e-6 * u.Mpc / float(obj["altdata"].get("parallax"))).value
-
-        if obj["altdata"].get("dist_kpc") is not None:
-            return (float(obj["altdata"].get("dist_kpc")) * 1e-3 * u.Mpc).value
-        if obj["altdata"].get("dist_Mpc") is not None:
-            return (float(obj["altdata"].get("dist_Mpc")) * u.Mpc).value
-        if obj["altdata"].get("dist_pc") is not None:
-            return (float(obj["altdata"].get("dist_pc")) * 1e-6 * u.Mpc).value
-        if obj["altdata"].get("dist_cm") is not None:
-            return (float(obj["altdata"].get("dist_cm")) * u.Mpc / 3.085e18).value
-
-    if obj["redshift"]:
-        if obj["redshift"] * HOOG_REDSHIFT_A < HOOG_REDSHIFT_B:
-            # stubbornly refuse to give a distance if the source
-            # is not in the Hubble flow
-            # cf. https://www.aanda.org/articles/aa/full/2003/05/aa3077/aa3077.html
-            # within ~5 Mpc (cz ~ 350 km/s) a given galaxy velocty
-            # can be between between ~0-500 km/s
-            return None
-        return (cosmo.luminosity_distance(obj["redshift"])).to(u.Mpc).value
-    return None
-
-
 async def get_sources(
     user_id,
     session,
@@ -2049,26 +2023,19 @@ async def get_sources(
             startTime = time.time()
             obj_coords = np.array([[obj["ra"], obj["dec"]] for obj in objs])
             obj_coords_gal = radec2lb(obj_coords[:, 0], obj_coords[:, 1])
+            # computed for all the objs at once, rather than one at a time
+            ebvs = get_ebv(obj_coords[:, 0], obj_coords[:, 1])
+            distances = get_distances(
+                [obj["redshift"] for obj in objs],
+                [obj["altdata"] for obj in objs],
+                cosmo,
+            )
             for i in range(len(objs)):
                 objs[i]["gal_lon"] = obj_coords_gal[0][i]
                 objs[i]["gal_lat"] = obj_coords_gal[1][i]
-                redshift = objs[i]["redshift"]
-                luminosity_distance = get_luminosity_distance(objs[i])
-                objs[i]["luminosity_distance"] = luminosity_distance
-                objs[i]["dm"] = (
-                    5.0 * np.log10((luminosity_distance * u.Mpc) / (10 * u.pc)).value
-                    if luminosity_distance
-                    else None
-                )
-                if luminosity_distance:
-                    if redshift and redshift * HOOG_REDSHIFT_A > HOOG_REDSHIFT_B:
-                        objs[i]["angular_diameter_distance"] = (
-                            luminosity_distance / (1 + redshift) ** 2
-                        )
-                    else:
-                        objs[i]["angular_diameter_distance"] = luminosity_distance
-                else:
-                    objs[i]["angular_diameter_distance"] = None
+                objs[i]["ebv"] = None if np.isnan(ebvs[i]) else float(ebvs[i])
+                for key, values in distances.items():
+                    objs[i][key] = values[i]
 
             endTime = time.time()
             if verbose:
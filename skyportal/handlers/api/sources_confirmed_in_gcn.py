@@ -15,6 +15,7 @@ from ...models import (
     TNSRobot,
     TNSRobotSubmission,
 )
+from ...utils.source_snapshots import invalidate_source_snapshots
 from ...utils.UTCTZnaiveDateTime import UTCTZnaiveDateTime
 from ..base import BaseHandler
 
@@ -440,6 +441,7 @@ class SourcesConfirmedInGCNHandler(BaseHandler):
 
         if obj_internal_key is not None:
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*", "skyportal/REFRESH_SOURCE", payload={"obj_key": obj_internal_key}
             )
@@ -575,6 +577,7 @@ class SourcesConfirmedInGCNHandler(BaseHandler):
 
         if obj_internal_key is not None:
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*", "skyportal/REFRESH_SOURCE", payload={"obj_key": obj_internal_key}
             )
@@ -679,6 +682,7 @@ class SourcesConfirmedInGCNHandler(BaseHandler):
 
         if obj_internal_key is not None:
             flow = Flow()
+            invalidate_source_snapshots(obj_internal_key)
             flow.push(
                 "*", "skyportal/REFRESH_SOURCE", payload={"obj_key": obj_internal_key}
             )
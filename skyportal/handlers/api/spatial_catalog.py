@@ -9,6 +9,7 @@ from sqlalchemy.orm import scoped_session, sessionmaker
 from tornado.ioloop import IOLoop
 
 from baselayer.app.access import auth_or_token, permissions
+from baselayer.app.env import load_env
 from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
@@ -18,14 +19,17 @@ from ...models import (
     SpatialCatalogEntry,
     SpatialCatalogEntryTile,
 )
-from ...utils.gcn import (
-    from_cone,
-    from_ellipse,
+from ...utils.spatial_catalog import (
+    catalog_entries,
+    copy_spatial_catalog_entries,
+    entry_skymaps,
 )
 from ..base import BaseHandler
 
 log = make_log("api/spatial_catalog")
 
+env, cfg = load_env()
+
 Session = scoped_session(sessionmaker())
 
 MAX_SPATIAL_CATALOG_ENTRIES = 1000
@@ -41,66 +45,15 @@ def add_catalog(catalog_id, catalog_data):
         session = Session(bind=DBSession.session_factory.kw["bind"])
 
     try:
-        entries = []
-        # check for cone key
-        if {"radius"}.issubset(set(catalog_data.keys())):
-            for ra, dec, name, radius in zip(
-                catalog_data["ra"],
-                catalog_data["dec"],
-                catalog_data["name"],
-                catalog_data["radius"],
-            ):
-                name = name.strip().replace(" ", "-")
-                skymap = from_cone(ra, dec, radius, n_sigma=2)
-                del skymap["localization_name"]
-                skymap["entry_name"] = name
-
-                data = {"ra": ra, "dec": dec, "radius": radius}
-
-                entry = SpatialCatalogEntry(
-                    **{**skymap, "catalog_id": catalog_id, "data": data}
-                )
-                entries.append(entry)
-        elif {"amaj", "amin", "phi"}.issubset(set(catalog_data.keys())):
-            for ra, dec, name, amaj, amin, phi in zip(
-                catalog_data["ra"],
-                catalog_data["dec"],
-                catalog_data["name"],
-                catalog_data["amaj"],
-                catalog_data["amin"],
-                catalog_data["phi"],
-            ):
-                name = name.strip().replace(" ", "-")
-                if np.isclose(amaj, amin):
-                    skymap = from_cone(ra, dec, amaj, n_sigma=1)
-                else:
-                    skymap = from_ellipse(name, ra, dec, amaj, amin, phi)
-                skymap["entry_name"] = skymap["localization_name"]
-                del skymap["localization_name"]
-
-                data = {"ra": ra, "dec": dec, "amaj": amaj, "amin": amin, "phi": phi}
-
-                entry = SpatialCatalogEntry(
-                    **{**skymap, "catalog_id": catalog_id, "data": data}
-                )
-                entries.append(entry)
-
-        else:
-            return ValueError("Could not disambiguate keys")
-
-        session.add_all(entries)
-        session.commit()
-
-        for entry in entries:
-            tiles = [
-                SpatialCatalogEntryTile(
-                    entry_name=entry.entry_name, healpix=uniq, probdensity=probdensity
-                )
-                for uniq, probdensity in zip(entry.uniq, entry.probdensity)
-            ]
-
-            session.add_all(tiles)
+        # the MOCs of the entries are computed in parallel, and the
+        # entries and their tiles written with COPY
+        skymaps = entry_skymaps(
+            catalog_entries(catalog_data),
+            n_processes=cfg.get("misc.spatial_catalog_processes", 4),
+        )
+        n_entries, n_tiles = copy_spatial_catalog_entries(catalog_id, skymaps, session)
         session.commit()
+        log(f"Added {n_entries} entries and {n_tiles} tiles to catalog {catalog_id}")
 
         flow = Flow()
         flow.push(
@@ -113,6 +66,7 @@ def add_catalog(catalog_id, catalog_data):
 
         log(f"Generated catalog with ID {catalog_id} in {duration} seconds")
     except Exception as e:
+        session.rollback()
         log(f"Unable to generate catalog: {e}")
     finally:
         session.close()
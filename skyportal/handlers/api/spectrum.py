@@ -39,6 +39,7 @@ from ...models.schema import (
     SpectrumAsciiFilePostJSON,
     SpectrumPost,
 )
+from ...utils.source_snapshots import invalidate_source_snapshots
 from ..base import BaseHandler
 from .photometry import add_external_photometry
 
@@ -204,6 +205,7 @@ def post_spectrum(data, user_id, session):
     session.commit()
 
     flow = Flow()
+    invalidate_source_snapshots(spec.obj.internal_key)
     flow.push(
         "*",
         "skyportal/REFRESH_SOURCE",
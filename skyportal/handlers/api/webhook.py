@@ -7,6 +7,7 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ...models import DBSession, ObjAnalysis
+from ...utils.source_snapshots import invalidate_source_snapshots
 from ..base import BaseHandler
 from .candidate import (
     update_summary_history_if_relevant,
@@ -167,6 +168,7 @@ class AnalysisWebhookHandler(BaseHandler):
                 )
                 session.commit()
                 log("analysis is a summary. Pushing to source.")
+                invalidate_source_snapshots(analysis.obj.internal_key)
                 flow.push(
                     "*",
                     "skyportal/REFRESH_SOURCE",
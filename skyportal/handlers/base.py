@@ -1,11 +1,14 @@
 from math import ceil
 
+import sqlalchemy as sa
 from tornado.gen import sleep
 from tornado.iostream import StreamClosedError
 
 from baselayer.app.handlers.base import BaseHandler as BaselayerHandler
 
 from .. import __version__
+from ..models import Obj
+from ..utils.source_snapshots import invalidate_source_snapshots
 
 
 class BaseHandler(BaselayerHandler):
@@ -15,6 +18,24 @@ class BaseHandler(BaselayerHandler):
             return self.current_user
         return self.current_user.created_by
 
+    def push_all(self, action, payload={}):
+        if action == "skyportal/REFRESH_SOURCE":
+            invalidate_source_snapshots(payload.get("obj_key"))
+        elif action in (
+            "skyportal/REFRESH_SOURCE_PHOTOMETRY",
+            "skyportal/REFRESH_SOURCE_SPECTRA",
+        ):
+            # the snapshots include photometry and spectra (and stats derived
+            # from them); these actions identify the Obj by key or by ID
+            obj_key = payload.get("obj_internal_key")
+            if obj_key is None and payload.get("obj_id") is not None:
+                with self.Session() as session:
+                    obj_key = session.scalar(
+                        sa.select(Obj.internal_key).where(Obj.id == payload["obj_id"])
+                    )
+            invalidate_source_snapshots(obj_key)
+        super().push_all(action, payload=payload)
+
     def success(self, *args, **kwargs):
         super().success(*args, **kwargs, extra={"version": __version__})
 
@@ -52,6 +73,9 @@ class BaseHandler(BaselayerHandler):
         if output_type == "pdf":
             self.set_header("Content-type", "application/pdf; charset='utf-8'")
             self.set_header("Content-Disposition", f"attachment; filename={filename}")
+        elif output_type == "zip":
+            self.set_header("Content-type", "application/zip")
+            self.set_header("Content-Disposition", f"attachment; filename={filename}")
         elif output_type in ["txt", "xml", "json", "csv"]:
             self.set_header("Content-type", "text/plain")
             self.set_header("Content-Disposition", f"attachment; filename={filename}")
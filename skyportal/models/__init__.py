@@ -39,6 +39,7 @@ from .public_pages.public_release import *
 from .public_pages.public_source_page import *
 from .recurring_api import *
 from .reminder import *
+from .scheduling import *
 
 # Generated schema
 from .schema import setup_schema
@@ -56,6 +57,7 @@ from .taxonomy import *
 from .telescope import *
 from .thumbnail import *
 from .tns import *
+from .tns_catalog import *
 from .user_notification import *
 from .user_token import *
 from .weather import *
@@ -1,7 +1,13 @@
-__all__ = ["Annotation", "AnnotationOnSpectrum", "AnnotationOnPhotometry"]
+__all__ = [
+    "Annotation",
+    "AnnotationValue",
+    "AnnotationOnSpectrum",
+    "AnnotationOnPhotometry",
+]
 
 import sqlalchemy as sa
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import relationship
 from sqlalchemy.schema import UniqueConstraint
@@ -10,6 +16,7 @@ from baselayer.app.models import (
     AccessibleIfRelatedRowsAreAccessible,
     AccessibleIfUserMatches,
     Base,
+    restricted,
 )
 
 from .group import accessible_by_groups_members
@@ -115,6 +122,145 @@ class Annotation(Base, AnnotationMixin):
     __table_args__ = (UniqueConstraint("obj_id", "origin"),)
 
 
+class AnnotationValue(Base):
+    """A numeric value of an Annotation's data, one row per key, so that
+    sources and candidates can be filtered and sorted by annotation values
+    using indexes. Rows are written by database triggers on the annotations
+    and group_annotations tables (see ANNOTATION_VALUES_TRIGGERS), never by
+    the application."""
+
+    __tablename__ = "annotation_values"
+
+    create = update = delete = restricted
+    read = AccessibleIfRelatedRowsAreAccessible(annotation="read")
+
+    annotation_id = sa.Column(
+        sa.ForeignKey("annotations.id", ondelete="CASCADE"),
+        nullable=False,
+        doc="ID of the Annotation the value is taken from.",
+    )
+    annotation = relationship(
+        "Annotation",
+        doc="The Annotation the value is taken from.",
+    )
+    obj_id = sa.Column(
+        sa.ForeignKey("objs.id", ondelete="CASCADE"),
+        nullable=False,
+        doc="ID of the Annotation's Obj.",
+    )
+    origin = sa.Column(sa.String, nullable=False, doc="The Annotation's origin.")
+    key = sa.Column(sa.String, nullable=False, doc="Key in the Annotation's data.")
+    value = sa.Column(
+        sa.Float,
+        nullable=False,
+        doc="Value of the key, a number or a string representing a number.",
+    )
+    group_ids = sa.Column(
+        ARRAY(sa.Integer),
+        nullable=False,
+        server_default="{}",
+        doc="IDs of the groups that can see the Annotation.",
+    )
+
+    __table_args__ = (
+        UniqueConstraint("annotation_id", "key"),
+        sa.Index("ix_annotation_values_key_value", "key", "value"),
+        sa.Index("ix_annotation_values_obj_id_key", "obj_id", "key"),
+        sa.Index(
+            "ix_annotation_values_group_ids_gin",
+            "group_ids",
+            postgresql_using="gin",
+        ),
+    )
+
+
+# condition on the items of jsonb_each(annotations.data) that are copied
+# to annotation_values: numbers, and strings representing numbers (within
+# the range of double precision, see annotation_value_to_float)
+ANNOTATION_NUMERIC_ITEM = r"""(
+    jsonb_typeof(item.value) = 'number'
+    OR (
+        jsonb_typeof(item.value) = 'string'
+        AND item.value #>> '{}' ~ '^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$'
+    )
+)"""
+
+# Keep annotation_values in sync with the annotations: the values of an
+# annotation are rewritten when it is created or its data changes, and
+# deleted with it (ON DELETE CASCADE); their group_ids follow the
+# annotation's groups.
+ANNOTATION_VALUES_TRIGGERS = (
+    r"""
+CREATE OR REPLACE FUNCTION annotation_value_to_float(value text) RETURNS double precision AS $$
+BEGIN
+    RETURN value::double precision;
+EXCEPTION
+    -- values outside the range of double precision (e.g. 1e999) are
+    -- skipped rather than failing the write of the annotation
+    WHEN numeric_value_out_of_range OR invalid_text_representation THEN
+        RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE STRICT;
+
+CREATE OR REPLACE FUNCTION annotation_values_refresh() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM annotation_values WHERE annotation_id = NEW.id;
+    INSERT INTO annotation_values
+        (annotation_id, obj_id, origin, key, value, group_ids, created_at, modified)
+    SELECT
+        NEW.id,
+        NEW.obj_id,
+        NEW.origin,
+        item.key,
+        float_value,
+        ARRAY(SELECT group_id FROM group_annotations WHERE annotation_id = NEW.id),
+        now() AT TIME ZONE 'utc',
+        now() AT TIME ZONE 'utc'
+    FROM jsonb_each(NEW.data) AS item,
+        LATERAL annotation_value_to_float(item.value #>> '{}') AS float_value
+    WHERE float_value IS NOT NULL AND """
+    + ANNOTATION_NUMERIC_ITEM
+    + r""";
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION annotation_values_refresh_groups() RETURNS trigger AS $$
+DECLARE
+    changed_annotation_id integer;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_annotation_id := OLD.annotation_id;
+    ELSE
+        changed_annotation_id := NEW.annotation_id;
+    END IF;
+    UPDATE annotation_values
+    SET group_ids = ARRAY(
+        SELECT group_id FROM group_annotations
+        WHERE annotation_id = changed_annotation_id
+    )
+    WHERE annotation_id = changed_annotation_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS annotation_values_refresh ON annotations;
+CREATE TRIGGER annotation_values_refresh
+    AFTER INSERT OR UPDATE OF obj_id, origin, data ON annotations
+    FOR EACH ROW EXECUTE FUNCTION annotation_values_refresh();
+
+DROP TRIGGER IF EXISTS annotation_values_refresh_groups ON group_annotations;
+CREATE TRIGGER annotation_values_refresh_groups
+    AFTER INSERT OR UPDATE OR DELETE ON group_annotations
+    FOR EACH ROW EXECUTE FUNCTION annotation_values_refresh_groups();
+"""
+)
+
+# the triggers span several tables, so they are created once all the
+# tables exist
+event.listen(Base.metadata, "after_create", sa.DDL(ANNOTATION_VALUES_TRIGGERS))
+
+
 class AnnotationOnSpectrum(Base, AnnotationMixin):
     __tablename__ = "annotations_on_spectra"
 
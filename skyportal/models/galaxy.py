@@ -1,11 +1,18 @@
-__all__ = ["GalaxyCatalog", "Galaxy"]
+__all__ = [
+    "GalaxyCatalog",
+    "Galaxy",
+    "LocalizationGalaxyRanking",
+    "LocalizationGalaxy",
+]
 
 import conesearch_alchemy as ca
 import healpix_alchemy
 import sqlalchemy as sa
+from sqlalchemy import event
 from sqlalchemy.orm import relationship
+from sqlalchemy.schema import UniqueConstraint
 
-from baselayer.app.models import Base
+from baselayer.app.models import Base, restricted
 
 
 class GalaxyCatalog(Base):
@@ -76,3 +83,143 @@ class Galaxy(Base, ca.Point):
 Galaxy.__table_args__ = (
     sa.Index("galaxy_name_catalog_id", "name", "catalog_id", unique=True),
 )
+
+
+class LocalizationGalaxyRanking(Base):
+    """The galaxies of a catalog within a localization, with their
+    probabilities, computed once (see skyportal.utils.galaxy_ranking) and
+    read by galaxy queries on the localization. Rankings are deleted by
+    database triggers when the localization's sky map or the catalog's
+    galaxies change (see GALAXY_RANKING_TRIGGERS), and recomputed on
+    the next query."""
+
+    __tablename__ = "localization_galaxy_rankings"
+
+    create = update = delete = restricted
+
+    localization_id = sa.Column(
+        sa.ForeignKey("localizations.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+        doc="ID of the Localization.",
+    )
+    catalog_id = sa.Column(
+        sa.ForeignKey("galaxycatalogs.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+        doc="ID of the GalaxyCatalog.",
+    )
+    cumprob = sa.Column(
+        sa.Float,
+        nullable=False,
+        doc="Cumulative probability of the localization covered by the galaxies.",
+    )
+
+    galaxies = relationship(
+        "LocalizationGalaxy",
+        back_populates="ranking",
+        passive_deletes=True,
+        doc="Galaxies of the ranking.",
+    )
+
+    __table_args__ = (UniqueConstraint("localization_id", "catalog_id"),)
+
+
+class LocalizationGalaxy(Base):
+    """A galaxy of a LocalizationGalaxyRanking, with the probability
+    density of the localization at its position."""
+
+    __tablename__ = "localization_galaxies"
+
+    create = update = delete = restricted
+
+    ranking_id = sa.Column(
+        sa.ForeignKey("localization_galaxy_rankings.id", ondelete="CASCADE"),
+        nullable=False,
+        doc="ID of the LocalizationGalaxyRanking.",
+    )
+    ranking = relationship(
+        "LocalizationGalaxyRanking",
+        back_populates="galaxies",
+        doc="The LocalizationGalaxyRanking.",
+    )
+    galaxy_id = sa.Column(
+        sa.ForeignKey("galaxys.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+        doc="ID of the Galaxy.",
+    )
+    probdensity = sa.Column(
+        sa.Float,
+        nullable=False,
+        doc="Probability density of the localization's tile containing the galaxy [1/sr].",
+    )
+    cum_prob = sa.Column(
+        sa.Float,
+        nullable=False,
+        doc="Cumulative probability of the localization's tiles with a "
+        "probability density greater than or equal to that of the tile "
+        "containing the galaxy.",
+    )
+    probability = sa.Column(
+        sa.Float,
+        nullable=False,
+        doc="Probability of the galaxy: the probability of its pixel for 2D "
+        "localizations, and the probability density at its position and "
+        "distance for 3D localizations [1/Mpc^3].",
+    )
+
+    __table_args__ = (
+        UniqueConstraint("ranking_id", "galaxy_id"),
+        sa.Index(
+            "ix_localization_galaxies_ranking_id_cum_prob", "ranking_id", "cum_prob"
+        ),
+    )
+
+
+# Delete the rankings of a localization when its sky map changes, and
+# those of a catalog when galaxies are added to or changed in it (deleted
+# galaxies are removed from the rankings by ON DELETE CASCADE).
+GALAXY_RANKING_TRIGGERS = r"""
+CREATE OR REPLACE FUNCTION localization_galaxy_rankings_invalidate_localization() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM localization_galaxy_rankings WHERE localization_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION localization_galaxy_rankings_invalidate_catalogs() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        DELETE FROM localization_galaxy_rankings
+        WHERE catalog_id IN (
+            SELECT catalog_id FROM old_galaxys
+            UNION SELECT catalog_id FROM new_galaxys
+        );
+    ELSE
+        DELETE FROM localization_galaxy_rankings
+        WHERE catalog_id IN (SELECT DISTINCT catalog_id FROM new_galaxys);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS localization_galaxy_rankings_invalidate ON localizations;
+CREATE TRIGGER localization_galaxy_rankings_invalidate
+    AFTER UPDATE OF uniq, probdensity, distmu, distsigma, distnorm ON localizations
+    FOR EACH ROW EXECUTE FUNCTION localization_galaxy_rankings_invalidate_localization();
+
+DROP TRIGGER IF EXISTS localization_galaxy_rankings_invalidate_insert ON galaxys;
+CREATE TRIGGER localization_galaxy_rankings_invalidate_insert
+    AFTER INSERT ON galaxys
+    REFERENCING NEW TABLE AS new_galaxys
+    FOR EACH STATEMENT EXECUTE FUNCTION localization_galaxy_rankings_invalidate_catalogs();
+
+DROP TRIGGER IF EXISTS localization_galaxy_rankings_invalidate_update ON galaxys;
+CREATE TRIGGER localization_galaxy_rankings_invalidate_update
+    AFTER UPDATE ON galaxys
+    REFERENCING OLD TABLE AS old_galaxys NEW TABLE AS new_galaxys
+    FOR EACH STATEMENT EXECUTE FUNCTION localization_galaxy_rankings_invalidate_catalogs();
+"""
+
+event.listen(Base.metadata, "after_create", sa.DDL(GALAXY_RANKING_TRIGGERS))
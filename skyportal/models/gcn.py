@@ -1,5 +1,6 @@
 __all__ = [
     "GcnNotice",
+    "GcnDeadLetter",
     "GcnTag",
     "GcnEvent",
     "GcnEventUser",
@@ -463,6 +464,31 @@ class GcnNotice(Base):
     )
 
 
+class GcnDeadLetter(Base):
+    """GCN notices that the GCN service failed to ingest, kept (instead of
+    being dropped) to be inspected and replayed"""
+
+    create = read = update = delete = restricted
+
+    topic = sa.Column(sa.String, nullable=False, index=True, doc="Kafka topic")
+
+    kafka_partition = sa.Column(
+        sa.Integer, nullable=False, doc="Kafka partition of the notice"
+    )
+
+    kafka_offset = sa.Column(
+        sa.BigInteger, nullable=False, doc="Kafka offset of the notice"
+    )
+
+    content = deferred(
+        sa.Column(sa.LargeBinary, nullable=True, doc="Raw notice content")
+    )
+
+    error = sa.Column(
+        sa.String, nullable=False, doc="Error of the last ingestion attempt"
+    )
+
+
 class GcnProperty(Base):
     """Store properties for events."""
 
@@ -7,7 +7,6 @@ __all__ = [
 
 import datetime
 
-import dustmaps.sfd
 import healpix_alchemy
 import healpy
 import ligo.skymap.bayestar as ligo_bayestar
@@ -20,7 +19,6 @@ from astropy import units as u
 from astropy.coordinates import SkyCoord
 from astropy.table import Table
 from dateutil.relativedelta import relativedelta
-from dustmaps.config import config
 from sqlalchemy import event, func
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -31,10 +29,10 @@ from baselayer.app.env import load_env
 from baselayer.app.models import AccessibleIfUserMatches, Base
 from baselayer.log import make_log
 
+from ..utils.extinction import get_ebv
 from ..utils.files import delete_file_data, save_file_data
 
 _, cfg = load_env()
-config["data_dir"] = cfg["misc.dustmap_folder"]
 
 log = make_log("models/localizations")
 
@@ -241,11 +239,8 @@ class Localization(Base):
         center_info["gal_lat"] = coord.galactic.b.deg
         center_info["gal_lon"] = coord.galactic.l.deg
 
-        try:
-            ebv = float(dustmaps.sfd.SFDQuery()(coord))
-        except Exception:
-            ebv = None
-        center_info["ebv"] = ebv
+        ebv = get_ebv(coord.ra.deg, coord.dec.deg)[0]
+        center_info["ebv"] = None if np.isnan(ebv) else float(ebv)
 
         return center_info
 
@@ -6,14 +6,12 @@ import uuid
 
 import astroplan
 import conesearch_alchemy
-import dustmaps.sfd
 import healpix_alchemy
 import numpy as np
 import requests
 import sqlalchemy as sa
 from astropy import coordinates as ap_coord
 from astropy import units as u
-from dustmaps.config import config
 from sqlalchemy import event
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
@@ -28,6 +26,12 @@ from baselayer.app.models import (
 )
 from baselayer.log import make_log
 
+from ..utils.cosmology import (
+    HUBBLE_FLOW_MIN_VELOCITY_KMS,
+    SPEED_OF_LIGHT_KMS,
+    altdata_luminosity_distance,
+)
+from ..utils.extinction import get_ebv
 from .candidate import Candidate
 from .cosmo import cosmo
 from .photometric_series import PhotometricSeries
@@ -43,18 +47,6 @@ PHOT_DETECTION_THRESHOLD = cfg["misc.photometry_detection_threshold_nsigma"]
 
 PS1_CUTOUT_TIMEOUT = 15  # seconds
 
-# download dustmap if required
-config["data_dir"] = cfg["misc.dustmap_folder"]
-required_files = ["sfd/SFD_dust_4096_ngp.fits", "sfd/SFD_dust_4096_sgp.fits"]
-if any(
-    not os.path.isfile(os.path.join(config["data_dir"], required_file))
-    for required_file in required_files
-):
-    try:
-        dustmaps.sfd.fetch()
-    except requests.exceptions.HTTPError:
-        pass
-
 
 def delete_obj_if_all_data_owned(cls, user_or_token):
     from .source import Source
@@ -588,33 +580,14 @@ class Obj(Base, conesearch_alchemy.Point):
 
         # there may be a non-redshift based measurement of distance
         # for nearby sources
-        if isinstance(self.altdata, dict):
-            if self.altdata.get("dm") is not None:
-                # see eq (24) of https://ned.ipac.caltech.edu/level5/Hogg/Hogg7.html
-                return (
-                    (10 ** (float(self.altdata.get("dm")) / 5.0)) * 1e-5 * u.Mpc
-                ).value
-            if self.altdata.get("parallax") is not None:
-                if float(self.altdata.get("parallax")) > 0:
-                    # assume parallax in arcsec
-                    return (1e-6 * u.Mpc / float(self.altdata.get("parallax"))).value
-
-            if self.altdata.get("dist_kpc") is not None:
-                return (float(self.altdata.get("dist_kpc")) * 1e-3 * u.Mpc).value
-            if self.altdata.get("dist_Mpc") is not None:
-                return (float(self.altdata.get("dist_Mpc")) * u.Mpc).value
-            if self.altdata.get("dist_pc") is not None:
-                return (float(self.altdata.get("dist_pc")) * 1e-6 * u.Mpc).value
-            if self.altdata.get("dist_cm") is not None:
-                return (float(self.altdata.get("dist_cm")) * u.Mpc / 3.085e18).value
+        distance = altdata_luminosity_distance(self.altdata)
+        if distance is not None:
+            return distance
 
         if self.redshift:
-            if self.redshift * 2.99e5 * u.km / u.s < 350 * u.km / u.s:
+            if self.redshift * SPEED_OF_LIGHT_KMS < HUBBLE_FLOW_MIN_VELOCITY_KMS:
                 # stubbornly refuse to give a distance if the source
                 # is not in the Hubble flow
-                # cf. https://www.aanda.org/articles/aa/full/2003/05/aa3077/aa3077.html
-                # within ~5 Mpc (cz ~ 350 km/s) a given galaxy velocity
-                # can be between between ~0-500 km/s
                 return None
             return (cosmo.luminosity_distance(self.redshift)).to(u.Mpc).value
         return None
@@ -631,7 +604,10 @@ class Obj(Base, conesearch_alchemy.Point):
     def angular_diameter_distance(self):
         dl = self.luminosity_distance
         if dl:
-            if self.redshift and self.redshift * 2.99e5 * u.km / u.s > 350 * u.km / u.s:
+            if (
+                self.redshift
+                and self.redshift * SPEED_OF_LIGHT_KMS > HUBBLE_FLOW_MIN_VELOCITY_KMS
+            ):
                 # see eq (20) of https://ned.ipac.caltech.edu/level5/Hogg/Hogg7.html
                 return dl / (1 + self.redshift) ** 2
             return dl
@@ -740,11 +716,8 @@ class Obj(Base, conesearch_alchemy.Point):
     def ebv(self):
         """E(B-V) extinction for the object"""
 
-        coord = ap_coord.SkyCoord(self.ra, self.dec, unit="deg")
-        try:
-            return float(dustmaps.sfd.SFDQuery()(coord))
-        except Exception:
-            return None
+        ebv = get_ebv(self.ra, self.dec)[0]
+        return None if np.isnan(ebv) else float(ebv)
 
 
 Obj.candidates = relationship(
@@ -0,0 +1,51 @@
+__all__ = ["DUE_CHANNEL", "DUE_NOTIFY_TABLES"]
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from baselayer.app.models import Base
+
+# channel on which the database notifies the scheduler service
+# (services/scheduler) of changes to the rows it schedules, with payload
+# "<table>:<id>"
+DUE_CHANNEL = "skyportal_due"
+
+# tables of scheduled rows, with the columns that determine when they are
+# due, and an optional condition on the rows
+DUE_NOTIFY_TABLES = {
+    "reminders": (["next_reminder", "number_of_reminders"], None),
+    "reminders_on_spectra": (["next_reminder", "number_of_reminders"], None),
+    "reminders_on_gcns": (["next_reminder", "number_of_reminders"], None),
+    "reminders_on_shifts": (["next_reminder", "number_of_reminders"], None),
+    "recurringapis": (["next_call", "active"], None),
+    "listings": (["list_name", "params"], "NEW.list_name = 'watchlist'"),
+}
+
+
+def due_notify_triggers():
+    """SQL creating the triggers notifying DUE_CHANNEL of inserts and
+    updates of the columns of DUE_NOTIFY_TABLES."""
+    statements = [
+        f"""
+        CREATE OR REPLACE FUNCTION notify_due_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{DUE_CHANNEL}', TG_TABLE_NAME || ':' || NEW.id);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    ]
+    for table, (columns, condition) in DUE_NOTIFY_TABLES.items():
+        statements.append(f"DROP TRIGGER IF EXISTS {table}_notify_due ON {table}")
+        statements.append(
+            f"""
+            CREATE TRIGGER {table}_notify_due
+                AFTER INSERT OR UPDATE OF {", ".join(columns)} ON {table}
+                FOR EACH ROW {f"WHEN ({condition})" if condition else ""}
+                EXECUTE FUNCTION notify_due_change()
+            """
+        )
+    return ";\n".join(statements)
+
+
+event.listen(Base.metadata, "after_create", sa.DDL(due_notify_triggers()))
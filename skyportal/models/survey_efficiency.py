@@ -65,6 +65,12 @@ class SurveyEfficiencyAnalysisMixin:
         doc="The status of the request.",
     )
 
+    progress = sa.Column(
+        sa.Float,
+        nullable=True,
+        doc="Fraction of the injections simulated so far.",
+    )
+
     lightcurves = sa.Column(psql.JSONB, doc="Simulated light curve dictionary")
 
     @property
@@ -23,6 +23,7 @@ from baselayer.app.models import (
 from baselayer.log import make_log
 
 from ..utils.cache import Cache, dict_to_bytes
+from ..utils.observability import compute_twilight_table, next_event
 
 env, cfg = load_env()
 
@@ -413,3 +414,68 @@ class Telescope(Base):
         }
         cache[f"{self.id}"] = dict_to_bytes(time_info)
         return time_info
+
+    def twilight_table(self, year):
+        """Times of sunset, sunrise and twilights at this site for a whole
+        year (see `skyportal.utils.observability.compute_twilight_table`),
+        cached on disk. None if the site has no fixed location."""
+        if self.observer is None:
+            return None
+
+        location = (self.lon, self.lat, self.elevation)
+        key = f"{self.id}_twilight_{year}"
+        cached = cache[key]
+        if cached is not None:
+            try:
+                table = np.load(cached, allow_pickle=True).item()
+                # the telescope may have been moved since
+                if table["location"] == location:
+                    return table
+            except Exception:
+                log(f"Failed to load cached twilight table for telescope {self.id}")
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            table = compute_twilight_table(self.observer, year)
+        table["location"] = location
+        cache[key] = dict_to_bytes(table)
+        return table
+
+    def next_twilight_event(self, event, time=None):
+        """The astropy timestamp of the next `event` after `time` at this
+        site, from the twilight tables. `event` is one of
+        `skyportal.utils.observability.TWILIGHT_EVENTS`.
+        If time=None, uses the current time."""
+        if time is None:
+            time = ap_time.Time.now()
+        year = time.datetime.year
+        # the event may be in the table of the next year, or none at all
+        # (e.g. no sunset during the polar day)
+        for table_year in [year, year + 1]:
+            table = self.twilight_table(table_year)
+            if table is None:
+                return None
+            t = next_event(table, event, time.unix)
+            if t is not None:
+                return ap_time.Time(t, format="unix")
+        return None
+
+    def night(self, time=None):
+        """Sunset and sunrise of the night in progress at `time` at this site,
+        or of the next night if it is daytime, from the twilight tables.
+        (None, None) if there is no such night."""
+        if time is None:
+            time = ap_time.Time.now()
+        sunrise = self.next_twilight_event("sun_rise", time)
+        if sunrise is None:
+            return None, None
+        sunset = None
+        for table_year in [sunrise.datetime.year, sunrise.datetime.year - 1]:
+            table = self.twilight_table(table_year)
+            sunsets = table["sun_set"][table["sun_set"] < sunrise.unix]
+            if len(sunsets) > 0:
+                sunset = ap_time.Time(sunsets[-1], format="unix")
+                break
+        if sunset is None:
+            return None, None
+        return sunset, sunrise
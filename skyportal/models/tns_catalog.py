@@ -0,0 +1,46 @@
+__all__ = ["TNSCatalogObject"]
+
+import conesearch_alchemy as ca
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+from baselayer.app.models import Base
+
+
+class TNSCatalogObject(Base, ca.Point):
+    """A local mirror of an object from the TNS public objects catalog,
+    used to crossmatch the whole catalog against the Objs in a single query."""
+
+    name = sa.Column(
+        sa.String,
+        nullable=False,
+        unique=True,
+        index=True,
+        doc="TNS name of the object, without its prefix (e.g. 2024abc).",
+    )
+    name_prefix = sa.Column(
+        sa.String, nullable=True, doc="TNS name prefix of the object (AT, SN, ...)."
+    )
+    redshift = sa.Column(sa.Float, nullable=True, doc="Redshift reported on TNS.")
+    type = sa.Column(sa.String, nullable=True, doc="Classification reported on TNS.")
+    discovery_date = sa.Column(
+        sa.DateTime, nullable=True, doc="Discovery date reported on TNS."
+    )
+    last_modified = sa.Column(
+        sa.DateTime,
+        nullable=True,
+        index=True,
+        doc="Last time the object was modified on TNS.",
+    )
+    data = sa.Column(
+        JSONB,
+        nullable=False,
+        doc="Catalog row, in the format used for Obj.tns_info.",
+    )
+
+    @property
+    def tns_name(self):
+        """Full TNS name of the object, including its prefix."""
+        if self.name_prefix:
+            return f"{self.name_prefix} {self.name}"
+        return self.name
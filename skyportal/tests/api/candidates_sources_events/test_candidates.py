@@ -1716,3 +1716,61 @@ def test_candidate_filter_list(view_only_token, public_candidate):
     assert isinstance(data["data"]["totalMatches"], int)
     assert "passing_alert_id" in data["data"]["candidates"][0]
     assert "obj_id" in data["data"]["candidates"][0]
+
+
+def test_token_user_post_candidates_in_bulk(
+    upload_data_token, view_only_token, public_filter
+):
+    obj_id = str(uuid.uuid4())
+    obj_id2 = str(uuid.uuid4())
+    passed_at = str(datetime.datetime.utcnow())
+    candidate = {
+        "id": obj_id,
+        "ra": 234.22,
+        "dec": -22.33,
+        "redshift": 3,
+        "transient": False,
+        "ra_dis": 2.3,
+        "filter_ids": [public_filter.id],
+        "passed_at": passed_at,
+    }
+    status, data = api(
+        "POST",
+        "candidates_bulk",
+        data={
+            "candidates": [
+                candidate,
+                {**candidate, "id": obj_id2, "ra": 10.5, "dec": 45.0},
+                # same object, same filter and same passed_at: duplicate
+                candidate,
+                # new object without coordinates
+                {**candidate, "id": str(uuid.uuid4()), "ra": None},
+                {**candidate, "id": str(uuid.uuid4()), "filter_ids": []},
+            ]
+        },
+        token=upload_data_token,
+    )
+    assert status == 200
+    results = data["data"]["results"]
+    assert len(results) == 5
+    assert results[0]["obj_id"] == obj_id
+    assert len(results[0]["ids"]) == 1
+    assert results[0]["error"] is None
+    assert len(results[1]["ids"]) == 1
+    assert results[2]["ids"] == []
+    assert "Failed to post candidate" in results[2]["error"]
+    assert results[3]["error"] == "RA must not be null for a new Obj"
+    assert results[4]["error"] == "Missing required filter_ids parameter."
+
+    status, data = api("GET", f"candidates/{obj_id2}", token=view_only_token)
+    assert status == 200
+    assert data["data"]["id"] == obj_id2
+    npt.assert_almost_equal(data["data"]["ra"], 10.5)
+
+    for oid in [obj_id, obj_id2]:
+        status, data = api(
+            "DELETE",
+            f"candidates/{oid}/{public_filter.id}",
+            token=upload_data_token,
+        )
+        assert status == 200
@@ -197,6 +197,10 @@ def test_gcn_from_moc(super_admin_token):
     dateobs = "2022-06-18T18:31:12"
     tags = ["IPN", "GRB", name]
     skymap, _, _ = from_url(skymap)
+    skymap = {
+        key: value.tolist() if isinstance(value, np.ndarray) else value
+        for key, value in skymap.items()
+    }
     properties = {"BNS": 0.9, "NSBH": 0.1}
 
     event_data = {
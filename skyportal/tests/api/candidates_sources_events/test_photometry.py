@@ -1,5 +1,7 @@
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 
 import numpy as np
 import pandas as pd
@@ -11,6 +13,7 @@ from skyportal.handlers.api.photometry import add_external_photometry
 from skyportal.models import DBSession, Token
 from skyportal.models.photometry import Photometry
 from skyportal.tests import api, assert_api
+from skyportal.utils.source_snapshots import get_snapshot_key
 
 _, cfg = load_env()
 PHOT_DETECTION_THRESHOLD = cfg["misc.photometry_detection_threshold_nsigma"]
@@ -1726,6 +1729,53 @@ def test_user_can_delete_owned_photometry_data(
     assert status == 400
 
 
+def test_deleting_photometry_invalidates_source_snapshots(
+    upload_data_token, view_only_token, public_source, ztf_camera, public_group
+):
+    status, data = api(
+        "POST",
+        "photometry",
+        data={
+            "obj_id": str(public_source.id),
+            "mjd": 58000.0,
+            "instrument_id": ztf_camera.id,
+            "flux": 12.24,
+            "fluxerr": 0.031,
+            "zp": 25.0,
+            "magsys": "ab",
+            "filter": "ztfi",
+            "group_ids": [public_group.id],
+        },
+        token=upload_data_token,
+    )
+    assert status == 200
+    photometry_id = data["data"]["ids"][0]
+
+    # the snapshots of a source are keyed by its current generation
+    user = SimpleNamespace(
+        id=1,
+        is_admin=True,
+        permissions=[],
+        accessible_groups=[],
+        accessible_streams=[],
+    )
+    options = {"include_photometry": True}
+    snapshot_key = get_snapshot_key(public_source.internal_key, user, options)
+
+    status, data = api("DELETE", f"photometry/{photometry_id}", token=upload_data_token)
+    assert status == 200
+    assert get_snapshot_key(public_source.internal_key, user, options) != snapshot_key
+
+    status, data = api(
+        "GET",
+        f"sources/{public_source.id}",
+        params={"includePhotometry": "true"},
+        token=view_only_token,
+    )
+    assert status == 200
+    assert photometry_id not in [point["id"] for point in data["data"]["photometry"]]
+
+
 def test_user_cannot_delete_unowned_photometry_data(
     upload_data_token, manage_sources_token, public_source, ztf_camera, public_group
 ):
@@ -3255,3 +3305,39 @@ def test_token_user_big_post(
         data["message"]
         == "Maximum number of photometry rows to post exceeded: 30000 > 10000. Please break up the data into smaller sets and try again"
     )
+
+
+def test_token_user_concurrent_put_photometry_is_deduplicated(
+    upload_data_token, public_source, ztf_camera, public_group
+):
+    mjds = [59500 + i for i in range(20)]
+    payload = {
+        "obj_id": str(public_source.id),
+        "instrument_id": ztf_camera.id,
+        "mjd": mjds,
+        "mag": np.random.uniform(low=18, high=22, size=len(mjds)).tolist(),
+        "magerr": np.random.uniform(low=0.1, high=0.3, size=len(mjds)).tolist(),
+        "limiting_mag": 22.3,
+        "magsys": "ab",
+        "filter": "ztfg",
+        "group_ids": [public_group.id],
+    }
+
+    # the same points are PUT concurrently: the per-object lock
+    # must make all the requests return the same rows
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(
+            executor.map(
+                lambda _: api(
+                    "PUT", "photometry", data=payload, token=upload_data_token
+                ),
+                range(4),
+            )
+        )
+
+    for status, data in results:
+        assert status == 200
+        assert data["status"] == "success"
+    ids = results[0][1]["data"]["ids"]
+    assert len(set(ids)) == len(mjds)
+    assert all(data["data"]["ids"] == ids for _, data in results)
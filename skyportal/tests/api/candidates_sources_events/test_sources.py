@@ -541,6 +541,67 @@ def test_starlist(super_admin_token, upload_data_token, public_source):
     assert data["status"] == "success"
     assert isinstance(data["data"]["starlist_info"][2]["dec"], float)
 
+    status, data = api(
+        "GET",
+        f"sources/{public_source.id}/offsets",
+        params={"num_offset_stars": "11"},
+        token=upload_data_token,
+    )
+    assert status == 400
+
+
+def test_starlist_of_several_sources(
+    super_admin_token, upload_data_token, public_source
+):
+    status, data = api(
+        "PATCH",
+        f"sources/{public_source.id}",
+        data={"ra": 234.22, "dec": 22.33},
+        token=super_admin_token,
+    )
+    assert status == 200
+
+    missing_id = str(uuid.uuid4())
+    status, data = api(
+        "GET",
+        "sources/offsets",
+        params={
+            "obj_ids": f"{public_source.id},{missing_id},{public_source.id}",
+            "facility": "P200",
+            "num_offset_stars": "1",
+        },
+        token=upload_data_token,
+    )
+    assert status == 200
+    assert data["data"]["facility"] == "P200"
+    # duplicated IDs are dropped, sources are in the requested order
+    sources = data["data"]["sources"]
+    assert [source["obj_id"] for source in sources] == [public_source.id, missing_id]
+    assert sources[0]["noffsets"] == 1
+    assert isinstance(sources[0]["starlist_info"][0]["ra"], float)
+    # a source that is not found does not fail the others
+    assert sources[1]["starlist_info"] == []
+    assert sources[1]["error"] == "Source not found"
+    assert data["data"]["starlist_info"] == sources[0]["starlist_info"]
+
+    status, data = api(
+        "GET",
+        "sources/offsets",
+        params={"obj_ids": public_source.id, "num_offset_stars": "11"},
+        token=upload_data_token,
+    )
+    assert status == 400
+    assert "outside the allowed range (0-10)" in data["message"]
+
+    status, data = api(
+        "GET",
+        "sources/offsets",
+        params={"obj_ids": ",".join(str(uuid.uuid4()) for _ in range(501))},
+        token=upload_data_token,
+    )
+    assert status == 400
+    assert "more than 500 sources" in data["message"]
+
 
 def test_source_notifications_unauthorized(
     source_notification_user_token, public_group, public_source
@@ -2168,6 +2229,86 @@ def test_token_user_retrieving_source_with_annotation_filter(
     assert len(data["data"]["sources"]) == 1
 
 
+def test_annotation_filter_follows_annotation_updates(
+    super_admin_token, public_source, annotation_token
+):
+    annotation_name = str(uuid.uuid4())
+
+    def filtered_ids(annotations_filter):
+        status, data = api(
+            "GET",
+            "sources",
+            params={"annotationsFilter": annotations_filter},
+            token=super_admin_token,
+        )
+        assert status == 200
+        return [source["id"] for source in data["data"]["sources"]]
+
+    status, data = api(
+        "POST",
+        f"sources/{public_source.id}/annotations",
+        data={
+            "origin": str(uuid.uuid4()),
+            "data": {annotation_name: "0.5", "class": "SN Ia"},
+        },
+        token=annotation_token,
+    )
+    assert status == 200
+    annotation_id = data["data"]["annotation_id"]
+    # numbers given as strings are compared as numbers
+    assert filtered_ids(f"{annotation_name}:1.0:lt") == [public_source.id]
+
+    status, data = api(
+        "PUT",
+        f"sources/{public_source.id}/annotations/{annotation_id}",
+        data={"data": {annotation_name: 2.5}},
+        token=annotation_token,
+    )
+    assert status == 200
+    assert filtered_ids(f"{annotation_name}:1.0:lt") == []
+    assert filtered_ids(f"{annotation_name}:2.0:gt") == [public_source.id]
+
+    status, data = api(
+        "DELETE",
+        f"sources/{public_source.id}/annotations/{annotation_id}",
+        token=annotation_token,
+    )
+    assert status == 200
+    assert filtered_ids(f"{annotation_name}:2.0:gt") == []
+
+
+def test_annotation_filter_skips_out_of_range_values(
+    view_only_token, public_source, annotation_token
+):
+    annotation_name = str(uuid.uuid4())
+    out_of_range_name = str(uuid.uuid4())
+
+    # values that do not fit a double precision do not block the annotation
+    status, data = api(
+        "POST",
+        f"sources/{public_source.id}/annotations",
+        data={
+            "origin": str(uuid.uuid4()),
+            "data": {annotation_name: 1.5, out_of_range_name: "1e999"},
+        },
+        token=annotation_token,
+    )
+    assert status == 200
+
+    for annotations_filter, expected in [
+        (f"{annotation_name}:1.0:gt", [public_source.id]),
+        (f"{out_of_range_name}:1.0:gt", []),
+    ]:
+        status, data = api(
+            "GET",
+            "sources",
+            params={"annotationsFilter": annotations_filter},
+            token=view_only_token,
+        )
+        assert status == 200
+        assert [source["id"] for source in data["data"]["sources"]] == expected
+
+
 def test_add_source_redshift_origin(upload_data_token, view_only_token, public_group):
     obj_id = str(uuid.uuid4())
     status, data = api(
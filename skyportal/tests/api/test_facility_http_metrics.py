@@ -0,0 +1,14 @@
+from skyportal.tests import api
+
+
+def test_facility_http_metrics(super_admin_token):
+    status, data = api("GET", "facility_http_metrics", token=super_admin_token)
+    assert status == 200
+    assert data["status"] == "success"
+    assert isinstance(data["data"]["app"], dict)
+    assert "facility_queue" in data["data"]
+
+
+def test_facility_http_metrics_access_denied(view_only_token):
+    status, data = api("GET", "facility_http_metrics", token=view_only_token)
+    assert status == 401
@@ -3,8 +3,10 @@ import time
 import uuid
 
 import numpy as np
+import sqlalchemy as sa
 from astropy.table import Table
 
+from skyportal.models import DBSession, InstrumentField, PlannedObservation
 from skyportal.tests import api
 from skyportal.tests.external.test_moving_objects import (
     add_telescope_and_instrument,
@@ -315,3 +317,178 @@ def test_observation_plan_galaxy(
     assert n_retries < 10
 
     remove_telescope_and_instrument(telescope_id, instrument_id, super_admin_token)
+
+
+def test_observation_plan_geojson(super_admin_token, public_group, gcn_GW190814):
+    telescope_id, instrument_id, _, _ = add_telescope_and_instrument(
+        "ZTF", super_admin_token, list(range(200, 250))
+    )
+
+    status, data = api(
+        "POST",
+        "allocation",
+        data={
+            "group_id": public_group.id,
+            "instrument_id": instrument_id,
+            "pi": "Shri Kulkarni",
+            "hours_allocated": 200,
+            "start_date": "3021-02-27T00:00:00",
+            "end_date": "3021-07-20T00:00:00",
+            "proposal_id": "COO-2020A-P01",
+            "types": ["observation_plan"],
+        },
+        token=super_admin_token,
+    )
+    assert status == 200
+    allocation_id = data["data"]["id"]
+
+    status, data = api(
+        "POST",
+        "observation_plan",
+        data={
+            "allocation_id": allocation_id,
+            "gcnevent_id": gcn_GW190814.id,
+            "localization_id": gcn_GW190814.localizations[0].id,
+            "payload": {
+                "start_date": "2020-07-16 01:01:01",
+                "end_date": "2020-07-17 01:01:01",
+                "filter_strategy": "block",
+                "schedule_strategy": "tiling",
+                "schedule_type": "greedy_slew",
+                "exposure_time": 300,
+                "filters": "ztfr",
+                "maximum_airmass": 2.0,
+                "integrated_probability": 100,
+                "minimum_time_difference": 30,
+                "queue_name": str(uuid.uuid4()),
+                "program_id": "Partnership",
+                "subprogram_name": "GRB",
+                "galactic_latitude": 10,
+            },
+        },
+        token=super_admin_token,
+    )
+    assert status == 200
+    request_id = data["data"]["ids"][0]
+
+    n_retries = 0
+    while n_retries < 20:
+        status, data = api(
+            "GET",
+            f"observation_plan/{request_id}",
+            params={"includePlannedObservations": "true"},
+            token=super_admin_token,
+        )
+        assert status == 200
+        observation_plans = data["data"]["observation_plans"]
+        if (
+            len(observation_plans) == 1
+            and len(observation_plans[0]["planned_observations"]) >= 2
+        ):
+            break
+        n_retries += 1
+        time.sleep(5)
+    assert n_retries < 20
+    plan_id = observation_plans[0]["id"]
+
+    def get_geojson():
+        status, data = api(
+            "GET", f"observation_plan/{request_id}/geojson", token=super_admin_token
+        )
+        assert status == 200
+        return data["data"]["geojson"]
+
+    def expected_field_ids():
+        """Field IDs of the plan, in the order they are first observed."""
+        with DBSession() as session:
+            field_ids = session.scalars(
+                sa.select(InstrumentField.field_id)
+                .join(
+                    PlannedObservation,
+                    PlannedObservation.field_id == InstrumentField.id,
+                )
+                .where(PlannedObservation.observation_plan_id == plan_id)
+                .order_by(PlannedObservation.id)
+            ).all()
+        return list(dict.fromkeys(field_ids))
+
+    # one contour per field, in the order they are first observed
+    geojson = get_geojson()
+    field_ids = [contour["properties"]["field_id"] for contour in geojson]
+    assert field_ids == expected_field_ids()
+
+    # the contours are served from the cache until the plan changes: a change
+    # that does not update the plan's version is not seen
+    with DBSession() as session:
+        first_field = session.scalars(
+            sa.select(InstrumentField).where(
+                InstrumentField.instrument_id == instrument_id,
+                InstrumentField.field_id == field_ids[0],
+            )
+        ).first()
+        first_field_id = first_field.id
+        session.execute(
+            sa.text(
+                "UPDATE instrumentfields SET contour_summary = "
+                "jsonb_set(contour_summary, '{properties,marker}', 'true') "
+                "WHERE id = :id"
+            ),
+            {"id": first_field_id},
+        )
+        session.commit()
+    assert get_geojson() == geojson
+
+    # adding an observation of a new field invalidates the cache
+    with DBSession() as session:
+        last_observation = session.scalars(
+            sa.select(PlannedObservation)
+            .where(PlannedObservation.observation_plan_id == plan_id)
+            .order_by(PlannedObservation.id.desc())
+        ).first()
+        new_field = session.scalars(
+            sa.select(InstrumentField).where(
+                InstrumentField.instrument_id == instrument_id,
+                InstrumentField.field_id.not_in(field_ids),
+            )
+        ).first()
+        session.add(
+            PlannedObservation(
+                observation_plan_id=plan_id,
+                instrument_id=instrument_id,
+                dateobs=last_observation.dateobs,
+                field_id=new_field.id,
+                exposure_time=last_observation.exposure_time,
+                weight=last_observation.weight,
+                filt=last_observation.filt,
+                obstime=last_observation.obstime,
+                overhead_per_exposure=last_observation.overhead_per_exposure,
+                planned_observation_id=last_observation.planned_observation_id + 1,
+            )
+        )
+        new_field_id = new_field.field_id
+        session.commit()
+    geojson = get_geojson()
+    assert [contour["properties"]["field_id"] for contour in geojson] == [
+        *field_ids,
+        new_field_id,
+    ]
+    assert geojson[0]["properties"]["marker"] is True
+
+    # as does deleting the observations of a field
+    status, data = api(
+        "DELETE",
+        f"observation_plan/{request_id}/fields",
+        data={"fieldIds": [first_field_id]},
+        token=super_admin_token,
+    )
+    assert status == 200
+    geojson = get_geojson()
+    assert [contour["properties"]["field_id"] for contour in geojson] == [
+        *field_ids[1:],
+        new_field_id,
+    ]
+    assert [
+        contour["properties"]["field_id"] for contour in geojson
+    ] == expected_field_ids()
+
+    remove_telescope_and_instrument(telescope_id, instrument_id, super_admin_token)
@@ -4,10 +4,13 @@ import numpy as np
 import numpy.testing as npt
 import pytest
 import requests
+from astropy.table import Table
 from requests.exceptions import ConnectionError, HTTPError, MissingSchema, Timeout
 
 from skyportal.models import Photometry
 from skyportal.tests import api
+from skyportal.utils import offset
+from skyportal.utils.gaia_cache import GAIA_TILE_DTYPE, GAIA_TILE_UNITS
 from skyportal.utils.offset import (
     _calculate_best_position_for_offset_stars,
     get_finding_chart,
@@ -235,6 +238,43 @@ def test_get_nearby_offset_stars():
         )
 
 
+def test_offset_stars_without_parallax(monkeypatch):
+    # two stars ~30 and ~45 arcsec north of the source,
+    # the second one from a 2-parameter Gaia solution
+    sources = np.zeros(2, dtype=GAIA_TILE_DTYPE)
+    sources["source_id"] = [1, 2]
+    sources["ra"] = 123.0
+    sources["dec"] = [33.3 + 30 / 3600, 33.3 + 45 / 3600]
+    sources["ref_epoch"] = 2016.0
+    sources["phot_rp_mean_mag"] = [15.0, 16.0]
+    sources["pmra"] = [1.0, np.nan]
+    sources["pmdec"] = [-1.0, np.nan]
+    sources["parallax"] = [0.5, np.nan]
+
+    def cone_search(ra, dec, radius_degrees):
+        table = Table(sources)
+        table["dist"] = sources["dec"] - dec
+        for name, unit in GAIA_TILE_UNITS.items():
+            table[name].unit = unit
+        return table
+
+    monkeypatch.setattr(offset.gaia_tile_cache, "cone_search", cone_search)
+    starlist, query, queries_issued, noffsets, used_ztfref = get_nearby_offset_stars(
+        123.0,
+        33.3,
+        "testSource",
+        how_many=2,
+        allowed_queries=1,
+        use_ztfref=False,
+    )
+    assert noffsets == 2
+    assert queries_issued == 1
+    assert "tile cache" in query
+    assert all(
+        np.isfinite(star["ra"]) and np.isfinite(star["dec"]) for star in starlist
+    )
+
+
 desi_url = (
     "http://legacysurvey.org/viewer/fits-cutout/"
     "?ra=123.0&dec=33.0&layer=dr8&pixscale=2.0&bands=r"
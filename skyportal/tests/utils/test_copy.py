@@ -0,0 +1,86 @@
+import datetime
+
+import numpy as np
+
+from skyportal.utils.copy import (
+    COPY_NULL,
+    PGCOPY_HEADER,
+    PGCOPY_TRAILER,
+    _binary_array,
+    _decode_binary_array,
+    _iter_binary_rows,
+    encode_copy_column,
+    encode_copy_value,
+)
+
+
+def test_encode_copy_value():
+    assert encode_copy_value(None) == COPY_NULL
+    assert encode_copy_value("a\tb\nc\\d") == "a\\tb\\nc\\\\d"
+    assert encode_copy_value(True) == "t"
+    assert encode_copy_value(np.int64(42)) == "42"
+    assert encode_copy_value(0.1) == "0.1"
+    assert encode_copy_value(np.nan) == "nan"
+    assert (
+        encode_copy_value(datetime.datetime(2024, 1, 2, 3, 4, 5))
+        == "2024-01-02T03:04:05"
+    )
+
+
+def test_encode_copy_column():
+    assert encode_copy_column(np.array([1, 2, 3])) == ["1", "2", "3"]
+    assert encode_copy_column(np.array([1.5, np.nan])) == ["1.5", "nan"]
+    assert encode_copy_column(np.array([1.5, np.nan]), nan_as_null=True) == [
+        "1.5",
+        COPY_NULL,
+    ]
+    assert encode_copy_column(["ztfg", None, 12.0]) == ["ztfg", COPY_NULL, "12.0"]
+    assert encode_copy_column(np.array(["a", None], dtype=object)) == [
+        "a",
+        COPY_NULL,
+    ]
+
+
+def test_binary_array_round_trip():
+    values = np.array([4, 17, 2**60], dtype=np.int64)
+    encoded = _binary_array("int8[]", values)
+    # skip the length of the field
+    decoded = _decode_binary_array(encoded, 4)
+    np.testing.assert_array_equal(decoded, values)
+    assert decoded.dtype == np.int64
+
+    empty = _decode_binary_array(_binary_array("float8[]", []), 4)
+    assert empty.size == 0
+
+
+def test_iter_binary_rows():
+    columns = {
+        "localization_id": ("int4", 3),
+        "probdensity": ("float8", np.array([0.5, 0.25])),
+        "healpix": ("int8range", (np.array([0, 4]), np.array([4, 8]))),
+    }
+    data = b"".join(_iter_binary_rows(columns, 2, chunk_size=1))
+    assert data.startswith(PGCOPY_HEADER)
+    assert data.endswith(PGCOPY_TRAILER)
+    # per row: the field count, then the length and value of each field
+    row_size = 2 + (4 + 4) + (4 + 8) + (4 + 25)
+    assert len(data) == len(PGCOPY_HEADER) + 2 * row_size + len(PGCOPY_TRAILER)
+
+
+def test_iter_binary_rows_text():
+    columns = {
+        "entry_name": ("text", ["a", "bé"]),
+        "data": ("jsonb", [{"ra": 1.5}, {}]),
+        "catalog_id": ("int4", 3),
+    }
+    data = b"".join(_iter_binary_rows(columns, 2, chunk_size=1))
+    rows = data[len(PGCOPY_HEADER) : -len(PGCOPY_TRAILER)]
+    first_row = (
+        b"\x00\x03"
+        + b"\x00\x00\x00\x01a"
+        + b'\x00\x00\x00\x0c\x01{"ra": 1.5}'
+        + b"\x00\x00\x00\x04\x00\x00\x00\x03"
+    )
+    assert rows.startswith(first_row)
+    # UTF-8 names are sent as bytes
+    assert rows[len(first_row) :].startswith(b"\x00\x03\x00\x00\x00\x03b\xc3\xa9")
@@ -1,8 +1,9 @@
+import numpy.testing as npt
 import pytest
 from astropy import cosmology
 from astropy import units as u
 
-from skyportal.utils.cosmology import establish_cosmology
+from skyportal.utils.cosmology import establish_cosmology, get_distances
 
 
 def test_default_cosmology_planck18():
@@ -33,3 +34,33 @@ def test_bad_cosmology():
 
     with pytest.raises(RuntimeError):
         establish_cosmology(cfg=cfg)
+
+
+def test_get_distances():
+    cosmo = cosmology.Planck18
+    redshifts = [0.05, None, 0.0001, 0.01, 2.0, 0.0]
+    altdatas = [None, {"dm": 28.5}, None, {"dist_kpc": 10}, {"parallax": -1}, {}]
+    distances = get_distances(redshifts, altdatas, cosmo)
+
+    dl = distances["luminosity_distance"]
+    npt.assert_allclose(dl[0], cosmo.luminosity_distance(0.05).to_value(u.Mpc))
+    npt.assert_allclose(dl[1], 10 ** ((28.5 / 5) - 5))
+    # not in the Hubble flow
+    assert dl[2] is None
+    # altdata distances take precedence over the redshift
+    npt.assert_allclose(dl[3], 0.01)
+    # invalid parallaxes are ignored
+    npt.assert_allclose(dl[4], cosmo.luminosity_distance(2.0).to_value(u.Mpc))
+    assert dl[5] is None
+
+    npt.assert_allclose(distances["dm"][1], 28.5)
+    npt.assert_allclose(
+        distances["dm"][0], cosmo.distmod(0.05).to_value(u.mag), rtol=1e-6
+    )
+    assert distances["dm"][2] is None
+
+    add = distances["angular_diameter_distance"]
+    npt.assert_allclose(add[0], dl[0] / 1.05**2)
+    npt.assert_allclose(add[1], dl[1])
+    npt.assert_allclose(add[3], dl[3] / 1.01**2)
+    assert add[5] is None
@@ -0,0 +1,164 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from skyportal.utils.due_scheduler import DueScheduler, JobSource
+
+START = datetime(2024, 1, 1)
+
+
+class Clock:
+    def __init__(self):
+        self.time = START
+
+    def __call__(self):
+        return self.time
+
+
+class FakeSource(JobSource):
+    """Jobs due at the times of a dict, each run advancing it by a period."""
+
+    name = "fake"
+    tables = {"fakes"}
+
+    def __init__(self, due, period=timedelta(hours=1), fail=(), delay=0.0):
+        self.due = dict(due)
+        self.period = period
+        self.fail = set(fail)
+        self.delay = delay
+        self.runs = []
+        self.concurrent = 0
+        self.max_concurrent = {}
+        self._lock = threading.Lock()
+
+    def due_times(self, until):
+        return {job_id: due for job_id, due in self.due.items() if due <= until}
+
+    def due_time(self, job_id):
+        return self.due.get(job_id)
+
+    def run(self, job_id):
+        with self._lock:
+            self.runs.append(job_id)
+            self.concurrent += 1
+            self.max_concurrent[job_id] = max(
+                self.max_concurrent.get(job_id, 0), self.concurrent
+            )
+        time.sleep(self.delay)
+        with self._lock:
+            self.concurrent -= 1
+        if job_id in self.fail:
+            raise ValueError("failed")
+        self.due[job_id] += self.period
+
+
+def make_scheduler(source, clock, **kwargs):
+    scheduler = DueScheduler(
+        [source], max_workers=1, now=clock, log=lambda *args: None, **kwargs
+    )
+    scheduler.resync()
+    return scheduler
+
+
+def test_runs_due_jobs_and_reschedules_them():
+    clock = Clock()
+    source = FakeSource(
+        {1: START + timedelta(minutes=2), 2: START - timedelta(seconds=30)}
+    )
+    scheduler = make_scheduler(source, clock)
+
+    # runs the late job, and sleeps until the next one is due
+    assert scheduler.run_pending() == 120
+
+    clock.time = START + timedelta(minutes=2)
+    scheduler.run_pending()
+    scheduler.stop()
+
+    assert source.runs == [2, 1]
+    assert scheduler._due == {
+        ("fake", 1): START + timedelta(hours=1, minutes=2),
+        ("fake", 2): START + timedelta(minutes=59, seconds=30),
+    }
+
+    stages = scheduler.metrics.summary()["stages"]
+    assert stages["fake.lag"]["count"] == 2
+    assert stages["fake.lag"]["max"] == 30
+    assert stages["fake.run"]["count"] == 2
+    assert scheduler.metrics.summary()["counters"] == {"fake.runs": 2}
+
+
+def test_notify_reschedules_jobs():
+    clock = Clock()
+    source = FakeSource({1: START + timedelta(hours=1)})
+    scheduler = make_scheduler(source, clock)
+    assert scheduler.run_pending() == 300
+
+    # moved earlier
+    source.due[1] = START + timedelta(minutes=1)
+    scheduler.notify("fakes", 1)
+    assert scheduler.run_pending() == 60
+
+    # new job
+    source.due[2] = START + timedelta(seconds=10)
+    scheduler.notify("fakes", 2)
+    assert scheduler.run_pending() == 10
+
+    # deleted, and changes to other tables are ignored
+    del source.due[2]
+    scheduler.notify("fakes", 2)
+    scheduler.notify("others", 1)
+    assert scheduler.run_pending() == 60
+    scheduler.stop()
+    assert source.runs == []
+
+
+def test_notifications_are_coalesced():
+    class SingleJobSource(FakeSource):
+        """All the rows of the table concern the same job."""
+
+        due_time_calls = 0
+
+        def job_id(self, table, row_id):
+            return 1
+
+        def due_time(self, job_id):
+            self.due_time_calls += 1
+            return super().due_time(job_id)
+
+    clock = Clock()
+    source = SingleJobSource({1: START + timedelta(hours=1)})
+    scheduler = make_scheduler(source, clock)
+
+    source.due[1] = START + timedelta(minutes=1)
+    for row_id in range(100):
+        scheduler.notify("fakes", row_id)
+    assert scheduler.run_pending() == 60
+    scheduler.stop()
+    assert source.due_time_calls == 1
+
+
+def test_job_is_not_run_concurrently():
+    clock = Clock()
+    source = FakeSource({1: START}, period=timedelta(0), delay=0.1)
+    scheduler = DueScheduler([source], max_workers=4, now=clock, log=lambda *args: None)
+    scheduler.resync()
+    scheduler.run_pending()
+    # notified while running, and still due
+    scheduler.notify("fakes", 1)
+    scheduler.run_pending()
+    scheduler.stop()
+
+    assert source.runs == [1]
+    assert source.max_concurrent == {1: 1}
+
+
+def test_failed_job_is_retried():
+    clock = Clock()
+    source = FakeSource({1: START}, fail={1})
+    scheduler = make_scheduler(source, clock, retry_delay=timedelta(minutes=2))
+    scheduler.run_pending()
+    scheduler.stop()
+
+    assert source.runs == [1]
+    assert scheduler._due == {("fake", 1): START + timedelta(minutes=2)}
+    assert scheduler.metrics.summary()["counters"] == {"fake.failures": 1}
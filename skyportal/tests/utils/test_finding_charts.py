@@ -0,0 +1,90 @@
+import io
+import re
+import zipfile
+
+from PIL import Image
+
+from skyportal.utils import finding_charts
+from skyportal.utils.finding_charts import (
+    create_finding_chart_job,
+    get_finding_chart_job,
+    get_finding_chart_job_output,
+    run_finding_chart_job,
+)
+
+
+def fake_finding_chart(
+    source_ra, source_dec, source_name, output_format="pdf", **kwargs
+):
+    if source_name == "bad":
+        return {"success": False, "name": None, "data": None, "reason": "no image"}
+    buf = io.BytesIO()
+    Image.new("RGB", (200, 100), "white").save(buf, format=output_format)
+    return {
+        "success": True,
+        "name": f"finder_{source_name}.{output_format}",
+        "data": buf.getvalue(),
+        "reason": "",
+    }
+
+
+def setup_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(finding_charts, "FINDING_CHART_JOBS_DIR", tmp_path)
+    monkeypatch.setattr(finding_charts, "get_finding_chart", fake_finding_chart)
+    prefetched = []
+    monkeypatch.setattr(
+        finding_charts.gaia_tile_cache,
+        "prefetch",
+        lambda positions, radius: prefetched.append(list(positions)),
+    )
+    return prefetched
+
+
+def make_targets(names):
+    return [
+        {"obj_id": name, "ra": 10.0 + i, "dec": -5.0, "kwargs": {}}
+        for i, name in enumerate(names)
+    ]
+
+
+def test_combined_pdf(tmp_path, monkeypatch):
+    prefetched = setup_jobs(tmp_path, monkeypatch)
+    targets = make_targets(["a", "bad", "c"])
+    job_id = create_finding_chart_job(1, len(targets), "pdf")
+    assert get_finding_chart_job(job_id)["status"] == "pending"
+
+    run_finding_chart_job(job_id, targets, {"radius_degrees": 2 / 60}, output="pdf")
+
+    # the Gaia sources of all the targets are fetched once
+    assert prefetched == [[(10.0, -5.0), (11.0, -5.0), (12.0, -5.0)]]
+    job = get_finding_chart_job(job_id)
+    assert job["status"] == "complete"
+    assert job["n_done"] == 3
+    assert job["failed"] == {"bad": "no image"}
+    with open(get_finding_chart_job_output(job_id), "rb") as f:
+        pdf = f.read()
+    assert pdf.startswith(b"%PDF")
+    assert len(re.findall(rb"/Type\s*/Page\b", pdf)) == 2
+
+
+def test_zip_archive(tmp_path, monkeypatch):
+    setup_jobs(tmp_path, monkeypatch)
+    targets = make_targets(["a", "b"])
+    job_id = create_finding_chart_job(1, len(targets), "zip")
+    run_finding_chart_job(job_id, targets, {"output_format": "png"}, output="zip")
+
+    assert get_finding_chart_job(job_id)["status"] == "complete"
+    with zipfile.ZipFile(get_finding_chart_job_output(job_id)) as archive:
+        assert sorted(archive.namelist()) == ["finder_a.png", "finder_b.png"]
+
+
+def test_failed_job(tmp_path, monkeypatch):
+    setup_jobs(tmp_path, monkeypatch)
+    targets = make_targets(["bad"])
+    job_id = create_finding_chart_job(1, len(targets), "pdf")
+    run_finding_chart_job(job_id, targets, {}, output="pdf")
+
+    job = get_finding_chart_job(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "No finding chart could be generated"
+    assert get_finding_chart_job_output(job_id) is None
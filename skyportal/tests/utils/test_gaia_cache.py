@@ -0,0 +1,120 @@
+import os
+import time
+
+import healpy as hp
+import numpy as np
+import numpy.testing as npt
+from astropy import units as u
+from astropy.coordinates import SkyCoord
+
+from skyportal.utils.gaia_cache import (
+    GAIA_TILE_DTYPE,
+    GaiaTileCache,
+    source_id_to_tile,
+    tile_source_id_range,
+)
+
+# one fixture source every 16 pixels of order 12 (~50 arcsec apart)
+SOURCE_ORDER = 12
+SOURCE_STEP = 16
+
+
+class FixtureTiles:
+    """Generates the sources of tiles offline, and records the requests."""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, tiles, order):
+        self.requests.append(list(tiles))
+        subpixels = 4 ** (SOURCE_ORDER - order)
+        pixels = np.concatenate(
+            [
+                np.arange(tile * subpixels, (tile + 1) * subpixels, SOURCE_STEP)
+                for tile in tiles
+            ]
+        )
+        ra, dec = hp.pix2ang(2**SOURCE_ORDER, pixels, nest=True, lonlat=True)
+        sources = np.zeros(len(pixels), dtype=GAIA_TILE_DTYPE)
+        sources["source_id"] = (pixels << 35) + 7
+        sources["ra"] = ra
+        sources["dec"] = dec
+        sources["ref_epoch"] = 2016.0
+        sources["phot_rp_mean_mag"] = 15 + pixels % 7
+        sources["parallax"] = 1.0
+        return sources
+
+
+def test_tile_source_id_range():
+    pixel = 123456789  # order 12
+    source_id = (pixel << 35) + 42
+    tile = source_id_to_tile(source_id, order=8)
+    assert tile == pixel >> 8
+    first, last = tile_source_id_range(tile, order=8)
+    assert first <= source_id <= last
+    assert source_id_to_tile(first, order=8) == source_id_to_tile(last, order=8)
+    assert source_id_to_tile(last + 1, order=8) == tile + 1
+
+
+def test_cone_search_is_served_from_disk(tmp_path):
+    fixture = FixtureTiles()
+    cache = GaiaTileCache(tmp_path, fetch=fixture)
+    ra, dec, radius = 150.0, 2.2, 5 / 60
+
+    sources = cache.cone_search(ra, dec, radius)
+    assert len(fixture.requests) == 1
+    assert len(sources) > 0
+    assert sources["ra"].unit == u.deg
+
+    # distances are correct, and every fixture source in the cone is returned
+    center = SkyCoord(ra * u.deg, dec * u.deg)
+    separation = center.separation(
+        SkyCoord(sources["ra"].quantity, sources["dec"].quantity)
+    ).deg
+    npt.assert_allclose(sources["dist"], separation, atol=1e-9)
+    assert (separation <= radius).all()
+    everything = fixture(fixture.requests[0], 8)
+    in_cone = (
+        center.separation(SkyCoord(everything["ra"] * u.deg, everything["dec"] * u.deg))
+        <= radius * u.deg
+    )
+    assert sorted(sources["source_id"]) == sorted(everything["source_id"][in_cone])
+
+    # the same field, or a new process, do not query again
+    n_requests = len(fixture.requests)
+    cache.cone_search(ra + 1 / 60, dec, radius)
+    GaiaTileCache(tmp_path, fetch=fixture).cone_search(ra, dec, radius)
+    assert len(fixture.requests) == n_requests
+
+
+def test_prefetch_fetches_each_tile_once(tmp_path):
+    fixture = FixtureTiles()
+    cache = GaiaTileCache(tmp_path, fetch=fixture)
+    rng = np.random.default_rng(0)
+    # many targets, some of them in the same fields
+    positions = [(ra, dec) for ra, dec in rng.uniform([10, -30], [40, 30], (50, 2))]
+    positions += positions[:10]
+
+    n_tiles = cache.prefetch(positions, 2 / 60)
+    fetched = [tile for request in fixture.requests for tile in request]
+    assert len(fetched) == len(set(fetched)) == n_tiles
+    assert all(len(request) <= 20 for request in fixture.requests)
+
+    n_requests = len(fixture.requests)
+    for ra, dec in positions:
+        cache.cone_search(ra, dec, 2 / 60)
+    assert len(fixture.requests) == n_requests
+
+
+def test_expired_tiles_are_fetched_again(tmp_path):
+    fixture = FixtureTiles()
+    cache = GaiaTileCache(tmp_path, max_age=3600, fetch=fixture)
+    cache.cone_search(0.5, 0.5, 1 / 60)
+    cache.cone_search(0.5, 0.5, 1 / 60)
+    assert len(fixture.requests) == 1
+
+    old = time.time() - 7200
+    for path in (tmp_path / "8").iterdir():
+        os.utime(path, (old, old))
+    cache.cone_search(0.5, 0.5, 1 / 60)
+    assert len(fixture.requests) == 2
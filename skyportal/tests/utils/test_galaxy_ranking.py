@@ -0,0 +1,58 @@
+import numpy as np
+from scipy.stats import norm
+
+from skyportal.utils.galaxy_ranking import (
+    TILE_PIXEL_AREA,
+    galaxy_probability,
+    tile_cumulative_probability,
+)
+
+
+def test_tile_cumulative_probability():
+    # four tiles, two of them with the same probability density
+    lower = np.array([0, 4, 8, 12])
+    upper = np.array([4, 8, 12, 20])
+    probdensity = np.array([1.0, 3.0, 1.0, 2.0])
+    prob = probdensity * (upper - lower) * TILE_PIXEL_AREA
+
+    cum_prob = tile_cumulative_probability(lower, upper, probdensity)
+
+    assert np.allclose(
+        cum_prob,
+        [
+            prob.sum(),
+            prob[1],
+            prob.sum(),
+            prob[1] + prob[3],
+        ],
+    )
+
+
+def test_tile_cumulative_probability_sums_to_one():
+    # whole sky at order 0, uniform
+    lower = np.arange(12) * 4**29
+    upper = lower + 4**29
+    probdensity = np.full(12, 1 / (4 * np.pi))
+
+    cum_prob = tile_cumulative_probability(lower, upper, probdensity)
+
+    assert np.allclose(cum_prob, 1.0)
+
+
+def test_galaxy_probability():
+    probdensity = np.array([1.0, 2.0])
+    distmpc = np.array([100.0, np.nan])
+    distmu = np.array([90.0, 90.0])
+    distsigma = np.array([20.0, 20.0])
+    distnorm = np.array([1e-4, 1e-4])
+
+    probability = galaxy_probability(probdensity, distmpc, distmu, distsigma, distnorm)
+
+    assert np.isclose(probability[0], 1.0 * 1e-4 * norm(90.0, 20.0).pdf(100.0))
+    assert np.isnan(probability[1])
+
+    # pixel probability at nside 512 for 2D localizations
+    assert np.allclose(
+        galaxy_probability(probdensity),
+        probdensity * 4 * np.pi / (12 * 512**2),
+    )
@@ -0,0 +1,125 @@
+import numpy as np
+from astroplan import FixedTarget, Observer, ObservingBlock
+from astroplan.constraints import (
+    AirmassConstraint,
+    AltitudeConstraint,
+    AtNightConstraint,
+    HourAngleConstraint,
+)
+from astropy import units as u
+from astropy.coordinates import EarthLocation, SkyCoord
+from astropy.time import Time
+
+from skyportal.utils.grid_scheduler import grid_schedule, target_scores
+
+observer = Observer(
+    location=EarthLocation.from_geodetic(
+        -116.8650 * u.deg, 33.3563 * u.deg, 1712 * u.m
+    ),
+    name="P48",
+)
+# a night at Palomar, Jan 15 2024
+start = Time("2024-01-15T01:00:00")
+end = Time("2024-01-15T14:00:00")
+
+
+def make_block(name, ra, dec, priority, exposure=300, filt="r"):
+    target = FixedTarget(SkyCoord(ra * u.deg, dec * u.deg), name=name)
+    return ObservingBlock.from_exposures(
+        target,
+        priority,
+        exposure * u.s,
+        1,
+        10 * u.s,
+        configuration={"filter": filt},
+    )
+
+
+def test_scores_match_astroplan_constraints():
+    ra = np.array([60.0, 120.0, 200.0, 280.0])
+    dec = np.array([30.0, -10.0, 60.0, 0.0])
+    times = start + np.linspace(0, 13, 40) * u.hour
+    scores = target_scores(
+        ra,
+        dec,
+        np.zeros(len(ra), dtype=bool),
+        observer,
+        times,
+        min_moon_separation=0,
+    )
+
+    targets = [FixedTarget(SkyCoord(r * u.deg, d * u.deg)) for r, d in zip(ra, dec)]
+    expected = np.ones((len(ra), len(times)))
+    for constraint in [
+        AirmassConstraint(max=2.50, boolean_constraint=False),
+        AltitudeConstraint(20 * u.deg, 90 * u.deg),
+        AtNightConstraint.twilight_nautical(),
+        HourAngleConstraint(min=-5.5, max=5.5),
+    ]:
+        expected *= constraint(observer, targets, times=times)
+
+    # both observable or not, except right at the edges of the constraints
+    assert np.mean((scores > 0) == (expected > 0)) > 0.95
+    both = (scores > 0) & (expected > 0)
+    np.testing.assert_allclose(scores[both], expected[both], atol=0.02)
+
+
+def test_grid_schedule():
+    blocks = [
+        make_block("low", 100.0, 20.0, priority=10),
+        make_block("high", 101.0, 20.0, priority=1, filt="g"),
+        make_block("south", 120.0, -20.0, priority=5),
+        # never rises above the altitude limit at Palomar
+        make_block("never", 100.0, -80.0, priority=1),
+    ]
+    scheduled = grid_schedule(blocks, [False] * len(blocks), observer, start, end)
+    names = [block.target.name for block, _ in scheduled]
+    assert "never" not in names
+    assert set(names) == {"low", "high", "south"}
+
+    starts = [block_start for _, block_start in scheduled]
+    assert starts == sorted(starts)
+    for (block, block_start), (next_block, next_start) in zip(
+        scheduled[:-1], scheduled[1:]
+    ):
+        gap = (next_start - block_start).to(u.s) - block.duration
+        separation = block.target.coord.separation(next_block.target.coord)
+        transition = separation / (2 * u.deg / u.s)
+        if block.configuration["filter"] != next_block.configuration["filter"]:
+            transition += 10 * u.s
+        assert gap >= transition
+
+    scores = target_scores(
+        [block.target.ra.deg for block, _ in scheduled],
+        [block.target.dec.deg for block, _ in scheduled],
+        [False] * len(scheduled),
+        observer,
+        Time(starts),
+    )
+    assert np.all(np.diag(scores) > 0)
+
+
+def test_grid_schedule_by_priority():
+    # only one of them fits in a short window
+    window_end = start + 3.5 * u.hour
+    window_start = window_end - 6 * u.min
+    blocks = [
+        make_block("low", 40.0, 30.0, priority=10),
+        make_block("high", 41.0, 30.0, priority=1),
+    ]
+    scheduled = grid_schedule(
+        blocks, [False, False], observer, window_start, window_end
+    )
+    assert [block.target.name for block, _ in scheduled] == ["high"]
+
+    assert grid_schedule([], [], observer, start, end) == []
+
+
+def test_grid_schedule_zero_duration():
+    target = FixedTarget(SkyCoord(100.0 * u.deg, 20.0 * u.deg), name="zero")
+    blocks = [
+        ObservingBlock(target, 0 * u.s, 1, configuration={"filter": "r"}),
+        make_block("other", 101.0, 20.0, priority=2),
+    ]
+    scheduled = grid_schedule(blocks, [False, False], observer, start, end)
+    assert {block.target.name for block, _ in scheduled} == {"zero", "other"}
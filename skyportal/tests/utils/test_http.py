@@ -0,0 +1,66 @@
+import socket
+
+import pytest
+import requests
+
+from baselayer.app.env import load_env
+from skyportal.utils.http import (
+    FacilityBusyError,
+    FacilityClient,
+    get_facility_client,
+)
+
+_, cfg = load_env()
+
+
+def test_requests_are_counted():
+    client = FacilityClient("test_server")
+    url = f"http://localhost:{cfg['test_server.port']}/not/a/test/route"
+    for _ in range(3):
+        response = client.get(url)
+        # 500 is not a retried status
+        assert response.status_code == 500
+        assert response.text == "Could not find test route redirect"
+
+    metrics = client.get_metrics()
+    assert metrics["requests"] == 3
+    assert metrics["errors"] == 0
+    assert metrics["statuses"] == {"5xx": 3}
+    assert sum(metrics["latency_histogram"].values()) == 3
+    assert metrics["latency_sum"] > 0
+
+
+def test_connection_errors_are_counted():
+    # a port with nothing listening on it
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        port = s.getsockname()[1]
+
+    client = FacilityClient("closed", max_retries=0, connect_timeout=1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get(f"http://localhost:{port}/")
+
+    metrics = client.get_metrics()
+    assert metrics["requests"] == 1
+    assert metrics["errors"] == 1
+    assert metrics["statuses"] == {}
+
+
+def test_busy_facility_with_no_timeout():
+    client = FacilityClient(
+        "busy", max_concurrent_requests=1, connect_timeout=0.1, max_retries=0
+    )
+    url = f"http://localhost:{cfg['test_server.port']}/not/a/test/route"
+    # the only slot is taken: an explicit timeout=None must not wait forever
+    client._slots.acquire()
+    try:
+        with pytest.raises(FacilityBusyError):
+            client.get(url, timeout=None)
+    finally:
+        client._slots.release()
+    assert client.get_metrics()["errors"] == 1
+
+
+def test_clients_are_shared_per_facility():
+    assert get_facility_client("ztf") is get_facility_client("ztf")
+    assert get_facility_client("ztf") is not get_facility_client("lco")
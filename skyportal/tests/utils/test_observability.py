@@ -0,0 +1,64 @@
+import numpy as np
+from astropy.time import Time
+
+from skyportal.utils.calculations import get_airmass, get_observer
+from skyportal.utils.observability import (
+    TWILIGHT_EVENTS,
+    compute_twilight_table,
+    next_event,
+    night_airmass,
+)
+
+
+def test_twilight_table_matches_astroplan():
+    observer = get_observer({"lon": -116.8650, "lat": 33.3563, "elevation": 1712})
+    table = compute_twilight_table(observer, 2024)
+    assert set(TWILIGHT_EVENTS) <= set(table)
+    # about one event of each kind per day
+    assert all(360 < len(table[event]) < 375 for event in TWILIGHT_EVENTS)
+
+    for date in ["2024-01-01T00:00:00", "2024-06-21T12:00:00", "2024-12-31T20:00:00"]:
+        time = Time(date)
+        for event, expected in [
+            ("sun_set", observer.sun_set_time(time, which="next")),
+            ("sun_rise", observer.sun_rise_time(time, which="next")),
+            (
+                "twilight_evening_astronomical",
+                observer.twilight_evening_astronomical(time, which="next"),
+            ),
+            (
+                "twilight_morning_nautical",
+                observer.twilight_morning_nautical(time, which="next"),
+            ),
+        ]:
+            assert abs(next_event(table, event, time.unix) - expected.unix) < 60
+
+
+def test_no_sunset_during_polar_day():
+    observer = get_observer({"lon": 15.6, "lat": 78.2, "elevation": 0})
+    table = compute_twilight_table(observer, 2024)
+    sunsets = Time(table["sun_set"], format="unix")
+    assert not any(sunset.datetime.month == 6 for sunset in sunsets)
+    assert (
+        next_event(table, "sun_set", Time("2024-06-01").unix) > Time("2024-08-01").unix
+    )
+
+
+def test_night_airmass():
+    fields = [
+        {"ra": 30, "dec": 45, "field_id": 1},
+        {"ra": 145, "dec": 45, "field_id": 2},
+    ]
+    observer = get_observer({"lon": 30, "lat": 45, "elevation": 100})
+    nights = [
+        (Time("2024-01-01T16:00:00").unix, Time("2024-01-02T04:00:00").unix),
+        (Time("2024-03-01T17:00:00").unix, Time("2024-03-02T03:00:00").unix),
+    ]
+    times, airmass = night_airmass(fields, observer, nights, sample_size=10)
+    assert times.shape == (2, 10)
+    assert airmass.shape == (2, 2, 10)
+    np.testing.assert_allclose(times[:, 0], [night[0] for night in nights])
+    np.testing.assert_allclose(times[:, -1], [night[1] for night in nights])
+
+    expected = get_airmass(fields, Time(times[1], format="unix"), observer=observer)
+    np.testing.assert_allclose(airmass[:, 1], expected)
@@ -0,0 +1,31 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from skyportal.utils.observation_animation import encode_movie, field_alphas
+
+
+def test_field_alphas():
+    alphas = field_alphas(20, 10, decay=4, alpha_cutoff=0.1)
+    # the current and following fields are opaque
+    assert np.all(alphas[10:] == 1)
+    # the previous ones fade out, until they are not drawn
+    assert np.isclose(alphas[9], np.exp(-1 / 4))
+    assert np.all(np.diff(alphas[:11]) >= 0)
+    assert np.all(alphas[:1] == 0)
+
+    assert np.all(field_alphas(5, 2, decay=0, alpha_default=0.5) == 0.5)
+
+
+def test_encode_gif():
+    frames = []
+    for color in ["red", "green", "blue"]:
+        buf = io.BytesIO()
+        Image.new("RGBA", (20, 10), color).save(buf, format="png")
+        frames.append(buf.getvalue())
+
+    movie = Image.open(io.BytesIO(encode_movie(frames, output_format="gif")))
+    assert movie.format == "GIF"
+    assert movie.size == (20, 10)
+    assert movie.n_frames == 3
@@ -0,0 +1,183 @@
+import threading
+import time
+
+from skyportal.utils.ordered_consumer import OrderedConsumer, StageMetrics
+
+
+class FakeMessage:
+    def __init__(self, key, offset, partition=0, delay=0.0):
+        self.key = key
+        self.delay = delay
+        self._offset = offset
+        self._partition = partition
+
+    def topic(self):
+        return "gcn.notices.test"
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+
+def make_consumer(**kwargs):
+    processed, committed = [], []
+    lock = threading.Lock()
+
+    def process(message, metrics):
+        with metrics.time("sleep"):
+            time.sleep(message.delay)
+        with lock:
+            processed.append((message.key, message.offset()))
+
+    consumer = OrderedConsumer(
+        lambda message: (message.key, message),
+        process,
+        lambda message: committed.append((message.partition(), message.offset())),
+        retry_delay=0,
+        log=lambda *args: None,
+        **kwargs,
+    )
+    return consumer, processed, committed
+
+
+def test_messages_with_same_key_are_processed_in_order():
+    # the first message of each event is the slowest
+    messages = [
+        FakeMessage(key, offset, delay=0.05 if offset < 3 else 0.0)
+        for offset, key in enumerate(["a", "b", "c"] * 5)
+    ]
+    consumer, processed, committed = make_consumer(max_workers=4)
+    consumer.run([messages[:7], messages[7:]])
+    consumer.shutdown()
+
+    assert len(processed) == len(messages)
+    for key in "abc":
+        offsets = [offset for k, offset in processed if k == key]
+        assert offsets == sorted(offsets)
+    # everything is committed, and never beyond an unprocessed message
+    assert committed[-1] == (0, len(messages) - 1)
+    assert [offset for _, offset in committed] == sorted(
+        offset for _, offset in committed
+    )
+
+
+def test_offsets_are_committed_after_processing():
+    release = threading.Event()
+    consumer = OrderedConsumer(
+        lambda message: (message.key, message),
+        lambda message, metrics: message.key == "slow" and release.wait(5),
+        lambda message: committed.append(message.offset()),
+        log=lambda *args: None,
+    )
+    committed = []
+    consumer.submit(FakeMessage("slow", 0))
+    consumer.submit(FakeMessage("fast", 1))
+    time.sleep(0.1)
+    consumer.commit_ready()
+    # the fast message is processed, but the slow one before it is not
+    assert committed == []
+
+    release.set()
+    consumer.join()
+    assert committed == [1]
+    consumer.shutdown()
+
+
+def test_skipped_and_failed_messages():
+    attempts = []
+
+    def process(message, metrics):
+        attempts.append(message.offset())
+        raise ValueError("failed")
+
+    metrics = StageMetrics()
+    consumer = OrderedConsumer(
+        lambda message: None if message.key is None else (message.key, message),
+        process,
+        lambda message: committed.append(message.offset()),
+        max_retries=2,
+        retry_delay=0,
+        metrics=metrics,
+        log=lambda *args: None,
+    )
+    committed = []
+    consumer.run([[FakeMessage(None, 0), FakeMessage("a", 1), FakeMessage("b", 2)]])
+    consumer.shutdown()
+
+    assert sorted(attempts) == [1, 1, 1, 2, 2, 2]
+    # without dead_letter, the failed messages are dropped and committed
+    assert committed[-1] == 2
+    summary = metrics.summary()
+    assert summary["counters"] == {"retried": 4, "failed": 2, "dropped": 2}
+    assert summary["stages"]["prepare"]["count"] == 3
+    assert summary["stages"]["process"]["count"] == 6
+
+
+def test_failed_messages_are_dead_lettered_and_committed():
+    dead_letters = []
+    dead_letter_attempts = []
+
+    def dead_letter(message, error):
+        dead_letter_attempts.append(message.offset())
+        if message.key == "unrecordable":
+            raise ValueError("could not record")
+        dead_letters.append((message.offset(), str(error)))
+
+    def prepare(message):
+        if message.key == "unparsable":
+            raise ValueError("could not parse")
+        return message.key, message
+
+    def process(message, metrics):
+        if message.key != "ok":
+            raise ValueError("failed")
+
+    metrics = StageMetrics()
+    consumer = OrderedConsumer(
+        prepare,
+        process,
+        lambda message: committed.append((message.partition(), message.offset())),
+        max_retries=1,
+        retry_delay=0,
+        dead_letter=dead_letter,
+        metrics=metrics,
+        log=lambda *args: None,
+    )
+    committed = []
+    consumer.run(
+        [
+            [
+                FakeMessage("unparsable", 0),
+                FakeMessage("failing", 1),
+                FakeMessage("ok", 2),
+                FakeMessage("unrecordable", 0, partition=1),
+                FakeMessage("ok", 1, partition=1),
+            ]
+        ]
+    )
+    consumer.shutdown()
+
+    assert sorted(dead_letters) == [(0, "could not parse"), (1, "failed")]
+    # the recording of a failed message is retried, then the message is
+    # dropped without blocking the commits of its partition
+    assert sorted(dead_letter_attempts) == [0, 0, 0, 1]
+    assert sorted(committed)[-1] == (1, 1)
+    assert (0, 2) in committed
+    assert metrics.summary()["counters"]["dead_lettered"] == 2
+    assert metrics.summary()["counters"]["dropped"] == 1
+    # committed partitions are not tracked anymore
+    assert consumer._offsets == {}
+
+
+def test_stage_metrics():
+    metrics = StageMetrics(max_samples=3)
+    for duration in [4.0, 1.0, 2.0, 3.0]:
+        metrics.record("stage", duration)
+    stage = metrics.summary()["stages"]["stage"]
+    # only the 3 most recent samples are kept, but all are counted
+    assert stage["count"] == 4
+    assert stage["max"] == 3.0
+    assert stage["p50"] == 2.0
+    assert stage["mean"] == 2.0
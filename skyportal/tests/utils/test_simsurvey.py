@@ -0,0 +1,42 @@
+import numpy as np
+
+from skyportal.utils.simsurvey import merge_shards, shard_injections
+
+
+def test_shard_injections():
+    shards = shard_injections(1001, 250, seed=7)
+    assert [size for size, _ in shards] == [201, 200, 200, 200, 200]
+    # the seeds only depend on the seed of the run
+    assert shards == shard_injections(1001, 250, seed=7)
+    assert shards != shard_injections(1001, 250, seed=8)
+    assert len({seed for _, seed in shards}) == len(shards)
+    assert [size for size, _ in shard_injections(10, 250, seed=7)] == [10]
+
+
+def test_merge_shards():
+    shards = [
+        {
+            "lcs": [np.zeros(3)],
+            "meta": {"z": np.array([0.1]), "idx_orig": np.array([1])},
+            "meta_rejected": None,
+            "meta_notobserved": {"z": np.array([0.2, 0.3]), "idx_orig": [0, 2]},
+            "stats": {"p_det": np.array([1.0]), "mag_max": {"ztfg": [19.0]}},
+            "side": {"threshold": 5},
+        },
+        {
+            "lcs": None,
+            "meta": None,
+            "meta_rejected": {"z": np.array([0.4]), "idx_orig": np.array([0])},
+            "meta_notobserved": {"z": np.array([0.5]), "idx_orig": [1]},
+            "stats": None,
+            "side": {"threshold": 5},
+        },
+    ]
+    merged = merge_shards(shards, [3, 2])
+    assert len(merged["lcs"]) == 1
+    np.testing.assert_array_equal(merged["meta_notobserved"]["z"], [0.2, 0.3, 0.5])
+    # the indices of the second shard follow those of the first one
+    np.testing.assert_array_equal(merged["meta_notobserved"]["idx_orig"], [0, 2, 4])
+    np.testing.assert_array_equal(merged["meta_rejected"]["idx_orig"], [3])
+    np.testing.assert_array_equal(merged["stats"]["mag_max"]["ztfg"], [19.0])
+    assert merged["side"] == {"threshold": 5}
@@ -0,0 +1,60 @@
+import uuid
+from types import SimpleNamespace
+
+from skyportal.utils.source_snapshots import (
+    get_snapshot_key,
+    invalidate_source_snapshots,
+    load_source_snapshot,
+    save_source_snapshot,
+    source_snapshot_stats,
+)
+
+
+def make_user(user_id, group_ids, is_admin=False):
+    return SimpleNamespace(
+        id=user_id,
+        is_admin=is_admin,
+        permissions=["Upload data"],
+        accessible_groups=[SimpleNamespace(id=gid) for gid in group_ids],
+        accessible_streams=[],
+    )
+
+
+def test_snapshot_hit_and_invalidation():
+    obj_key = str(uuid.uuid4())
+    user = make_user(1, [1, 2])
+    options = {"include_photometry": True}
+
+    key = get_snapshot_key(obj_key, user, options)
+    assert load_source_snapshot(key) is None
+
+    save_source_snapshot(key, {"id": "ZTF_snapshot", "comments": []})
+    assert get_snapshot_key(obj_key, user, options) == key
+    assert load_source_snapshot(key)["id"] == "ZTF_snapshot"
+
+    invalidate_source_snapshots(obj_key)
+    new_key = get_snapshot_key(obj_key, user, options)
+    assert new_key != key
+    assert load_source_snapshot(new_key) is None
+
+    stats = source_snapshot_stats()
+    assert stats["hits"] >= 1
+    assert stats["invalidations"] >= 1
+
+
+def test_snapshot_key_depends_on_permissions_and_options():
+    obj_key = str(uuid.uuid4())
+    options = {"include_photometry": True}
+
+    key = get_snapshot_key(obj_key, make_user(1, [1, 2]), options)
+    assert get_snapshot_key(obj_key, make_user(1, [1]), options) != key
+    assert get_snapshot_key(obj_key, make_user(2, [1, 2]), options) != key
+    assert (
+        get_snapshot_key(obj_key, make_user(1, [1, 2]), {"include_photometry": False})
+        != key
+    )
+
+    # admins all read the same rows, so they share their snapshots
+    assert get_snapshot_key(
+        obj_key, make_user(1, [1], is_admin=True), options
+    ) == get_snapshot_key(obj_key, make_user(2, [3], is_admin=True), options)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from skyportal.utils.spatial_catalog import (
+    catalog_entries,
+    entry_skymap,
+    entry_skymaps,
+)
+
+
+def test_catalog_entries():
+    entries = catalog_entries(
+        {
+            "name": ["a", "b"],
+            "ra": [1.0, 2.0],
+            "dec": [3.0, 4.0],
+            "amaj": [0.1, 0.2],
+            "amin": [0.1, 0.1],
+            "phi": [0.0, 45.0],
+        }
+    )
+    assert entries == [
+        {"name": "a", "ra": 1.0, "dec": 3.0, "amaj": 0.1, "amin": 0.1, "phi": 0.0},
+        {"name": "b", "ra": 2.0, "dec": 4.0, "amaj": 0.2, "amin": 0.1, "phi": 45.0},
+    ]
+
+    with pytest.raises(ValueError, match="Could not disambiguate keys"):
+        catalog_entries({"name": ["a"], "ra": [1.0], "dec": [3.0]})
+
+
+def test_entry_skymaps(monkeypatch):
+    # use the process pool even for a few entries
+    monkeypatch.setattr("skyportal.utils.spatial_catalog.SKYMAP_CHUNK_SIZE", 1)
+    entries = catalog_entries(
+        {
+            "name": [f"source {i}" for i in range(3)],
+            "ra": [10.0, 20.0, 30.0],
+            "dec": [-5.0, 0.0, 5.0],
+            "radius": [0.01, 0.02, 0.03],
+        }
+    )
+    skymaps = entry_skymaps(entries, n_processes=2)
+
+    assert [skymap["entry_name"] for skymap in skymaps] == [
+        "source-0",
+        "source-1",
+        "source-2",
+    ]
+    for entry, skymap in zip(entries, skymaps):
+        assert skymap["data"] == {
+            "ra": entry["ra"],
+            "dec": entry["dec"],
+            "radius": entry["radius"],
+        }
+        assert skymap["uniq"].dtype == np.int64
+        assert len(skymap["uniq"]) == len(skymap["probdensity"])
+        # same sky map as the serial computation
+        expected = entry_skymap(entry)
+        np.testing.assert_array_equal(skymap["uniq"], expected["uniq"])
+
+
+def test_ellipse_entry_names():
+    entries = catalog_entries(
+        {
+            "name": ["circle", "ellipse"],
+            "ra": [1.0, 2.0],
+            "dec": [3.0, 4.0],
+            "amaj": [0.1, 0.2],
+            "amin": [0.1, 0.1],
+            "phi": [0.0, 45.0],
+        }
+    )
+    # circular ellipses are named after their cone, as they always were
+    assert [entry_skymap(entry)["entry_name"] for entry in entries] == [
+        "1.00000_3.00000_0.10000",
+        "ellipse",
+    ]
@@ -0,0 +1,92 @@
+import os
+
+import sqlalchemy as sa
+
+from skyportal.models import DBSession, Obj, TNSCatalogObject
+from skyportal.tests.fixtures import ObjFactory
+from skyportal.utils.tns_catalog import (
+    crossmatch_tns_catalog,
+    ingest_tns_public_objects,
+    read_tns_public_objects,
+    tns_name_takes_precedence,
+)
+
+fixture_path = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)),
+    "data",
+    "tns_public_objects_sample.csv",
+)
+
+
+def test_read_tns_public_objects():
+    df = read_tns_public_objects(fixture_path)
+    assert len(df) == 4
+    assert list(df["name"]) == ["2024aaa", "2024aab", "2024aac", "2024aad"]
+    assert df.loc[0, "name_prefix"] == "SN"
+
+
+def test_tns_name_takes_precedence():
+    # no current name
+    assert tns_name_takes_precedence(10.0, 10.0, None, None, "AT 2024aaa", 10.0, 10.0)
+    # same name
+    assert not tns_name_takes_precedence(
+        10.0, 10.0, "AT 2024aaa", None, "AT 2024aaa", 10.0, 10.0
+    )
+
+    # closest TNS object wins
+    current_info = {"radeg": 10.0, "decdeg": 10.0002}
+    assert tns_name_takes_precedence(
+        10.0, 10.0, "SN 2024aaa", current_info, "AT 2024aab", 10.0, 10.0001
+    )
+    assert not tns_name_takes_precedence(
+        10.0, 10.0, "AT 2024aaa", current_info, "SN 2024aab", 10.0, 10.0003
+    )
+
+    # SN over AT, for the same TNS object or without coordinates
+    current_info = {"radeg": 10.0, "decdeg": 10.0001}
+    assert tns_name_takes_precedence(
+        10.0, 10.0, "AT 2024aaa", current_info, "SN 2024aaa", 10.0, 10.0001
+    )
+    assert not tns_name_takes_precedence(
+        10.0, 10.0, "SN 2024aaa", current_info, "AT 2024aaa", 10.0, 10.0001
+    )
+    assert not tns_name_takes_precedence(
+        10.0, 10.0, "SN 2024aaa", None, "AT 2024aab", 10.0, 10.0
+    )
+
+
+def test_tns_catalog_crossmatch(public_group):
+    df = read_tns_public_objects(fixture_path)
+
+    # within 1 arcsec of 2024aad, and far from any catalog object
+    matched_obj = ObjFactory(groups=[public_group], ra=300.0002, dec=-60.0001)
+    unmatched_obj = ObjFactory(groups=[public_group], ra=299.9, dec=-60.0)
+
+    session = DBSession()
+    ingest_tns_public_objects(df, session)
+    tns_obj = session.scalar(
+        sa.select(TNSCatalogObject).where(TNSCatalogObject.name == "2024aad")
+    )
+    assert tns_obj.tns_name == "SN 2024aad"
+
+    # re-ingesting an unchanged catalog doesn't update anything
+    assert ingest_tns_public_objects(df, session) == 0
+
+    stats = crossmatch_tns_catalog(session, refresh=False)
+    assert stats["n_updated"] >= 1
+
+    session.expire_all()
+    obj = session.scalar(sa.select(Obj).where(Obj.id == matched_obj.id))
+    assert obj.tns_name == "SN 2024aad"
+    assert obj.tns_info["objname"] == "2024aad"
+    assert float(obj.tns_info["radeg"]) == 300.0
+
+    obj = session.scalar(sa.select(Obj).where(Obj.id == unmatched_obj.id))
+    assert obj.tns_name is None
+
+    # running the crossmatch again doesn't update the same objects twice
+    stats = crossmatch_tns_catalog(session, refresh=False)
+    assert stats["n_updated"] == 0
+
+    ObjFactory.teardown(matched_obj)
+    ObjFactory.teardown(unmatched_obj)
@@ -0,0 +1,175 @@
+import numpy as np
+
+from skyportal.utils.watch_list import (
+    angular_separation,
+    group_watched_positions,
+    search_watched_positions,
+)
+
+
+class LocalAlertDatabase:
+    """In-memory stand-in for the alert database, answering (multi-)cone
+    searches and counting the queries."""
+
+    def __init__(self, alerts):
+        self.alerts = alerts
+        self.queries = []
+
+    def _search(self, coordinates, radius, program_id_selector, filter):
+        self.queries.append(len(coordinates))
+        results = []
+        for alert in self.alerts:
+            candidate = alert["candidate"]
+            if alert["programid"] not in program_id_selector:
+                continue
+            if candidate["jd"] < filter.get("candidate.jd", {}).get("$gte", 0):
+                continue
+            if "candidate.magpsf" in filter and not (
+                candidate["magpsf"] < filter["candidate.magpsf"]["$lt"]
+            ):
+                continue
+            if any(
+                angular_separation(ra, dec, candidate["ra"], candidate["dec"])
+                <= radius / 3600.0
+                for ra, dec in coordinates
+            ):
+                results.append(
+                    {
+                        "objectId": alert["objectId"],
+                        "candidate": {
+                            key: candidate[key] for key in ["jd", "ra", "dec"]
+                        },
+                    }
+                )
+        return results
+
+    def get_alerts_by_positions(
+        self, coordinates, radius, unit, program_id_selector, filter=None, **kwargs
+    ):
+        return self._search(coordinates, radius, program_id_selector, filter or {})
+
+    def get_alerts_by_position(
+        self, ra, dec, radius, unit, program_id_selector, filter=None, **kwargs
+    ):
+        return self._search([(ra, dec)], radius, program_id_selector, filter or {})
+
+
+def make_alert(object_id, ra, dec, jd, programid=1, magpsf=18.0):
+    return {
+        "objectId": object_id,
+        "programid": programid,
+        "candidate": {"ra": ra, "dec": dec, "jd": jd, "magpsf": magpsf},
+    }
+
+
+def make_position(id, ra, dec, since=2460000.0, selector=(1,), filter=None):
+    return {
+        "id": id,
+        "ra": ra,
+        "dec": dec,
+        "arcsec": 5.0,
+        "filter": filter or {},
+        "program_id_selector": set(selector),
+        "since": since,
+    }
+
+
+def test_angular_separation():
+    assert np.isclose(angular_separation(10.0, 20.0, 10.0, 21.0), 1.0)
+    assert np.isclose(angular_separation(359.9995, 0.0, 0.0005, 0.0), 0.001)
+    assert np.isclose(angular_separation(0.0, 90.0, 180.0, 89.0), 1.0)
+
+
+def test_positions_are_grouped_by_permissions_filter_and_radius():
+    positions = [
+        make_position(1, 10.0, 10.0),
+        make_position(2, 20.0, 10.0, selector=(1,)),
+        make_position(3, 30.0, 10.0, selector=(1, 2)),
+        make_position(4, 40.0, 10.0, selector=(2, 1)),
+        make_position(5, 50.0, 10.0, filter={"candidate.magpsf": {"$lt": 19}}),
+    ]
+    groups = group_watched_positions(positions)
+    assert sorted(
+        sorted(position["id"] for position in group) for group in groups.values()
+    ) == [[1, 2], [3, 4], [5]]
+
+
+def test_search_batches_queries_and_matches_alerts_locally():
+    database = LocalAlertDatabase(
+        [
+            # 1 arcsec from position 1
+            make_alert("ZTF1", 10.0, 10.0 + 1 / 3600, 2460001.0),
+            # 10 arcsec from position 1, outside its cone
+            make_alert("ZTF2", 10.0, 10.0 + 10 / 3600, 2460001.0),
+            # near position 2, but older than its last candidates
+            make_alert("ZTF3", 20.0, 10.0, 2460001.0),
+            # near position 3, from a stream its owner has no access to
+            make_alert("ZTF4", 30.0, 10.0, 2460001.0, programid=2),
+            # near positions 1 and 4, which share the same query
+            make_alert("ZTF5", 10.0, 10.0, 2460002.0),
+            # near position 5, with and without passing its filter
+            make_alert("ZTF6", 50.0, 10.0, 2460001.0, magpsf=18.5),
+            make_alert("ZTF7", 50.0, 10.0, 2460001.0, magpsf=19.5),
+        ]
+    )
+    positions = [
+        make_position(1, 10.0, 10.0),
+        make_position(2, 20.0, 10.0, since=2460001.5),
+        make_position(3, 30.0, 10.0),
+        make_position(4, 10.0, 10.0 + 2 / 3600, since=2460001.5),
+        make_position(5, 50.0, 10.0, filter={"candidate.magpsf": {"$lt": 19}}),
+    ]
+
+    matches = search_watched_positions(
+        positions, get_alerts_by_positions=database.get_alerts_by_positions
+    )
+
+    # one query per group of positions, rather than one per position
+    assert sorted(database.queries) == [1, 4]
+    assert {
+        id: sorted(alert["objectId"] for alert in alerts)
+        for id, alerts in matches.items()
+    } == {
+        1: ["ZTF1", "ZTF5"],
+        2: [],
+        3: [],
+        4: ["ZTF5"],
+        5: ["ZTF6"],
+    }
+
+    # same results with single cone searches, and with smaller batches
+    database.queries = []
+    single_matches = search_watched_positions(
+        positions, get_alerts_by_position=database.get_alerts_by_position
+    )
+    assert len(database.queries) == len(positions)
+    batched_matches = search_watched_positions(
+        positions,
+        get_alerts_by_positions=database.get_alerts_by_positions,
+        max_cones=2,
+    )
+    for other in [single_matches, batched_matches]:
+        assert {
+            id: sorted(alert["objectId"] for alert in alerts)
+            for id, alerts in other.items()
+        } == {
+            id: sorted(alert["objectId"] for alert in alerts)
+            for id, alerts in matches.items()
+        }
+
+
+def test_failed_queries_are_left_out():
+    positions = [
+        make_position(1, 10.0, 10.0),
+        make_position(2, 20.0, 10.0, selector=(1, 2)),
+    ]
+
+    def get_alerts_by_positions(coordinates, *args, **kwargs):
+        if (20.0, 10.0) in coordinates:
+            return None
+        return []
+
+    matches = search_watched_positions(
+        positions, get_alerts_by_positions=get_alerts_by_positions
+    )
+    assert matches == {1: []}
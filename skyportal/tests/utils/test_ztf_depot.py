@@ -0,0 +1,103 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from astropy.time import Time
+
+from skyportal.facility_apis.ztf import aggregate_exposures, get_depot_observations
+
+
+class FakeDepot:
+    """Serves recorded depot files, in place of an authenticated session."""
+
+    def __init__(self, files):
+        self.files = files
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        if url not in self.files:
+            return SimpleNamespace(status_code=404, text="Not Found")
+        content = self.files[url]
+        return SimpleNamespace(
+            status_code=200, text=content, json=lambda: json.loads(content)
+        )
+
+
+def make_night(obsjd, exposure_ids):
+    return [
+        {
+            "exposure_id": int(exposure_id),
+            "field_id": 245,
+            "filter_id": 1 + i % 2,
+            "obsjd": obsjd + i / 1000,
+            "maglim": 20.0 + quadrant / 10,
+            "fwhm": 2.0,
+            "exposure_time": 30,
+            "status": 0 if quadrant < 60 else 1,
+            "filename": f"ztf_{exposure_id}_{quadrant}.fits",
+        }
+        for i, exposure_id in enumerate(exposure_ids)
+        for quadrant in range(64)
+    ]
+
+
+def test_aggregate_exposures():
+    obstable = pd.DataFrame(
+        {
+            "expid": [1, 1, 1, 2],
+            "field": [245, 245, 245, 246],
+            "fid": [2, 2, 2, 1],
+            "maglimit": [20.0, 21.0, 22.0, 19.5],
+            "obsjd": [2460000.5] * 3 + [2460000.6],
+            "name": ["a", "b", "c", "d"],
+        }
+    )
+    exposures = aggregate_exposures(obstable, "expid", "field", "fid")
+
+    assert exposures["observation_id"].tolist() == [1, 2]
+    assert exposures["field"].tolist() == [245, 246]
+    assert exposures["maglimit"].tolist() == [21.0, 19.5]
+    assert exposures["processed_fraction"].tolist() == [3 / 64, 1 / 64]
+    assert exposures["filter"].tolist() == ["ztfr", "ztfg"]
+    assert "name" not in exposures
+
+
+def test_get_depot_observations():
+    depot_url = "https://depot.test/ztf"
+    jd_start = Time("2024-01-01T13:00:00").jd
+    jd_end = jd_start + 3
+    jds = np.arange(np.floor(jd_start), np.ceil(jd_end))
+    dates = [Time(jd, format="jd").datetime.strftime("%Y%m%d") for jd in jds]
+
+    # no file for the second night
+    files = {
+        f"{depot_url}/{dates[0]}/ztf_recentproc_{dates[0]}.json": json.dumps(
+            make_night(jds[0], [100, 101])
+        ),
+        f"{depot_url}/{dates[2]}/ztf_recentproc_{dates[2]}.json": json.dumps(
+            make_night(jds[2], [300])
+        ),
+    }
+    depot = FakeDepot(files)
+    sessions = []
+
+    def make_session():
+        sessions.append(depot)
+        return depot
+
+    obstable = get_depot_observations(
+        1, make_session, depot_url, jd_start, jd_end, max_workers=2
+    )
+    # one session per worker thread
+    assert 1 <= len(sessions) <= 2
+
+    assert f"{depot_url}/{dates[1]}/goodsubs_{dates[1]}.txt" in depot.urls
+    assert sorted(obstable["observation_id"].tolist()) == [100, 101, 300]
+    # only the successfully processed quadrants are counted
+    assert (obstable["processed_fraction"] == 60 / 64).all()
+    assert {"obstime", "limmag", "seeing", "field_id", "filter"} <= set(
+        obstable.columns
+    )
+    assert obstable["target_name"].isna().all()
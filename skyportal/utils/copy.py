@@ -0,0 +1,401 @@
+import datetime
+import io
+import json
+import struct
+
+import numpy as np
+
+from ..models import DBSession
+
+COPY_NULL = "\\N"
+COPY_CHUNK_SIZE = 10000
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+# binary COPY format, see https://www.postgresql.org/docs/current/sql-copy.html
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+PGCOPY_TRAILER = struct.pack(">h", -1)
+POSTGRES_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+BINARY_SCALAR_TYPES = {
+    "int4": ">i4",
+    "int8": ">i8",
+    "float8": ">f8",
+    "timestamp": ">i8",
+}
+BINARY_ARRAY_TYPES = {
+    # element type OID and binary format
+    "int8[]": (20, ">i8"),
+    "float8[]": (701, ">f8"),
+}
+# binary format of the elements, by element type OID
+_BINARY_ARRAY_FORMATS = dict(BINARY_ARRAY_TYPES.values())
+# variable-length types sent as UTF-8 text (jsonb with a version byte)
+BINARY_TEXT_TYPES = {"text", "jsonb"}
+JSONB_VERSION = b"\x01"
+RANGE_LB_INC = 0x02
+
+
+def encode_copy_value(value):
+    """Encode a single value in the text format of COPY.
+
+    None is encoded as NULL, and floating-point NaNs as NaN.
+    """
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, str):
+        return value.translate(_COPY_ESCAPES)
+    if isinstance(value, bool | np.bool_):
+        return "t" if value else "f"
+    if isinstance(value, int | np.integer):
+        return str(int(value))
+    if isinstance(value, float | np.floating):
+        return repr(float(value))
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def encode_copy_column(values, nan_as_null=False):
+    """Encode a column (sequence or numpy array) in the text format of COPY.
+
+    Numeric numpy arrays are encoded without inspecting each value. Their
+    NaNs are encoded as NULL if `nan_as_null`, and as NaN otherwise.
+    """
+    if isinstance(values, np.ndarray):
+        if values.dtype.kind in "iu":
+            return [str(v) for v in values.tolist()]
+        if values.dtype.kind == "f":
+            if nan_as_null:
+                return [COPY_NULL if v != v else repr(v) for v in values.tolist()]
+            return [repr(v) for v in values.tolist()]
+        values = values.tolist()
+    return [encode_copy_value(v) for v in values]
+
+
+class _ChunkReader(io.RawIOBase):
+    """Read-only file-like object over an iterator of strings (or bytes),
+    so that the rows are encoded while they are sent to the database."""
+
+    def __init__(self, chunks, empty=""):
+        self._chunks = chunks
+        self._buffer = empty
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size is None or size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                break
+        if size is None or size < 0:
+            data, self._buffer = self._buffer, ""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _is_scalar(value):
+    return value is None or isinstance(value, str | datetime.date) or np.isscalar(value)
+
+
+def _iter_copy_rows(columns, n_rows, chunk_size, nan_as_null=False):
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        encoded = [
+            [encode_copy_value(values)] * (stop - start)
+            if _is_scalar(values)
+            else encode_copy_column(values[start:stop], nan_as_null=nan_as_null)
+            for values in columns
+        ]
+        yield "".join("\t".join(row) + "\n" for row in zip(*encoded))
+
+
+def copy_columns(
+    table, columns, session=None, chunk_size=COPY_CHUNK_SIZE, nan_as_null=False
+):
+    """Insert rows into a table with COPY ... FROM STDIN.
+
+    The data are given per column, and are encoded and streamed to the
+    database chunk by chunk, without building an intermediate row per record.
+
+    Parameters
+    ----------
+    table : str
+        Name of the table.
+    columns : dict
+        Mapping of column name to values. The values are a sequence or
+        a numpy array with one element per row, or a scalar that is
+        used for every row. None is inserted as NULL.
+    session : `sqlalchemy.orm.session.Session`, optional
+        Database session object, by default DBSession()
+    chunk_size : int, optional
+        Number of rows encoded at once, by default 10000
+    nan_as_null : bool, optional
+        Whether the NaNs of floating-point arrays are inserted as NULL,
+        by default False
+
+    Returns
+    -------
+    int
+        Number of inserted rows.
+    """
+    lengths = {len(v) for v in columns.values() if not _is_scalar(v)}
+    if len(lengths) == 0:
+        raise ValueError("At least one column must contain a sequence of values")
+    if len(lengths) > 1:
+        raise ValueError(f"All columns must have the same length, got {lengths}")
+    n_rows = lengths.pop()
+    if n_rows == 0:
+        return 0
+
+    if session is None:
+        session = DBSession()
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN",
+            _ChunkReader(
+                _iter_copy_rows(list(columns.values()), n_rows, chunk_size, nan_as_null)
+            ),
+        )
+    finally:
+        cursor.close()
+    return n_rows
+
+
+def _binary_timestamps(values):
+    values = np.asarray(values, dtype="datetime64[us]")
+    return (values - POSTGRES_EPOCH).astype(np.int64)
+
+
+def _binary_array(pg_type, values):
+    oid, element_format = BINARY_ARRAY_TYPES[pg_type]
+    values = np.asarray(values)
+    if values.size == 0:
+        payload = struct.pack(">iii", 0, 0, oid)
+    else:
+        elements = np.empty(
+            values.size, dtype=[("length", ">i4"), ("value", element_format)]
+        )
+        elements["length"] = np.dtype(element_format).itemsize
+        elements["value"] = values.ravel()
+        # one dimension, no NULL elements, lower bound of 1
+        payload = struct.pack(">iiiii", 1, 0, oid, values.size, 1) + elements.tobytes()
+    return struct.pack(">i", len(payload)) + payload
+
+
+def _binary_text(pg_type, value):
+    if pg_type == "jsonb":
+        payload = JSONB_VERSION + json.dumps(value).encode()
+    else:
+        payload = value.encode()
+    return struct.pack(">i", len(payload)) + payload
+
+
+def _binary_row_dtype(columns):
+    fields = [("n_fields", ">i2")]
+    for name, (pg_type, _) in columns.items():
+        if pg_type == "int8range":
+            fields += [
+                (f"{name}_length", ">i4"),
+                (f"{name}_flags", "u1"),
+                (f"{name}_lower_length", ">i4"),
+                (f"{name}_lower", ">i8"),
+                (f"{name}_upper_length", ">i4"),
+                (f"{name}_upper", ">i8"),
+            ]
+        else:
+            fields += [
+                (f"{name}_length", ">i4"),
+                (name, BINARY_SCALAR_TYPES[pg_type]),
+            ]
+    return np.dtype(fields)
+
+
+def _iter_binary_rows(columns, n_rows, chunk_size):
+    yield PGCOPY_HEADER
+
+    def chunk(values, start, stop):
+        return values if _is_scalar(values) else values[start:stop]
+
+    if any(
+        pg_type in BINARY_ARRAY_TYPES or pg_type in BINARY_TEXT_TYPES
+        for pg_type, _ in columns.values()
+    ):
+        # variable-length rows, encoded one by one
+        for i in range(n_rows):
+            parts = [struct.pack(">h", len(columns))]
+            for pg_type, values in columns.values():
+                value = values if _is_scalar(values) else values[i]
+                if pg_type in BINARY_ARRAY_TYPES:
+                    parts.append(_binary_array(pg_type, value))
+                elif pg_type in BINARY_TEXT_TYPES:
+                    parts.append(_binary_text(pg_type, value))
+                elif pg_type == "int8range":
+                    parts.append(
+                        struct.pack(
+                            ">iBiqiq", 25, RANGE_LB_INC, 8, value[0], 8, value[1]
+                        )
+                    )
+                else:
+                    if pg_type == "timestamp":
+                        value = _binary_timestamps(value)
+                    element_format = BINARY_SCALAR_TYPES[pg_type]
+                    parts.append(
+                        struct.pack(">i", np.dtype(element_format).itemsize)
+                        + np.asarray(value, dtype=element_format).tobytes()
+                    )
+            yield b"".join(parts)
+    else:
+        # fixed-length rows, encoded at once with a structured array
+        dtype = _binary_row_dtype(columns)
+        for start in range(0, n_rows, chunk_size):
+            stop = min(start + chunk_size, n_rows)
+            rows = np.empty(stop - start, dtype=dtype)
+            rows["n_fields"] = len(columns)
+            for name, (pg_type, values) in columns.items():
+                if pg_type == "int8range":
+                    lower, upper = values
+                    rows[f"{name}_length"] = 25
+                    rows[f"{name}_flags"] = RANGE_LB_INC
+                    rows[f"{name}_lower_length"] = 8
+                    rows[f"{name}_lower"] = chunk(lower, start, stop)
+                    rows[f"{name}_upper_length"] = 8
+                    rows[f"{name}_upper"] = chunk(upper, start, stop)
+                else:
+                    values = chunk(values, start, stop)
+                    if pg_type == "timestamp":
+                        values = _binary_timestamps(values)
+                    rows[f"{name}_length"] = dtype[name].itemsize
+                    rows[name] = values
+            yield rows.tobytes()
+
+    yield PGCOPY_TRAILER
+
+
+def copy_binary(table, columns, session=None, chunk_size=COPY_CHUNK_SIZE):
+    """Insert rows into a table with a binary COPY ... FROM STDIN.
+
+    The columns are NumPy arrays that are packed into the binary format
+    of COPY without being converted to Python objects or text. NULL
+    values are not supported.
+
+    Parameters
+    ----------
+    table : str
+        Name of the table.
+    columns : dict
+        Mapping of column name to a (type, values) tuple. The type is one of
+        int4, int8, float8, timestamp, int8range, int8[], float8[], text
+        or jsonb. The values are an array with one element per row, or a
+        scalar used for every row. The values of an int8range column are a
+        (lower, upper) tuple of arrays, for [lower, upper) ranges, those of
+        an array column are a sequence of arrays, one per row, and those of
+        a jsonb column are a sequence of JSON-serializable objects. Rows
+        with array, text or jsonb columns are packed one by one.
+    session : `sqlalchemy.orm.session.Session`, optional
+        Database session object, by default DBSession()
+    chunk_size : int, optional
+        Number of rows packed at once, by default 10000
+
+    Returns
+    -------
+    int
+        Number of inserted rows.
+    """
+    lengths = set()
+    for pg_type, values in columns.values():
+        if pg_type == "int8range":
+            values = values[0]
+        if not _is_scalar(values):
+            lengths.add(len(values))
+    if len(lengths) == 0:
+        raise ValueError("At least one column must contain a sequence of values")
+    if len(lengths) > 1:
+        raise ValueError(f"All columns must have the same length, got {lengths}")
+    n_rows = lengths.pop()
+    if n_rows == 0:
+        return 0
+
+    if session is None:
+        session = DBSession()
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)",
+            _ChunkReader(_iter_binary_rows(columns, n_rows, chunk_size), empty=b""),
+        )
+    finally:
+        cursor.close()
+    return n_rows
+
+
+def _decode_binary_array(data, offset):
+    ndim, has_null, oid = struct.unpack_from(">iii", data, offset)
+    element_format = _BINARY_ARRAY_FORMATS.get(oid)
+    if element_format is None:
+        raise ValueError(f"Unsupported array element type OID {oid}")
+    native_dtype = np.dtype(element_format).newbyteorder("=")
+    if ndim == 0:
+        return np.empty(0, dtype=native_dtype)
+    if ndim != 1 or has_null:
+        raise ValueError("Only one-dimensional arrays without NULLs are supported")
+    (size,) = struct.unpack_from(">i", data, offset + 12)
+    elements = np.frombuffer(
+        data,
+        dtype=[("length", ">i4"), ("value", element_format)],
+        count=size,
+        offset=offset + 20,
+    )
+    return elements["value"].astype(native_dtype)
+
+
+def copy_binary_arrays_out(query, session=None):
+    """Run a query with a binary COPY ... TO STDOUT, and decode the arrays
+    it returns into NumPy arrays, without going through Python lists.
+
+    Parameters
+    ----------
+    query : str
+        SQL query selecting int8[] or float8[] columns only.
+    session : `sqlalchemy.orm.session.Session`, optional
+        Database session object, by default DBSession()
+
+    Returns
+    -------
+    list of list
+        For each row, one array (or None) per column.
+    """
+    if session is None:
+        session = DBSession()
+    output = io.BytesIO()
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", output)
+    finally:
+        cursor.close()
+    data = output.getbuffer()
+
+    # skip the signature and flags, and the header extension
+    (extension_length,) = struct.unpack_from(">i", data, 15)
+    offset = 19 + extension_length
+    rows = []
+    while True:
+        (n_fields,) = struct.unpack_from(">h", data, offset)
+        offset += 2
+        if n_fields == -1:
+            break
+        row = []
+        for _ in range(n_fields):
+            (length,) = struct.unpack_from(">i", data, offset)
+            offset += 4
+            if length == -1:
+                row.append(None)
+                continue
+            row.append(_decode_binary_array(data, offset))
+            offset += length
+        rows.append(row)
+    return rows
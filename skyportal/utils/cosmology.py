@@ -1,3 +1,4 @@
+import numpy as np
 from astropy import cosmology
 from astropy import units as u
 
@@ -7,6 +8,13 @@ from baselayer.log import make_log
 log = make_log("cosmology")
 _, cfg = load_env()
 
+# below cz ~ 350 km/s, sources are not considered to be in the Hubble flow
+# cf. https://www.aanda.org/articles/aa/full/2003/05/aa3077/aa3077.html
+# within ~5 Mpc (cz ~ 350 km/s) a given galaxy velocity
+# can be between between ~0-500 km/s
+SPEED_OF_LIGHT_KMS = 2.99e5
+HUBBLE_FLOW_MIN_VELOCITY_KMS = 350
+
 
 def establish_cosmology(cfg=cfg):
     user_cosmo = cfg["misc"]["cosmology"]
@@ -51,3 +59,96 @@ def establish_cosmology(cfg=cfg):
     log(f"{cosmo}")
 
     return cosmo
+
+
+def altdata_luminosity_distance(altdata):
+    """
+    The luminosity distance in Mpc from the DM or distance data in the
+    altdata fields of an object: `dm` (mag), `parallax` (arcsec), `dist_kpc`,
+    `dist_Mpc`, `dist_pc` or `dist_cm`, picked up in that order.
+
+    Return None if there is no such field.
+    """
+    if not isinstance(altdata, dict):
+        return None
+    if altdata.get("dm") is not None:
+        # see eq (24) of https://ned.ipac.caltech.edu/level5/Hogg/Hogg7.html
+        return (10 ** (float(altdata.get("dm")) / 5.0)) * 1e-5
+    if altdata.get("parallax") is not None:
+        if float(altdata.get("parallax")) > 0:
+            # assume parallax in arcsec
+            return 1e-6 / float(altdata.get("parallax"))
+    if altdata.get("dist_kpc") is not None:
+        return float(altdata.get("dist_kpc")) * 1e-3
+    if altdata.get("dist_Mpc") is not None:
+        return float(altdata.get("dist_Mpc"))
+    if altdata.get("dist_pc") is not None:
+        return float(altdata.get("dist_pc")) * 1e-6
+    if altdata.get("dist_cm") is not None:
+        return float(altdata.get("dist_cm")) / 3.085e18
+    return None
+
+
+def get_distances(redshifts, altdatas, cosmo):
+    """
+    Luminosity distance, distance modulus and angular diameter distance
+    of many objects at once.
+
+    The distance of an object is taken from its altdata fields if any
+    (see `altdata_luminosity_distance`), otherwise from its redshift using
+    the cosmology. Objects with a redshift that does not put them within the
+    Hubble flow have no distance.
+
+    Parameters
+    ----------
+    redshifts : list of float or None
+        Redshift of each object.
+    altdatas : list of dict or None
+        Altdata of each object.
+    cosmo : astropy.cosmology.FLRW
+        Cosmology used to compute the distances from the redshifts.
+
+    Returns
+    -------
+    dict
+        luminosity_distance (Mpc), dm (mag) and angular_diameter_distance
+        (Mpc), as lists with None where undefined.
+    """
+    redshifts = np.array(
+        [np.nan if z is None else float(z) for z in redshifts], dtype=float
+    )
+    luminosity_distance = np.array(
+        [altdata_luminosity_distance(altdata) for altdata in altdatas], dtype=float
+    )
+    velocities = redshifts * SPEED_OF_LIGHT_KMS
+    in_hubble_flow = velocities > HUBBLE_FLOW_MIN_VELOCITY_KMS
+
+    from_redshift = np.isnan(luminosity_distance) & (
+        velocities >= HUBBLE_FLOW_MIN_VELOCITY_KMS
+    )
+    if from_redshift.any():
+        # one call for all the objects, rather than one per object
+        luminosity_distance[from_redshift] = cosmo.luminosity_distance(
+            redshifts[from_redshift]
+        ).to_value(u.Mpc)
+
+    known = ~np.isnan(luminosity_distance)
+    defined = known & (luminosity_distance != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # 5 log10(d / 10 pc), with d in Mpc
+        dm = 5.0 * np.log10(luminosity_distance * 1e5)
+    # see eq (20) of https://ned.ipac.caltech.edu/level5/Hogg/Hogg7.html
+    angular_diameter_distance = np.where(
+        in_hubble_flow,
+        luminosity_distance / (1 + np.where(in_hubble_flow, redshifts, 0)) ** 2,
+        luminosity_distance,
+    )
+
+    def to_list(values, mask):
+        return [float(value) if ok else None for value, ok in zip(values, mask)]
+
+    return {
+        "luminosity_distance": to_list(luminosity_distance, known),
+        "dm": to_list(dm, defined),
+        "angular_diameter_distance": to_list(angular_diameter_distance, defined),
+    }
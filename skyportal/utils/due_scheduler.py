@@ -0,0 +1,266 @@
+import heapq
+import select
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from .ordered_consumer import StageMetrics
+
+
+def utcnow():
+    """Current time as a naive UTC datetime, like the database columns."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class JobSource:
+    """A kind of scheduled job, read from the database.
+
+    Subclasses implement `due_times`, `due_time` and `run`. Jobs are
+    identified by an ID unique within the source, and their due times are
+    naive UTC datetimes.
+    """
+
+    # name of the source, used as prefix of its metrics
+    name = None
+
+    # tables whose notifications concern this source
+    tables = ()
+
+    def due_times(self, until):
+        """Due times of all the pending jobs due before `until`,
+        as a dict {job ID: due time}."""
+        raise NotImplementedError
+
+    def due_time(self, job_id):
+        """Due time of a job, or None if it is not pending anymore."""
+        raise NotImplementedError
+
+    def run(self, job_id):
+        """Run a due job. Its next due time is then read with `due_time`."""
+        raise NotImplementedError
+
+    def job_id(self, table, row_id):
+        """ID of the job concerned by a notification for a row of a table."""
+        return row_id
+
+
+class DueScheduler:
+    """Run jobs exactly when they are due, on a bounded pool of workers.
+
+    The due times of the jobs of all sources are kept in a heap. The
+    scheduler sleeps until the earliest one, or until it is notified that a
+    job changed (see `notify`), rather than polling the database.
+    Notifications are coalesced: the due time of a job is read once per
+    wake-up, however many of its rows changed in the meantime. The heap
+    is rebuilt from the sources every `resync_interval` (with the jobs due
+    within two intervals), so that changes that were not notified are picked
+    up too.
+
+    A job is never run twice concurrently: after each run, its next due
+    time is read from its source. A job that fails and is still due is
+    retried after `retry_delay`.
+
+    The lag of each run (time between when it was due and when it started)
+    and its duration are recorded in `metrics`, as "<source>.lag" and
+    "<source>.run".
+    """
+
+    def __init__(
+        self,
+        sources,
+        max_workers=4,
+        resync_interval=timedelta(minutes=5),
+        retry_delay=timedelta(minutes=1),
+        metrics=None,
+        log=print,
+        now=utcnow,
+    ):
+        self.sources = {source.name: source for source in sources}
+        self.resync_interval = resync_interval
+        self.retry_delay = retry_delay
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.log = log
+        self.now = now
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._condition = threading.Condition()
+        self._heap = []
+        # current due time of each scheduled job, entries of the heap that
+        # do not match are outdated
+        self._due = {}
+        self._running = set()
+        # jobs notified since the last run_pending
+        self._notified = set()
+        self._next_resync = None
+        # whether jobs were rescheduled since the last run_pending
+        self._changed = False
+        self._stopped = False
+
+    def _schedule(self, key, due):
+        if due is None:
+            self._due.pop(key, None)
+        elif self._due.get(key) != due:
+            self._due[key] = due
+            heapq.heappush(self._heap, (due, key))
+            self._changed = True
+
+    def resync(self):
+        """Reload the jobs due within two resync intervals from all sources."""
+        now = self.now()
+        until = now + 2 * self.resync_interval
+        for name, source in self.sources.items():
+            try:
+                due_times = source.due_times(until)
+            except Exception as e:
+                traceback.print_exc()
+                self.log(f"Failed to load the jobs of {name}: {e}")
+                continue
+            with self._condition:
+                for key, due in list(self._due.items()):
+                    if key[0] == name and due <= until and key[1] not in due_times:
+                        del self._due[key]
+                for job_id, due in due_times.items():
+                    self._schedule((name, job_id), due)
+                self._condition.notify()
+        self._next_resync = now + self.resync_interval
+
+    def notify(self, table, row_id):
+        """Mark the jobs concerned by a change to a row of a table to be
+        rescheduled by the next run_pending."""
+        with self._condition:
+            for name, source in self.sources.items():
+                if table in source.tables:
+                    self._notified.add((name, source.job_id(table, row_id)))
+            self._condition.notify()
+
+    def _reschedule_notified(self):
+        with self._condition:
+            notified, self._notified = self._notified, set()
+        for name, job_id in notified:
+            try:
+                due = self.sources[name].due_time(job_id)
+            except Exception as e:
+                self.log(f"Failed to reschedule {name} job {job_id}: {e}")
+                continue
+            with self._condition:
+                self._schedule((name, job_id), due)
+
+    def _run(self, key, due):
+        name, job_id = key
+        source = self.sources[name]
+        start = self.now()
+        self.metrics.record(f"{name}.lag", max((start - due).total_seconds(), 0))
+        try:
+            with self.metrics.time(f"{name}.run"):
+                source.run(job_id)
+            self.metrics.increment(f"{name}.runs")
+        except Exception as e:
+            traceback.print_exc()
+            self.log(f"Failed to run {name} job {job_id}: {e}")
+            self.metrics.increment(f"{name}.failures")
+
+        try:
+            next_due = source.due_time(job_id)
+        except Exception as e:
+            self.log(f"Failed to reschedule {name} job {job_id}: {e}")
+            next_due = self.now() + self.retry_delay
+        if next_due is not None and next_due <= start:
+            # not rescheduled by the run, try again later
+            next_due = self.now() + self.retry_delay
+
+        with self._condition:
+            self._running.discard(key)
+            # drop any due time notified during the run, next_due is newer
+            self._due.pop(key, None)
+            self._schedule(key, next_due)
+            self._condition.notify()
+
+    def run_pending(self):
+        """Start the jobs that are due, and return the number of seconds
+        until the next one (or until the next resync)."""
+        self._reschedule_notified()
+        with self._condition:
+            self._changed = False
+            now = self.now()
+            while self._heap:
+                due, key = self._heap[0]
+                if self._due.get(key) != due or key in self._running:
+                    # outdated, or rescheduled once the current run finishes
+                    heapq.heappop(self._heap)
+                    continue
+                if due > now:
+                    break
+                heapq.heappop(self._heap)
+                del self._due[key]
+                self._running.add(key)
+                self._executor.submit(self._run, key, due)
+
+            wait = (self._next_resync - now).total_seconds()
+            if self._heap:
+                wait = min(wait, (self._heap[0][0] - now).total_seconds())
+            return max(wait, 0)
+
+    def run_forever(self):
+        self.resync()
+        while not self._stopped:
+            if self.now() >= self._next_resync:
+                self.resync()
+            wait = self.run_pending()
+            with self._condition:
+                if not (self._stopped or self._changed or self._notified):
+                    self._condition.wait(timeout=wait)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._executor.shutdown(wait=True)
+
+    def pending(self):
+        """Jobs scheduled, and running, for monitoring."""
+        with self._condition:
+            return {
+                "scheduled": len(self._due),
+                "running": len(self._running),
+                "next_due": min(self._due.values()).isoformat() if self._due else None,
+            }
+
+
+def listen(connect, channel, callback, log=print, timeout=60):
+    """Call `callback(table, row_id)` for each notification on a channel.
+
+    Parameters
+    ----------
+    connect : callable
+        Returns a new psycopg2 connection, called again to reconnect
+        after errors.
+    channel : str
+        The channel.
+    callback : callable
+        Called with the table and the row ID of each notification
+        (payload "<table>:<id>").
+    """
+    while True:
+        try:
+            connection = connect()
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {channel}")
+            while True:
+                if select.select([connection], [], [], timeout) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notification = connection.notifies.pop(0)
+                    table, _, row_id = notification.payload.rpartition(":")
+                    try:
+                        callback(table, int(row_id))
+                    except Exception as e:
+                        log(
+                            f"Failed to handle notification {notification.payload}: {e}"
+                        )
+        except Exception as e:
+            log(f"Lost connection listening to {channel}: {e}")
+            time.sleep(5)
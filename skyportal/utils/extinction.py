@@ -0,0 +1,68 @@
+import os
+import threading
+
+import dustmaps.sfd
+import numpy as np
+import requests
+from astropy.coordinates import SkyCoord
+from dustmaps.config import config
+
+from baselayer.app.env import load_env
+from baselayer.log import make_log
+
+_, cfg = load_env()
+log = make_log("extinction")
+
+# download dustmap if required
+config["data_dir"] = cfg["misc.dustmap_folder"]
+required_files = ["sfd/SFD_dust_4096_ngp.fits", "sfd/SFD_dust_4096_sgp.fits"]
+if any(
+    not os.path.isfile(os.path.join(config["data_dir"], required_file))
+    for required_file in required_files
+):
+    try:
+        dustmaps.sfd.fetch()
+    except requests.exceptions.HTTPError:
+        pass
+
+_sfd_query = None
+_sfd_lock = threading.Lock()
+
+
+def get_sfd_query():
+    """The SFD dust map, loaded from disk the first time it is needed
+    and then shared by the whole process."""
+    global _sfd_query
+    if _sfd_query is None:
+        with _sfd_lock:
+            if _sfd_query is None:
+                _sfd_query = dustmaps.sfd.SFDQuery()
+    return _sfd_query
+
+
+def get_ebv(ra, dec):
+    """E(B-V) extinction from the SFD dust map, for many positions at once.
+
+    Parameters
+    ----------
+    ra : float or array-like
+        Right ascension (J2000), in degrees.
+    dec : float or array-like
+        Declination (J2000), in degrees.
+
+    Returns
+    -------
+    numpy.ndarray
+        E(B-V) at each position, NaN if the dust map is not available.
+    """
+    ra = np.atleast_1d(np.asarray(ra, dtype=float))
+    dec = np.atleast_1d(np.asarray(dec, dtype=float))
+    if len(ra) == 0:
+        return np.empty(0)
+    try:
+        return np.atleast_1d(
+            np.asarray(get_sfd_query()(SkyCoord(ra, dec, unit="deg")), dtype=float)
+        )
+    except Exception as e:
+        log(f"Could not query the SFD dust map: {e}")
+        return np.full(len(ra), np.nan)
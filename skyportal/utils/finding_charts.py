@@ -0,0 +1,258 @@
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from PIL import Image
+
+from baselayer.log import make_log
+
+from .gaia_cache import gaia_tile_cache
+from .offset import get_finding_chart
+
+log = make_log("finding-charts")
+
+FINDING_CHART_JOBS_DIR = Path("./cache/finding_chart_jobs/")
+
+# jobs (and their output) are removed once they are this old
+FINDING_CHART_JOB_MAX_AGE = 86400
+
+# resolution of the pages of the combined PDF
+FINDING_CHART_PDF_DPI = 150
+
+
+def _job_dir(job_id):
+    # job IDs are generated here, but come back from the API
+    if not isinstance(job_id, str) or not job_id.isalnum():
+        raise ValueError(f"Invalid finding chart job ID: {job_id}")
+    return FINDING_CHART_JOBS_DIR / job_id
+
+
+def _write_atomic(path, data):
+    # write to a temporary file first, so that readers never see
+    # a partially written file
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+
+
+def clean_finding_chart_jobs(max_age=FINDING_CHART_JOB_MAX_AGE):
+    """Remove the jobs older than `max_age` seconds, with their output."""
+    if not FINDING_CHART_JOBS_DIR.is_dir():
+        return
+    now = time.time()
+    for job_dir in FINDING_CHART_JOBS_DIR.iterdir():
+        try:
+            if now - job_dir.stat().st_mtime > max_age:
+                shutil.rmtree(job_dir)
+        except OSError as e:
+            log(f"Could not remove finding chart job {job_dir}: {e}")
+
+
+def create_finding_chart_job(user_id, n_targets, output):
+    """Register a new finding chart job.
+
+    Parameters
+    ----------
+    user_id : int
+        ID of the user requesting the finding charts.
+    n_targets : int
+        Number of finding charts to render.
+    output : {'pdf', 'zip'}
+        Whether the charts are combined in a single PDF or in a zip archive.
+
+    Returns
+    -------
+    str
+        ID of the job.
+    """
+    clean_finding_chart_jobs()
+    job_id = uuid.uuid4().hex
+    _job_dir(job_id).mkdir(parents=True)
+    update_finding_chart_job(
+        job_id,
+        user_id=user_id,
+        status="pending",
+        output=output,
+        n_targets=n_targets,
+        n_done=0,
+        failed={},
+        created_at=time.time(),
+    )
+    return job_id
+
+
+def get_finding_chart_job(job_id):
+    """Status of a finding chart job, or None if there is no such job."""
+    try:
+        with open(_job_dir(job_id) / "status.json") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def update_finding_chart_job(job_id, **fields):
+    """Update the status of a finding chart job."""
+    status = get_finding_chart_job(job_id) or {}
+    status.update(fields)
+    _write_atomic(_job_dir(job_id) / "status.json", json.dumps(status).encode("utf-8"))
+
+
+def get_finding_chart_job_output(job_id):
+    """Path to the output of a finding chart job."""
+    status = get_finding_chart_job(job_id)
+    if status is None or status.get("filename") is None:
+        return None
+    return _job_dir(job_id) / status["filename"]
+
+
+def render_finding_chart(target, options):
+    """Render the finding chart of one target. Runs in the worker processes.
+
+    Parameters
+    ----------
+    target : dict
+        obj_id, ra and dec of the target, and the keyword arguments of
+        `get_nearby_offset_stars` specific to the target (kwargs).
+    options : dict
+        Keyword arguments of `get_finding_chart` common to all the targets.
+
+    Returns
+    -------
+    dict
+        The output of `get_finding_chart`.
+    """
+    try:
+        return get_finding_chart(
+            target["ra"],
+            target["dec"],
+            target["obj_id"],
+            **options,
+            **target["kwargs"],
+        )
+    except Exception as e:
+        return {"success": False, "name": None, "data": None, "reason": str(e)}
+
+
+def combine_finding_charts(charts, dpi=FINDING_CHART_PDF_DPI):
+    """Combine PNG finding charts in a PDF, one chart per page."""
+    pages = [Image.open(io.BytesIO(chart)).convert("RGB") for chart in charts]
+    buf = io.BytesIO()
+    pages[0].save(
+        buf, format="PDF", save_all=True, append_images=pages[1:], resolution=dpi
+    )
+    return buf.getvalue()
+
+
+def archive_finding_charts(charts):
+    """Zip finding charts, given as (filename, data) pairs."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for filename, data in charts:
+            archive.writestr(filename, data)
+    return buf.getvalue()
+
+
+def run_finding_chart_job(job_id, targets, options, output="pdf", n_processes=1):
+    """Render the finding charts of many targets, and save them in a single
+    PDF or zip archive. The status of the job is updated as charts complete.
+
+    Parameters
+    ----------
+    job_id : str
+        ID of the job, from `create_finding_chart_job`.
+    targets : list of dict
+        Targets, as expected by `render_finding_chart`.
+    options : dict
+        Keyword arguments of `get_finding_chart` common to all the targets.
+    output : {'pdf', 'zip'}, optional
+        Combine the charts in a single PDF, or in a zip archive of files
+        of options["output_format"], by default "pdf"
+    n_processes : int, optional
+        Number of processes, by default 1 (render in the current process)
+    """
+    try:
+        update_finding_chart_job(job_id, status="running", started_at=time.time())
+        if output == "pdf":
+            options = {**options, "output_format": "png", "dpi": FINDING_CHART_PDF_DPI}
+
+        # fetch the Gaia sources around all the targets in a few queries,
+        # rather than leaving each worker to query the archive, with the
+        # larger radius used when too few offset stars are found
+        try:
+            gaia_tile_cache.prefetch(
+                [(target["ra"], target["dec"]) for target in targets],
+                options.get("radius_degrees", 2 / 60.0) * 1.3,
+            )
+        except Exception as e:
+            log(f"Could not prefetch the Gaia sources of job {job_id}: {e}")
+
+        results = [None] * len(targets)
+        failed = {}
+
+        def record(i, result):
+            results[i] = result
+            if not result["success"]:
+                failed[targets[i]["obj_id"]] = result["reason"]
+            update_finding_chart_job(
+                job_id,
+                n_done=sum(result is not None for result in results),
+                failed=failed,
+            )
+
+        if n_processes <= 1 or len(targets) <= 1:
+            for i, target in enumerate(targets):
+                record(i, render_finding_chart(target, options))
+        else:
+            # spawn rather than fork, as the app process has threads and
+            # open database connections
+            with ProcessPoolExecutor(
+                max_workers=min(n_processes, len(targets)),
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                futures = {
+                    executor.submit(render_finding_chart, target, options): i
+                    for i, target in enumerate(targets)
+                }
+                for future in as_completed(futures):
+                    record(futures[future], future.result())
+
+        charts = [result for result in results if result["success"]]
+        if len(charts) == 0:
+            update_finding_chart_job(
+                job_id,
+                status="failed",
+                error="No finding chart could be generated",
+                finished_at=time.time(),
+            )
+            return
+
+        if output == "pdf":
+            filename = "finding_charts.pdf"
+            data = combine_finding_charts([chart["data"] for chart in charts])
+        else:
+            filename = "finding_charts.zip"
+            data = archive_finding_charts(
+                [(chart["name"], chart["data"]) for chart in charts]
+            )
+        _write_atomic(_job_dir(job_id) / filename, data)
+        update_finding_chart_job(
+            job_id, status="complete", filename=filename, finished_at=time.time()
+        )
+    except Exception as e:
+        log(f"Finding chart job {job_id} failed: {e}")
+        update_finding_chart_job(
+            job_id, status="failed", error=str(e), finished_at=time.time()
+        )
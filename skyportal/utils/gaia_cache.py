@@ -0,0 +1,282 @@
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import healpy as hp
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import angular_separation
+from astropy.table import Table
+
+from baselayer.app.env import load_env
+from baselayer.log import make_log
+
+log = make_log("gaia-cache")
+
+_, cfg = load_env()
+
+# Gaia source IDs start with the index of the source in the nested HEALPix
+# grid of order 12 (source_id >> 35), so the sources of a tile of any lower
+# order are a contiguous range of source IDs.
+GAIA_SOURCE_ID_ORDER = 12
+GAIA_SOURCE_ID_SHIFT = 35
+
+# tiles of order 8 are ~14 arcmin wide
+GAIA_TILE_ORDER = 8
+MAX_TILES_PER_QUERY = 20
+
+GAIA_TILE_DTYPE = np.dtype(
+    [
+        ("source_id", np.int64),
+        ("ra", np.float64),
+        ("dec", np.float64),
+        ("ref_epoch", np.float64),
+        ("phot_rp_mean_mag", np.float64),
+        ("pmra", np.float64),
+        ("pmdec", np.float64),
+        ("parallax", np.float64),
+    ]
+)
+GAIA_TILE_UNITS = {
+    "ra": u.deg,
+    "dec": u.deg,
+    "ref_epoch": u.yr,
+    "phot_rp_mean_mag": u.mag,
+    "pmra": u.mas / u.yr,
+    "pmdec": u.mas / u.yr,
+    "parallax": u.mas,
+    "dist": u.deg,
+}
+
+
+def _tile_shift(order):
+    return GAIA_SOURCE_ID_SHIFT + 2 * (GAIA_SOURCE_ID_ORDER - order)
+
+
+def tile_source_id_range(tile, order=GAIA_TILE_ORDER):
+    """First and last Gaia source ID of a nested HEALPix tile."""
+    shift = _tile_shift(order)
+    return int(tile) << shift, ((int(tile) + 1) << shift) - 1
+
+
+def source_id_to_tile(source_id, order=GAIA_TILE_ORDER):
+    """Nested HEALPix tile of Gaia sources, from their source IDs."""
+    return np.asarray(source_id, dtype=np.int64) >> _tile_shift(order)
+
+
+def cone_tiles(ra, dec, radius_degrees, order=GAIA_TILE_ORDER):
+    """Nested HEALPix tiles that overlap a cone."""
+    return hp.query_disc(
+        hp.order2nside(order),
+        hp.ang2vec(ra, dec, lonlat=True),
+        np.radians(radius_degrees),
+        inclusive=True,
+        nest=True,
+    )
+
+
+def table_to_tile_array(table):
+    """Convert a Gaia query result (astropy Table) to an array of
+    GAIA_TILE_DTYPE, with missing values as NaN."""
+    # depending on the server, the column names may be in upper case
+    names = {name.lower(): name for name in table.colnames}
+    sources = np.empty(len(table), dtype=GAIA_TILE_DTYPE)
+    for name in GAIA_TILE_DTYPE.names:
+        column = table[names[name]]
+        if hasattr(column, "filled"):
+            column = column.filled(np.nan if name != "source_id" else -1)
+        sources[name] = np.asarray(column, dtype=GAIA_TILE_DTYPE[name])
+    return sources
+
+
+def query_gaia_tiles(tiles, order=GAIA_TILE_ORDER):
+    """Query all the Gaia sources of nested HEALPix tiles, in one query.
+
+    Parameters
+    ----------
+    tiles : list of int
+        Nested HEALPix tile indices.
+    order : int, optional
+        HEALPix order of the tiles, by default GAIA_TILE_ORDER
+
+    Returns
+    -------
+    numpy.ndarray
+        Sources, as an array of GAIA_TILE_DTYPE.
+    """
+    # imported here, as offset imports this module
+    from .offset import GaiaQuery
+
+    ranges = " OR ".join(
+        "(source_id BETWEEN {} AND {})".format(*tile_source_id_range(tile, order))
+        for tile in tiles
+    )
+    query_string = (
+        f"SELECT {', '.join(GAIA_TILE_DTYPE.names)} "
+        f"FROM {{main_db}}.gaia_source WHERE {ranges}"
+    )
+    return table_to_tile_array(GaiaQuery().query(query_string, async_job=True))
+
+
+class GaiaTileCache:
+    """Cache of the Gaia sources on disk, one file per HEALPix tile, that
+    serves cone searches with as few remote queries as possible.
+
+    Tiles are fetched as a whole the first time a cone overlaps them, and
+    again once they are older than `max_age`.
+
+    Parameters
+    ----------
+    cache_dir : Path or str
+        Path to the cache. Will be created if necessary.
+    order : int, optional
+        HEALPix order of the tiles, by default GAIA_TILE_ORDER
+    max_age : float, optional
+        Maximum age (in seconds) of a tile before it is fetched again.
+        If unspecified, tiles never expire.
+    fetch : callable, optional
+        Called with a list of tiles and the order, returns their sources as
+        an array of GAIA_TILE_DTYPE. By default, the Gaia archive is queried.
+    """
+
+    def __init__(self, cache_dir, order=GAIA_TILE_ORDER, max_age=None, fetch=None):
+        self._cache_dir = Path(cache_dir) / str(order)
+        self._order = order
+        self._max_age = max_age
+        self._fetch = fetch if fetch is not None else query_gaia_tiles
+        self._fetch_lock = threading.Lock()
+
+    def _path(self, tile):
+        return self._cache_dir / f"{int(tile)}.npy"
+
+    def _load(self, tile):
+        path = self._path(tile)
+        try:
+            if (
+                self._max_age is not None
+                and time.time() - path.stat().st_mtime > self._max_age
+            ):
+                return None
+            return np.load(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log(f"Could not read Gaia tile {path}: {e}")
+            return None
+
+    def _save(self, tile, sources):
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first, so that readers never see
+        # a partially written tile
+        fd, temp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, sources)
+            os.replace(temp_path, self._path(tile))
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+    def get_tiles(self, tiles):
+        """Sources of each tile, from the disk or fetched when missing.
+
+        Parameters
+        ----------
+        tiles : iterable of int
+            Nested HEALPix tile indices.
+
+        Returns
+        -------
+        dict
+            Mapping of tile index to an array of GAIA_TILE_DTYPE.
+        """
+        tiles = sorted({int(tile) for tile in tiles})
+        sources = {tile: self._load(tile) for tile in tiles}
+        missing = [tile for tile in tiles if sources[tile] is None]
+        if len(missing) == 0:
+            return sources
+
+        with self._fetch_lock:
+            # the tiles may have been fetched while waiting for the lock
+            for tile in missing:
+                sources[tile] = self._load(tile)
+            missing = [tile for tile in missing if sources[tile] is None]
+
+            for start in range(0, len(missing), MAX_TILES_PER_QUERY):
+                batch = missing[start : start + MAX_TILES_PER_QUERY]
+                fetched = self._fetch(batch, self._order)
+                fetched_tiles = source_id_to_tile(fetched["source_id"], self._order)
+                for tile in batch:
+                    # empty tiles are saved too, so they are not queried again
+                    sources[tile] = fetched[fetched_tiles == tile]
+                    self._save(tile, sources[tile])
+            if len(missing) > 0:
+                log(f"Fetched {len(missing)} Gaia tiles")
+        return sources
+
+    def prefetch(self, positions, radius_degrees):
+        """Make sure all the tiles needed by cone searches around many
+        positions are cached, fetching the missing ones in as few queries
+        as possible.
+
+        Parameters
+        ----------
+        positions : iterable of (float, float)
+            (RA, Dec) of the centers of the cones, in degrees.
+        radius_degrees : float
+            Radius of the cones, in degrees.
+
+        Returns
+        -------
+        int
+            Number of distinct tiles needed.
+        """
+        tiles = set()
+        for ra, dec in positions:
+            tiles.update(cone_tiles(ra, dec, radius_degrees, self._order).tolist())
+        self.get_tiles(tiles)
+        return len(tiles)
+
+    def cone_search(self, ra, dec, radius_degrees):
+        """Gaia sources within a cone.
+
+        Parameters
+        ----------
+        ra : float
+            Right ascension (J2000) of the center, in degrees.
+        dec : float
+            Declination (J2000) of the center, in degrees.
+        radius_degrees : float
+            Radius of the cone, in degrees.
+
+        Returns
+        -------
+        astropy.table.Table
+            Sources, with the columns of GAIA_TILE_DTYPE and their distance
+            to the center (dist), in degrees.
+        """
+        tiles = self.get_tiles(cone_tiles(ra, dec, radius_degrees, self._order))
+        sources = np.concatenate([np.empty(0, dtype=GAIA_TILE_DTYPE), *tiles.values()])
+        dist = np.degrees(
+            angular_separation(
+                np.radians(sources["ra"]),
+                np.radians(sources["dec"]),
+                np.radians(ra),
+                np.radians(dec),
+            )
+        )
+        within = dist <= radius_degrees
+
+        table = Table(sources[within])
+        table["dist"] = dist[within]
+        for name, unit in GAIA_TILE_UNITS.items():
+            table[name].unit = unit
+        return table
+
+
+gaia_tile_cache = GaiaTileCache(
+    "./cache/gaia_tiles/",
+    max_age=cfg.get("misc.days_to_keep_gaia_tile_cache", 30) * 86400,
+)
@@ -0,0 +1,290 @@
+import datetime
+
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..models import DBSession, Localization, LocalizationGalaxyRanking
+from .copy import copy_binary, copy_binary_arrays_out
+from .gcn import HEALPIX_TILE_ORDER, uniq_to_tile_ranges
+
+# the rankings cover at least this cumulative probability of the
+# localization, so that they are shared by the usual queries
+# (the default cumulative probability of the galaxy queries)
+MIN_RANKING_CUMPROB = 0.95
+
+LOCALIZATION_COLUMNS = ["uniq", "probdensity", "distmu", "distsigma", "distnorm"]
+
+# solid angle of a nested HEALPix pixel at HEALPIX_TILE_ORDER [sr]
+TILE_PIXEL_AREA = 4 * np.pi / (12 * 4**HEALPIX_TILE_ORDER)
+
+
+def tile_cumulative_probability(lower, upper, probdensity):
+    """Cumulative probability of the tiles of a localization, summed by
+    decreasing probability density.
+
+    Tiles with the same probability density are peers sharing the
+    cumulative probability of the last of them, as with the default
+    window frame of ``sum(...) OVER (ORDER BY probdensity DESC)``.
+
+    Parameters
+    ----------
+    lower, upper : `numpy.ndarray`
+        Bounds of the tiles' [lower, upper) ranges of nested pixels at
+        HEALPIX_TILE_ORDER, see `uniq_to_tile_ranges`.
+    probdensity : `numpy.ndarray`
+        Probability density of the tiles [1/sr].
+
+    Returns
+    -------
+    `numpy.ndarray`
+        Cumulative probability of each tile.
+    """
+    probdensity = np.asarray(probdensity, dtype=float)
+    area = (np.asarray(upper) - np.asarray(lower)).astype(float) * TILE_PIXEL_AREA
+    order = np.argsort(-probdensity, kind="stable")
+    sorted_probdensity = probdensity[order]
+    cumulative = np.cumsum(sorted_probdensity * area[order])
+
+    # give each group of peers the cumulative probability of its last tile
+    new_peer_group = np.r_[True, sorted_probdensity[1:] != sorted_probdensity[:-1]]
+    peer_group = np.cumsum(new_peer_group) - 1
+    last_of_peer_group = np.r_[np.nonzero(new_peer_group)[0][1:] - 1, len(order) - 1]
+
+    cum_prob = np.empty_like(cumulative)
+    cum_prob[order] = cumulative[last_of_peer_group][peer_group]
+    return cum_prob
+
+
+def galaxy_probability(
+    probdensity, distmpc=None, distmu=None, distsigma=None, distnorm=None
+):
+    """Probability of galaxies from the localization at their position.
+
+    Parameters
+    ----------
+    probdensity : `numpy.ndarray`
+        Probability density of the localization at the galaxies [1/sr].
+    distmpc : `numpy.ndarray`, optional
+        Distances of the galaxies [Mpc], NaN when unknown.
+    distmu, distsigma, distnorm : `numpy.ndarray`, optional
+        Distance parameters of the localization at the galaxies, for 3D
+        localizations.
+
+    Returns
+    -------
+    `numpy.ndarray`
+        For 2D localizations, the probability of the galaxies' pixels at
+        the resolution of `Localization.nside`. For 3D localizations, the
+        probability density at the galaxies' positions and distances
+        [1/(sr Mpc^3)], NaN for galaxies without distance.
+    """
+    probdensity = np.asarray(probdensity, dtype=float)
+    if distmu is None:
+        pixel_area = 4 * np.pi / (12 * Localization.nside**2)
+        return probdensity * pixel_area
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        z = (distmpc - distmu) / distsigma
+        return (
+            probdensity
+            * distnorm
+            * np.exp(-0.5 * z**2)
+            / (distsigma * np.sqrt(2 * np.pi))
+        )
+
+
+def compute_galaxy_ranking(ranking_id, localization_id, catalog_id, cumprob, session):
+    """Write the galaxies of a catalog within the tiles of a localization
+    covering `cumprob` of its probability into a ranking.
+
+    The containment of the galaxies in the tiles is a single query, joining
+    the tiles (copied into a temporary table) to the galaxies on their
+    indexed HEALPix index, and the probabilities are computed for all the
+    galaxies at once.
+
+    Parameters
+    ----------
+    ranking_id : int
+        ID of the LocalizationGalaxyRanking.
+    localization_id : int
+        ID of the Localization.
+    catalog_id : int
+        ID of the GalaxyCatalog.
+    cumprob : float
+        Cumulative probability of the localization covered by the ranking.
+    session : `sqlalchemy.orm.session.Session`
+        Database session object
+
+    Returns
+    -------
+    int
+        Number of galaxies in the ranking.
+    """
+    (row,) = copy_binary_arrays_out(
+        f"SELECT {', '.join(LOCALIZATION_COLUMNS)} "
+        f"FROM localizations WHERE id = {int(localization_id)}",
+        session=session,
+    )
+    arrays = dict(zip(LOCALIZATION_COLUMNS, row))
+    is_3d = all(
+        arrays[name] is not None for name in ["distmu", "distsigma", "distnorm"]
+    )
+
+    lower, upper = uniq_to_tile_ranges(arrays["uniq"])
+    cum_prob = tile_cumulative_probability(lower, upper, arrays["probdensity"])
+    (tiles,) = np.nonzero(cum_prob <= cumprob)
+    if len(tiles) == 0:
+        return 0
+
+    session.execute(
+        sa.text(
+            "CREATE TEMPORARY TABLE ranking_tiles "
+            "(tile int4, lower int8, upper int8) ON COMMIT DROP"
+        )
+    )
+    copy_binary(
+        "ranking_tiles",
+        {
+            "tile": ("int4", tiles),
+            "lower": ("int8", lower[tiles]),
+            "upper": ("int8", upper[tiles]),
+        },
+        session=session,
+    )
+    rows = session.execute(
+        sa.text(
+            "SELECT galaxys.id, ranking_tiles.tile, galaxys.distmpc "
+            "FROM ranking_tiles JOIN galaxys "
+            "ON galaxys.catalog_id = :catalog_id "
+            "AND galaxys.healpix >= ranking_tiles.lower "
+            "AND galaxys.healpix < ranking_tiles.upper"
+        ),
+        {"catalog_id": catalog_id},
+    ).all()
+    if len(rows) == 0:
+        return 0
+
+    galaxy_ids = np.array([r[0] for r in rows], dtype=np.int32)
+    galaxy_tiles = np.array([r[1] for r in rows], dtype=np.int64)
+    probdensity = arrays["probdensity"][galaxy_tiles]
+    if is_3d:
+        distmpc = np.array(
+            [np.nan if r[2] is None else r[2] for r in rows], dtype=float
+        )
+        probability = galaxy_probability(
+            probdensity,
+            distmpc,
+            *(
+                arrays[name][galaxy_tiles]
+                for name in ["distmu", "distsigma", "distnorm"]
+            ),
+        )
+    else:
+        probability = galaxy_probability(probdensity)
+
+    utcnow = datetime.datetime.utcnow()
+    return copy_binary(
+        "localization_galaxies",
+        {
+            "ranking_id": ("int4", ranking_id),
+            "galaxy_id": ("int4", galaxy_ids),
+            "probdensity": ("float8", probdensity),
+            "cum_prob": ("float8", cum_prob[galaxy_tiles]),
+            "probability": ("float8", probability),
+            "created_at": ("timestamp", utcnow),
+            "modified": ("timestamp", utcnow),
+        },
+        session=session,
+    )
+
+
+def get_or_compute_galaxy_ranking(localization_id, catalog_id, cumprob, session):
+    """Get the ID of the ranking of the galaxies of a catalog within a
+    localization, computing it if it is missing or covers less than
+    `cumprob` of the localization.
+
+    Returns None if a concurrent query inserted the ranking first, in which
+    case the caller should try again: the competing ranking may cover less
+    than `cumprob`.
+    """
+    ranking = session.scalar(
+        sa.select(LocalizationGalaxyRanking).where(
+            LocalizationGalaxyRanking.localization_id == localization_id,
+            LocalizationGalaxyRanking.catalog_id == catalog_id,
+        )
+    )
+    if ranking is not None and ranking.cumprob >= cumprob:
+        return ranking.id
+    if ranking is not None:
+        # covers too little of the localization, extend it
+        session.execute(
+            sa.delete(LocalizationGalaxyRanking).where(
+                LocalizationGalaxyRanking.id == ranking.id
+            )
+        )
+
+    # concurrent queries wait for the first one to commit its ranking
+    utcnow = datetime.datetime.utcnow()
+    ranking_id = session.scalar(
+        insert(LocalizationGalaxyRanking)
+        .values(
+            localization_id=localization_id,
+            catalog_id=catalog_id,
+            cumprob=cumprob,
+            created_at=utcnow,
+            modified=utcnow,
+        )
+        .on_conflict_do_nothing(index_elements=["localization_id", "catalog_id"])
+        .returning(LocalizationGalaxyRanking.id)
+    )
+    if ranking_id is None:
+        session.rollback()
+        return None
+
+    try:
+        compute_galaxy_ranking(
+            ranking_id, localization_id, catalog_id, cumprob, session
+        )
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return ranking_id
+
+
+def get_galaxy_rankings(localization_id, catalog_ids, cumprob):
+    """Get the rankings of the galaxies of catalogs within a localization,
+    computing (and storing) those that are missing, or that cover less
+    than `cumprob` of the localization.
+
+    The rankings are computed in their own session and committed, so that
+    they are shared by the following queries (and their pages) whatever
+    the outcome of the caller's transaction.
+
+    Parameters
+    ----------
+    localization_id : int
+        ID of the Localization.
+    catalog_ids : list of int
+        IDs of the GalaxyCatalogs.
+    cumprob : float
+        Cumulative probability of the localization the rankings must cover.
+
+    Returns
+    -------
+    dict
+        LocalizationGalaxyRanking IDs, by catalog ID.
+    """
+    cumprob = max(float(cumprob), MIN_RANKING_CUMPROB)
+    ranking_ids = {}
+    with Session(bind=DBSession.session_factory.kw["bind"]) as session:
+        for catalog_id in catalog_ids:
+            ranking_id = None
+            while ranking_id is None:
+                ranking_id = get_or_compute_galaxy_ranking(
+                    localization_id, catalog_id, cumprob, session
+                )
+            ranking_ids[catalog_id] = ranking_id
+    return ranking_ids
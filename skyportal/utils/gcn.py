@@ -18,6 +18,7 @@ import numpy as np
 import requests
 import scipy
 from astropy.coordinates import ICRS, Angle, Latitude, Longitude, SkyCoord
+from astropy.io import fits
 from astropy.table import Table
 from astropy.time import Time
 from astropy_healpix import HEALPix, nside_to_level, pixel_resolution_to_nside
@@ -25,6 +26,9 @@ from mocpy import MOC
 
 SKYMAP_MIN = 1e-300
 
+# HEALPix order of the pixel ranges used by healpix_alchemy
+HEALPIX_TILE_ORDER = 29
+
 
 def get_trigger(root):
     """Get the trigger ID from a GCN notice."""
@@ -602,15 +606,73 @@ def from_ellipse(localization_name, ra, dec, amaj, amin, phi):
     return skymap
 
 
-def from_bytes(arr):
-    def get_col(m, name):
-        try:
-            col = m[name]
-        except KeyError:
-            return None
-        else:
-            return col.tolist()
+def skymap_column(skymap, name):
+    """Return a column of a skymap table as a NumPy array, or None if missing."""
+    try:
+        col = skymap[name]
+    except KeyError:
+        return None
+    else:
+        return np.asarray(col)
+
+
+def read_skymap(filename, localization_name, nside=128):
+    """Read a multi-order FITS skymap from disk.
+
+    The file is opened once: the same HDU list provides the skymap and the
+    header used to find the region occulted by the Earth (if any). The
+    columns are returned as NumPy arrays.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the (possibly gzipped) FITS file.
+    localization_name : str
+        Name of the localization.
+    nside : int, optional
+        Resolution used to remove the occulted region, by default 128
+
+    Returns
+    -------
+    skymap : dict
+        Localization name, and UNIQ, PROBDENSITY and DIST* arrays.
+    properties_dict : dict
+        Properties found in the header.
+    tags_list : list
+        Tags derived from the properties.
+    """
+    with fits.open(filename, memmap=False) as hdul:
+        header = hdul[1].header
+        skymap = ligo.skymap.io.read_sky_map(hdul, moc=True)
 
+    idx = np.where(skymap["PROBDENSITY"] < SKYMAP_MIN)[0]
+    skymap["PROBDENSITY"][idx] = 0
+
+    properties_dict, tags_list = properties_tags_from_meta(skymap.meta)
+
+    occulted = get_occulted_from_header(header, nside=nside)
+    if occulted is not None:
+        order = hp.nside2order(nside)
+        skymap_flat = ligo_bayestar.rasterize(skymap, order)["PROB"]
+        skymap_flat = hp.reorder(skymap_flat, "NESTED", "RING")
+        skymap_flat[occulted] = 0.0
+        skymap_flat = skymap_flat / skymap_flat.sum()
+        skymap_flat = hp.reorder(skymap_flat, "RING", "NESTED")
+        skymap = ligo_bayestar.derasterize(Table([skymap_flat], names=["PROB"]))
+
+    skymap = {
+        "localization_name": localization_name,
+        "uniq": skymap_column(skymap, "UNIQ"),
+        "probdensity": skymap_column(skymap, "PROBDENSITY"),
+        "distmu": skymap_column(skymap, "DISTMU"),
+        "distsigma": skymap_column(skymap, "DISTSIGMA"),
+        "distnorm": skymap_column(skymap, "DISTNORM"),
+    }
+
+    return skymap, properties_dict, tags_list
+
+
+def from_bytes(arr):
     with tempfile.NamedTemporaryFile(suffix=".fits.gz", mode="wb") as f:
         arrSplit = arr.split("base64,")
         filename = arrSplit[0].split("name=")[-1].replace(";", "")
@@ -620,41 +682,13 @@ def from_bytes(arr):
         f.write(base64.b64decode(arrSplit[-1]))
         f.flush()
 
-        skymap = ligo.skymap.io.read_sky_map(f.name, moc=True)
-
-        idx = np.where(skymap["PROBDENSITY"] < SKYMAP_MIN)[0]
-        skymap["PROBDENSITY"][idx] = 0
-
-        properties_dict, tags_list = properties_tags_from_meta(skymap.meta)
-
-        nside = 128
-        occulted = get_occulted(f.name, nside=nside)
-        if occulted is not None:
-            order = hp.nside2order(nside)
-            skymap_flat = ligo_bayestar.rasterize(skymap, order)["PROB"]
-            skymap_flat = hp.reorder(skymap_flat, "NESTED", "RING")
-            skymap_flat[occulted] = 0.0
-            skymap_flat = skymap_flat / skymap_flat.sum()
-            skymap_flat = hp.reorder(skymap_flat, "RING", "NESTED")
-            skymap = ligo_bayestar.derasterize(Table([skymap_flat], names=["PROB"]))
-
-        skymap = {
-            "localization_name": filename,
-            "uniq": get_col(skymap, "UNIQ"),
-            "probdensity": get_col(skymap, "PROBDENSITY"),
-            "distmu": get_col(skymap, "DISTMU"),
-            "distsigma": get_col(skymap, "DISTSIGMA"),
-            "distnorm": get_col(skymap, "DISTNORM"),
-        }
-
-    return skymap, properties_dict, tags_list
+        return read_skymap(f.name, filename)
 
 
-def get_occulted(url, nside=64):
-    m = Table.read(url, format="fits")
-    ra = m.meta.get("GEO_RA", None)
-    dec = m.meta.get("GEO_DEC", None)
-    error = m.meta.get("GEO_RAD", 67.5)
+def get_occulted_from_header(header, nside=64):
+    ra = header.get("GEO_RA", None)
+    dec = header.get("GEO_DEC", None)
+    error = header.get("GEO_RAD", 67.5)
 
     if (ra is None) or (dec is None) or (error is None):
         return None
@@ -670,6 +704,10 @@ def get_occulted(url, nside=64):
     return ipix
 
 
+def get_occulted(url, nside=64):
+    return get_occulted_from_header(fits.getheader(url, ext=1), nside=nside)
+
+
 def properties_tags_from_meta(meta):
     property_names = [
         # Gravitational waves
@@ -695,44 +733,40 @@ def properties_tags_from_meta(meta):
     return properties_dict, tags_list
 
 
-def from_url(url):
-    def get_col(m, name):
-        try:
-            col = m[name]
-        except KeyError:
-            return None
-        else:
-            return col.tolist()
-
+def from_url(url, timeout=60):
     filename = os.path.basename(urlparse(url).path)
 
-    skymap = ligo.skymap.io.read_sky_map(url, moc=True)
-    properties_dict, tags_list = properties_tags_from_meta(skymap.meta)
-
-    idx = np.where(skymap["PROBDENSITY"] < SKYMAP_MIN)[0]
-    skymap["PROBDENSITY"][idx] = 0
-
-    nside = 128
-    occulted = get_occulted(url, nside=nside)
-    if occulted is not None:
-        order = hp.nside2order(nside)
-        skymap_flat = ligo_bayestar.rasterize(skymap, order)["PROB"]
-        skymap_flat = hp.reorder(skymap_flat, "NESTED", "RING")
-        skymap_flat[occulted] = 0.0
-        skymap_flat = skymap_flat / skymap_flat.sum()
-        skymap_flat = hp.reorder(skymap_flat, "RING", "NESTED")
-        skymap = ligo_bayestar.derasterize(Table([skymap_flat], names=["PROB"]))
-
-    skymap = {
-        "localization_name": filename,
-        "uniq": get_col(skymap, "UNIQ"),
-        "probdensity": get_col(skymap, "PROBDENSITY"),
-        "distmu": get_col(skymap, "DISTMU"),
-        "distsigma": get_col(skymap, "DISTSIGMA"),
-        "distnorm": get_col(skymap, "DISTNORM"),
-    }
+    if urlparse(url).scheme not in ["http", "https"]:
+        # local file
+        return read_skymap(url, filename)
 
-    return skymap, properties_dict, tags_list
+    # download the skymap once, instead of letting each reader fetch it
+    r = requests.get(url, allow_redirects=True, timeout=timeout)
+    r.raise_for_status()
+    with tempfile.NamedTemporaryFile(suffix=filename, mode="wb") as f:
+        f.write(r.content)
+        f.flush()
+        return read_skymap(f.name, filename)
+
+
+def uniq_to_tile_ranges(uniq):
+    """Convert multi-order HEALPix UNIQ indices to the [lower, upper) ranges
+    of nested pixels at HEALPIX_TILE_ORDER stored in the tiles tables.
+
+    Parameters
+    ----------
+    uniq : array-like
+        UNIQ pixel indices.
+
+    Returns
+    -------
+    lower, upper : `numpy.ndarray`
+        Bounds of the pixel ranges.
+    """
+    order, ipix = ligo.skymap.moc.uniq2nest(np.asarray(uniq, dtype=np.int64))
+    shift = 2 * (HEALPIX_TILE_ORDER - order.astype(np.int64))
+    ipix = ipix.astype(np.int64)
+    return ipix << shift, (ipix + 1) << shift
 
 
 def get_contour(localization):
@@ -0,0 +1,232 @@
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import (
+    FK5,
+    AltAz,
+    SkyCoord,
+    angular_separation,
+    get_body,
+)
+from astropy.time import TimeDelta
+
+
+def target_scores(
+    ra,
+    dec,
+    toos,
+    observer,
+    times,
+    max_airmass=2.5,
+    min_altitude=20.0,
+    max_sun_altitude=-12.0,
+    hour_angle_limits=(-5.5, 5.5),
+    min_moon_separation=30.0,
+    too_tau=1 / 24 * u.day,
+):
+    """Score of many targets at many times, the product of the global
+    constraints of the follow-up scheduler, computed in one pass.
+
+    Parameters
+    ----------
+    ra, dec : numpy.ndarray
+        Coordinates (J2000) of the targets, in degrees.
+    toos : numpy.ndarray of bool
+        Whether each target is a target of opportunity, whose score
+        decays with time from the start of the schedule.
+    observer : `astroplan.Observer`
+        The site.
+    times : `astropy.time.Time`
+        The times.
+    max_airmass : float, optional
+        Score decreases linearly from 1 at airmass 1 to 0 at max_airmass.
+    min_altitude : float, optional
+        Minimum altitude of the targets, in degrees.
+    max_sun_altitude : float, optional
+        Maximum altitude of the Sun, in degrees (nautical twilight).
+    hour_angle_limits : (float, float), optional
+        Minimum and maximum hour angle of the targets, in hours.
+    min_moon_separation : float, optional
+        Minimum separation from the Moon, in degrees.
+    too_tau : `astropy.units.Quantity`, optional
+        Decay constant of the score of targets of opportunity.
+
+    Returns
+    -------
+    numpy.ndarray
+        Scores of shape (targets, times), 0 where a target cannot
+        be observed.
+    """
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    location = observer.location
+
+    # positions of the targets at the equinox of date, so that the hour
+    # angles are not off by the precession since J2000
+    of_date = SkyCoord(ra * u.deg, dec * u.deg).transform_to(
+        FK5(equinox=times[len(times) // 2])
+    )
+    ra_of_date = of_date.ra.deg[:, None]
+    dec_of_date = np.radians(of_date.dec.deg)[:, None]
+
+    # same sidereal time as HourAngleConstraint
+    gmst = np.mod(18.697374558 + 24.06570982441908 * (times.jd - 2451545), 24)
+    lst = np.mod(gmst + location.lon.deg / 15, 24)
+    hour_angle = np.mod(lst[None, :] - ra_of_date / 15 + 12, 24) - 12
+
+    latitude = location.lat.rad
+    sin_altitude = np.sin(dec_of_date) * np.sin(latitude) + np.cos(
+        dec_of_date
+    ) * np.cos(latitude) * np.cos(np.radians(hour_angle * 15))
+    altitude = np.degrees(np.arcsin(np.clip(sin_altitude, -1, 1)))
+
+    with np.errstate(divide="ignore"):
+        airmass = np.where(sin_altitude > 0, 1 / sin_altitude, np.inf)
+    scores = np.clip((max_airmass - airmass) / (max_airmass - 1), 0, 1)
+
+    scores *= altitude >= min_altitude
+    scores *= (hour_angle >= hour_angle_limits[0]) & (
+        hour_angle <= hour_angle_limits[1]
+    )
+
+    sun = get_body("sun", times, location=location)
+    sun_altitude = sun.transform_to(AltAz(obstime=times, location=location)).alt.deg
+    scores *= (sun_altitude <= max_sun_altitude)[None, :]
+
+    moon = get_body("moon", times, location=location).icrs
+    moon_separation = np.degrees(
+        angular_separation(
+            np.radians(moon.ra.deg)[None, :],
+            np.radians(moon.dec.deg)[None, :],
+            np.radians(ra)[:, None],
+            np.radians(dec)[:, None],
+        )
+    )
+    scores *= moon_separation >= min_moon_separation
+
+    toos = np.asarray(toos, dtype=bool)
+    if toos.any():
+        elapsed = (times - times[0]).to_value(u.day)
+        scores[toos] *= np.exp(-elapsed / too_tau.to_value(u.day))[None, :]
+
+    return scores
+
+
+def _windows(values, size):
+    """Sums of `values` over all the windows of `size` consecutive items."""
+    cumsum = np.concatenate([[0], np.cumsum(values)])
+    return cumsum[size:] - cumsum[: len(cumsum) - size]
+
+
+def grid_schedule(
+    blocks,
+    toos,
+    observer,
+    start_time,
+    end_time,
+    time_resolution=20 * u.second,
+    slew_rate=2.0 * u.deg / u.second,
+    filter_change_time=10 * u.second,
+    **constraint_kwargs,
+):
+    """Schedule observing blocks on a grid of time slots.
+
+    The scores of all the blocks in all the slots are computed at once
+    (see `target_scores`). Blocks are then placed one at a time, by
+    priority (lower values first, as in astroplan), at the start with the
+    best total score over the block among those where the block fits,
+    leaving enough free slots before and after for the slews from and to
+    its neighbours, and the filter changes.
+
+    Parameters
+    ----------
+    blocks : list of `astroplan.ObservingBlock`
+        The blocks, with a "filter" in their configuration.
+    toos : list of bool
+        Whether each block is a target of opportunity.
+    observer : `astroplan.Observer`
+        The site.
+    start_time, end_time : `astropy.time.Time`
+        Window of the schedule.
+    time_resolution : `astropy.units.Quantity`, optional
+        Duration of the slots, by default 20 seconds.
+    slew_rate : `astropy.units.Quantity`, optional
+        Slew rate of the telescope, by default 2 deg/s.
+    filter_change_time : `astropy.units.Quantity`, optional
+        Duration of a filter change, by default 10 seconds.
+    **constraint_kwargs
+        Passed to `target_scores`.
+
+    Returns
+    -------
+    list of (`astroplan.ObservingBlock`, `astropy.time.Time`)
+        The scheduled blocks and their start times, in time order.
+    """
+    dt = time_resolution.to_value(u.second)
+    n_slots = int((end_time - start_time).sec // dt)
+    if len(blocks) == 0 or n_slots == 0:
+        return []
+    times = start_time + TimeDelta(np.arange(n_slots) * dt * u.second)
+
+    ra = np.array([block.target.ra.deg for block in blocks])
+    dec = np.array([block.target.dec.deg for block in blocks])
+    filters = np.array([block.configuration.get("filter") for block in blocks])
+    # blocks occupy at least one slot, even with a zero duration
+    durations = np.array(
+        [max(np.ceil(block.duration.to_value(u.second) / dt), 1) for block in blocks],
+        dtype=int,
+    )
+    scores = target_scores(ra, dec, toos, observer, times, **constraint_kwargs)
+
+    slots = np.arange(n_slots)
+    # index of the block occupying each slot, -1 if free
+    occupied = np.full(n_slots, -1)
+    scheduled = []
+    # stable sort: blocks of equal priority are placed in the order given
+    order = np.argsort([block.priority for block in blocks], kind="stable")
+    for i in order:
+        size = durations[i]
+        if size > n_slots or not scores[i].any():
+            continue
+
+        available = (scores[i] > 0) & (occupied < 0)
+        fits = _windows(available, size) == size
+        if not fits.any():
+            continue
+
+        # number of slots needed to move from each block to this one
+        separation = np.degrees(
+            angular_separation(
+                np.radians(ra[i]), np.radians(dec[i]), np.radians(ra), np.radians(dec)
+            )
+        )
+        transition = separation / slew_rate.to_value(u.deg / u.second) + np.where(
+            filters != filters[i], filter_change_time.to_value(u.second), 0
+        )
+        transition_slots = np.ceil(transition / dt).astype(int)
+
+        starts = slots[: n_slots - size + 1]
+        ends = starts + size
+        # last occupied slot before each start, and first one after each end
+        last_occupied = np.maximum.accumulate(np.where(occupied >= 0, slots, -1))
+        previous = np.concatenate([[-1], last_occupied])[starts]
+        first_occupied = np.minimum.accumulate(
+            np.where(occupied >= 0, slots, n_slots)[::-1]
+        )[::-1]
+        following = np.concatenate([first_occupied, [n_slots]])[ends]
+
+        fits &= (previous < 0) | (
+            starts - previous - 1 >= transition_slots[occupied[previous]]
+        )
+        fits &= (following >= n_slots) | (
+            following - ends
+            >= transition_slots[occupied[np.minimum(following, n_slots - 1)]]
+        )
+        if not fits.any():
+            continue
+
+        window_scores = np.where(fits, _windows(scores[i], size), -np.inf)
+        start = int(np.argmax(window_scores))
+        occupied[start : start + size] = i
+        scheduled.append((start, i))
+
+    return [(blocks[i], times[start]) for start, i in sorted(scheduled)]
@@ -1,3 +1,21 @@
+import http.cookiejar
+import threading
+import time
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from baselayer.app.env import load_env
+
+_, cfg = load_env()
+
+# upper bounds (in seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
 def serialize_requests_request(request):
     if request.body is not None:
         if isinstance(request.body, bytes):
@@ -41,3 +59,170 @@ def serialize_tornado_request(handler):
         "url": handler.request.uri,
         "method": handler.request.method,
     }
+
+
+class FacilityBusyError(requests.exceptions.RequestException):
+    """Raised when too many requests to a facility are already in progress."""
+
+
+class FacilityClient:
+    """HTTP client of a facility API, with the interface of `requests`.
+
+    Requests share a pool of keep-alive connections, have default timeouts,
+    and are retried with exponential backoff on connection errors (and, for
+    idempotent methods, on 429/502/503/504 responses). The number of
+    concurrent requests is capped, and the count, status codes and latency
+    histogram of the requests are recorded.
+
+    Cookies set by the facility are not kept between requests, so that the
+    requests made on behalf of different users do not share a state.
+
+    Parameters
+    ----------
+    facility : str
+        Name of the facility, used in the metrics.
+    connect_timeout, read_timeout : float, optional
+        Default timeouts in seconds, by default app.facility_http.*_timeout
+    max_retries : int, optional
+        Maximum number of retries, by default app.facility_http.max_retries
+    backoff_factor : float, optional
+        Backoff factor between retries, by default app.facility_http.backoff_factor
+    max_concurrent_requests : int, optional
+        Maximum number of requests in progress, by default
+        app.facility_http.max_concurrent_requests
+    """
+
+    def __init__(
+        self,
+        facility,
+        connect_timeout=None,
+        read_timeout=None,
+        max_retries=None,
+        backoff_factor=None,
+        max_concurrent_requests=None,
+    ):
+        config = cfg.get("app.facility_http", {}) or {}
+        self.facility = facility
+        self.timeout = (
+            connect_timeout or config.get("connect_timeout", 10),
+            read_timeout or config.get("read_timeout", 60),
+        )
+        if max_retries is None:
+            max_retries = config.get("max_retries", 3)
+        if backoff_factor is None:
+            backoff_factor = config.get("backoff_factor", 0.5)
+        max_concurrent_requests = max_concurrent_requests or config.get(
+            "max_concurrent_requests", 8
+        )
+
+        self.session = requests.Session()
+        self.session.cookies.set_policy(
+            http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max_concurrent_requests,
+            max_retries=Retry(
+                total=max_retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrent_requests)
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._statuses = Counter()
+        self._histogram = [0] * len(LATENCY_BUCKETS)
+        self._latency_sum = 0.0
+
+    def _record(self, duration, status=None):
+        with self._lock:
+            self._requests += 1
+            if status is None:
+                self._errors += 1
+            else:
+                self._statuses[f"{status // 100}xx"] += 1
+            self._latency_sum += duration
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    self._histogram[i] += 1
+                    break
+
+    def request(self, method, url, **kwargs):
+        """Send a request, see `requests.request`. Without a timeout
+        (or with None), the client's default timeouts are used."""
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        timeout = kwargs["timeout"]
+        connect_timeout = timeout[0] if isinstance(timeout, tuple) else timeout
+        if not self._slots.acquire(timeout=connect_timeout):
+            self._record(0.0)
+            raise FacilityBusyError(
+                f"Too many requests in progress to {self.facility}, try again later"
+            )
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception:
+            self._record(time.perf_counter() - start)
+            raise
+        finally:
+            self._slots.release()
+        self._record(time.perf_counter() - start, response.status_code)
+        return response
+
+    def get(self, url, params=None, **kwargs):
+        return self.request("GET", url, params=params, **kwargs)
+
+    def post(self, url, data=None, json=None, **kwargs):
+        return self.request("POST", url, data=data, json=json, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request("PUT", url, data=data, **kwargs)
+
+    def patch(self, url, data=None, **kwargs):
+        return self.request("PATCH", url, data=data, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def get_metrics(self):
+        """Request count, errors (no response), status codes and
+        latency histogram (count of requests per upper bound in seconds)."""
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "errors": self._errors,
+                "statuses": dict(self._statuses),
+                "latency_sum": self._latency_sum,
+                "latency_histogram": {
+                    str(bound): count
+                    for bound, count in zip(LATENCY_BUCKETS, self._histogram)
+                },
+            }
+
+
+_facility_clients = {}
+_facility_clients_lock = threading.Lock()
+
+
+def get_facility_client(facility):
+    """The (per process) shared FacilityClient of a facility."""
+    with _facility_clients_lock:
+        if facility not in _facility_clients:
+            _facility_clients[facility] = FacilityClient(facility)
+        return _facility_clients[facility]
+
+
+def get_facility_metrics():
+    """Metrics of the FacilityClient of each facility, see FacilityClient.get_metrics."""
+    with _facility_clients_lock:
+        clients = dict(_facility_clients)
+    return {facility: client.get_metrics() for facility, client in clients.items()}
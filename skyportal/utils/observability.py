@@ -0,0 +1,112 @@
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import AltAz, get_body
+from astropy.time import Time, TimeDelta
+
+from .calculations import get_airmass
+
+# sampling of the altitude of the Sun, the twilight times are then
+# interpolated between the samples
+TWILIGHT_SAMPLE_MINUTES = 5
+
+# altitude of the Sun (in degrees) at each pair of events
+TWILIGHT_HORIZONS = {
+    ("sun_set", "sun_rise"): 0,
+    ("twilight_evening_nautical", "twilight_morning_nautical"): -12,
+    ("twilight_evening_astronomical", "twilight_morning_astronomical"): -18,
+}
+TWILIGHT_EVENTS = [event for events in TWILIGHT_HORIZONS for event in events]
+
+
+def _crossings(times, altitudes, horizon):
+    """Times (unix) at which the altitudes cross the horizon downwards
+    (setting) and upwards (rising), interpolated between the samples."""
+    above = altitudes > horizon
+    setting = np.flatnonzero(above[:-1] & ~above[1:])
+    rising = np.flatnonzero(~above[:-1] & above[1:])
+
+    def interpolate(i):
+        fraction = (altitudes[i] - horizon) / (altitudes[i] - altitudes[i + 1])
+        return times[i] + fraction * (times[i + 1] - times[i])
+
+    return interpolate(setting), interpolate(rising)
+
+
+def compute_twilight_table(observer, year):
+    """Times of sunset, sunrise and twilights at a site for a whole year.
+
+    The altitude of the Sun is computed for the whole year in a single
+    transformation, rather than solving for each event separately.
+
+    Parameters
+    ----------
+    observer : `astroplan.Observer`
+        The site.
+    year : int
+        The year. The table extends a few days into the previous
+        and next years, so that the nights around new year are complete.
+
+    Returns
+    -------
+    dict
+        For each of TWILIGHT_EVENTS, the sorted times (unix) of the event.
+    """
+    start = Time(f"{year}-01-01T00:00:00", scale="utc") - TimeDelta(2 * u.day)
+    end = Time(f"{year + 1}-01-01T00:00:00", scale="utc") + TimeDelta(2 * u.day)
+    step = TWILIGHT_SAMPLE_MINUTES * 60
+    times = start + TimeDelta(np.arange(0, (end - start).sec + step, step) * u.s)
+
+    sun = get_body("sun", times, location=observer.location)
+    altitudes = sun.transform_to(
+        AltAz(obstime=times, location=observer.location)
+    ).alt.deg
+    unix = times.unix
+
+    table = {"year": year}
+    for (evening, morning), horizon in TWILIGHT_HORIZONS.items():
+        table[evening], table[morning] = _crossings(unix, altitudes, horizon)
+    return table
+
+
+def next_event(table, event, time):
+    """Time (unix) of the first `event` after `time` (unix) in a twilight
+    table, or None if there is no such event in the table."""
+    times = table[event]
+    i = np.searchsorted(times, time, side="right")
+    if i >= len(times):
+        return None
+    return float(times[i])
+
+
+def night_airmass(fields, observer, nights, sample_size=60, **kwargs):
+    """Airmass of many fields, sampled over many nights, in a single
+    transformation.
+
+    Parameters
+    ----------
+    fields : list of dict
+        The fields, with keys 'ra', 'dec' and 'field_id'.
+    observer : `astroplan.Observer`
+        The site.
+    nights : list of (float, float)
+        Start and end time (unix) of each night.
+    sample_size : int, optional
+        Number of samples per night, by default 60
+    **kwargs
+        Passed to `get_airmass`.
+
+    Returns
+    -------
+    times : numpy.ndarray
+        Sample times (unix), of shape (nights, samples).
+    airmass : numpy.ndarray
+        Airmass of shape (fields, nights, samples).
+    """
+    nights = np.asarray(nights, dtype=float).reshape(-1, 2)
+    times = np.linspace(nights[:, 0], nights[:, 1], sample_size, axis=1)
+    if len(nights) == 0:
+        return times, np.empty((len(fields), 0, sample_size))
+    airmass = get_airmass(
+        fields, Time(times.ravel(), format="unix"), observer=observer, **kwargs
+    )
+    return times, airmass.reshape(len(fields), *times.shape)
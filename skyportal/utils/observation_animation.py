@@ -0,0 +1,200 @@
+import io
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.patches as mpatches
+import matplotlib.pyplot as plt
+import numpy as np
+from ligo.skymap import plot  # noqa: F401
+from matplotlib import animation
+from PIL import Image
+
+# frames per second of the movies
+MOVIE_FPS = 5
+
+# frames sent at once to each worker process
+FRAME_CHUNK_SIZE = 10
+
+# figure, axes and fields of the process rendering frames
+_renderer = None
+
+
+def field_alphas(n_fields, k, decay=4, alpha_default=1, alpha_cutoff=0.1):
+    """Opacity of the fields of a plan in frame `k` of its movie.
+
+    Fields up to the k-th are fading out exponentially with their age
+    (at a rate of `decay` frames), the following ones are opaque. With no
+    decay, all fields have `alpha_default`. Fields with an opacity below
+    `alpha_cutoff` are not drawn (their opacity is 0).
+    """
+    if decay != 0:
+        alphas = np.minimum(np.exp((np.arange(n_fields) - k) / decay), 1)
+    else:
+        alphas = np.full(n_fields, float(alpha_default))
+    alphas[alphas <= alpha_cutoff] = 0
+    return alphas
+
+
+def _make_renderer(skymap, fields, colors, figsize, alpha_options):
+    matplotlib.use("Agg")
+    fig = plt.figure(figsize=figsize, constrained_layout=False)
+    ax = plt.axes(projection="astro mollweide")
+    ax.imshow_hpx(skymap, cmap="cylon")
+    plt.legend(
+        handles=[
+            mpatches.Patch(color=color, label=filt) for filt, color in colors.items()
+        ]
+    )
+    return {
+        "fig": fig,
+        "ax": ax,
+        "fields": fields,
+        "colors": colors,
+        "alpha_options": alpha_options,
+    }
+
+
+def _init_frame_renderer(*args):
+    global _renderer
+    _renderer = _make_renderer(*args)
+
+
+def _render_frame(renderer, k):
+    fig, ax, fields = renderer["fig"], renderer["ax"], renderer["fields"]
+    alphas = field_alphas(len(fields), k, **renderer["alpha_options"])
+    patches = []
+    for (coords, filt), alpha in zip(fields, alphas):
+        if coords is None or alpha == 0:
+            continue
+        patches.append(
+            ax.add_patch(
+                plt.Polygon(
+                    coords,
+                    alpha=alpha,
+                    facecolor=renderer["colors"][filt],
+                    edgecolor="black",
+                    transform=ax.get_transform("world"),
+                )
+            )
+        )
+    fig.canvas.draw()
+    image = Image.fromarray(np.asarray(fig.canvas.buffer_rgba()))
+    for patch in patches:
+        patch.remove()
+
+    # frames are sent back compressed
+    buf = io.BytesIO()
+    image.save(buf, format="png")
+    return buf.getvalue()
+
+
+def render_frame(k):
+    """Render frame `k` in a process initialized by `_init_frame_renderer`."""
+    return _render_frame(_renderer, k)
+
+
+def render_frames(
+    skymap,
+    fields,
+    colors,
+    figsize=(10, 8),
+    alpha_options=None,
+    n_processes=1,
+):
+    """Render the frames of the movie of an observation plan, one per
+    field: the sky map with the fields drawn over it, fading out with their
+    age (see `field_alphas`).
+
+    Parameters
+    ----------
+    skymap : `numpy.ndarray`
+        Flat (RING ordered) HEALPix probability map.
+    fields : list of tuple
+        Outline (list of [ra, dec] in degrees, or None not to draw the
+        field) and filter of the observed fields, in order.
+    colors : dict
+        Color of each filter.
+    figsize : tuple, optional
+        Matplotlib figsize of the frames.
+    alpha_options : dict, optional
+        Keyword arguments of `field_alphas`.
+    n_processes : int, optional
+        Number of processes rendering the frames, by default 1 (no pool).
+
+    Returns
+    -------
+    list of bytes
+        Frames, as PNG images.
+    """
+    args = (skymap, fields, colors, figsize, alpha_options or {})
+    if n_processes <= 1 or len(fields) <= FRAME_CHUNK_SIZE:
+        renderer = _make_renderer(*args)
+        try:
+            return [_render_frame(renderer, k) for k in range(len(fields))]
+        finally:
+            plt.close(renderer["fig"])
+
+    # spawn rather than fork, as the app process has threads and
+    # open database connections
+    with ProcessPoolExecutor(
+        max_workers=min(n_processes, -(-len(fields) // FRAME_CHUNK_SIZE)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_frame_renderer,
+        initargs=args,
+    ) as executor:
+        return list(
+            executor.map(render_frame, range(len(fields)), chunksize=FRAME_CHUNK_SIZE)
+        )
+
+
+def encode_movie(frames, output_format="gif", fps=MOVIE_FPS):
+    """Assemble PNG frames into a movie.
+
+    Parameters
+    ----------
+    frames : list of bytes
+        Frames, as PNG images of the same size.
+    output_format : str, optional
+        "gif" or "mp4".
+    fps : int, optional
+        Frames per second.
+
+    Returns
+    -------
+    bytes
+        The movie.
+    """
+    if output_format == "gif":
+        images = [Image.open(io.BytesIO(frame)) for frame in frames]
+        buf = io.BytesIO()
+        images[0].save(
+            buf,
+            format="gif",
+            save_all=True,
+            append_images=images[1:],
+            duration=int(1000 / fps),
+            loop=0,
+        )
+        return buf.getvalue()
+    elif output_format == "mp4":
+        matplotlib.use("Agg")
+        images = [np.asarray(Image.open(io.BytesIO(frame))) for frame in frames]
+        height, width = images[0].shape[:2]
+        dpi = 100
+        fig = plt.figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+        figimage = fig.figimage(images[0])
+        writer = animation.FFMpegWriter(fps=fps)
+        try:
+            with tempfile.NamedTemporaryFile(suffix=".mp4") as f:
+                with writer.saving(fig, f.name, dpi):
+                    for image in images:
+                        figimage.set_data(image)
+                        writer.grab_frame()
+                with open(f.name, mode="rb") as g:
+                    return g.read()
+        finally:
+            plt.close(fig)
+    else:
+        raise ValueError("output_format must be gif or mp4")
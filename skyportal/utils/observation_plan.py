@@ -20,7 +20,7 @@ from baselayer.app.flow import Flow
 from baselayer.log import make_log
 
 from ..handlers.api.galaxy import get_galaxies
-from .cache import Cache, array_to_bytes
+from .cache import Cache, array_to_bytes, dict_to_bytes
 
 log = make_log("api/observation_plan")
 
@@ -33,6 +33,15 @@ cache = Cache(
     * 60,  # defaults to 1 day
 )
 
+# skymaps prepared for planning, shared by the plans of all the instruments
+# and allocations for the same localization (and by the queue workers)
+skymap_cache = Cache(
+    cache_dir="cache/observation_plan_skymaps",
+    max_items=cfg.get("misc.max_items_in_localization_instrument_query_cache", 100),
+    max_age=cfg.get("misc.minutes_to_keep_localization_instrument_query_cache", 24 * 60)
+    * 60,
+)
+
 use_skyportal_fields = cfg["app.observation_plan.use_skyportal_fields"]
 use_parallel = cfg.get("app.observation_plan.use_parallel", False)
 Ncores = cfg.get("app.observation_plan.Ncores", 1)
@@ -331,6 +340,133 @@ def generate_observation_plan_statistics(
         session.commit()
 
 
+def get_map_struct(localization, nside, confidence_level, galactic_limit):
+    """Skymap of a localization prepared for gwemopt: the multiresolution
+    skymap with the coordinates of its pixels, the skymap to schedule
+    (restricted to the confidence level and away from the galactic plane)
+    and the center of the localization.
+
+    Loading, rasterizing and masking the skymap is done once per
+    localization and parameters, the result is cached on disk and reused by
+    the other plans of the event.
+
+    Parameters
+    ----------
+    localization : skyportal.models.Localization
+        The localization.
+    nside : int
+        HEALPix nside at which the skymap is rasterized.
+    confidence_level : float
+        Maximum integrated probability of the skymap to schedule.
+    galactic_limit : float
+        Galactic latitude (in degrees) under which the skymap is not scheduled.
+
+    Returns
+    -------
+    dict
+        The map_struct, with the "skymap", "skymap_schedule" and "center" keys.
+    """
+    modified = localization.modified.isoformat() if localization.modified else ""
+    query_id = (
+        f"{localization.id}_{modified}_{nside}_{confidence_level}_{galactic_limit}"
+    )
+    cache_filename = skymap_cache[query_id]
+    if cache_filename is not None:
+        try:
+            map_struct = np.load(cache_filename, allow_pickle=True).item()
+            # copied, as gwemopt modifies the skymaps
+            return {
+                "skymap": map_struct["skymap"].copy(),
+                "skymap_schedule": map_struct["skymap_schedule"].copy(),
+                "center": map_struct["center"],
+            }
+        except Exception:
+            log(f"Failed to load cached skymap for localization {localization.id}")
+
+    map_struct = {"skymap": localization.table}
+
+    level, ipix = ah.uniq_to_level_ipix(map_struct["skymap"]["UNIQ"])
+    ra, dec = ah.healpix_to_lonlat(ipix, ah.level_to_nside(level), order="nested")
+    map_struct["skymap"]["ra"] = ra.deg
+    map_struct["skymap"]["dec"] = dec.deg
+
+    map_struct["skymap_schedule"] = map_struct["skymap"].copy()
+
+    skymap_raster = rasterize(map_struct["skymap"], order=hp.nside2order(int(nside)))
+
+    peak = skymap_raster[skymap_raster["PROB"] == np.max(skymap_raster["PROB"])]
+    map_struct["center"] = SkyCoord(peak["ra"][0] * u.deg, peak["dec"][0] * u.deg)
+
+    if confidence_level < 1.0:
+        prob = skymap_raster["PROB"]
+        ind = np.argsort(prob)[::-1]
+        prob = prob[ind]
+        ii = np.where(np.cumsum(prob) > confidence_level)[0]
+        skymap_raster["PROB"][ind[ii]] = 0.0
+        map_struct["skymap_schedule"] = derasterize(skymap_raster)
+
+    if galactic_limit > 0.0:
+        coords = SkyCoord(ra=ra, dec=dec)
+        ipix = np.where(np.abs(coords.galactic.b.deg) <= galactic_limit)[0]
+        map_struct["skymap_schedule"]["PROBDENSITY"][ipix] = 0.0
+
+    skymap_cache[query_id] = dict_to_bytes(map_struct)
+    return {
+        "skymap": map_struct["skymap"].copy(),
+        "skymap_schedule": map_struct["skymap_schedule"].copy(),
+        "center": map_struct["center"],
+    }
+
+
+def get_min_probdensity(
+    session, localizationtilescls, localization_id, integrated_probability
+):
+    """Minimum probability density of the tiles of a localization within
+    an integrated probability, cached for the other plans of the event.
+
+    Parameters
+    ----------
+    session : sqlalchemy.orm.Session
+        Database session.
+    localizationtilescls : type
+        The LocalizationTile partition holding the tiles of the localization.
+    localization_id : int
+        ID of the localization.
+    integrated_probability : float
+        Integrated probability (between 0 and 1).
+
+    Returns
+    -------
+    float or None
+        The minimum probability density, None if the localization has no tiles.
+    """
+    query_id = f"{localization_id}_{integrated_probability}_min_probdensity"
+    cache_filename = cache[query_id]
+    if cache_filename is not None:
+        return float(np.load(cache_filename)[0])
+
+    cum_prob = (
+        sa.func.sum(
+            localizationtilescls.probdensity * localizationtilescls.healpix.area
+        )
+        .over(order_by=localizationtilescls.probdensity.desc())
+        .label("cum_prob")
+    )
+    localizationtile_subquery = (
+        sa.select(localizationtilescls.probdensity, cum_prob).filter(
+            localizationtilescls.localization_id == localization_id
+        )
+    ).subquery()
+    min_probdensity = session.scalar(
+        sa.select(sa.func.min(localizationtile_subquery.columns.probdensity)).filter(
+            localizationtile_subquery.columns.cum_prob <= integrated_probability
+        )
+    )
+    if min_probdensity is not None:
+        cache[query_id] = array_to_bytes([min_probdensity])
+    return min_probdensity
+
+
 def generate_plan(
     observation_plan_ids,
     request_ids,
@@ -589,38 +725,13 @@ def generate_plan(
 
         log(f"Reading skymap for ID(s): {','.join(observation_plan_id_strings)}")
 
-        map_struct = {"skymap": request.localization.table}
-
-        level, ipix = ah.uniq_to_level_ipix(map_struct["skymap"]["UNIQ"])
-        nside = ah.level_to_nside(level)
-        ra, dec = ah.healpix_to_lonlat(ipix, nside, order="nested")
-        map_struct["skymap"]["ra"] = ra.deg
-        map_struct["skymap"]["dec"] = dec.deg
-
-        map_struct["skymap_schedule"] = map_struct["skymap"].copy()
-
-        skymap_raster = rasterize(
-            map_struct["skymap"], order=hp.nside2order(int(params["nside"]))
+        map_struct = get_map_struct(
+            request.localization,
+            params["nside"],
+            params["confidence_level"],
+            params["galactic_limit"],
         )
 
-        peak = skymap_raster[skymap_raster["PROB"] == np.max(skymap_raster["PROB"])]
-        map_struct["center"] = SkyCoord(peak["ra"][0] * u.deg, peak["dec"][0] * u.deg)
-
-        if params["confidence_level"] < 1.0:
-            prob = skymap_raster["PROB"]
-            ind = np.argsort(prob)[::-1]
-            prob = prob[ind]
-            ii = np.where(np.cumsum(prob) > params["confidence_level"])[0]
-            skymap_raster["PROB"][ind[ii]] = 0.0
-            map_struct["skymap_schedule"] = derasterize(skymap_raster)
-
-        if params["galactic_limit"] > 0.0:
-            coords = SkyCoord(ra=ra, dec=dec)
-            ipix = np.where(np.abs(coords.galactic.b.deg) <= params["galactic_limit"])[
-                0
-            ]
-            map_struct["skymap_schedule"]["PROBDENSITY"][ipix] = 0.0
-
         # get the partition name for the localization tiles using the dateobs
         # that way, we explicitely use the partition that contains the localization tiles we are interested in
         # that should help not reach that "critical point" mentioned by @mcoughlin where the queries almost dont work anymore
@@ -654,28 +765,8 @@ def generate_plan(
 
         start = time.time()
 
-        cum_prob = (
-            sa.func.sum(
-                localizationtilescls.probdensity * localizationtilescls.healpix.area
-            )
-            .over(order_by=localizationtilescls.probdensity.desc())
-            .label("cum_prob")
-        )
-        localizationtile_subquery = (
-            sa.select(localizationtilescls.probdensity, cum_prob).filter(
-                localizationtilescls.localization_id == request.localization.id
-            )
-        ).subquery()
-
         # convert to 0-1
         integrated_probability = request.payload["integrated_probability"] * 0.01
-        min_probdensity = (
-            sa.select(
-                sa.func.min(localizationtile_subquery.columns.probdensity)
-            ).filter(
-                localizationtile_subquery.columns.cum_prob <= integrated_probability
-            )
-        ).scalar_subquery()
 
         if params["tilesType"] == "galaxy":
             if "galaxy_sorting" not in request.payload:
@@ -762,6 +853,12 @@ def generate_plan(
                     if cache_filename is not None:
                         field_tiles = np.load(cache_filename).tolist()
                     else:
+                        min_probdensity = get_min_probdensity(
+                            session,
+                            localizationtilescls,
+                            request.localization.id,
+                            integrated_probability,
+                        )
                         field_tiles_query = sa.select(InstrumentField.field_id).where(
                             localizationtilescls.localization_id
                             == request.localization.id,
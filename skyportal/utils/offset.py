@@ -13,7 +13,6 @@ import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import pyvo as vo
 import requests
 import seaborn as sns
 from astropy import units as u
@@ -26,11 +25,8 @@ from astropy.visualization import ImageNormalize, ZScaleInterval
 from astropy.wcs import WCS
 from astropy.wcs.utils import pixel_to_skycoord
 from astropy.wcs.wcs import FITSFixedWarning
-from astroquery.gaia import Gaia
 from joblib import Memory
 from numpy import ma
-from pyvo.dal.exceptions import DALQueryError, DALServiceError
-from reproject import reproject_adaptive
 from requests.exceptions import HTTPError
 from scipy.ndimage import gaussian_filter
 
@@ -38,6 +34,7 @@ from baselayer.app.env import load_env
 from baselayer.log import make_log
 
 from .cache import Cache
+from .gaia_cache import gaia_tile_cache
 
 log = make_log("finder-chart")
 
@@ -99,6 +96,11 @@ class GaiaQuery:
         """Try to connect to the main Gaia server of astroquery, else
         fall over to backup server
         """
+        # astroquery and pyvo are only imported once a finding chart is made
+        import pyvo as vo
+        from astroquery.gaia import Gaia
+        from pyvo.dal.exceptions import DALQueryError
+
         try:
             g = Gaia
             q = f"SELECT TOP 1 ra, dec from {self.main_db}.gaia_source"
@@ -128,20 +130,31 @@ class GaiaQuery:
                 self.connection = None
                 return False
 
-    def query(self, q):
+    def query(self, q, async_job=False):
+        """Run an ADQL query, in which {main_db} is replaced by the name
+        of the database. Asynchronous jobs are not limited in the number
+        of rows they return."""
         if not self.db_connected or self.connection is None:
             raise HTTPError("GaiaQuery not connected properly.")
 
+        from pyvo.dal.exceptions import DALServiceError
+
         # replace the main db name
         q = q.format(main_db=self.main_db)
         if not self.is_backup:
-            job = self.connection.launch_job(q)
+            if async_job:
+                job = self.connection.launch_job_async(q)
+            else:
+                job = self.connection.launch_job(q)
             rez = job.get_results()
             return rez
         else:
             try:
                 # native return type is pyvo.dal.tap.TAPResults
-                job = self.connection.search(q)
+                if async_job:
+                    job = self.connection.run_async(q)
+                else:
+                    job = self.connection.search(q)
                 return self._standardize_table(job.to_table())
             except DALServiceError:
                 log("Warning: backup TAP+ server failed")
@@ -948,9 +961,10 @@ def get_nearby_offset_stars(
     -------
     (list, str, int, int, bool)
         Return a tuple which contains: a list of dictionaries for each object
-        in the star list, the query issued, the number of queries issues,
-        the length of the star list (not including the source itself),
-        and whether the ZTFref catalog was used for source positions or not.
+        in the star list, a description of the catalog search, the number of
+        queries issues, the length of the star list (not including the source
+        itself), and whether the ZTFref catalog was used for source positions
+        or not.
     """
     if queries_issued >= allowed_queries:
         raise Exception("Number of offsets queries needed exceeds what is allowed")
@@ -974,32 +988,24 @@ def get_nearby_offset_stars(
     search_multipler = 20
     min_distance = 5.0 / 3600.0  # min distance from source for offset star
     source_in_catalog_dist = 0.5 / 3600.0  # min distance from source for offset star
-    query_string = f"""
-                  SELECT DISTANCE(
-                    POINT('ICRS', ra, dec),
-                    POINT('ICRS', {source_ra}, {source_dec})) AS
-                    dist, source_id, ra, dec, ref_epoch,
-                    phot_rp_mean_mag, pmra, pmdec, parallax
-                  FROM {{main_db}}.gaia_source
-                  WHERE 1=CONTAINS(
-                    POINT('ICRS', ra, dec),
-                    CIRCLE('ICRS', {source_ra}, {source_dec},
-                           {radius_degrees}))
-                """
+    query_description = (
+        f"Gaia DR3 sources within {radius_degrees} deg of "
+        f"({source_ra}, {source_dec}), from the local Gaia tile cache"
+    )
     default_return = (
         [],
-        query_string.replace("\n", " "),
+        query_description,
         queries_issued,
         0,
         False,
     )
 
-    # try to get Gaia sources first
+    # try to get Gaia sources first, from the local tile cache
+    # (which queries the Gaia archive for the tiles it does not have)
     r = None
     for retry in range(2):
         try:
-            g = GaiaQuery()
-            r = g.query(query_string)
+            r = gaia_tile_cache.cone_search(source_ra, source_dec, radius_degrees)
             break
         except Exception as e:
             log(f"Gaia query failed: {e}]")
@@ -1011,6 +1017,9 @@ def get_nearby_offset_stars(
         if use_ztfref_as_gaia_backup:
             r = get_astrometry_backup_from_ztf(source_ra, source_dec)
             use_ztfref = True
+            query_description = (
+                f"ZTF reference catalog sources around ({source_ra}, {source_dec})"
+            )
         else:
             return default_return
     if r is None or len(r) == 0:
@@ -1018,10 +1027,12 @@ def get_nearby_offset_stars(
 
     # we need to filter here to get around the new Gaia archive slowdown
     # when SQL filtering on different columns
+    # (2-parameter Gaia solutions, without parallax, are kept)
+    parallax = np.ma.filled(np.ma.asarray(r["parallax"], dtype=float), np.nan)
     filter_mask = (
         (r["phot_rp_mean_mag"] < mag_limit + fainter_diff)
         & (r["phot_rp_mean_mag"] > mag_min)
-        & (r["parallax"] < 250)
+        & ~(parallax >= 250)
     )
     r = r[filter_mask]
     # sort by distance and take the top several results
@@ -1079,16 +1090,36 @@ def get_nearby_offset_stars(
     min_sep = min_sep_arcsec * u.arcsec
     good_list = []
     for source in r:
-        c = SkyCoord(
-            ra=source["ra"],
-            dec=source["dec"],
-            unit=(u.degree, u.degree),
-            pm_ra_cosdec=source["pmra"] * u.mas / u.yr,
-            pm_dec=source["pmdec"] * u.mas / u.yr,
-            frame="icrs",
-            distance=min(abs(1 / source["parallax"]), 10) * u.kpc,
-            obstime=Time(source["ref_epoch"], format="jyear"),
+        pmra, pmdec, source_parallax = (
+            float(np.ma.filled(source[name], np.nan))
+            for name in ["pmra", "pmdec", "parallax"]
         )
+        # 2-parameter Gaia solutions have no proper motion
+        has_motion = np.isfinite(pmra) and np.isfinite(pmdec)
+        if has_motion:
+            c = SkyCoord(
+                ra=source["ra"],
+                dec=source["dec"],
+                unit=(u.degree, u.degree),
+                pm_ra_cosdec=pmra * u.mas / u.yr,
+                pm_dec=pmdec * u.mas / u.yr,
+                frame="icrs",
+                distance=(
+                    min(abs(1 / source_parallax), 10)
+                    if np.isfinite(source_parallax) and source_parallax != 0
+                    else 10
+                )
+                * u.kpc,
+                obstime=Time(source["ref_epoch"], format="jyear"),
+            )
+        else:
+            c = SkyCoord(
+                ra=source["ra"],
+                dec=source["dec"],
+                unit=(u.degree, u.degree),
+                frame="icrs",
+                obstime=source_obstime,
+            )
 
         d2d = c.separation(catalog)  # match it to the catalog
         if sum(d2d < min_sep) == 1 and source["phot_rp_mean_mag"] <= mag_limit:
@@ -1138,7 +1169,10 @@ def get_nearby_offset_stars(
                 # precess it's position forward to the source obstime and
                 # get offsets suitable for spectroscopy
                 # TODO: put this in geocentric coords to account for parallax
-                cprime = c.apply_space_motion(new_obstime=source_obstime)
+                if has_motion:
+                    cprime = c.apply_space_motion(new_obstime=source_obstime)
+                else:
+                    cprime = c
                 dra, ddec = cprime.spherical_offsets_to(center)
                 pa = cprime.position_angle(center).degree
                 good_list.append(
@@ -1329,7 +1363,7 @@ def get_nearby_offset_stars(
     # send back the starlist in
     return (
         star_list,
-        query_string.replace("\n", " "),
+        query_description,
         queries_issued,
         len(star_list) - 1,
         use_ztfref,
@@ -1437,6 +1471,7 @@ def get_finding_chart(
     zscale_contrast=0.045,
     zscale_krej=2.5,
     extra_display_string="",
+    dpi=None,
     **offset_star_kwargs,
 ):
     """Create a finder chart suitable for spectroscopic observations of
@@ -1470,6 +1505,9 @@ def get_finding_chart(
         Krej parameter for the Zscale interval
     extra_display_string :  str, optional
         What else to show for the source itself in the chart (e.g. proper motion)
+    dpi : float, optional
+        Resolution of the output, in dots per inch. Defaults to the
+        matplotlib default.
     **offset_star_kwargs : dict, optional
         Other parameters passed to `get_nearby_offset_stars`
 
@@ -1551,6 +1589,8 @@ def get_finding_chart(
 
         if source_image_parameters[image_source].get("reproject", False):
             # project image to the skeleton WCS solution
+            from reproject import reproject_adaptive
+
             log("Reprojecting image to requested position and orientation")
             im, _ = reproject_adaptive(hdu, wcs, shape_out=(npixels, npixels))
         else:
@@ -1835,7 +1875,7 @@ def get_finding_chart(
             )
 
     buf = io.BytesIO()
-    fig.savefig(buf, format=output_format)
+    fig.savefig(buf, format=output_format, dpi=dpi)
     plt.close(fig)
     buf.seek(0)
 
@@ -0,0 +1,286 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class StageMetrics:
+    """Thread-safe latency statistics (in seconds) of processing stages,
+    over the most recent samples, and counters of processed items."""
+
+    def __init__(self, max_samples=1000):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self._totals = defaultdict(int)
+        self._counters = defaultdict(int)
+
+    def record(self, stage, duration):
+        with self._lock:
+            self._samples[stage].append(duration)
+            self._totals[stage] += 1
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def increment(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] += value
+
+    def summary(self):
+        """Count, mean, median, 95th percentile and maximum of each stage,
+        along with the counters."""
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+            totals = dict(self._totals)
+            counters = dict(self._counters)
+
+        stages = {}
+        for stage, values in samples.items():
+            if len(values) == 0:
+                continue
+            stages[stage] = {
+                "count": totals[stage],
+                "mean": sum(values) / len(values),
+                "p50": values[(len(values) - 1) // 2],
+                "p95": values[int(0.95 * (len(values) - 1))],
+                "max": values[-1],
+            }
+        return {"stages": stages, "counters": counters}
+
+
+class OrderedConsumer:
+    """Process the messages of a (Kafka-like) stream with a pool of workers.
+
+    Messages sharing a key are processed one at a time, in the order in
+    which they were received, while messages with different keys are
+    processed concurrently. The offset of a message is only committed once
+    it and all the earlier messages of its partition have been processed,
+    so that messages in flight when the consumer stops are received again.
+
+    Messages must provide the `topic()`, `partition()` and `offset()` methods
+    of `confluent_kafka.Message`.
+
+    Parameters
+    ----------
+    prepare : callable
+        Called with each message in the consuming thread, returns a
+        (key, item) tuple, or None to skip the message.
+    process : callable
+        Called with each item and the StageMetrics in a worker thread.
+    commit : callable
+        Called with the last processed message of a partition, in the
+        consuming thread, to commit its offset.
+    max_workers : int, optional
+        Number of worker threads, by default 4
+    max_pending : int, optional
+        Maximum number of messages received but not yet processed, after
+        which the consumer waits for the workers, by default 100
+    max_retries : int, optional
+        Number of times the processing of an item (or its recording with
+        `dead_letter`) is retried when it fails, by default 2. Items that
+        still fail are passed to `dead_letter`.
+    retry_delay : float, optional
+        Seconds to wait before retrying, by default 5
+    dead_letter : callable, optional
+        Called, in the thread where it failed, with each message that could
+        not be prepared or processed and the error, to record it (e.g. in a
+        dead-letter table). It is retried like the processing when it fails.
+        A failed message is then committed even if it could not be recorded
+        (it is logged as dropped), so that it does not block the commits of
+        the following messages of its partition.
+    metrics : StageMetrics, optional
+        Latency statistics, by default a new StageMetrics.
+    log : callable, optional
+        Logger, by default print.
+    """
+
+    def __init__(
+        self,
+        prepare,
+        process,
+        commit,
+        max_workers=4,
+        max_pending=100,
+        max_retries=2,
+        retry_delay=5.0,
+        dead_letter=None,
+        metrics=None,
+        log=print,
+    ):
+        self.prepare = prepare
+        self.process = process
+        self.commit = commit
+        self.dead_letter = dead_letter
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.metrics = metrics if metrics is not None else StageMetrics()
+        self.log = log
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # items waiting for an earlier item with the same key, per key
+        self._chains = {}
+        # messages not committed yet, per partition, in offset order,
+        # with whether they have been processed
+        self._offsets = defaultdict(OrderedDict)
+        self._n_in_flight = 0
+
+    def submit(self, message):
+        """Prepare a message and schedule its processing."""
+        received_at = time.perf_counter()
+        partition = (message.topic(), message.partition())
+        with self._lock:
+            self._offsets[partition][message.offset()] = [message, False]
+
+        try:
+            with self.metrics.time("prepare"):
+                prepared = self.prepare(message)
+        except Exception as e:
+            traceback.print_exc()
+            self.log(f"Failed to prepare message from {message.topic()}: {e}")
+            self.metrics.increment("failed")
+            self._fail(message, e)
+            return
+        if prepared is None:
+            self._done(message)
+            return
+
+        key, item = prepared
+        self._pending.acquire()
+        job = (message, item, received_at)
+        with self._lock:
+            self._n_in_flight += 1
+            if key in self._chains:
+                self._chains[key].append(job)
+                return
+            self._chains[key] = deque()
+        self._executor.submit(self._run, key, job)
+
+    def _run(self, key, job):
+        message, item, received_at = job
+        self.metrics.record("queue", time.perf_counter() - received_at)
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.metrics.time("process"):
+                    self.process(item, self.metrics)
+                self.metrics.increment("processed")
+                error = None
+                break
+            except Exception as e:
+                traceback.print_exc()
+                error = e
+                if attempt < self.max_retries:
+                    self.log(
+                        f"Failed to process message from {message.topic()} "
+                        f"(attempt {attempt + 1}), retrying: {e}"
+                    )
+                    self.metrics.increment("retried")
+                    time.sleep(self.retry_delay)
+                else:
+                    self.log(
+                        f"Failed to process message from {message.topic()} "
+                        f"after {attempt + 1} attempts: {e}"
+                    )
+                    self.metrics.increment("failed")
+        self.metrics.record("total", time.perf_counter() - received_at)
+
+        self._pending.release()
+        if error is None:
+            self._done(message)
+        else:
+            self._fail(message, error)
+        with self._lock:
+            self._n_in_flight -= 1
+            if len(self._chains[key]) > 0:
+                next_job = self._chains[key].popleft()
+            else:
+                next_job = None
+                del self._chains[key]
+            self._idle.notify_all()
+        if next_job is not None:
+            self._executor.submit(self._run, key, next_job)
+
+    def _fail(self, message, error):
+        """Record a failed message with `dead_letter`, then mark it as done
+        (to be committed), whether it could be recorded or not."""
+        if self.dead_letter is not None:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self.dead_letter(message, error)
+                    self.metrics.increment("dead_lettered")
+                    self._done(message)
+                    return
+                except Exception as e:
+                    traceback.print_exc()
+                    self.log(
+                        f"Failed to record failed message from {message.topic()} "
+                        f"(attempt {attempt + 1}): {e}"
+                    )
+                    if attempt < self.max_retries:
+                        time.sleep(self.retry_delay)
+        self.log(
+            f"Dropping message {message.offset()} of {message.topic()} "
+            f"[{message.partition()}]"
+        )
+        self.metrics.increment("dropped")
+        self._done(message)
+
+    def _done(self, message):
+        with self._lock:
+            self._offsets[(message.topic(), message.partition())][message.offset()][
+                1
+            ] = True
+
+    def commit_ready(self):
+        """Commit, for each partition, the last message processed after
+        all the earlier ones."""
+        to_commit = []
+        with self._lock:
+            for partition, offsets in list(self._offsets.items()):
+                last = None
+                while len(offsets) > 0:
+                    offset, (message, done) = next(iter(offsets.items()))
+                    if not done:
+                        break
+                    last = message
+                    del offsets[offset]
+                if last is not None:
+                    to_commit.append(last)
+                if len(offsets) == 0:
+                    # no message in flight, forget the partition
+                    del self._offsets[partition]
+        for message in to_commit:
+            self.commit(message)
+
+    def join(self):
+        """Wait until all the submitted messages are processed, and commit them."""
+        with self._lock:
+            self._idle.wait_for(lambda: self._n_in_flight == 0)
+        self.commit_ready()
+
+    def run(self, batches):
+        """Consume batches (lists) of messages until the iterator is exhausted,
+        committing the processed messages after each batch.
+
+        For a Kafka consumer, this could be
+        `iter(lambda: consumer.consume(timeout=1), None)`.
+        """
+        for batch in batches:
+            for message in batch:
+                self.submit(message)
+            self.commit_ready()
+        self.join()
+
+    def shutdown(self):
+        self.join()
+        self._executor.shutdown()
@@ -1,3 +1,6 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
 
 from ..models import (
@@ -81,3 +84,334 @@ def random_parameters_notheta(redshifts, model, r_v=2.0, ebv_rate=0.11, **kwargs
         amp.append(10 ** (-0.4 * cosmo.distmod(z).value))
 
     return {"amplitude": np.array(amp)}
+
+
+# parameters shared by all the shards of a run, set once per worker process
+_shard_context = {}
+
+
+def get_transient_properties(model_name, optional_injection_parameters):
+    """Get the simsurvey transient properties of an injection model
+
+    Parameters
+    ----------
+    model_name : str
+        Model to simulate efficiency for. Must be one of kilonova, afterglow, or linear.
+    optional_injection_parameters: dict
+        Parameters of the model (see get_simsurvey_parameters)
+
+    Returns
+    -------
+    transientprop : dict
+        Light curve model, and function to draw its parameters.
+    template : str
+        Name of the simsurvey template, if any.
+    """
+    import sncosmo
+
+    if model_name == "kilonova":
+        from simsurvey.models import AngularTimeSeriesSource
+        from simsurvey.utils import model_tools
+
+        phase, wave, cos_theta, flux = model_tools.read_possis_file(
+            optional_injection_parameters["injection_filename"]
+        )
+        transientprop = {
+            "lcmodel": sncosmo.Model(
+                AngularTimeSeriesSource(
+                    phase=phase, wave=wave, flux=flux, cos_theta=cos_theta
+                )
+            )
+        }
+        template = "AngularTimeSeriesSource"
+
+    elif model_name == "afterglow":
+        import afterglowpy
+
+        phases = np.linspace(
+            optional_injection_parameters["t_i"],
+            optional_injection_parameters["t_f"],
+            optional_injection_parameters["ntime"],
+        )
+        wave = np.linspace(
+            optional_injection_parameters["lambda_min"],
+            optional_injection_parameters["lambda_max"],
+            optional_injection_parameters["nlambda"],
+        )
+        nu = 3e8 / (wave * 1e-10)
+
+        grb_param_keys = [
+            "jetType",
+            "specType",
+            "thetaObs",
+            "E0",
+            "thetaCore",
+            "thetaWing",
+            "n0",
+            "p",
+            "epsilon_e",
+            "epsilon_B",
+            "z",
+            "d_L",
+            "xi_N",
+        ]
+        grb_params = {k: optional_injection_parameters[k] for k in grb_param_keys}
+        # explicitly case E0 and d_L as float as they like to be an int
+        grb_params["E0"] = float(grb_params["E0"])
+        grb_params["d_L"] = float(grb_params["d_L"])
+
+        flux = []
+        for phase in phases:
+            t = phase * np.ones(nu.shape)
+            mJys = afterglowpy.fluxDensity(t, nu, **grb_params)
+            Jys = 1e-3 * mJys
+            # convert to erg/s/cm^2/A
+            flux.append(Jys * 2.99792458e-05 / (wave**2))
+        transientprop = {
+            "lcmodel": sncosmo.Model(
+                sncosmo.TimeSeriesSource(phases, wave, np.array(flux))
+            ),
+            "lcsimul_func": random_parameters_notheta,
+        }
+        template = None
+
+    elif model_name == "linear":
+        phases = np.linspace(
+            optional_injection_parameters["t_i"],
+            optional_injection_parameters["t_f"],
+            optional_injection_parameters["ntime"],
+        )
+        wave = np.linspace(
+            optional_injection_parameters["lambda_min"],
+            optional_injection_parameters["lambda_max"],
+            optional_injection_parameters["nlambda"],
+        )
+        magdiff = (
+            optional_injection_parameters["mag"]
+            + phases * optional_injection_parameters["dmag"]
+        )
+        F_Lxlambda2 = 10 ** (-(magdiff + 2.406) / 2.5)
+        waves, F_Lxlambda2s = np.meshgrid(wave, F_Lxlambda2)
+        flux = F_Lxlambda2s / (waves) ** 2
+        transientprop = {
+            "lcmodel": sncosmo.Model(sncosmo.TimeSeriesSource(phases, wave, flux)),
+            "lcsimul_func": random_parameters_notheta,
+        }
+        template = None
+
+    else:
+        raise ValueError(f"Unknown simsurvey model {model_name}")
+
+    return transientprop, template
+
+
+def shard_injections(number_of_injections, injections_per_shard, seed):
+    """Split the injections of a run into shards, each with its own seed.
+
+    The shards (and their seeds) only depend on the number of injections,
+    the shard size and the seed of the run, not on the number of processes,
+    so that a run is reproducible however it is executed.
+
+    Returns
+    -------
+    list of tuple
+        Number of injections and seed of each shard.
+    """
+    n_shards = max(1, -(-number_of_injections // injections_per_shard))
+    sizes = np.full(n_shards, number_of_injections // n_shards)
+    sizes[: number_of_injections % n_shards] += 1
+    seeds = [
+        int(child.generate_state(1)[0])
+        for child in np.random.SeedSequence(seed).spawn(n_shards)
+    ]
+    return [(int(size), seed) for size, seed in zip(sizes, seeds)]
+
+
+def _init_shard_worker(context):
+    _shard_context.clear()
+    _shard_context.update(context)
+
+
+def simulate_shard(number_of_injections, seed):
+    """Simulate the light curves of one shard of injections, with the
+    parameters set by _init_shard_worker.
+
+    Returns
+    -------
+    dict
+        Light curves, metadata and statistics of the simulated transients.
+    """
+    import pandas as pd
+    import simsurvey
+
+    context = _shard_context
+    # simsurvey draws from the global NumPy random state
+    np.random.seed(seed)
+
+    pointings = context["pointings"]
+    df = pd.DataFrame.from_dict(pointings)
+    plan = simsurvey.SurveyPlan(
+        time=df["jd"],
+        band=df["filter"],
+        obs_field=df["field_id"].astype(int),
+        skynoise=df["skynoise"],
+        zp=df["zp"],
+        width=context["width"],
+        height=context["height"],
+        fields={k: v for k, v in pointings.items() if k in ["ra", "dec", "field_id"]},
+    )
+
+    if "transient_properties" not in context:
+        context["transient_properties"] = get_transient_properties(
+            context["model_name"], context["optional_injection_parameters"]
+        )
+    transientprop, template = context["transient_properties"]
+
+    tr = simsurvey.get_transient_generator(
+        context["redshift_range"],
+        transient="generic",
+        template=template,
+        ntransient=number_of_injections,
+        ratefunc=lambda z: 5e-7,
+        dec_range=(-90, 90),
+        ra_range=(0, 360),
+        mjd_range=(context["trigger_jd"], context["trigger_jd"]),
+        transientprop=transientprop,
+        skymap=context["map_struct"],
+        sfd98_dir=context["sfd98_dir"],
+        apply_mwebv=True,
+    )
+
+    survey = simsurvey.SimulSurvey(
+        generator=tr,
+        plan=plan,
+        phase_range=context["phase_range"],
+        n_det=context["number_of_detections"],
+        threshold=context["detection_threshold"],
+    )
+
+    lcs = survey.get_lightcurves(notebook=True)
+
+    return {
+        "lcs": lcs._properties["lcs"],
+        "meta": lcs._properties["meta"],
+        "meta_rejected": lcs._properties["meta_rejected"],
+        "meta_notobserved": lcs._properties["meta_notobserved"],
+        "stats": lcs._derived_properties["stats"],
+        "side": lcs._side_properties,
+    }
+
+
+def _merge_columns(merged, shard, offset=0):
+    """Concatenate the columns (possibly nested dicts of arrays) of two shards."""
+    if shard is None:
+        return merged
+    if isinstance(shard, dict):
+        shard = dict(shard)
+        # indices of the transients in the generator of their shard
+        if "idx_orig" in shard:
+            shard["idx_orig"] = np.asarray(shard["idx_orig"]) + offset
+        if merged is None:
+            return shard
+        return {
+            key: _merge_columns(merged.get(key), value, offset)
+            for key, value in shard.items()
+        }
+    if merged is None:
+        return shard
+    return np.concatenate([np.atleast_1d(merged), np.atleast_1d(shard)])
+
+
+def merge_shards(shards, sizes):
+    """Merge the simulations of several shards as if they were a single run.
+
+    Parameters
+    ----------
+    shards : list of dict
+        Results of simulate_shard, in shard order.
+    sizes : list of int
+        Number of injections of each shard.
+    """
+    merged = {
+        "lcs": None,
+        "meta": None,
+        "meta_rejected": None,
+        "meta_notobserved": None,
+        "stats": None,
+        "side": shards[0]["side"],
+    }
+    offset = 0
+    for shard, size in zip(shards, sizes):
+        if shard["lcs"] is not None:
+            merged["lcs"] = (merged["lcs"] or []) + list(shard["lcs"])
+        for key in ["meta", "meta_rejected", "meta_notobserved", "stats"]:
+            merged[key] = _merge_columns(merged[key], shard[key], offset)
+        offset += size
+    return merged
+
+
+def run_simsurvey(
+    context,
+    number_of_injections,
+    seed,
+    injections_per_shard=250,
+    n_processes=1,
+    progress=None,
+):
+    """Run a simsurvey efficiency analysis, with the injections sharded
+    across a pool of processes.
+
+    Parameters
+    ----------
+    context : dict
+        Parameters of the simulation: pointings, width, height, model_name,
+        optional_injection_parameters, redshift_range, trigger_jd, map_struct,
+        sfd98_dir, phase_range, number_of_detections and detection_threshold.
+    number_of_injections : int
+        Number of simulated transients.
+    seed : int
+        Seed of the run, from which the seed of each shard is derived.
+    injections_per_shard : int, optional
+        Maximum number of injections per shard, by default 250
+    n_processes : int, optional
+        Number of processes, by default 1 (run in the current process)
+    progress : callable, optional
+        Called with the number of injections simulated so far after each shard.
+
+    Returns
+    -------
+    dict
+        Merged light curves, metadata and statistics.
+    """
+    shards = shard_injections(number_of_injections, injections_per_shard, seed)
+    results = [None] * len(shards)
+    n_done = 0
+
+    if n_processes <= 1 or len(shards) == 1:
+        _init_shard_worker(context)
+        for i, (size, shard_seed) in enumerate(shards):
+            results[i] = simulate_shard(size, shard_seed)
+            n_done += size
+            if progress is not None:
+                progress(n_done)
+    else:
+        # spawn rather than fork, as the app process has threads and
+        # open database connections
+        with ProcessPoolExecutor(
+            max_workers=min(n_processes, len(shards)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_shard_worker,
+            initargs=(context,),
+        ) as executor:
+            futures = {
+                executor.submit(simulate_shard, size, shard_seed): i
+                for i, (size, shard_seed) in enumerate(shards)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                n_done += shards[i][0]
+                if progress is not None:
+                    progress(n_done)
+
+    return merge_shards(results, [size for size, _ in shards])
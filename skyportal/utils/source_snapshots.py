@@ -0,0 +1,191 @@
+import hashlib
+import json
+import uuid
+
+import numpy as np
+
+from baselayer.app.env import load_env
+from baselayer.log import make_log
+
+from .cache import Cache, dict_to_bytes
+
+_, cfg = load_env()
+
+log = make_log("source_snapshots")
+
+cache = Cache(
+    cache_dir="cache/source_snapshots",
+    max_items=cfg.get("misc.max_items_in_source_snapshot_cache", 2000),
+    max_age=cfg.get("misc.minutes_to_keep_source_snapshot_cache", 30) * 60,
+)
+
+# number of lookups between two hit rate reports in the logs
+STATS_LOG_INTERVAL = 100
+
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _generation_key(obj_key):
+    return f"generation_{obj_key}"
+
+
+def _get_generation(obj_key):
+    """Return the current snapshot generation of an object.
+
+    Every snapshot key embeds the generation of the object it was built
+    for, so that bumping the generation invalidates all the snapshots
+    of that object (whatever the permissions and options they were built
+    with) at once. A missing generation (never set, or evicted from the
+    cache) is replaced by a fresh one, which can't match any older snapshot.
+
+    Parameters
+    ----------
+    obj_key : str
+        Internal key of the Obj.
+    """
+    cached = cache[_generation_key(obj_key)]
+    if cached is not None:
+        try:
+            generation = cached.read_bytes().decode("utf-8")
+        except FileNotFoundError:
+            generation = None
+        if generation:
+            return generation
+        if generation is not None:
+            # being written by another process
+            return None
+
+    generation = uuid.uuid4().hex
+    cache[_generation_key(obj_key)] = generation.encode("utf-8")
+    return generation
+
+
+def invalidate_source_snapshots(obj_key):
+    """Invalidate all the cached snapshots of a source.
+
+    This is called alongside every `skyportal/REFRESH_SOURCE`,
+    `skyportal/REFRESH_SOURCE_PHOTOMETRY` and `skyportal/REFRESH_SOURCE_SPECTRA`
+    push, so that the snapshots are dropped by the same write paths that ask
+    the frontend to refetch the source.
+
+    Parameters
+    ----------
+    obj_key : str
+        Internal key of the Obj.
+    """
+    if obj_key is None:
+        return
+    cache[_generation_key(obj_key)] = uuid.uuid4().hex.encode("utf-8")
+    _stats["invalidations"] += 1
+
+
+def permissions_fingerprint(user):
+    """Return a hash of everything that determines what a user can read.
+
+    Admins bypass the row-level security policies and thus all share the
+    same snapshots. For other users, some policies match on the user
+    itself (photometry owner, follow-up request requester), so the user
+    id is part of the fingerprint along with their groups, streams and ACLs.
+
+    Parameters
+    ----------
+    user : `skyportal.models.User`
+        User requesting the source.
+    """
+    if user.is_admin:
+        permissions = {"admin": True}
+    else:
+        permissions = {
+            "user_id": user.id,
+            "acls": sorted(user.permissions),
+            "groups": sorted(g.id for g in user.accessible_groups),
+            "streams": sorted(s.id for s in user.accessible_streams),
+        }
+    return hashlib.md5(
+        json.dumps(permissions, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def get_snapshot_key(obj_key, user, options):
+    """Build the cache key of a source snapshot.
+
+    Parameters
+    ----------
+    obj_key : str
+        Internal key of the Obj.
+    user : `skyportal.models.User`
+        User requesting the source.
+    options : dict
+        Options (include flags, ...) the snapshot is built with.
+
+    Returns
+    -------
+    str or None
+        The cache key, or None if the snapshot can't be cached right now.
+    """
+    generation = _get_generation(obj_key)
+    if generation is None:
+        return None
+    options_hash = hashlib.md5(
+        json.dumps(options, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return (
+        f"source_{obj_key}_{generation}_{permissions_fingerprint(user)}_{options_hash}"
+    )
+
+
+def _record_lookup(hit):
+    _stats["hits" if hit else "misses"] += 1
+    lookups = _stats["hits"] + _stats["misses"]
+    if lookups % STATS_LOG_INTERVAL == 0:
+        log(
+            f"hit rate: {100 * _stats['hits'] / lookups:.1f}% "
+            f"({_stats['hits']}/{lookups} lookups, "
+            f"{_stats['invalidations']} invalidations)"
+        )
+
+
+def load_source_snapshot(snapshot_key):
+    """Return the cached source snapshot, or None if there is none.
+
+    Parameters
+    ----------
+    snapshot_key : str
+        Key returned by `get_snapshot_key`.
+    """
+    if snapshot_key is None:
+        return None
+    cached = cache[snapshot_key]
+    source_info = None
+    if cached is not None:
+        try:
+            source_info = np.load(cached, allow_pickle=True).item()
+        except (FileNotFoundError, EOFError, ValueError):
+            source_info = None
+    _record_lookup(source_info is not None)
+    return source_info
+
+
+def save_source_snapshot(snapshot_key, source_info):
+    """Store a source snapshot in the cache.
+
+    Parameters
+    ----------
+    snapshot_key : str
+        Key returned by `get_snapshot_key`.
+    source_info : dict
+        Serialized source, as returned by `get_source`.
+    """
+    if snapshot_key is None:
+        return
+    cache[snapshot_key] = dict_to_bytes(source_info)
+
+
+def source_snapshot_stats():
+    """Return the hit/miss/invalidation counters of this process."""
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "lookups": lookups,
+        "hit_rate": _stats["hits"] / lookups if lookups > 0 else None,
+    }
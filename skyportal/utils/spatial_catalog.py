@@ -0,0 +1,187 @@
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import sqlalchemy as sa
+
+from .copy import copy_binary
+from .gcn import from_cone, from_ellipse, uniq_to_tile_ranges
+
+# entries sent at once to each worker process
+SKYMAP_CHUNK_SIZE = 100
+
+
+def catalog_entries(catalog_data):
+    """Split the columns of a spatial catalog into one dict per entry.
+
+    Parameters
+    ----------
+    catalog_data : dict
+        Columns of the catalog: name, ra and dec, and either radius (cones)
+        or amaj, amin and phi (ellipses), in degrees.
+
+    Returns
+    -------
+    list of dict
+        The entries, with the keys of the catalog's shape.
+    """
+    if {"radius"}.issubset(set(catalog_data.keys())):
+        keys = ["name", "ra", "dec", "radius"]
+    elif {"amaj", "amin", "phi"}.issubset(set(catalog_data.keys())):
+        keys = ["name", "ra", "dec", "amaj", "amin", "phi"]
+    else:
+        raise ValueError("Could not disambiguate keys")
+    return [dict(zip(keys, values)) for values in zip(*(catalog_data[k] for k in keys))]
+
+
+def entry_skymap(entry):
+    """Compute the multi-order sky map of a spatial catalog entry: a
+    Gaussian cone for a radius, or a uniform ellipse.
+
+    Parameters
+    ----------
+    entry : dict
+        Entry of the catalog, see `catalog_entries`.
+
+    Returns
+    -------
+    dict
+        Entry name, UNIQ and probability density arrays, and the entry's
+        data (shape parameters).
+    """
+    name = entry["name"].strip().replace(" ", "-")
+    ra, dec = entry["ra"], entry["dec"]
+    if "radius" in entry:
+        skymap = from_cone(ra, dec, entry["radius"], n_sigma=2)
+        data = {"ra": ra, "dec": dec, "radius": entry["radius"]}
+    else:
+        amaj, amin, phi = entry["amaj"], entry["amin"], entry["phi"]
+        if np.isclose(amaj, amin):
+            skymap = from_cone(ra, dec, amaj, n_sigma=1)
+        else:
+            skymap = from_ellipse(name, ra, dec, amaj, amin, phi)
+        # ellipse entries are named after their sky map (for circular ones,
+        # "<ra>_<dec>_<radius>" rather than the name given in the catalog)
+        name = skymap["localization_name"]
+        data = {"ra": ra, "dec": dec, "amaj": amaj, "amin": amin, "phi": phi}
+
+    return {
+        "entry_name": name,
+        "uniq": np.asarray(skymap["uniq"], dtype=np.int64),
+        "probdensity": np.asarray(skymap["probdensity"], dtype=float),
+        "data": data,
+    }
+
+
+def entry_skymaps(entries, n_processes=1):
+    """Compute the sky maps of spatial catalog entries (see `entry_skymap`),
+    in a pool of processes.
+
+    Parameters
+    ----------
+    entries : list of dict
+        Entries of the catalog, see `catalog_entries`.
+    n_processes : int, optional
+        Number of processes, by default 1 (no pool).
+
+    Returns
+    -------
+    list of dict
+        Sky maps, in the order of the entries.
+    """
+    if n_processes <= 1 or len(entries) <= SKYMAP_CHUNK_SIZE:
+        return [entry_skymap(entry) for entry in entries]
+
+    # spawn rather than fork, as the app process has threads and
+    # open database connections
+    with ProcessPoolExecutor(
+        max_workers=min(n_processes, -(-len(entries) // SKYMAP_CHUNK_SIZE)),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        return list(executor.map(entry_skymap, entries, chunksize=SKYMAP_CHUNK_SIZE))
+
+
+def copy_spatial_catalog_entries(catalog_id, skymaps, session):
+    """Write spatial catalog entries and their tiles with COPY.
+
+    The entries are copied into spatial_catalog_entries, and the tiles of
+    all the entries into a temporary table (as packed NumPy arrays, with
+    the index of their entry) before being inserted into the tiles table
+    with a single INSERT ... SELECT joining them to the entry names.
+
+    Parameters
+    ----------
+    catalog_id : int
+        ID of the SpatialCatalog.
+    skymaps : list of dict
+        Sky maps of the entries, see `entry_skymap`.
+    session : `sqlalchemy.orm.session.Session`
+        Database session object
+
+    Returns
+    -------
+    n_entries, n_tiles : int
+        Number of inserted entries and tiles.
+    """
+    if len(skymaps) == 0:
+        return 0, 0
+
+    utcnow = datetime.datetime.utcnow()
+    entry_names = [skymap["entry_name"] for skymap in skymaps]
+    n_entries = copy_binary(
+        "spatial_catalog_entries",
+        {
+            "catalog_id": ("int4", catalog_id),
+            "entry_name": ("text", entry_names),
+            "data": ("jsonb", [skymap["data"] for skymap in skymaps]),
+            "uniq": ("int8[]", [skymap["uniq"] for skymap in skymaps]),
+            "probdensity": (
+                "float8[]",
+                [skymap["probdensity"] for skymap in skymaps],
+            ),
+            "created_at": ("timestamp", utcnow),
+            "modified": ("timestamp", utcnow),
+        },
+        session=session,
+    )
+
+    lower, upper = uniq_to_tile_ranges(
+        np.concatenate([skymap["uniq"] for skymap in skymaps])
+    )
+    entries = np.repeat(
+        np.arange(1, len(skymaps) + 1, dtype=np.int32),
+        [len(skymap["uniq"]) for skymap in skymaps],
+    )
+    session.execute(
+        sa.text(
+            "CREATE TEMPORARY TABLE spatial_catalog_tiles "
+            "(entry int4, probdensity float8, healpix int8range)"
+        )
+    )
+    copy_binary(
+        "spatial_catalog_tiles",
+        {
+            "entry": ("int4", entries),
+            "probdensity": (
+                "float8",
+                np.concatenate([skymap["probdensity"] for skymap in skymaps]),
+            ),
+            "healpix": ("int8range", (lower, upper)),
+        },
+        session=session,
+    )
+    n_tiles = session.execute(
+        sa.text(
+            "INSERT INTO spatial_catalog_entriess "
+            "(entry_name, probdensity, healpix, created_at, modified) "
+            "SELECT names.entry_name, tiles.probdensity, tiles.healpix, "
+            ":utcnow, :utcnow "
+            "FROM spatial_catalog_tiles AS tiles "
+            "JOIN unnest(CAST(:entry_names AS text[])) WITH ORDINALITY "
+            "AS names(entry_name, entry) USING (entry)"
+        ),
+        {"entry_names": entry_names, "utcnow": utcnow},
+    ).rowcount
+    session.execute(sa.text("DROP TABLE spatial_catalog_tiles"))
+    return n_entries, n_tiles
@@ -0,0 +1,371 @@
+import io
+import time
+import urllib
+import zipfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import requests
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as psql
+
+from baselayer.app.env import load_env
+from baselayer.app.flow import Flow
+from baselayer.log import make_log
+
+from ..models import Obj, TNSCatalogObject
+from .calculations import great_circle_distance
+from .source_snapshots import invalidate_source_snapshots
+
+env, cfg = load_env()
+
+log = make_log("tns_catalog")
+
+TNS_URL = cfg["app.tns.endpoint"]
+public_objects_url = urllib.parse.urljoin(
+    TNS_URL, "system/files/tns_public_objects/tns_public_objects.csv.zip"
+)
+
+DEFAULT_RADIUS = 2.0 / 3600  # 2 arcsec in degrees
+INGEST_BATCH_SIZE = 10000
+UPDATE_BATCH_SIZE = 1000
+
+
+def download_tns_public_objects(api_key, headers, timeout=300):
+    """Download the (zipped) TNS public objects catalog.
+
+    Parameters
+    ----------
+    api_key : str
+        TNS api key
+    headers : dict
+        TNS query headers
+    timeout : int, optional
+        Request timeout in seconds, by default 300
+
+    Returns
+    -------
+    bytes
+        Content of the zip file.
+    """
+    r = requests.post(
+        public_objects_url,
+        headers=headers,
+        data={"api_key": api_key},
+        timeout=timeout,
+    )
+    if r.status_code != 200:
+        raise ValueError(
+            f"Failed to download the TNS public objects catalog: {r.status_code} {r.text}"
+        )
+    return r.content
+
+
+def read_tns_public_objects(file):
+    """Read the TNS public objects catalog (zipped or plain CSV).
+
+    The first line of the file is the timestamp of the catalog,
+    the header starts on the second line.
+
+    Parameters
+    ----------
+    file : str, path-like, bytes or file-like
+        The catalog, as downloaded from TNS.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per TNS object.
+    """
+    if isinstance(file, bytes):
+        file = io.BytesIO(file)
+    if zipfile.is_zipfile(file):
+        with zipfile.ZipFile(file) as zf:
+            csv_name = next(n for n in zf.namelist() if n.endswith(".csv"))
+            content = zf.read(csv_name)
+        file = io.BytesIO(content)
+    elif hasattr(file, "seek"):
+        file.seek(0)
+
+    df = pd.read_csv(file, skiprows=1, dtype={"name": str, "internal_names": str})
+    df = df.dropna(subset=["name", "ra", "declination"])
+    df["name"] = df["name"].str.strip()
+    return df.drop_duplicates(subset="name", keep="last").reset_index(drop=True)
+
+
+def _parse_date(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def catalog_row_to_tns_info(row):
+    """Convert a catalog row into the format used for Obj.tns_info,
+    which uses the keys of the TNS object API where they exist.
+
+    Parameters
+    ----------
+    row : dict
+        Row of the TNS public objects catalog.
+    """
+    tns_info = {
+        k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in row.items()
+    }
+    tns_info["objname"] = tns_info.get("name")
+    tns_info["radeg"] = tns_info.get("ra")
+    tns_info["decdeg"] = tns_info.get("declination")
+    return tns_info
+
+
+def ingest_tns_public_objects(df, session, batch_size=INGEST_BATCH_SIZE):
+    """Upsert the TNS public objects catalog into the local mirror table.
+
+    Rows that have not been modified on TNS since the last ingestion are left untouched.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Catalog, as returned by `read_tns_public_objects`.
+    session : `sqlalchemy.orm.session.Session`
+        Database session object
+    batch_size : int, optional
+        Number of rows upserted per statement, by default 10000
+
+    Returns
+    -------
+    int
+        Number of rows inserted or updated.
+    """
+    start = time.perf_counter()
+    table = TNSCatalogObject.__table__
+    n_upserted = 0
+    for i in range(0, len(df), batch_size):
+        now = datetime.utcnow()
+        rows = []
+        for row in df.iloc[i : i + batch_size].to_dict(orient="records"):
+            tns_info = catalog_row_to_tns_info(row)
+            rows.append(
+                {
+                    "created_at": now,
+                    "modified": now,
+                    "name": tns_info["name"],
+                    "name_prefix": tns_info.get("name_prefix"),
+                    "ra": float(tns_info["ra"]),
+                    "dec": float(tns_info["declination"]),
+                    "redshift": tns_info.get("redshift"),
+                    "type": tns_info.get("type"),
+                    "discovery_date": _parse_date(tns_info.get("discoverydate")),
+                    "last_modified": _parse_date(tns_info.get("lastmodified")),
+                    "data": tns_info,
+                }
+            )
+        stmt = psql.insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={
+                c: stmt.excluded[c]
+                for c in [
+                    "modified",
+                    "name_prefix",
+                    "ra",
+                    "dec",
+                    "redshift",
+                    "type",
+                    "discovery_date",
+                    "last_modified",
+                    "data",
+                ]
+            },
+            where=sa.or_(
+                table.c.last_modified.is_distinct_from(stmt.excluded.last_modified),
+                table.c.name_prefix.is_distinct_from(stmt.excluded.name_prefix),
+            ),
+        )
+        n_upserted += session.execute(stmt).rowcount
+        session.commit()
+
+    log(
+        f"Upserted {n_upserted}/{len(df)} TNS catalog objects in {time.perf_counter() - start:.2f} s"
+    )
+    return n_upserted
+
+
+def tns_name_takes_precedence(
+    obj_ra, obj_dec, current_tns_name, current_tns_info, tns_name, tns_ra, tns_dec
+):
+    """Whether a TNS name (and its info) should replace the current TNS name
+    of an Obj within the crossmatch radius of the TNS object.
+
+    An Obj without a TNS name takes the new one. If the current TNS info has
+    coordinates, the TNS object closest to the Obj wins. Otherwise (or for
+    the same position, i.e. the same TNS object), an SN designation replaces
+    an AT one, but not the other way around.
+
+    Parameters
+    ----------
+    obj_ra, obj_dec : float
+        Position of the Obj, in degrees.
+    current_tns_name : str or None
+        Current TNS name of the Obj.
+    current_tns_info : dict or None
+        Current TNS info of the Obj.
+    tns_name : str
+        New TNS name (with prefix).
+    tns_ra, tns_dec : float
+        Position of the new TNS object, in degrees.
+
+    Returns
+    -------
+    bool
+        Whether the Obj should take the new TNS name.
+    """
+    tns_name = str(tns_name).strip()
+    if current_tns_name == tns_name:
+        return False
+    if current_tns_name is None or current_tns_name == "":
+        return True
+
+    # if the obj has tns_info that contains radeg and decdeg,
+    # check if the new TNS source is closer to the obj than the existing TNS source
+    if (
+        isinstance(current_tns_info, dict)
+        and "radeg" in current_tns_info
+        and "decdeg" in current_tns_info
+    ):
+        try:
+            existing_tns_dist = great_circle_distance(
+                obj_ra,
+                obj_dec,
+                float(current_tns_info["radeg"]),
+                float(current_tns_info["decdeg"]),
+            )
+        except (TypeError, ValueError):
+            existing_tns_dist = None
+        if existing_tns_dist is not None:
+            new_tns_dist = great_circle_distance(
+                obj_ra, obj_dec, float(tns_ra), float(tns_dec)
+            )
+            if new_tns_dist != existing_tns_dist:
+                return bool(new_tns_dist < existing_tns_dist)
+
+    # if the current name doesn't have the SN designation but the new name has it, update
+    return not str(current_tns_name).lower().strip().startswith(
+        "sn"
+    ) and "AT" not in str(tns_name)
+
+
+def crossmatch_tns_catalog(
+    session,
+    radius=DEFAULT_RADIUS,
+    batch_size=UPDATE_BATCH_SIZE,
+    refresh=True,
+):
+    """Crossmatch the local TNS catalog mirror against all the Objs at once,
+    and set the TNS name and info of the Objs whose closest TNS object changed,
+    when it takes precedence over their current TNS name
+    (see `tns_name_takes_precedence`).
+
+    Parameters
+    ----------
+    session : `sqlalchemy.orm.session.Session`
+        Database session object
+    radius : float, optional
+        Crossmatch radius in degrees, by default 2 arcsec
+    batch_size : int, optional
+        Number of Objs updated per transaction, by default 1000
+    refresh : bool, optional
+        Whether to refresh the updated sources on the frontend, by default True
+
+    Returns
+    -------
+    dict
+        Number of matched and updated Objs, and the time spent in each step.
+    """
+    start = time.perf_counter()
+
+    # the closest TNS object of each Obj, using the dot product of
+    # the cartesian coordinates (the larger, the closer)
+    dot_product = sum(
+        lhs * rhs for lhs, rhs in zip(Obj.cartesian, TNSCatalogObject.cartesian)
+    )
+    full_name = sa.case(
+        (
+            TNSCatalogObject.name_prefix.is_not(None),
+            sa.func.concat(TNSCatalogObject.name_prefix, " ", TNSCatalogObject.name),
+        ),
+        else_=TNSCatalogObject.name,
+    )
+    closest = (
+        sa.select(
+            Obj.id.label("obj_id"),
+            Obj.internal_key.label("internal_key"),
+            Obj.ra.label("obj_ra"),
+            Obj.dec.label("obj_dec"),
+            Obj.tns_name.label("current_tns_name"),
+            Obj.tns_info.label("current_tns_info"),
+            full_name.label("tns_name"),
+            TNSCatalogObject.data.label("tns_info"),
+            TNSCatalogObject.ra.label("tns_ra"),
+            TNSCatalogObject.dec.label("tns_dec"),
+        )
+        .join(TNSCatalogObject, Obj.within(TNSCatalogObject, radius))
+        .distinct(Obj.id)
+        .order_by(Obj.id, dot_product.desc())
+        .subquery()
+    )
+    n_matched = session.scalar(sa.select(sa.func.count()).select_from(closest))
+    changed = [
+        row
+        for row in session.execute(
+            sa.select(closest).where(
+                closest.c.current_tns_name.is_distinct_from(closest.c.tns_name)
+            )
+        ).all()
+        if tns_name_takes_precedence(
+            row.obj_ra,
+            row.obj_dec,
+            row.current_tns_name,
+            row.current_tns_info,
+            row.tns_name,
+            row.tns_ra,
+            row.tns_dec,
+        )
+    ]
+    match_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    flow = Flow() if refresh else None
+    for i in range(0, len(changed), batch_size):
+        batch = changed[i : i + batch_size]
+        session.execute(
+            sa.update(Obj),
+            [
+                {"id": row.obj_id, "tns_name": row.tns_name, "tns_info": row.tns_info}
+                for row in batch
+            ],
+        )
+        session.commit()
+        if refresh:
+            for row in batch:
+                invalidate_source_snapshots(row.internal_key)
+                flow.push(
+                    "*",
+                    "skyportal/REFRESH_SOURCE",
+                    payload={"obj_key": row.internal_key},
+                )
+    update_duration = time.perf_counter() - start
+
+    log(
+        f"Crossmatched the TNS catalog: {n_matched} Objs matched in {match_duration:.2f} s, "
+        f"{len(changed)} updated in {update_duration:.2f} s"
+    )
+    return {
+        "n_matched": n_matched,
+        "n_updated": len(changed),
+        "match_duration": match_duration,
+        "update_duration": update_duration,
+    }
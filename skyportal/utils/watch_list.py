@@ -0,0 +1,163 @@
+import json
+from collections import defaultdict
+
+import numpy as np
+
+# cone searches sent in a single query to the alert database
+MAX_CONES_PER_QUERY = 500
+
+# fields of the alerts needed to match them to the watched positions
+PROJECTION = {
+    "_id": 0,
+    "objectId": 1,
+    "candidate.jd": 1,
+    "candidate.ra": 1,
+    "candidate.dec": 1,
+}
+
+
+def group_watched_positions(positions):
+    """Group watched positions that can be searched for in the same query:
+    those with the same alert stream permissions, extra filter and radius.
+
+    Parameters
+    ----------
+    positions : list of dict
+        Watched positions, with keys "id", "ra", "dec" (in degrees), "arcsec"
+        (radius of the cone search), "filter" (extra filter on the alerts),
+        "program_id_selector" (alert streams the owner has access to) and
+        "since" (JD from which alerts are new).
+
+    Returns
+    -------
+    dict
+        Lists of positions, by (program_id_selector, filter, arcsec).
+    """
+    groups = defaultdict(list)
+    for position in positions:
+        key = (
+            tuple(sorted(position["program_id_selector"])),
+            json.dumps(position["filter"], sort_keys=True),
+            float(position["arcsec"]),
+        )
+        groups[key].append(position)
+    return groups
+
+
+def angular_separation(ra1, dec1, ra2, dec2):
+    """Angular separation (in degrees) between coordinates (in degrees),
+    broadcast against each other."""
+    ra1, dec1, ra2, dec2 = map(np.radians, (ra1, dec1, ra2, dec2))
+    sin_ddec = np.sin((dec2 - dec1) / 2)
+    sin_dra = np.sin((ra2 - ra1) / 2)
+    a = sin_ddec**2 + np.cos(dec1) * np.cos(dec2) * sin_dra**2
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(a, 0, 1))))
+
+
+def match_alerts(positions, alerts, arcsec):
+    """Match alerts to the watched positions they are within `arcsec` of,
+    and that they are new for.
+
+    Returns
+    -------
+    dict
+        Matched alerts, by position ID.
+    """
+    matches = defaultdict(list)
+    if len(positions) == 0 or len(alerts) == 0:
+        return matches
+
+    ra = np.array([alert["candidate"]["ra"] for alert in alerts])
+    dec = np.array([alert["candidate"]["dec"] for alert in alerts])
+    jd = np.array([alert["candidate"]["jd"] for alert in alerts])
+    position_ra = np.array([position["ra"] for position in positions])
+    position_dec = np.array([position["dec"] for position in positions])
+    since = np.array([position["since"] for position in positions])
+
+    # positions x alerts, bounded by the number of cones per query
+    separation = angular_separation(
+        position_ra[:, None], position_dec[:, None], ra[None, :], dec[None, :]
+    )
+    matched = (separation <= arcsec / 3600.0) & (jd[None, :] >= since[:, None])
+    for i, j in zip(*np.nonzero(matched)):
+        matches[positions[i]["id"]].append(alerts[j])
+    return matches
+
+
+def search_watched_positions(
+    positions,
+    get_alerts_by_positions=None,
+    get_alerts_by_position=None,
+    max_cones=MAX_CONES_PER_QUERY,
+):
+    """Search for new alerts around watched positions, with one query per
+    group of positions sharing the same permissions, filter and radius
+    (see `group_watched_positions`), and match the alerts back to the
+    positions.
+
+    Each query is restricted to the alerts that are new for at least one of
+    its positions, the alerts are then matched locally to the positions they
+    are within the radius of and new for.
+
+    Parameters
+    ----------
+    positions : list of dict
+        Watched positions, see `group_watched_positions`.
+    get_alerts_by_positions : callable, optional
+        Multi-cone search of the alert database, called as
+        ``get_alerts_by_positions(coordinates, radius, unit,
+        program_id_selector, projection=..., include_all_fields=False,
+        filter=...)`` with a list of (ra, dec) coordinates, and returning a
+        list of alerts (None on failure).
+    get_alerts_by_position : callable, optional
+        Single cone search with the same signature (for a single ra, dec),
+        used when no multi-cone search is available.
+    max_cones : int, optional
+        Maximum number of cones per query.
+
+    Returns
+    -------
+    dict
+        New alerts, by position ID. Positions whose query failed are missing.
+    """
+    if get_alerts_by_positions is None:
+        if get_alerts_by_position is None:
+            raise ValueError("No alert database query available")
+
+        def get_alerts_by_positions(coordinates, *args, **kwargs):
+            alerts = []
+            for ra, dec in coordinates:
+                result = get_alerts_by_position(ra, dec, *args, **kwargs)
+                if result is None:
+                    return None
+                alerts.extend(result)
+            return alerts
+
+    matches = {}
+    for (
+        program_id_selector,
+        filter,
+        arcsec,
+    ), group in group_watched_positions(positions).items():
+        for start in range(0, len(group), max_cones):
+            batch = group[start : start + max_cones]
+            alerts = get_alerts_by_positions(
+                [(position["ra"], position["dec"]) for position in batch],
+                arcsec,
+                "arcsec",
+                list(program_id_selector),
+                projection=PROJECTION,
+                include_all_fields=False,
+                filter={
+                    **json.loads(filter),
+                    "candidate.jd": {
+                        "$gte": min(position["since"] for position in batch)
+                    },
+                },
+            )
+            if alerts is None:
+                continue
+            batch_matches = match_alerts(batch, alerts, arcsec)
+            for position in batch:
+                matches[position["id"]] = batch_matches.get(position["id"], [])
+    return matches
@@ -14,6 +14,9 @@ import Tooltip from "@mui/material/Tooltip";
 
 import { GET } from "../API";
 
+// maximum number of sources per request to /api/sources/offsets
+const MAX_OFFSETS_SOURCES = 500;
+
 const useStyles = makeStyles(() => ({
   starList: {
     fontSize: "0.75rem",
@@ -167,14 +170,23 @@ export const ObservingRunStarList = () => {
 
   useEffect(() => {
     const fetchStarList = async () => {
-      const promises = assignments.map((assignment) =>
-        dispatch(
-          GET(
-            `/api/sources/${assignment.obj_id}/offsets?facility=${facility}&observing_run_id=${assignment.run_id}`,
-            "skyportal/FETCH_STARLIST",
+      // the offset stars of the targets are retrieved in batches
+      // of at most MAX_OFFSETS_SOURCES sources
+      const objIds = [
+        ...new Set(assignments.map((assignment) => assignment.obj_id)),
+      ];
+      const promises = [];
+      for (let i = 0; i < objIds.length; i += MAX_OFFSETS_SOURCES) {
+        const batch = objIds.slice(i, i + MAX_OFFSETS_SOURCES).join(",");
+        promises.push(
+          dispatch(
+            GET(
+              `/api/sources/offsets?obj_ids=${batch}&facility=${facility}&observing_run_id=${assignments[0].run_id}`,
+              "skyportal/FETCH_STARLIST",
+            ),
           ),
-        ),
-      );
+        );
+      }
       const standard_promise = [
         dispatch(
           GET(
@@ -188,9 +200,14 @@ export const ObservingRunStarList = () => {
       const standard_value = await Promise.allSettled(standard_promise);
       values.push(standard_value[0]);
 
-      values.forEach((response) =>
-        starlistInfo.push(...response.value.data.starlist_info),
-      );
+      values.forEach((response) => {
+        if (
+          response.status === "fulfilled" &&
+          response.value?.status === "success"
+        ) {
+          starlistInfo.push(...response.value.data.starlist_info);
+        }
+      });
 
       // if the facility is P200-NGPS, we add the header to the starlist
       if (facility === "P200-NGPS") {
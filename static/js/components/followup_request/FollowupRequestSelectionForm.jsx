@@ -75,6 +75,7 @@ const FollowupRequestSelectionForm = ({ fetchParams, setFetchParams }) => {
   const [selectedInstrumentId, setSelectedInstrumentId] = useState(null);
   const [selectedFormat, setSelectedFormat] = useState("csv");
   const [includeStandards, setIncludeStandards] = useState(false);
+  const [useGridScheduler, setUseGridScheduler] = useState(false);
 
   useEffect(() => {
     const getInstruments = async () => {
@@ -213,6 +214,7 @@ const FollowupRequestSelectionForm = ({ fetchParams, setFetchParams }) => {
       url += `?${queryString}`;
     }
     url += `&output_format=${format}&includeStandards=${includeStandards}`;
+    url += `&scheduler=${useGridScheduler ? "grid" : "astroplan"}`;
     return url;
   }
 
@@ -442,6 +444,18 @@ const FollowupRequestSelectionForm = ({ fetchParams, setFetchParams }) => {
             />
           }
         />
+        <FormControlLabel
+          label="Fast scheduler?"
+          control={
+            <Checkbox
+              color="primary"
+              title="Fast scheduler?"
+              type="checkbox"
+              onChange={(event) => setUseGridScheduler(event.target.checked)}
+              checked={useGridScheduler}
+            />
+          }
+        />
         <Button
           primary
           href={`${scheduleUrl}`}
@@ -114,7 +114,20 @@ const SurveyEfficiencyObservationPlanLists = ({
   };
 
   const getDataTableColumns = () => {
-    const columns = [{ name: "status", label: "Status" }];
+    const renderStatus = (dataIndex) => {
+      const analysis = survey_efficiency_analyses[dataIndex];
+      if (analysis.status === "running" && analysis.progress != null) {
+        return `running (${Math.round(100 * analysis.progress)}%)`;
+      }
+      return analysis.status;
+    };
+    const columns = [
+      {
+        name: "status",
+        label: "Status",
+        options: { customBodyRenderLite: renderStatus },
+      },
+    ];
 
     const renderPayload = (dataIndex) => {
       const analysis = survey_efficiency_analyses[dataIndex];
@@ -316,6 +329,7 @@ SurveyEfficiencyObservationPlanLists.propTypes = {
       id: PropTypes.number,
       payload: PropTypes.objectOf(PropTypes.any).isRequired, // eslint-disable-line react/forbid-prop-types,
       status: PropTypes.string,
+      progress: PropTypes.number,
       number_of_transients: PropTypes.number,
       number_in_covered: PropTypes.number,
       number_detected: PropTypes.number,
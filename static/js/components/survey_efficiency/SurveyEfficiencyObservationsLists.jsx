@@ -133,7 +133,20 @@ const SurveyEfficiencyObservationsLists = ({ survey_efficiency_analyses }) => {
   });
 
   const getDataTableColumns = (keys, instrument_id) => {
-    const columns = [{ name: "status", label: "Status" }];
+    const renderStatus = (dataIndex) => {
+      const analysis = analysesGroupedByInstId[instrument_id][dataIndex];
+      if (analysis.status === "running" && analysis.progress != null) {
+        return `running (${Math.round(100 * analysis.progress)}%)`;
+      }
+      return analysis.status;
+    };
+    const columns = [
+      {
+        name: "status",
+        label: "Status",
+        options: { customBodyRenderLite: renderStatus },
+      },
+    ];
 
     const renderPayload = (dataIndex) => {
       const analysis = analysesGroupedByInstId[instrument_id][dataIndex];
@@ -513,6 +526,7 @@ SurveyEfficiencyObservationsLists.propTypes = {
       id: PropTypes.number,
       payload: PropTypes.objectOf(PropTypes.any).isRequired, // eslint-disable-line react/forbid-prop-types,
       status: PropTypes.string,
+      progress: PropTypes.number,
       number_of_transients: PropTypes.number,
       number_in_covered: PropTypes.number,
       number_detected: PropTypes.number,
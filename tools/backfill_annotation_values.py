@@ -0,0 +1,74 @@
+import argparse
+import time
+
+parser = argparse.ArgumentParser(
+    description=(
+        "Copy the numeric values of existing annotations into the "
+        "annotation_values table. The migration creating the table already "
+        "copies them, and new and updated annotations are kept in sync by "
+        "database triggers, so this is only needed to repair the table; it "
+        "can be interrupted and resumed with --start-id."
+    )
+)
+parser.add_argument(
+    "--batch-size", type=int, default=10_000, help="Annotations per transaction"
+)
+parser.add_argument(
+    "--start-id", type=int, default=0, help="First annotation ID to copy"
+)
+args = parser.parse_args()
+
+import sqlalchemy as sa  # noqa: E402
+
+from baselayer.app.env import load_env  # noqa: E402
+from baselayer.app.models import DBSession, init_db  # noqa: E402
+from skyportal.models.annotation import ANNOTATION_NUMERIC_ITEM  # noqa: E402
+
+env, cfg = load_env()
+init_db(**cfg["database"])
+
+BACKFILL = sa.text(
+    """
+    INSERT INTO annotation_values
+        (annotation_id, obj_id, origin, key, value, group_ids, created_at, modified)
+    SELECT
+        annotations.id,
+        annotations.obj_id,
+        annotations.origin,
+        item.key,
+        float_value,
+        ARRAY(
+            SELECT group_id FROM group_annotations
+            WHERE annotation_id = annotations.id
+        ),
+        now() AT TIME ZONE 'utc',
+        now() AT TIME ZONE 'utc'
+    FROM annotations, jsonb_each(annotations.data) AS item,
+        LATERAL annotation_value_to_float(item.value #>> '{}') AS float_value
+    WHERE annotations.id >= :start AND annotations.id < :end
+        AND float_value IS NOT NULL AND """
+    + ANNOTATION_NUMERIC_ITEM
+    + """
+    ON CONFLICT (annotation_id, key) DO UPDATE SET
+        obj_id = EXCLUDED.obj_id,
+        origin = EXCLUDED.origin,
+        value = EXCLUDED.value,
+        group_ids = EXCLUDED.group_ids,
+        modified = EXCLUDED.modified
+    """
+)
+
+session = DBSession()
+max_id = session.scalar(sa.text("SELECT max(id) FROM annotations")) or 0
+start_time = time.time()
+n_values = 0
+for start in range(args.start_id, max_id + 1, args.batch_size):
+    end = start + args.batch_size
+    result = session.execute(BACKFILL, {"start": start, "end": end})
+    session.commit()
+    n_values += result.rowcount
+    print(
+        f"Annotations {start} to {min(end, max_id + 1) - 1}: "
+        f"{n_values} values in {time.time() - start_time:.1f} s"
+    )
+print(f"Done: {n_values} values copied.")
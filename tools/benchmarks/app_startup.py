@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Measure how long an app process takes to start.
+
+Reports the slowest imports of `skyportal.app_server` (from `python -X importtime`),
+the time needed to generate the OpenAPI spec, and optionally the time until
+a (re)started SkyPortal instance answers its first request.
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import requests
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument(
+    "--top", type=int, default=25, help="Number of slowest imports to show"
+)
+parser.add_argument(
+    "--url",
+    help="URL to poll until it answers, e.g. http://localhost:5000/api/sysinfo, "
+    "to be run right after restarting the app",
+)
+parser.add_argument(
+    "--timeout", type=float, default=300, help="Polling timeout in seconds"
+)
+args = parser.parse_args()
+
+
+def import_times(module):
+    """Cumulative import time (in seconds) of every module imported by `module`."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    total = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"Failed to import {module}:\n{proc.stderr[-2000:]}")
+
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (x.strip() for x in line.split("|"))
+        cumulative[name.strip()] = int(cumulative_us) / 1e6
+    return total, cumulative
+
+
+total, cumulative = import_times("skyportal.app_server")
+print(f"import skyportal.app_server: {total:.2f} s (including interpreter startup)")
+
+packages = defaultdict(float)
+for name, duration in cumulative.items():
+    # only the top-level modules, whose cumulative time includes their children
+    if "." not in name:
+        packages[name] += duration
+
+print(f"\nslowest top-level packages (top {args.top}):")
+for name, duration in sorted(packages.items(), key=lambda x: -x[1])[: args.top]:
+    print(f"  {duration:8.3f} s  {name}")
+
+print(f"\nslowest skyportal modules (top {args.top}):")
+skyportal_modules = {k: v for k, v in cumulative.items() if k.startswith("skyportal.")}
+for name, duration in sorted(skyportal_modules.items(), key=lambda x: -x[1])[
+    : args.top
+]:
+    print(f"  {duration:8.3f} s  {name}")
+
+# imports are cached from now on, so this only measures the docstring parsing
+from baselayer.app.app_server import handlers as baselayer_handlers  # noqa: E402
+from skyportal import openapi  # noqa: E402
+from skyportal.app_server import skyportal_handlers  # noqa: E402
+
+start = time.perf_counter()
+openapi.spec_from_handlers(baselayer_handlers + skyportal_handlers)
+print(f"\nOpenAPI spec generation: {time.perf_counter() - start:.2f} s")
+
+if args.url:
+    start = time.perf_counter()
+    while True:
+        try:
+            r = requests.get(args.url, timeout=5)
+            if r.status_code < 500:
+                break
+        except requests.exceptions.ConnectionError:
+            pass
+        if time.perf_counter() - start > args.timeout:
+            raise TimeoutError(f"{args.url} did not answer within {args.timeout} s")
+        time.sleep(0.1)
+    print(
+        f"time to first request ({args.url}): {time.perf_counter() - start:.2f} s "
+        f"(status {r.status_code})"
+    )
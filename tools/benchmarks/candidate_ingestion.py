@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Compare the throughput of the single-item and bulk candidate endpoints.
+
+Posts the same number of synthetic candidates through POST /api/candidates
+(one request per candidate) and through POST /api/candidates_bulk, against
+a running SkyPortal instance, and prints candidates/second for both.
+"""
+
+import argparse
+import datetime
+import time
+import uuid
+
+import numpy as np
+import yaml
+
+from baselayer.app.env import load_env
+from skyportal.tests import api
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--filter-id", type=int, required=True, help="Filter to post to")
+parser.add_argument(
+    "--n", type=int, default=1000, help="Number of candidates per endpoint"
+)
+parser.add_argument(
+    "--batch-size", type=int, default=1000, help="Candidates per bulk request"
+)
+parser.add_argument("--host", help="SkyPortal URL (defaults to localhost)")
+parser.add_argument("--token", help="Token (defaults to the INITIAL_ADMIN token)")
+args = parser.parse_args()
+
+env, cfg = load_env()
+token = args.token or yaml.safe_load(open(".tokens.yaml"))["INITIAL_ADMIN"]
+
+rng = np.random.default_rng()
+
+
+def make_candidates(n):
+    passed_at = str(datetime.datetime.utcnow())
+    return [
+        {
+            "id": f"bench_{uuid.uuid4().hex[:16]}",
+            "ra": float(ra),
+            "dec": float(dec),
+            "redshift": float(z),
+            "filter_ids": [args.filter_id],
+            "passed_at": passed_at,
+        }
+        for ra, dec, z in zip(
+            rng.uniform(0, 360, n),
+            np.degrees(np.arcsin(rng.uniform(-1, 1, n))),
+            rng.uniform(0, 0.2, n),
+        )
+    ]
+
+
+def delete_candidates(candidates):
+    for c in candidates:
+        api(
+            "DELETE",
+            f"candidates/{c['id']}/{args.filter_id}",
+            host=args.host,
+            token=token,
+        )
+
+
+candidates = make_candidates(args.n)
+start = time.perf_counter()
+for c in candidates:
+    status, data = api("POST", "candidates", data=c, host=args.host, token=token)
+    if status != 200:
+        raise RuntimeError(f"Single-item post failed: {data}")
+single_duration = time.perf_counter() - start
+delete_candidates(candidates)
+
+candidates = make_candidates(args.n)
+start = time.perf_counter()
+for i in range(0, len(candidates), args.batch_size):
+    status, data = api(
+        "POST",
+        "candidates_bulk",
+        data={"candidates": candidates[i : i + args.batch_size]},
+        host=args.host,
+        token=token,
+    )
+    if status != 200:
+        raise RuntimeError(f"Bulk post failed: {data['message']}")
+    errors = [r["error"] for r in data["data"]["results"] if r["error"] is not None]
+    if len(errors) > 0:
+        raise RuntimeError(f"Bulk post failed: {errors[:5]}")
+bulk_duration = time.perf_counter() - start
+delete_candidates(candidates)
+
+print(
+    f"single-item: {args.n / single_duration:.1f} candidates/s ({single_duration:.2f} s)"
+)
+print(
+    f"bulk ({args.batch_size}/request): {args.n / bulk_duration:.1f} candidates/s "
+    f"({bulk_duration:.2f} s)"
+)
+print(f"speedup: {single_duration / bulk_duration:.1f}x")
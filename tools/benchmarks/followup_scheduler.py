@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""Compare astroplan's priority scheduler with the grid scheduler.
+
+Schedules synthetic follow-up requests, spread over the sky with random
+priorities, exposure times and filters, on a telescope at Palomar for one
+night, with both schedulers. Reports the run time, and the quality of each
+schedule: the number of requests scheduled, their total priority, the time
+spent on targets and their mean airmass.
+"""
+
+import argparse
+import io
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from astroplan import Observer
+from astropy import units as u
+from astropy.coordinates import EarthLocation, SkyCoord
+from astropy.time import Time
+
+from baselayer.app.env import load_env
+from skyportal.handlers.api.followup_request import observation_schedule
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument(
+    "--requests",
+    type=int,
+    nargs="+",
+    default=[25, 100, 400],
+    help="Numbers of follow-up requests to compare",
+)
+parser.add_argument("--time-resolution", type=float, default=20, help="seconds")
+parser.add_argument(
+    "--schedulers", nargs="+", default=["astroplan", "grid"], help="Schedulers to run"
+)
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
+
+env, cfg = load_env()
+
+telescope = SimpleNamespace(lon=-116.8650, lat=33.3563, elevation=1712.0)
+instrument = SimpleNamespace(name="SEDM", telescope=telescope)
+observer = Observer(
+    location=EarthLocation.from_geodetic(
+        telescope.lon * u.deg, telescope.lat * u.deg, telescope.elevation * u.m
+    )
+)
+observation_start = Time("2024-01-15T01:00:00")
+observation_end = Time("2024-01-15T14:00:00")
+
+
+def make_requests(n_requests, rng):
+    # sources observable during the night: RA between ~0h and ~14h
+    ra = rng.uniform(0, 210, n_requests)
+    dec = np.degrees(np.arcsin(rng.uniform(-0.4, 1, n_requests)))
+    return [
+        SimpleNamespace(
+            id=i,
+            obj=SimpleNamespace(id=f"obj{i}", ra=ra[i], dec=dec[i]),
+            payload={
+                "priority": int(rng.integers(1, 6)),
+                "exposure_time": int(rng.choice([120, 300, 600])),
+                "observation_choices": list(
+                    rng.choice(["g", "r", "i"], rng.integers(1, 3), replace=False)
+                ),
+            },
+            allocation=SimpleNamespace(group_id=1),
+            requester=SimpleNamespace(username="benchmark"),
+        )
+        for i in range(n_requests)
+    ]
+
+
+def quality(data, requests):
+    df = pd.read_csv(io.BytesIO(data))
+    if len(df) == 0:
+        return 0, 0, 0.0, np.nan
+    priorities = {request.id: request.payload["priority"] for request in requests}
+    starts = Time(list(df["observation_start"]))
+    ends = Time(list(df["observation_end"]))
+    middle = starts + (ends - starts) / 2
+    coords = SkyCoord(df["ra"], df["dec"], unit=(u.hourangle, u.deg))
+    airmass = observer.altaz(middle, coords).secz
+    return (
+        df["request_id"].nunique(),
+        sum(priorities[i] for i in df["request_id"].unique()),
+        float(np.sum((ends - starts).to_value(u.hour))),
+        float(np.mean(airmass)),
+    )
+
+
+rng = np.random.default_rng(args.seed)
+for n_requests in args.requests:
+    requests = make_requests(n_requests, rng)
+    n_blocks = sum(len(r.payload["observation_choices"]) for r in requests)
+    print(f"{n_requests} requests, {n_blocks} blocks")
+    for scheduler in args.schedulers:
+        start = time.perf_counter()
+        rez = observation_schedule(
+            requests,
+            instrument,
+            observation_start=observation_start,
+            observation_end=observation_end,
+            time_resolution=args.time_resolution * u.s,
+            output_format="csv",
+            scheduler=scheduler,
+        )
+        elapsed = time.perf_counter() - start
+        n_scheduled, total_priority, hours, mean_airmass = quality(
+            rez["data"], requests
+        )
+        print(
+            f"  {scheduler:>9}: {elapsed:8.1f} s, {n_scheduled} requests "
+            f"(total priority {total_priority}), {hours:.1f} h on target, "
+            f"mean airmass {mean_airmass:.2f}"
+        )
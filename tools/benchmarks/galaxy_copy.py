@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""Measure the galaxies/second of galaxy catalog ingestion.
+
+Ingests a synthetic catalog with the chunked COPY writer used by
+add_galaxies and add_glade (copy_galaxies), and a subset of it with the
+previous approach (one Galaxy ORM object and one HEALPix conversion per
+galaxy). The peak memory of the COPY writer is reported too. Nothing is
+committed.
+"""
+
+import argparse
+import time
+import tracemalloc
+import uuid
+
+import astropy.units as u
+import healpix_alchemy as ha
+import numpy as np
+
+from baselayer.app.env import load_env
+from skyportal.handlers.api.galaxy import copy_galaxies
+from skyportal.models import DBSession, Galaxy, GalaxyCatalog, init_db
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--n", type=int, default=5_000_000, help="Number of galaxies")
+parser.add_argument(
+    "--legacy-n",
+    type=int,
+    default=50_000,
+    help="Number of galaxies ingested with the ORM (0 to skip)",
+)
+parser.add_argument(
+    "--chunk-size", type=int, default=100_000, help="Galaxies per COPY chunk"
+)
+args = parser.parse_args()
+
+env, cfg = load_env()
+init_db(**cfg["database"])
+
+rng = np.random.default_rng()
+n = args.n
+distmpc = rng.uniform(1, 500, n)
+catalog_data = {
+    "ra": rng.uniform(0, 360, n),
+    "dec": np.degrees(np.arcsin(rng.uniform(-1, 1, n))),
+    "name": np.array([f"bench-{i}" for i in range(n)], dtype=object),
+    # a tenth of the values are missing
+    "distmpc": np.where(rng.uniform(size=n) < 0.1, np.nan, distmpc),
+    "distmpc_unc": 0.1 * distmpc,
+    "redshift": distmpc / 4400,
+    "mstar": 10 ** rng.uniform(8, 12, n),
+    "magb": rng.uniform(10, 20, n),
+    "magk": rng.uniform(8, 18, n),
+}
+
+with DBSession() as session:
+    catalog = GalaxyCatalog(name=f"benchmark-{uuid.uuid4()}")
+    session.add(catalog)
+    session.flush()
+
+    if args.legacy_n > 0:
+        m = min(args.legacy_n, n)
+        start = time.perf_counter()
+        session.add_all(
+            [
+                Galaxy(
+                    catalog_id=catalog.id,
+                    ra=catalog_data["ra"][i],
+                    dec=catalog_data["dec"][i],
+                    name=catalog_data["name"][i],
+                    distmpc=None
+                    if np.isnan(catalog_data["distmpc"][i])
+                    else catalog_data["distmpc"][i],
+                    distmpc_unc=catalog_data["distmpc_unc"][i],
+                    redshift=catalog_data["redshift"][i],
+                    mstar=catalog_data["mstar"][i],
+                    magb=catalog_data["magb"][i],
+                    magk=catalog_data["magk"][i],
+                    healpix=ha.constants.HPX.lonlat_to_healpix(
+                        catalog_data["ra"][i] * u.deg, catalog_data["dec"][i] * u.deg
+                    ),
+                )
+                for i in range(m)
+            ]
+        )
+        session.flush()
+        duration = time.perf_counter() - start
+        print(f"legacy (ORM): {m / duration:.0f} galaxies/s ({m} in {duration:.2f} s)")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    copy_galaxies(
+        catalog.id,
+        catalog_data,
+        session=session,
+        chunk_size=args.chunk_size,
+        progress=lambda n_done, n: print(
+            f"  {n_done}/{n} galaxies in {time.perf_counter() - start:.1f} s"
+        )
+        if n_done % (10 * args.chunk_size) == 0
+        else None,
+    )
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"COPY: {n / duration:.0f} galaxies/s ({n} in {duration:.2f} s, "
+        f"peak memory {peak / 1e6:.0f} MB on top of the catalog)"
+    )
+    session.rollback()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Measure photometry upload throughput with several concurrent uploaders.
+
+Each uploader PUTs batches of synthetic photometry to its own source (or,
+with --same-object, all uploaders share a single source), against a running
+SkyPortal instance. Uploads to different objects should scale with the
+number of uploaders, while uploads to the same object are serialized.
+"""
+
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import yaml
+
+from baselayer.app.env import load_env
+from skyportal.tests import api
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument(
+    "--instrument-id", type=int, required=True, help="Instrument to post to"
+)
+parser.add_argument(
+    "--filter", default="ztfg", help="Filter of the photometry (default: ztfg)"
+)
+parser.add_argument("--uploaders", type=int, default=8, help="Concurrent uploaders")
+parser.add_argument(
+    "--requests", type=int, default=20, help="Requests sent by each uploader"
+)
+parser.add_argument("--points", type=int, default=100, help="Points per request")
+parser.add_argument(
+    "--same-object",
+    action="store_true",
+    help="Post all the photometry to a single object",
+)
+parser.add_argument("--host", help="SkyPortal URL (defaults to localhost)")
+parser.add_argument("--token", help="Token (defaults to the INITIAL_ADMIN token)")
+args = parser.parse_args()
+
+env, cfg = load_env()
+token = args.token or yaml.safe_load(open(".tokens.yaml"))["INITIAL_ADMIN"]
+
+rng = np.random.default_rng()
+
+
+def create_source():
+    obj_id = f"bench_{uuid.uuid4().hex[:16]}"
+    status, data = api(
+        "POST",
+        "sources",
+        data={"id": obj_id, "ra": rng.uniform(0, 360), "dec": rng.uniform(-30, 60)},
+        host=args.host,
+        token=token,
+    )
+    if status != 200:
+        raise RuntimeError(f"Failed to create source: {data['message']}")
+    return obj_id
+
+
+def upload(obj_id, uploader):
+    uploader_rng = np.random.default_rng(uploader)
+    durations = []
+    for i in range(args.requests):
+        # distinct mjds per uploader and request, so nothing is deduplicated
+        mjd_start = 59000 + (uploader * args.requests + i) * args.points
+        payload = {
+            "obj_id": obj_id,
+            "instrument_id": args.instrument_id,
+            "mjd": [mjd_start + j for j in range(args.points)],
+            "mag": uploader_rng.uniform(18, 22, args.points).tolist(),
+            "magerr": uploader_rng.uniform(0.05, 0.2, args.points).tolist(),
+            "limiting_mag": 22.5,
+            "magsys": "ab",
+            "filter": args.filter,
+        }
+        start = time.perf_counter()
+        status, data = api(
+            "PUT", "photometry", data=payload, host=args.host, token=token
+        )
+        durations.append(time.perf_counter() - start)
+        if status != 200:
+            raise RuntimeError(f"Upload failed: {data['message']}")
+    return durations
+
+
+if args.same_object:
+    obj_ids = [create_source()] * args.uploaders
+else:
+    obj_ids = [create_source() for _ in range(args.uploaders)]
+
+start = time.perf_counter()
+with ThreadPoolExecutor(max_workers=args.uploaders) as executor:
+    durations = np.concatenate(
+        list(executor.map(upload, obj_ids, range(args.uploaders)))
+    )
+elapsed = time.perf_counter() - start
+
+for obj_id in set(obj_ids):
+    api("DELETE", f"sources/{obj_id}", host=args.host, token=token)
+
+n_points = args.uploaders * args.requests * args.points
+print(
+    f"{args.uploaders} uploaders, {'one object' if args.same_object else 'one object each'}: "
+    f"{n_points} points in {elapsed:.2f} s ({n_points / elapsed:.1f} points/s)"
+)
+print(
+    f"request latency: median {np.median(durations):.3f} s, "
+    f"p95 {np.percentile(durations, 95):.3f} s, max {np.max(durations):.3f} s"
+)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""Measure the rows/second of the COPY writer used for photometry uploads.
+
+Writes synthetic photometry rows into a temporary copy of the photometry
+table, with the column-based COPY writer (skyportal.utils.copy) and with the
+previous approach (one dict per row, rendered to CSV by pandas). Nothing is
+committed.
+"""
+
+import argparse
+import datetime
+import json
+import time
+import uuid
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from baselayer.app.env import load_env
+from skyportal.models import DBSession, init_db
+from skyportal.utils.copy import copy_columns
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--n", type=int, default=100_000, help="Number of rows")
+parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions")
+args = parser.parse_args()
+
+env, cfg = load_env()
+init_db(**cfg["database"])
+
+rng = np.random.default_rng()
+utcnow = datetime.datetime.utcnow().isoformat()
+n = args.n
+columns = {
+    "id": np.arange(n),
+    "original_user_data": json.dumps({"limiting_mag": 21.5, "magsys": "ab"}),
+    "upload_id": str(uuid.uuid4()),
+    "flux": np.where(rng.uniform(size=n) < 0.1, np.nan, rng.uniform(1, 100, n)),
+    "fluxerr": rng.uniform(0.1, 5, n),
+    "obj_id": [f"bench_{i % 1000}" for i in range(n)],
+    "altdata": json.dumps(None),
+    "instrument_id": 1,
+    "ra_unc": [None] * n,
+    "dec_unc": [None] * n,
+    "mjd": 59000 + rng.uniform(0, 1000, n),
+    "filter": "ztfg",
+    "ra": rng.uniform(0, 360, n),
+    "dec": rng.uniform(-30, 60, n),
+    "origin": "None",
+    "owner_id": 1,
+    "created_at": utcnow,
+    "modified": utcnow,
+    "ref_flux": [None] * n,
+    "ref_fluxerr": [None] * n,
+}
+
+
+def legacy_copy(session, table):
+    # the previous implementation: one dict per row, rendered by pandas
+    rows = [
+        {
+            name: values if np.isscalar(values) or values is None else values[i]
+            for name, values in columns.items()
+        }
+        for i in range(n)
+    ]
+    output = StringIO()
+    df = pd.DataFrame.from_records(rows)
+    df.replace("NaN", "null", inplace=True)
+    df.replace(np.nan, "NaN", inplace=True)
+    df.to_csv(
+        output, index=False, sep="\t", header=False, encoding="utf8", quotechar="'"
+    )
+    output.seek(0)
+    cursor = session.connection().connection.cursor()
+    cursor.copy_from(output, table, sep="\t", null="", columns=tuple(columns))
+    cursor.close()
+
+
+def column_copy(session, table):
+    copy_columns(table, columns, session=session)
+
+
+with DBSession() as session:
+    session.execute(
+        sa.text(
+            "CREATE TEMPORARY TABLE bench_photometry "
+            "(LIKE photometry INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+    )
+    for name, writer in [
+        ("legacy (pandas CSV)", legacy_copy),
+        ("columns", column_copy),
+    ]:
+        durations = []
+        for _ in range(args.repeat):
+            session.execute(sa.text("TRUNCATE bench_photometry"))
+            start = time.perf_counter()
+            writer(session, "bench_photometry")
+            durations.append(time.perf_counter() - start)
+        best = min(durations)
+        print(f"{name}: {n / best:.0f} rows/s (best of {args.repeat}: {best:.2f} s)")
+    session.rollback()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""Measure the run time of a sharded simsurvey efficiency analysis.
+
+Simulates injections of the linear model in a synthetic skymap observed by
+a synthetic grid of pointings, with an increasing number of processes. The
+shards and their seeds do not depend on the number of processes, so every
+run must give the same efficiency; the efficiency of a differently seeded
+run must agree within its binomial uncertainty.
+"""
+
+import argparse
+import os
+import time
+
+import healpy as hp
+import numpy as np
+from astropy.time import Time
+
+from baselayer.app.env import load_env
+from skyportal.utils.simsurvey import get_simsurvey_parameters, run_simsurvey
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--injections", type=int, default=10_000)
+parser.add_argument("--injections-per-shard", type=int, default=250)
+parser.add_argument(
+    "--processes",
+    type=int,
+    nargs="+",
+    default=[1, 2, 4, 8],
+    help="Numbers of processes to compare",
+)
+parser.add_argument("--seed", type=int, default=42)
+args = parser.parse_args()
+
+env, cfg = load_env()
+
+nside = 64
+ra0, dec0, sigma = 180.0, 30.0, 5.0
+theta, phi = hp.pix2ang(nside, np.arange(hp.nside2npix(nside)), lonlat=False)
+center = hp.ang2vec(ra0, dec0, lonlat=True)
+separation = np.degrees(np.arccos(np.clip(hp.ang2vec(theta, phi) @ center, -1, 1)))
+prob = np.exp(-0.5 * (separation / sigma) ** 2)
+prob /= prob.sum()
+
+trigger_jd = Time("2024-01-01T00:00:00").jd
+width = height = 7.0
+pointings = {k: [] for k in ["ra", "dec", "field_id", "limMag", "jd", "filter"]}
+field_id = 0
+for dec in np.arange(dec0 - 14, dec0 + 15, height):
+    for ra in np.arange(ra0 - 14, ra0 + 15, width / np.cos(np.radians(dec))):
+        field_id += 1
+        for night in range(3):
+            for i, filt in enumerate(["ztfg", "ztfr"]):
+                pointings["ra"].append(ra)
+                pointings["dec"].append(dec)
+                pointings["field_id"].append(field_id)
+                pointings["limMag"].append(20.5)
+                pointings["jd"].append(trigger_jd + 0.2 + night + 0.05 * i)
+                pointings["filter"].append(filt)
+zp = 30.0
+pointings["skynoise"] = [10 ** (-0.4 * (m - zp)) / 5.0 for m in pointings["limMag"]]
+pointings["zp"] = zp
+
+context = {
+    "pointings": pointings,
+    "width": width,
+    "height": height,
+    "model_name": "linear",
+    "optional_injection_parameters": get_simsurvey_parameters("linear", {}),
+    "redshift_range": [0.001, 0.05],
+    "trigger_jd": trigger_jd,
+    "map_struct": {"prob": prob},
+    "sfd98_dir": os.path.join(cfg["misc.dustmap_folder"], "sfd"),
+    "phase_range": (0, 3),
+    "number_of_detections": 2,
+    "detection_threshold": 5,
+}
+
+
+def efficiency(data):
+    n_detected = 0 if data["lcs"] is None else len(data["lcs"])
+    return n_detected / args.injections
+
+
+def run(n_processes, seed):
+    start = time.perf_counter()
+    data = run_simsurvey(
+        context,
+        args.injections,
+        seed=seed,
+        injections_per_shard=args.injections_per_shard,
+        n_processes=n_processes,
+    )
+    return time.perf_counter() - start, efficiency(data)
+
+
+print(f"{args.injections} injections, {args.injections_per_shard} per shard")
+efficiencies = set()
+baseline = None
+for n_processes in args.processes:
+    elapsed, eff = run(n_processes, args.seed)
+    efficiencies.add(eff)
+    baseline = baseline or elapsed
+    print(
+        f"  {n_processes} process(es): {elapsed:8.1f} s "
+        f"(speedup {baseline / elapsed:.1f}x), efficiency {eff:.4f}"
+    )
+if len(efficiencies) > 1:
+    raise RuntimeError(f"Efficiencies differ between runs: {efficiencies}")
+
+_, other = run(max(args.processes), args.seed + 1)
+eff = efficiencies.pop()
+sigma = np.sqrt(eff * (1 - eff) / args.injections)
+print(
+    f"  other seed: efficiency {other:.4f} "
+    f"({abs(other - eff) / max(sigma, 1e-12):.1f} sigma from {eff:.4f})"
+)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""Measure the latency and memory of skymap ingestion, from the skymap file
+(or URL) of a notice to the localization tiles being available.
+
+Each stage (reading the skymap, inserting the localization, reading its arrays
+back and writing the tiles) is timed, and its peak Python memory allocation is
+traced. With --legacy, the previous list-based path through the ORM is measured
+as well. Everything is written in a transaction that is rolled back.
+"""
+
+import argparse
+import datetime
+import time
+import tracemalloc
+
+import sqlalchemy as sa
+
+from baselayer.app.env import load_env
+from skyportal.handlers.api.gcn import (
+    add_localization,
+    load_localization_arrays,
+    set_localization_arrays,
+)
+from skyportal.models import (
+    DBSession,
+    GcnEvent,
+    Localization,
+    LocalizationTile,
+    User,
+    init_db,
+)
+from skyportal.utils.copy import copy_binary
+from skyportal.utils.gcn import from_url, uniq_to_tile_ranges
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("skymap", help="Path or URL of a (multi-order) FITS skymap")
+parser.add_argument(
+    "--legacy",
+    action="store_true",
+    help="Also measure the previous list-based ingestion through the ORM",
+)
+args = parser.parse_args()
+
+env, cfg = load_env()
+init_db(**cfg["database"])
+
+
+def measure(name, function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {name:<30} {elapsed:8.2f} s  {peak / 1024**2:10.1f} MB peak")
+    return result, elapsed
+
+
+def add_tiles(localization, session):
+    arrays = load_localization_arrays(localization.id, session)
+    set_localization_arrays(localization, arrays)
+    lower, upper = uniq_to_tile_ranges(arrays["uniq"])
+    utcnow = datetime.datetime.utcnow()
+    return copy_binary(
+        "localizationtiles",
+        {
+            "localization_id": ("int4", localization.id),
+            "dateobs": ("timestamp", localization.dateobs),
+            "probdensity": ("float8", arrays["probdensity"]),
+            "healpix": ("int8range", (lower, upper)),
+            "created_at": ("timestamp", utcnow),
+            "modified": ("timestamp", utcnow),
+        },
+        session=session,
+    )
+
+
+def legacy_read(skymap):
+    skymap, properties, tags = from_url(skymap)
+    return {k: v.tolist() if hasattr(v, "tolist") else v for k, v in skymap.items()}
+
+
+def legacy_add_localization(skymap, session):
+    localization = Localization(**skymap)
+    session.add(localization)
+    session.flush()
+    return localization
+
+
+def legacy_add_tiles(localization, session):
+    session.expire(localization)
+    tiles = [
+        LocalizationTile(
+            localization_id=localization.id,
+            healpix=uniq,
+            probdensity=probdensity,
+            dateobs=localization.dateobs,
+        )
+        for uniq, probdensity in zip(localization.uniq, localization.probdensity)
+    ]
+    session.add_all(tiles)
+    session.flush()
+    return len(tiles)
+
+
+def run(session, user, dateobs, legacy):
+    print("legacy (lists and ORM):" if legacy else "binary COPY:")
+    total = 0
+    if legacy:
+        skymap, elapsed = measure("read skymap", legacy_read, args.skymap)
+    else:
+        (skymap, _, _), elapsed = measure("read skymap", from_url, args.skymap)
+    total += elapsed
+    skymap["dateobs"] = dateobs
+    skymap["sent_by_id"] = user.id
+    skymap["localization_name"] += "_legacy" if legacy else ""
+
+    localization, elapsed = measure(
+        "insert localization",
+        legacy_add_localization if legacy else add_localization,
+        skymap,
+        session,
+    )
+    total += elapsed
+    n_tiles, elapsed = measure(
+        "insert tiles",
+        legacy_add_tiles if legacy else add_tiles,
+        localization,
+        session,
+    )
+    total += elapsed
+    print(f"  {n_tiles} tiles available after {total:.2f} s")
+
+
+with DBSession() as session:
+    user = session.scalar(sa.select(User).order_by(User.id))
+    dateobs = datetime.datetime(2000, 1, 1) + datetime.timedelta(
+        seconds=int(time.time()) % 86400
+    )
+    session.add(GcnEvent(dateobs=dateobs, sent_by_id=user.id))
+    session.flush()
+
+    run(session, user, dateobs, legacy=False)
+    if args.legacy:
+        run(session, user, dateobs, legacy=True)
+    session.rollback()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""Measure the entries/second of spatial catalog ingestion.
+
+Generates the sky maps (MOCs) of a synthetic catalog of X-ray/radio-like
+error regions in a pool of processes and writes the entries and their
+tiles with COPY (as add_catalog does), and a subset of it with the
+previous approach (serial sky maps, then one SpatialCatalogEntry and one
+SpatialCatalogEntryTile ORM object per entry and tile). Nothing is
+committed.
+"""
+
+import argparse
+import time
+import uuid
+
+import numpy as np
+
+from baselayer.app.env import load_env
+from skyportal.models import (
+    DBSession,
+    SpatialCatalog,
+    SpatialCatalogEntry,
+    SpatialCatalogEntryTile,
+    init_db,
+)
+from skyportal.utils.spatial_catalog import (
+    catalog_entries,
+    copy_spatial_catalog_entries,
+    entry_skymap,
+    entry_skymaps,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=10_000, help="Number of entries")
+    parser.add_argument(
+        "--shape",
+        choices=["cone", "ellipse"],
+        default="ellipse",
+        help="Shape of the error regions",
+    )
+    parser.add_argument(
+        "--processes", type=int, default=4, help="Processes generating the sky maps"
+    )
+    parser.add_argument(
+        "--legacy-n",
+        type=int,
+        default=500,
+        help="Number of entries ingested serially with the ORM (0 to skip)",
+    )
+    args = parser.parse_args()
+
+    env, cfg = load_env()
+    init_db(**cfg["database"])
+
+    rng = np.random.default_rng()
+    n = args.n
+    prefix = uuid.uuid4().hex[:8]
+    catalog_data = {
+        "name": [f"bench-{prefix}-{i}" for i in range(n)],
+        "ra": rng.uniform(0, 360, n).tolist(),
+        "dec": np.degrees(np.arcsin(rng.uniform(-1, 1, n))).tolist(),
+    }
+    # error regions of 10 arcsec to 5 arcmin
+    amaj = 10 ** rng.uniform(np.log10(10 / 3600), np.log10(5 / 60), n)
+    if args.shape == "cone":
+        catalog_data["radius"] = amaj.tolist()
+    else:
+        catalog_data["amaj"] = amaj.tolist()
+        catalog_data["amin"] = (amaj * rng.uniform(0.2, 0.9, n)).tolist()
+        catalog_data["phi"] = rng.uniform(0, 180, n).tolist()
+    entries = catalog_entries(catalog_data)
+
+    with DBSession() as session:
+        catalog = SpatialCatalog(catalog_name=f"benchmark-{prefix}")
+        session.add(catalog)
+        session.flush()
+
+        if args.legacy_n > 0:
+            m = min(args.legacy_n, n)
+            start = time.perf_counter()
+            skymaps = [entry_skymap(entry) for entry in entries[:m]]
+            moc_duration = time.perf_counter() - start
+            legacy_entries = [
+                SpatialCatalogEntry(
+                    catalog_id=catalog.id,
+                    entry_name=f"legacy-{skymap['entry_name']}",
+                    data=skymap["data"],
+                    uniq=skymap["uniq"].tolist(),
+                    probdensity=skymap["probdensity"].tolist(),
+                )
+                for skymap in skymaps
+            ]
+            session.add_all(legacy_entries)
+            session.flush()
+            for entry in legacy_entries:
+                session.add_all(
+                    [
+                        SpatialCatalogEntryTile(
+                            entry_name=entry.entry_name,
+                            healpix=uniq,
+                            probdensity=probdensity,
+                        )
+                        for uniq, probdensity in zip(entry.uniq, entry.probdensity)
+                    ]
+                )
+            session.flush()
+            duration = time.perf_counter() - start
+            print(
+                f"legacy (serial, ORM): {m / duration:.0f} entries/s "
+                f"({m} in {duration:.2f} s, of which {moc_duration:.2f} s of MOCs)"
+            )
+
+        start = time.perf_counter()
+        skymaps = entry_skymaps(entries, n_processes=args.processes)
+        moc_duration = time.perf_counter() - start
+        n_entries, n_tiles = copy_spatial_catalog_entries(catalog.id, skymaps, session)
+        duration = time.perf_counter() - start
+        print(
+            f"pool + COPY: {n / duration:.0f} entries/s ({n_entries} entries and "
+            f"{n_tiles} tiles in {duration:.2f} s, of which {moc_duration:.2f} s "
+            f"of MOCs on {args.processes} processes)"
+        )
+        session.rollback()
+
+
+# the sky maps are generated by spawned processes, which import this module
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""Measure the retrieval of executed ZTF observations from the depot.
+
+The depot is replayed from recorded files, laid out as on the depot server
+(<directory>/<YYYYMMDD>/ztf_recentproc_<YYYYMMDD>.json or goodsubs_<YYYYMMDD>.txt),
+with a simulated network latency per request. The nights are fetched one at a
+time and concurrently, and the per-exposure aggregation is compared with the
+previous loop over the groups. Nothing is written to the database.
+
+With --synthetic N, N nights of synthetic observations are recorded in the
+directory first.
+"""
+
+import argparse
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from astropy.time import Time
+
+from baselayer.app.env import load_env
+from skyportal.facility_apis.ztf import (
+    aggregate_exposures,
+    get_depot_observations,
+    inv_bands,
+)
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("directory", help="Directory of the recorded depot files")
+parser.add_argument("--start", default="2024-01-01", help="First night (UTC date)")
+parser.add_argument("--nights", type=int, default=30, help="Number of nights")
+parser.add_argument(
+    "--latency", type=float, default=0.2, help="Simulated seconds per request"
+)
+parser.add_argument("--workers", type=int, default=8, help="Concurrent nights")
+parser.add_argument(
+    "--synthetic",
+    type=int,
+    default=0,
+    help="Record this many nights of synthetic observations first",
+)
+args = parser.parse_args()
+
+env, cfg = load_env()
+
+DEPOT_URL = "https://depot.test"
+jd_start = Time(f"{args.start}T12:00:00").jd
+jd_end = jd_start + args.nights
+dates = [
+    Time(jd, format="jd").datetime.strftime("%Y%m%d")
+    for jd in np.arange(np.floor(jd_start), np.ceil(jd_end))
+]
+
+
+class RecordedDepot:
+    def __init__(self, directory, latency):
+        self.directory = directory
+        self.latency = latency
+
+    def get(self, url):
+        time.sleep(self.latency)
+        path = os.path.join(self.directory, url.removeprefix(f"{DEPOT_URL}/"))
+        if not os.path.exists(path):
+            return SimpleNamespace(status_code=404, text="Not Found")
+        with open(path) as f:
+            content = f.read()
+        return SimpleNamespace(
+            status_code=200, text=content, json=lambda: json.loads(content)
+        )
+
+
+def record_synthetic(directory, n_nights):
+    rng = np.random.default_rng(0)
+    for date in dates[:n_nights]:
+        n_exposures = 300
+        n_rows = n_exposures * 64
+        night = pd.DataFrame(
+            {
+                "exposure_id": np.repeat(int(date) * 1000 + np.arange(n_exposures), 64),
+                "field_id": np.repeat(rng.integers(200, 900, n_exposures), 64),
+                "filter_id": np.repeat(rng.integers(1, 4, n_exposures), 64),
+                "obsjd": np.repeat(
+                    Time(f"{date[:4]}-{date[4:6]}-{date[6:]}").jd
+                    + np.sort(rng.uniform(0, 0.4, n_exposures)),
+                    64,
+                ),
+                "maglim": rng.normal(20.5, 0.3, n_rows),
+                "fwhm": rng.normal(2.0, 0.2, n_rows),
+                "exposure_time": 30,
+                "status": (rng.uniform(size=n_rows) < 0.05).astype(int),
+            }
+        )
+        os.makedirs(os.path.join(directory, date), exist_ok=True)
+        night.to_json(
+            os.path.join(directory, date, f"ztf_recentproc_{date}.json"),
+            orient="records",
+        )
+
+
+def legacy_aggregate(obstable):
+    # the previous implementation: one median per group
+    dfs = []
+    for expid, df_group in obstable.groupby("exposure_id"):
+        df_group_median = df_group.median(numeric_only=True)
+        df_group_median["observation_id"] = int(expid)
+        df_group_median["processed_fraction"] = len(df_group["field_id"]) / 64.0
+        df_group_median["filter"] = inv_bands[int(df_group_median["filter_id"])]
+        dfs.append(df_group_median)
+    return pd.concat(dfs, axis=1).T
+
+
+if args.synthetic > 0:
+    record_synthetic(args.directory, args.synthetic)
+
+depot = RecordedDepot(args.directory, args.latency)
+for name, workers in [("one night at a time", 1), ("concurrent", args.workers)]:
+    start = time.perf_counter()
+    obstable = get_depot_observations(
+        1, lambda: depot, DEPOT_URL, jd_start, jd_end, max_workers=workers
+    )
+    elapsed = time.perf_counter() - start
+    n_observations = 0 if obstable is None else len(obstable)
+    print(f"{name}: {n_observations} observations in {elapsed:.2f} s")
+
+nights = [
+    pd.read_json(os.path.join(args.directory, date, f"ztf_recentproc_{date}.json"))
+    for date in dates
+    if os.path.exists(os.path.join(args.directory, date, f"ztf_recentproc_{date}.json"))
+]
+if len(nights) > 0:
+    quadrants = pd.concat(nights, ignore_index=True)
+    quadrants = quadrants[quadrants["status"] == 0]
+    for name, aggregate in [
+        ("loop over exposures", legacy_aggregate),
+        (
+            "groupby aggregation",
+            lambda obstable: aggregate_exposures(
+                obstable, "exposure_id", "field_id", "filter_id"
+            ),
+        ),
+    ]:
+        start = time.perf_counter()
+        exposures = aggregate(quadrants)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {len(exposures)} exposures in {elapsed:.3f} s")
@@ -0,0 +1,77 @@
+import argparse
+import sys
+import time
+
+parser = argparse.ArgumentParser(
+    description="Mirror the TNS public objects catalog and crossmatch it against all the objects",
+    add_help=True,
+)
+parser.add_argument(
+    "--file",
+    help="Path to a local copy of the catalog (tns_public_objects.csv or .csv.zip). "
+    "If not provided, the catalog is downloaded from TNS.",
+)
+parser.add_argument(
+    "--radius",
+    type=float,
+    default=2.0,
+    help="Crossmatch radius in arcseconds (default: 2)",
+)
+parser.add_argument(
+    "--skip-ingest",
+    action="store_true",
+    help="Only re-run the crossmatch against the existing mirror",
+)
+parser.add_argument(
+    "--no-refresh",
+    action="store_true",
+    help="Do not refresh the updated sources on the frontend",
+)
+
+args = parser.parse_args()
+
+from baselayer.app.env import load_env  # noqa: E402
+from baselayer.app.models import DBSession, init_db  # noqa: E402
+from skyportal.utils.tns_catalog import (  # noqa: E402
+    crossmatch_tns_catalog,
+    download_tns_public_objects,
+    ingest_tns_public_objects,
+    read_tns_public_objects,
+)
+
+env, cfg = load_env()
+init_db(**cfg["database"])
+
+with DBSession() as session:
+    if not args.skip_ingest:
+        start = time.perf_counter()
+        if args.file is not None:
+            df = read_tns_public_objects(args.file)
+        else:
+            bot_id = cfg.get("app.tns.bot_id", None)
+            bot_name = cfg.get("app.tns.bot_name", None)
+            api_key = cfg.get("app.tns.api_key", None)
+            if bot_id is None or bot_name is None or api_key is None:
+                print("TNS bot not configured, provide a local copy with --file")
+                sys.exit(1)
+            tns_headers = {
+                "User-Agent": f'tns_marker{{"tns_id": {bot_id},"type": "bot", "name": "{bot_name}"}}',
+            }
+            df = read_tns_public_objects(
+                download_tns_public_objects(api_key, tns_headers)
+            )
+        print(f"Read {len(df)} TNS objects in {time.perf_counter() - start:.2f} s")
+
+        start = time.perf_counter()
+        n_upserted = ingest_tns_public_objects(df, session)
+        print(
+            f"Upserted {n_upserted} TNS objects in {time.perf_counter() - start:.2f} s"
+        )
+
+    stats = crossmatch_tns_catalog(
+        session, radius=args.radius / 3600, refresh=not args.no_refresh
+    )
+    print(
+        f"Matched {stats['n_matched']} objects in {stats['match_duration']:.2f} s, "
+        f"updated {stats['n_updated']} in {stats['update_duration']:.2f} s"
+    )